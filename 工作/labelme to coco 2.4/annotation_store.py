@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+列式标注存储
+
+COCO标注在写出前不再以dict列表保存在内存中，而是按列写入磁盘上的 np.memmap：
+
+- rows: 每个标注一条定长记录（id、image_id、category_id、bbox、area、坐标区间）
+- coords: 所有segmentation坐标连续存放的float64缓冲区，rows中记录起点和长度
+
+内存占用只有操作系统缓存的页面，数据集大小受磁盘而不是内存限制。
+坐标用float64保存，int与float写出时保持原来的类型，还原出的标注与写入的dict序列化后逐字节一致；
+结构不符合常规COCO标注的（多段segmentation、额外字段等）整体序列化后放在raw缓冲区，读取时原样解析。
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import json_codec
+
+ANNOTATION_KEYS = ('segmentation', 'iscrowd', 'image_id', 'bbox', 'area', 'category_id', 'id')
+
+ROW_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('image_id', '<i8'),
+    ('category_id', '<i8'),
+    ('flags', 'u1'),
+    ('bbox', '<f8', (4,)),
+    ('area', '<f8'),
+    ('start', '<i8'),       # coords（或raw）中的起点
+    ('count', '<i8')        # 坐标个数（或raw字节数）
+])
+
+FLAG_INT_COORDS = 1     # segmentation坐标都是整数
+FLAG_RAW = 2            # 整个标注以JSON保存在raw缓冲区
+
+_FLOAT_TYPES = {float, np.float64}
+_INT_TYPES = {int, np.int64, np.int32}
+
+class _GrowableMemmap:
+    """按需倍增容量的一维memmap"""
+    
+    def __init__(self, path, dtype, capacity=1024):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.size = 0
+        self._array = None
+        self._resize(capacity)
+    
+    def _resize(self, capacity):
+        if self._array is not None:
+            self._memmap.flush()
+            self._array = self._memmap = None
+        with open(self.path, 'ab') as f:
+            f.truncate(capacity * self.dtype.itemsize)
+        self._memmap = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(capacity,))
+        # 切片和赋值用普通ndarray视图，避免memmap子类的额外开销
+        self._array = self._memmap.view(np.ndarray)
+    
+    def extend(self, values):
+        """追加一段数据，返回起始位置"""
+        needed = self.size + len(values)
+        if needed > len(self._array):
+            self._resize(max(needed, 2 * len(self._array)))
+        start = self.size
+        self._array[start:needed] = values
+        self.size = needed
+        return start
+    
+    def view(self):
+        """已写入部分"""
+        return self._array[:self.size]
+    
+    def close(self):
+        if self._array is not None:
+            self._memmap.flush()
+            self._array = self._memmap = None
+
+def _columnar_flags(annotation):
+    """标注可以按列保存时返回flags，否则返回None"""
+    if tuple(annotation) != ANNOTATION_KEYS or annotation['iscrowd'] != 0:
+        return None
+    if not {type(annotation['iscrowd']), type(annotation['image_id']), type(annotation['category_id']),
+            type(annotation['id'])} <= _INT_TYPES:
+        return None
+    bbox = annotation['bbox']
+    if type(bbox) is not list or len(bbox) != 4 or not {type(annotation['area']), *map(type, bbox)} <= _FLOAT_TYPES:
+        return None
+    segmentation = annotation['segmentation']
+    if type(segmentation) is not list or len(segmentation) != 1 or type(segmentation[0]) is not list:
+        return None
+    types = set(map(type, segmentation[0]))
+    if types <= _FLOAT_TYPES:
+        return 0
+    if types <= _INT_TYPES:
+        return FLAG_INT_COORDS
+    return None
+
+class ColumnarAnnotationStore:
+    """
+    磁盘上的列式标注存储
+    
+    Args:
+        directory: 存放memmap文件的目录，临时子目录在close时删除；None为系统临时目录
+    """
+    
+    # 追加的标注先在内存中攒一批，再整批转换写入memmap
+    BATCH_SIZE = 4096
+    
+    def __init__(self, directory=None):
+        self._dir = tempfile.mkdtemp(prefix='annotations_', dir=directory)
+        self._rows = _GrowableMemmap(os.path.join(self._dir, 'rows.bin'), ROW_DTYPE)
+        self._coords = _GrowableMemmap(os.path.join(self._dir, 'coords.bin'), '<f8', 16 * 1024)
+        self._raw = None
+        self._coord_count = 0   # 包括未写入的坐标
+        self._reset_pending()
+    
+    def _reset_pending(self):
+        # 按列攒着的标注：id、image_id、category_id、flags、start、count各一个列表，bbox+area每个标注5个值
+        self._pending_ints = ([], [], [], [], [], [])
+        self._pending_floats = []
+        self._pending_coords = []
+    
+    def __len__(self):
+        return self._rows.size + len(self._pending_ints[0])
+    
+    def append(self, annotation):
+        """追加一个标注（dict，键顺序与SimpleLabelme2COCO生成的相同）"""
+        ids, image_ids, category_ids, flag_list, starts, counts = self._pending_ints
+        flags = _columnar_flags(annotation)
+        if flags is None:
+            self._append_raw(annotation)
+        else:
+            coords = annotation['segmentation'][0]
+            ids.append(annotation['id'])
+            image_ids.append(annotation['image_id'])
+            category_ids.append(annotation['category_id'])
+            flag_list.append(flags)
+            starts.append(self._coord_count)
+            counts.append(len(coords))
+            self._pending_floats.extend(annotation['bbox'])
+            self._pending_floats.append(annotation['area'])
+            self._pending_coords.extend(coords)
+            self._coord_count += len(coords)
+        if len(ids) >= self.BATCH_SIZE:
+            self.flush()
+    
+    def _append_raw(self, annotation):
+        data = np.frombuffer(json_codec.dumps(annotation), dtype='u1')
+        if self._raw is None:
+            self._raw = _GrowableMemmap(os.path.join(self._dir, 'raw.bin'), 'u1', 64 * 1024)
+        start = self._raw.extend(data)
+        # 统计用的列尽量填写，取不到时为0
+        for column, key in zip(self._pending_ints, ('id', 'image_id', 'category_id')):
+            value = annotation.get(key, 0)
+            column.append(value if type(value) in _INT_TYPES else 0)
+        for column, value in zip(self._pending_ints[3:], (FLAG_RAW, start, len(data))):
+            column.append(value)
+        self._pending_floats.extend((0.0, 0.0, 0.0, 0.0, 0.0))
+    
+    def flush(self):
+        """把攒着的标注写入memmap"""
+        ids, image_ids, category_ids, flag_list, starts, counts = self._pending_ints
+        if ids:
+            rows = np.empty(len(ids), dtype=ROW_DTYPE)
+            rows['id'] = ids
+            rows['image_id'] = image_ids
+            rows['category_id'] = category_ids
+            rows['flags'] = flag_list
+            rows['start'] = starts
+            rows['count'] = counts
+            floats = np.array(self._pending_floats, dtype='<f8').reshape(-1, 5)
+            rows['bbox'] = floats[:, :4]
+            rows['area'] = floats[:, 4]
+            self._rows.extend(rows)
+        if self._pending_coords:
+            self._coords.extend(np.array(self._pending_coords, dtype='<f8'))
+        self._reset_pending()
+    
+    def iter_annotations(self, chunk_size=8192, numpy_segmentation=False):
+        """
+        按写入顺序还原标注dict
+        
+        numpy_segmentation=True时segmentation中是memmap上的ndarray视图（整数坐标为int64数组），
+        只用于直接序列化写出：json_codec按对应的Python数值写出，省去逐个创建Python数值
+        """
+        self.flush()
+        rows = self._rows.view()
+        coords = self._coords.view()
+        for chunk_start in range(0, len(rows), chunk_size):
+            chunk = rows[chunk_start:chunk_start + chunk_size]
+            base = 0
+            chunk_coords = coords
+            if not numpy_segmentation:
+                columnar = chunk[chunk['flags'] & FLAG_RAW == 0]
+                if len(columnar):
+                    # 整个分块的坐标一次转换成Python数值
+                    base = int(columnar['start'].min())
+                    chunk_coords = coords[base:int((columnar['start'] + columnar['count']).max())].tolist()
+            for flags, image_id, category_id, annotation_id, bbox, area, start, count in zip(
+                    chunk['flags'].tolist(), chunk['image_id'].tolist(), chunk['category_id'].tolist(),
+                    chunk['id'].tolist(), chunk['bbox'].tolist(), chunk['area'].tolist(),
+                    chunk['start'].tolist(), chunk['count'].tolist()):
+                if flags & FLAG_RAW:
+                    yield json_codec.loads(self._raw.view()[start:start + count].tobytes())
+                    continue
+                segmentation = chunk_coords[start - base:start - base + count]
+                if flags & FLAG_INT_COORDS:
+                    segmentation = segmentation.astype(np.int64) if numpy_segmentation else list(map(int, segmentation))
+                yield {
+                    'segmentation': [segmentation],
+                    'iscrowd': 0,
+                    'image_id': image_id,
+                    'bbox': bbox,
+                    'area': area,
+                    'category_id': category_id,
+                    'id': annotation_id
+                }
+    
+    def category_counts(self):
+        """category_id -> 标注数"""
+        self.flush()
+        ids, counts = np.unique(self._rows.view()['category_id'], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+    
+    def image_counts(self):
+        """image_id -> 标注数"""
+        self.flush()
+        ids, counts = np.unique(self._rows.view()['image_id'], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+    
+    def area_summary(self):
+        """按列计算的标注面积统计（不含raw格式的标注）"""
+        self.flush()
+        rows = self._rows.view()
+        area = rows['area'][rows['flags'] & FLAG_RAW == 0]
+        if len(area) == 0:
+            return {'count': 0}
+        return {
+            'count': int(len(area)),
+            'min': float(area.min()),
+            'max': float(area.max()),
+            'mean': float(area.mean())
+        }
+    
+    def close(self):
+        """关闭memmap并删除磁盘文件"""
+        for buffer in (self._rows, self._coords, self._raw):
+            if buffer is not None:
+                buffer.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+转换流程基准测试：生成合成labelme数据集，无界面运行完整转换，记录各阶段耗时和内存峰值
+
+    python benchmark_conversion.py --folders 4 --images 2000 --shapes 30 -o report.json
+    python benchmark_conversion.py --images 500 --vertices 4-40 --width 4096 --height 3000 --repeat 3
+    python benchmark_conversion.py --compare report_old.json report.json
+
+报告为2空格缩进的JSON，键的顺序固定，可以直接在两次提交之间diff，或用 --compare 打印各阶段的耗时变化。
+阶段来自 DatasetConversionEngine.stage_timings：scan、label_mapping、split、copy、coco、validation，
+每个阶段记录耗时、文件数、文件/s、写入字节数和进程内存峰值；加 --trace-memory 时还有tracemalloc峰值。
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+import json_codec
+from coco_engine import ConversionConfig, DatasetConversionEngine, PLACEMENT_MODES, BBOX_MODES, peak_rss_mb
+
+REPORT_VERSION = 1
+
+
+def parse_range(text):
+    """'8' 或 '4-40' -> (最小, 最大)"""
+    low, _, high = str(text).partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if low <= 0 or high < low:
+        raise argparse.ArgumentTypeError(f"无效的范围: {text}")
+    return low, high
+
+
+def synthetic_image_bytes(width, height, seed):
+    """带噪声的JPEG，文件大小接近真实照片；所有图片共用同一份编码结果"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None]
+    pixels = gradient + rng.normal(0, 25, (height, width, 3)).astype(np.float32)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), 'RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def synthetic_shapes(rng, width, height, shapes, vertices, labels, rectangle_ratio, out_of_bounds_ratio):
+    result = []
+    for _ in range(shapes):
+        label = f'label_{rng.randrange(labels):03d}'
+        size = rng.uniform(0.02, 0.25) * min(width, height)
+        cx = rng.uniform(size, width - size)
+        cy = rng.uniform(size, height - size)
+        if rng.random() < out_of_bounds_ratio:
+            # 越界的多边形，触发光栅化回退
+            cx = rng.choice([-size / 2, width + size / 2])
+        if rng.random() < rectangle_ratio:
+            points = [[round(cx - size, 2), round(cy - size / 2, 2)], [round(cx + size, 2), round(cy + size / 2, 2)]]
+            result.append({'label': label, 'points': points, 'group_id': None,
+                           'shape_type': 'rectangle', 'flags': {}})
+            continue
+        n = rng.randint(*vertices)
+        angles = sorted(rng.uniform(0, 2 * np.pi) for _ in range(n))
+        points = [[round(cx + size * rng.uniform(0.5, 1) * np.cos(a), 2),
+                   round(cy + size * rng.uniform(0.5, 1) * np.sin(a), 2)] for a in angles]
+        result.append({'label': label, 'points': points, 'group_id': None,
+                       'shape_type': 'polygon', 'flags': {}})
+    return result
+
+
+def generate_dataset(root, folders=2, images=500, shapes=(20, 20), vertices=(8, 8), width=1920, height=1080,
+                     labels=10, rectangle_ratio=0.5, out_of_bounds_ratio=0.02, seed=0):
+    """
+    生成合成labelme文件夹
+
+    Returns:
+        dict: 文件夹列表、文件数、shape数和总字节数
+    """
+    rng = random.Random(seed)
+    image_bytes = synthetic_image_bytes(width, height, seed)
+    stats = {'folders': [], 'images': 0, 'shapes': 0, 'bytes': 0}
+    for folder_index in range(folders):
+        folder = os.path.join(root, f'folder_{folder_index:02d}')
+        os.makedirs(folder, exist_ok=True)
+        for image_index in range(images):
+            name = f'img_{folder_index:02d}_{image_index:06d}'
+            with open(os.path.join(folder, name + '.jpg'), 'wb') as f:
+                f.write(image_bytes)
+            data = {
+                'version': '5.2.1',
+                'flags': {},
+                'shapes': synthetic_shapes(rng, width, height, rng.randint(*shapes), vertices, labels,
+                                           rectangle_ratio, out_of_bounds_ratio),
+                'imagePath': name + '.jpg',
+                'imageData': None,
+                'imageHeight': height,
+                'imageWidth': width
+            }
+            blob = json_codec.dumps(data, indent=True)
+            with open(os.path.join(folder, name + '.json'), 'wb') as f:
+                f.write(blob)
+            stats['images'] += 1
+            stats['shapes'] += len(data['shapes'])
+            stats['bytes'] += len(image_bytes) + len(blob)
+        stats['folders'].append(folder)
+    return stats
+
+
+def git_commit():
+    """当前提交（不在git仓库中时返回None）"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_conversion(folders, output_dir, config_values, verbose=False):
+    """运行一次完整转换，返回各阶段耗时"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    config = ConversionConfig(input_folders=folders, output_dir=output_dir, **config_values)
+    engine = DatasetConversionEngine(config, (lambda message: print(message, flush=True)) if verbose else None)
+    start = time.perf_counter()
+    engine.run()
+    total = time.perf_counter() - start
+    return {
+        'total_seconds': round(total, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {timing['stage']: {key: round(value, 4) if isinstance(value, float) else value
+                                     for key, value in timing.items() if key != 'stage'}
+                   for timing in engine.stage_timings}
+    }
+
+
+def best_stages(runs):
+    """每个阶段取多次运行中的最短用时"""
+    best = {}
+    for run in runs:
+        for stage, timing in run['stages'].items():
+            if stage not in best or timing['seconds'] < best[stage]:
+                best[stage] = timing['seconds']
+    return best
+
+
+def compare_reports(old_path, new_path):
+    old = json_codec.load(old_path)
+    new = json_codec.load(new_path)
+    old_best, new_best = old['best_stages'], new['best_stages']
+    print(f"{'阶段':<14}{'旧(s)':>10}{'新(s)':>10}{'变化':>10}")
+    for stage in list(dict.fromkeys(list(old_best) + list(new_best))):
+        before, after = old_best.get(stage), new_best.get(stage)
+        change = f"{(after - before) / before:+.1%}" if before and after is not None else '-'
+        print(f"{stage:<14}{before if before is not None else '-':>10}{after if after is not None else '-':>10}{change:>10}")
+    if old.get('dataset') != new.get('dataset'):
+        print("注意: 两次报告的数据集参数不同")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="labelme → COCO 转换流程基准测试")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="比较两份报告后退出")
+    parser.add_argument('-o', '--output', default='benchmark_report.json', help="报告文件")
+    parser.add_argument('--workdir', help="数据集和输出目录，默认使用临时目录并在结束后删除")
+    parser.add_argument('--keep', action='store_true', help="保留生成的数据集和输出")
+    parser.add_argument('--repeat', type=int, default=1, help="转换重复次数，报告中各阶段取最短用时")
+    parser.add_argument('--verbose', action='store_true', help="输出转换日志")
+    dataset = parser.add_argument_group('合成数据集')
+    dataset.add_argument('--folders', type=int, default=2, help="文件夹数量")
+    dataset.add_argument('--images', type=int, default=500, help="每个文件夹的图片数")
+    dataset.add_argument('--shapes', type=parse_range, default=(20, 20), help="每张图片的shape数，如 20 或 5-50")
+    dataset.add_argument('--vertices', type=parse_range, default=(8, 8), help="多边形顶点数，如 8 或 4-40")
+    dataset.add_argument('--width', type=int, default=1920, help="图片宽度")
+    dataset.add_argument('--height', type=int, default=1080, help="图片高度")
+    dataset.add_argument('--labels', type=int, default=10, help="标签种类数")
+    dataset.add_argument('--rectangles', type=float, default=0.5, help="矩形占shape的比例")
+    dataset.add_argument('--out-of-bounds', type=float, default=0.02, help="越界多边形的比例")
+    dataset.add_argument('--seed', type=int, default=0, help="生成数据集和切分使用的随机种子")
+    conversion = parser.add_argument_group('转换设置')
+    conversion.add_argument('--placement', choices=list(PLACEMENT_MODES), default='copy', help="图片放置方式")
+    conversion.add_argument('--bbox-mode', choices=BBOX_MODES, default='geometric', help="bbox计算模式")
+    conversion.add_argument('--no-parallel', action='store_true', help="单进程生成COCO标注")
+    conversion.add_argument('--workers', type=int, help="生成COCO标注的进程数")
+    conversion.add_argument('--compact', action='store_true', help="紧凑COCO JSON")
+    conversion.add_argument('--max-images', type=int, default=2000, help="每个子集最多图片数量")
+    conversion.add_argument('--trace-memory', action='store_true', help="记录各阶段tracemalloc峰值（会拖慢转换）")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare_reports(*args.compare)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='labelme2coco_bench_')
+    dataset_dir = os.path.join(workdir, 'dataset')
+    output_dir = os.path.join(workdir, 'output')
+    dataset_params = {
+        'folders': args.folders, 'images': args.images, 'shapes': list(args.shapes), 'vertices': list(args.vertices),
+        'width': args.width, 'height': args.height, 'labels': args.labels, 'rectangle_ratio': args.rectangles,
+        'out_of_bounds_ratio': args.out_of_bounds, 'seed': args.seed
+    }
+    config_values = {
+        'seed': args.seed, 'placement_mode': args.placement, 'bbox_mode': args.bbox_mode,
+        'parallel_conversion': not args.no_parallel, 'conversion_workers': args.workers,
+        'compact_json': args.compact, 'max_images_per_folder': args.max_images, 'trace_memory': args.trace_memory
+    }
+
+    try:
+        print(f"生成数据集: {args.folders} 个文件夹 × {args.images} 张图片 → {dataset_dir}")
+        start = time.perf_counter()
+        shutil.rmtree(dataset_dir, ignore_errors=True)
+        stats = generate_dataset(dataset_dir, **dataset_params)
+        print(f"  {stats['images']} 张图片, {stats['shapes']} 个shape, "
+              f"{stats['bytes'] / (1024 * 1024):.1f} MB, 用时 {time.perf_counter() - start:.1f}s")
+
+        runs = []
+        for i in range(args.repeat):
+            run = run_conversion(stats['folders'], output_dir, config_values, args.verbose)
+            runs.append(run)
+            stage_text = ', '.join(f"{stage} {timing['seconds']:.2f}s" for stage, timing in run['stages'].items())
+            print(f"第{i + 1}次: 总计 {run['total_seconds']:.2f}s ({stage_text})")
+    finally:
+        if not args.keep:
+            shutil.rmtree(dataset_dir, ignore_errors=True)
+            shutil.rmtree(output_dir, ignore_errors=True)
+            if not args.workdir:
+                os.rmdir(workdir)
+
+    report = {
+        'version': REPORT_VERSION,
+        'generated': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'json_backend': json_codec.backend,
+            'pillow': Image.__version__,
+            'numpy': np.__version__
+        },
+        'dataset': dict(dataset_params, total_images=stats['images'], total_shapes=stats['shapes'],
+                        total_bytes=stats['bytes']),
+        'config': config_values,
+        'runs': runs,
+        'best_stages': best_stages(runs),
+        'best_total_seconds': min(run['total_seconds'] for run in runs)
+    }
+    json_codec.dump(report, args.output)
+    print(f"报告已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+JSON编解码基准测试：在真实的labelme文件上比较各后端的解析与写出吞吐量
+
+    python benchmark_json_codec.py 文件夹1 文件夹2 --repeat 5
+
+文件内容先全部读入内存，只计时解析/序列化本身，不包含磁盘IO。
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+import json_codec
+
+
+def read_label_files(folders, limit=None):
+    """读取文件夹中所有labelme JSON的原始字节"""
+    blobs = []
+    for folder in folders:
+        for label_file in sorted(glob.glob(os.path.join(folder, '*.json'))):
+            with open(label_file, 'rb') as f:
+                blobs.append(f.read())
+            if limit and len(blobs) >= limit:
+                return blobs
+    return blobs
+
+
+def best_of(repeat, func):
+    """重复执行取最短用时"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(blobs, repeat):
+    """
+    Returns:
+        dict: 后端 -> {'parse': 秒, 'dump_indent': 秒, 'dump_compact': 秒}
+    """
+    results = {}
+    previous = json_codec.backend
+    try:
+        for name in json_codec.BACKENDS:
+            json_codec.set_backend(name)
+            documents = [json_codec.loads(blob) for blob in blobs]
+            results[name] = {
+                'parse': best_of(repeat, lambda: [json_codec.loads(blob) for blob in blobs]),
+                'dump_indent': best_of(repeat, lambda: [json_codec.dumps(doc, indent=True) for doc in documents]),
+                'dump_compact': best_of(repeat, lambda: [json_codec.dumps(doc) for doc in documents]),
+            }
+    finally:
+        json_codec.set_backend(previous)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="labelme JSON解析/写出吞吐量基准测试")
+    parser.add_argument('folders', nargs='+', help="labelme文件夹")
+    parser.add_argument('--repeat', type=int, default=5, help="每项重复次数，取最短用时")
+    parser.add_argument('--limit', type=int, help="最多读取的文件数")
+    args = parser.parse_args(argv)
+
+    blobs = read_label_files(args.folders, args.limit)
+    if not blobs:
+        print("没有找到labelme JSON文件", file=sys.stderr)
+        return 1
+
+    total_mb = sum(len(blob) for blob in blobs) / (1024 * 1024)
+    print(f"文件: {len(blobs)} 个, {total_mb:.1f} MB, 可用后端: {', '.join(json_codec.BACKENDS)}")
+
+    results = benchmark(blobs, args.repeat)
+    baseline = results['json']
+    for name, timings in results.items():
+        print(f"\n[{name}]")
+        for key, label in (('parse', '解析'), ('dump_indent', '写出(缩进)'), ('dump_compact', '写出(紧凑)')):
+            elapsed = timings[key]
+            print(f"  {label}: {len(blobs) / elapsed:10.0f} 文件/s, {total_mb / elapsed:8.1f} MB/s, "
+                  f"相对标准库 {baseline[key] / elapsed:.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4367 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+labelme → COCO 转换引擎（不依赖Tk）
+
+数据集切分、COCO标注生成和图片放置都在这里完成，GUI（labelme to coco 2.4.py）只负责收集设置并显示日志。
+也可以在没有图形界面的服务器上直接运行：
+
+    python coco_engine.py -i 文件夹1 -i 文件夹2 -o 输出目录 --seed 42
+    python coco_engine.py --config build.json
+    python coco_engine.py --config build.json --write-config build_full.json
+    python coco_engine.py --config build.json --incremental
+    python coco_engine.py -i 文件夹 -o 输出目录 --sharded --shard-size-mb 128
+    python coco_engine.py --config build.json --trace-memory --profile-dir profile
+    python coco_engine.py --config build.json --resume
+    python coco_engine.py --config build.json --fix-image-sizes
+    python coco_engine.py --config build.json --export yolo --export hik
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import os.path as osp
+import math
+import argparse
+import numpy as np
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import PIL
+from PIL import Image, ImageDraw
+import random
+import datetime
+import tempfile
+import time
+import itertools
+import hashlib
+import cProfile
+import unicodedata
+import tracemalloc
+from collections import Counter, deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import json_codec
+from annotation_store import ColumnarAnnotationStore
+from image_header import read_image_size
+from export_sinks import (
+    EXPORT_FORMATS, HIK_RESULT_DIRNAME, HIK_RESULT_FILENAME, YOLO_CLASSES_FILENAME,
+    SHAPE_TYPE_FIELD, FanOutWriter, YoloLabelWriter, HikFrameInfoWriter, write_yolo_classes
+)
+
+# Pillow 11.2 起多边形按截断后的整数顶点光栅化；更早的版本使用浮点边填充，
+# 边缘像素与顶点取整结果可能相差1像素，此时 geometric 模式一律走窗口光栅化
+# （旧版本的窗口光栅化同样可能有1像素差异，需要逐像素复现旧结果时使用 full 模式）
+_PIL_POLYGON_TRUNCATES_VERTICES = tuple(int(v) for v in PIL.__version__.split('.')[:2]) >= (11, 2)
+
+BBOX_MODES = ('geometric', 'raster', 'full')
+
+class SimpleLabelme2COCO:
+    def __init__(self, bbox_mode='geometric'):
+        if bbox_mode not in BBOX_MODES:
+            raise ValueError(f"不支持的bbox计算模式: {bbox_mode}")
+        self.bbox_mode = bbox_mode
+        self.label_to_num = {}
+        self.categories_list = []
+        self.labels_list = []
+        
+    def images_labelme(self, data, num):
+        image = {}
+        image['height'] = data['imageHeight']
+        image['width'] = data['imageWidth']
+        image['id'] = num + 1
+        if '\\' in data['imagePath']:
+            image['file_name'] = data['imagePath'].split('\\')[-1]
+        else:
+            image['file_name'] = data['imagePath'].split('/')[-1]
+        return image
+    
+    def categories(self, label):
+        category = {}
+        category['supercategory'] = 'component'
+        category['id'] = len(self.labels_list) + 1
+        category['name'] = label
+        return category
+    
+    def annotations_polygon(self, height, width, points, label, image_num, object_num):
+        annotation = {}
+        annotation['segmentation'] = [list(np.asarray(points).flatten())]
+        annotation['iscrowd'] = 0
+        annotation['image_id'] = image_num + 1
+        annotation['bbox'] = list(map(float, self.get_bbox(height, width, points)))
+        annotation['area'] = annotation['bbox'][2] * annotation['bbox'][3]
+        annotation['category_id'] = self.label_to_num[label]
+        annotation['id'] = object_num + 1
+        return annotation
+    
+    def annotations_rectangle(self, points, label, image_num, object_num):
+        annotation = {}
+        # 正确处理矩形的四个顶点，按逆时针顺序：左上->右上->右下->左下
+        # points[0] = [x1, y1] 左上角, points[1] = [x2, y2] 右下角
+        x1, y1 = points[0]
+        x2, y2 = points[1]
+        
+        # 确保按逆时针顺序排列顶点
+        rect_points = [
+            [x1, y1],  # 左上
+            [x2, y1],  # 右上
+            [x2, y2],  # 右下
+            [x1, y2]   # 左下
+        ]
+        
+        annotation['segmentation'] = [list(np.asarray(rect_points).flatten())]
+        annotation['iscrowd'] = 0
+        annotation['image_id'] = image_num + 1
+        annotation['bbox'] = list(
+            map(float, [
+                points[0][0], points[0][1], points[1][0] - points[0][0], points[1][1] - points[0][1]
+            ]))
+        annotation['area'] = annotation['bbox'][2] * annotation['bbox'][3]
+        annotation['category_id'] = self.label_to_num[label]
+        annotation['id'] = object_num + 1
+        return annotation
+    
+    def get_bbox(self, height, width, points):
+        """
+        计算多边形的外接框 [x, y, w, h]（像素坐标）
+
+        bbox_mode:
+            geometric: 顶点取整后直接求最小/最大值，不再分配整幅掩码；
+                       顶点超出图像范围时回退到 raster 模式以保证结果一致
+            raster:    只在多边形外接窗口内光栅化（Pillow >= 11.2 时与整幅光栅化完全一致）
+            full:      原始实现，按 height x width 整幅掩码光栅化
+        """
+        if self.bbox_mode == 'full':
+            return self.get_bbox_full_frame(height, width, points)
+        
+        if self.bbox_mode == 'geometric' and _PIL_POLYGON_TRUNCATES_VERTICES:
+            # Pillow 按截断后的整数顶点绘制多边形（含轮廓），
+            # 顶点全部落在图像内时外接框就是整数顶点的最小/最大值
+            xs = [math.floor(p[0]) for p in points]
+            ys = [math.floor(p[1]) for p in points]
+            min_x, max_x = min(xs), max(xs)
+            min_y, max_y = min(ys), max(ys)
+            if min_x >= 0 and min_y >= 0 and max_x < width and max_y < height:
+                return [min_x, min_y, max_x - min_x, max_y - min_y]
+        
+        return self.get_bbox_window_raster(height, width, points)
+    
+    def get_bbox_window_raster(self, height, width, points):
+        """只在多边形外接窗口（与图像求交）内光栅化计算外接框"""
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        # 窗口左上角向外留1像素；多边形越过图像左/上边界时窗口原点为0，坐标不平移
+        x0 = max(0, math.floor(min(xs)) - 1)
+        y0 = max(0, math.floor(min(ys)) - 1)
+        x1 = min(width, math.ceil(max(xs)) + 2)
+        y1 = min(height, math.ceil(max(ys)) + 2)
+        if x1 <= x0 or y1 <= y0:
+            # 与整幅光栅化一致：多边形完全在图像外时没有像素
+            raise ValueError("多边形完全位于图像范围之外，无法计算bbox")
+        
+        mask = Image.new('L', (x1 - x0, y1 - y0), 0)
+        xy = [(x - x0, y - y0) for x, y in zip(xs, ys)]
+        ImageDraw.Draw(mask).polygon(xy=xy, outline=1, fill=1)
+        mask = np.array(mask, dtype=bool)
+        index = np.argwhere(mask)
+        if len(index) == 0:
+            raise ValueError("多边形完全位于图像范围之外，无法计算bbox")
+        rows = index[:, 0]
+        clos = index[:, 1]
+        left_top_r = int(np.min(rows)) + y0
+        left_top_c = int(np.min(clos)) + x0
+        right_bottom_r = int(np.max(rows)) + y0
+        right_bottom_c = int(np.max(clos)) + x0
+        return [
+            left_top_c, left_top_r, right_bottom_c - left_top_c,
+            right_bottom_r - left_top_r
+        ]
+    
+    def get_bbox_full_frame(self, height, width, points):
+        """原始实现：分配 height x width 掩码整幅光栅化后求外接框"""
+        polygons = points
+        mask = np.zeros([height, width], dtype=np.uint8)
+        mask = Image.fromarray(mask)
+        xy = list(map(tuple, polygons))
+        ImageDraw.Draw(mask).polygon(xy=xy, outline=1, fill=1)
+        mask = np.array(mask, dtype=bool)
+        index = np.argwhere(mask == 1)
+        rows = index[:, 0]
+        clos = index[:, 1]
+        left_top_r = np.min(rows)
+        left_top_c = np.min(clos)
+        right_bottom_r = np.max(rows)
+        right_bottom_c = np.max(clos)
+        return [
+            left_top_c, left_top_r, right_bottom_c - left_top_c,
+            right_bottom_r - left_top_r
+        ]
+
+class DatasetSplitter:
+    """数据集切分类"""
+    
+    def __init__(self, train_ratio=0.8, test_ratio=0.1, verify_ratio=0.1):
+        """
+        初始化数据集切分器
+        
+        Args:
+            train_ratio: 训练集比例
+            test_ratio: 测试集比例  
+            verify_ratio: 验证集比例
+        """
+        self.train_ratio = train_ratio
+        self.test_ratio = test_ratio
+        self.verify_ratio = verify_ratio
+        
+        # 验证比例总和是否为1
+        total = train_ratio + test_ratio + verify_ratio
+        if abs(total - 1.0) > 0.001:
+            raise ValueError(f"比例总和必须为1，当前为{total}")
+    
+    def split_dataset(self, file_list, random_seed=None):
+        """
+        切分数据集
+        
+        Args:
+            file_list: 文件列表
+            random_seed: 随机种子，确保结果可重现
+            
+        Returns:
+            dict: 包含train、test、verify三个列表的字典
+        """
+        if random_seed is not None:
+            random.seed(random_seed)
+        
+        # 随机打乱文件列表
+        shuffled_files = file_list.copy()
+        random.shuffle(shuffled_files)
+        
+        total_files = len(shuffled_files)
+        train_count = int(total_files * self.train_ratio)
+        test_count = int(total_files * self.test_ratio)
+        
+        # 分配文件
+        train_files = shuffled_files[:train_count]
+        test_files = shuffled_files[train_count:train_count + test_count]
+        verify_files = shuffled_files[train_count + test_count:]
+        
+        return {
+            'train': train_files,
+            'test': test_files,
+            'verify': verify_files
+        }
+
+class MultiFolderDatasetSplitter:
+    """多文件夹数据集切分类"""
+    
+    def __init__(self, train_ratio=0.8, test_ratio=0.1, verify_ratio=0.1, max_images_per_folder=2000, auto_split=True):
+        """
+        初始化多文件夹数据集切分器
+        
+        Args:
+            train_ratio: 训练集比例
+            test_ratio: 测试集比例  
+            verify_ratio: 验证集比例
+            max_images_per_folder: 每个文件夹最大图片数量
+            auto_split: 是否自动分割大文件夹
+        """
+        self.train_ratio = train_ratio
+        self.test_ratio = test_ratio
+        self.verify_ratio = verify_ratio
+        self.max_images_per_folder = max_images_per_folder
+        self.auto_split = auto_split
+        
+        # 验证比例总和是否为1
+        total = train_ratio + test_ratio + verify_ratio
+        if abs(total - 1.0) > 0.001:
+            raise ValueError(f"比例总和必须为1，当前为{total}")
+    
+    def split_multiple_folders(self, folder_files_dict, random_seed=None):
+        """
+        对多个文件夹分别进行切分
+        
+        Args:
+            folder_files_dict: 文件夹路径到文件列表的字典
+            random_seed: 随机种子，确保结果可重现
+            
+        Returns:
+            dict: 包含train、test、verify三个列表的字典，每个列表包含所有文件夹的文件
+        """
+        if random_seed is not None:
+            random.seed(random_seed)
+        
+        all_train_files = []
+        all_test_files = []
+        all_verify_files = []
+        
+        # 为每个文件夹单独切分
+        for folder_path, file_list in folder_files_dict.items():
+            if not file_list:
+                continue
+                
+            # 随机打乱当前文件夹的文件列表
+            shuffled_files = file_list.copy()
+            random.shuffle(shuffled_files)
+            
+            total_files = len(shuffled_files)
+            train_count = int(total_files * self.train_ratio)
+            test_count = int(total_files * self.test_ratio)
+            
+            # 分配文件
+            folder_train_files = shuffled_files[:train_count]
+            folder_test_files = shuffled_files[train_count:train_count + test_count]
+            folder_verify_files = shuffled_files[train_count + test_count:]
+            
+            # 添加到总列表
+            all_train_files.extend(folder_train_files)
+            all_test_files.extend(folder_test_files)
+            all_verify_files.extend(folder_verify_files)
+        
+        return {
+            'train': all_train_files,
+            'test': all_test_files,
+            'verify': all_verify_files
+        }
+    
+    def get_folder_split_info(self, folder_files_dict, random_seed=None):
+        """
+        获取每个文件夹的切分信息
+        
+        Args:
+            folder_files_dict: 文件夹路径到文件列表的字典
+            random_seed: 随机种子
+            
+        Returns:
+            dict: 每个文件夹的切分详细信息
+        """
+        if random_seed is not None:
+            random.seed(random_seed)
+        
+        folder_info = {}
+        
+        for folder_path, file_list in folder_files_dict.items():
+            if not file_list:
+                folder_info[folder_path] = {'train': 0, 'test': 0, 'verify': 0, 'total': 0}
+                continue
+            
+            # 随机打乱当前文件夹的文件列表
+            shuffled_files = file_list.copy()
+            random.shuffle(shuffled_files)
+            
+            total_files = len(shuffled_files)
+            train_count = int(total_files * self.train_ratio)
+            test_count = int(total_files * self.test_ratio)
+            
+            folder_info[folder_path] = {
+                'train': train_count,
+                'test': test_count,
+                'verify': total_files - train_count - test_count,
+                'total': total_files
+            }
+        
+        return folder_info
+    
+    def split_large_folders(self, folder_files_dict, log_callback=None):
+        """
+        分割大文件夹，确保每个文件夹不超过最大图片数量
+        
+        Args:
+            folder_files_dict: 文件夹路径到文件列表的字典
+            log_callback: 日志回调函数
+            
+        Returns:
+            dict: 分割后的文件夹字典，可能包含子文件夹
+        """
+        if not self.auto_split:
+            return folder_files_dict
+        
+        def log(message):
+            if log_callback:
+                log_callback(message)
+        
+        split_folders_dict = {}
+        
+        for folder_path, file_list in folder_files_dict.items():
+            if len(file_list) <= self.max_images_per_folder:
+                # 不需要分割
+                split_folders_dict[folder_path] = file_list
+            else:
+                # 需要分割
+                folder_name = os.path.basename(folder_path)
+                if not folder_name:
+                    folder_name = "folder"
+                
+                log(f"文件夹 {folder_name} 有 {len(file_list)} 张图片，超过上限 {self.max_images_per_folder}，开始分割...")
+                
+                # 计算需要分割成多少个子文件夹
+                num_splits = (len(file_list) + self.max_images_per_folder - 1) // self.max_images_per_folder
+                
+                # 随机打乱文件列表以确保均匀分布
+                shuffled_files = file_list.copy()
+                random.shuffle(shuffled_files)
+                
+                # 分割文件
+                for i in range(num_splits):
+                    start_idx = i * self.max_images_per_folder
+                    end_idx = min((i + 1) * self.max_images_per_folder, len(shuffled_files))
+                    sub_files = shuffled_files[start_idx:end_idx]
+                    
+                    # 创建子文件夹路径标识
+                    sub_folder_key = f"{folder_path}_part{i+1:02d}"
+                    split_folders_dict[sub_folder_key] = sub_files
+                    
+                    log(f"  创建子文件夹 {folder_name}_part{i+1:02d}: {len(sub_files)} 张图片")
+        
+        return split_folders_dict
+
+class AnnotationRecord:
+    """单个labelme JSON文件的解析结果"""
+    __slots__ = ('path', 'mtime_ns', 'size', 'data', 'labels', 'error', 'labels_error')
+    
+    def __init__(self, path, mtime_ns, size):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.data = None          # 只保留转换需要的字段（不保存imageData）
+        self.labels = None        # 按shapes顺序的标签列表
+        self.error = None         # JSON读取/解析错误
+        self.labels_error = None  # shapes结构错误（缺少shapes或label字段）
+    
+    @property
+    def image_size(self):
+        """返回 (height, width)，字段缺失时为None"""
+        if self.data is None:
+            return None
+        if 'imageHeight' not in self.data or 'imageWidth' not in self.data:
+            return None
+        return self.data['imageHeight'], self.data['imageWidth']
+    
+    def missing_field(self):
+        """返回第一个缺失的必要字段名，全部存在时返回None"""
+        for field in AnnotationIndex.REQUIRED_FIELDS:
+            if field not in self.data:
+                return field
+        return None
+    
+    @property
+    def is_valid(self):
+        return self.error is None and self.labels_error is None and self.missing_field() is None
+
+class AnnotationIndex:
+    """会话级labelme标注索引：每个JSON文件只解析一次，按 路径+mtime+大小 判断是否失效"""
+    
+    REQUIRED_FIELDS = ('imagePath', 'imageHeight', 'imageWidth', 'shapes')
+    
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, label_file):
+        """
+        获取JSON文件的解析结果
+        
+        Args:
+            label_file: labelme JSON文件路径
+            
+        Returns:
+            AnnotationRecord: 文件不存在时返回None
+        """
+        try:
+            st = os.stat(label_file)
+        except OSError:
+            with self._lock:
+                self._records.pop(label_file, None)
+            return None
+        
+        with self._lock:
+            record = self._records.get(label_file)
+            if record is not None and record.mtime_ns == st.st_mtime_ns and record.size == st.st_size:
+                self.hits += 1
+                return record
+            self.misses += 1
+        
+        record = self._parse(label_file, st)
+        with self._lock:
+            self._records[label_file] = record
+        return record
+    
+    def _parse(self, label_file, st):
+        record = AnnotationRecord(label_file, st.st_mtime_ns, st.st_size)
+        try:
+            raw = json_codec.load(label_file)
+            if not isinstance(raw, dict):
+                raise ValueError("JSON根节点不是对象")
+        except Exception as e:
+            record.error = str(e)
+            return record
+        
+        record.data = {key: raw[key] for key in self.REQUIRED_FIELDS if key in raw}
+        try:
+            record.labels = [shape['label'] for shape in raw['shapes']]
+        except Exception as e:
+            record.labels_error = f"shapes结构错误: {e!r}"
+        return record
+    
+    def invalidate(self, label_file):
+        """使单个文件的缓存失效"""
+        with self._lock:
+            self._records.pop(label_file, None)
+    
+    def discard_folder(self, folder_path):
+        """移除某个文件夹下所有文件的缓存"""
+        folder_key = os.path.normcase(os.path.abspath(folder_path))
+        with self._lock:
+            for path in [p for p in self._records
+                         if os.path.normcase(os.path.abspath(os.path.dirname(p))) == folder_key]:
+                del self._records[path]
+    
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+    
+    def __len__(self):
+        return len(self._records)
+
+class LabelFileIndex:
+    """
+    单个文件夹的 标签 -> {JSON文件: 出现次数} 倒排索引
+    
+    一次扫描建立，之后refresh只重新解析大小或修改时间变化的文件（经由AnnotationIndex），
+    标签计数、修改预览和"哪些文件会被修改"都直接从索引得到。
+    JSON文件列表与转换使用同一套FolderScan规则；传入dataset_index时refresh同时更新其中的扫描结果。
+    """
+    
+    def __init__(self, folder_path, annotation_index, dataset_index=None):
+        self.folder_path = folder_path
+        self.annotation_index = annotation_index
+        self.dataset_index = dataset_index
+        self._records = {}      # JSON文件 -> 建立索引时的AnnotationRecord
+        self._label_files = {}  # 标签 -> {JSON文件: 出现次数}
+    
+    def _remove(self, json_file):
+        record = self._records.pop(json_file, None)
+        if record is None or not record.labels:
+            return
+        for label in set(record.labels):
+            files = self._label_files.get(label)
+            if files is None:
+                continue
+            files.pop(json_file, None)
+            if not files:
+                del self._label_files[label]
+    
+    def _add(self, json_file, record):
+        self._records[json_file] = record
+        if not record.labels:
+            return
+        for label, count in Counter(record.labels).items():
+            self._label_files.setdefault(label, {})[json_file] = count
+    
+    def update_files(self, json_files):
+        """重新索引指定文件（修改或回滚之后调用），返回变化的文件数"""
+        changed = 0
+        for json_file in json_files:
+            record = self.annotation_index.get(json_file)
+            if record is not None and record is self._records.get(json_file):
+                continue
+            self._remove(json_file)
+            if record is not None:
+                self._add(json_file, record)
+            changed += 1
+        return changed
+    
+    def refresh(self):
+        """扫描文件夹，只重新索引新增、删除或变化的文件，返回变化的文件数"""
+        if self.dataset_index is not None:
+            folder_scan = self.dataset_index.scan(self.folder_path)
+        else:
+            folder_scan = FolderScan(self.folder_path)
+        json_files = folder_scan.label_files
+        removed = set(self._records).difference(json_files)
+        for json_file in removed:
+            self._remove(json_file)
+        return self.update_files(json_files) + len(removed)
+    
+    def labels(self):
+        return set(self._label_files)
+    
+    def count(self, label):
+        """标签在文件夹中的标注数"""
+        return sum(self._label_files.get(label, {}).values())
+    
+    def files_for(self, label):
+        """包含该标签的文件 -> 出现次数"""
+        return dict(self._label_files.get(label, {}))
+    
+    def preview_changes(self, map_label):
+        """
+        按标签映射函数（如 LabelRewriter.map_label）计算会被修改的文件
+        
+        Returns:
+            dict: JSON文件 -> [(原标签, 新标签, 次数)]，按文件路径排序
+        """
+        changes = {}
+        for label, files in self._label_files.items():
+            if not isinstance(label, str):
+                continue
+            new_label = map_label(label)
+            if not new_label or new_label == label:
+                continue
+            for json_file, count in files.items():
+                changes.setdefault(json_file, []).append((label, new_label, count))
+        return dict(sorted(changes.items()))
+    
+    def __len__(self):
+        return len(self._records)
+
+def _new_conversion_result(data):
+    """读取文件名和图片尺寸，返回尚未处理shapes的转换结果；imagePath无法读取时error非空"""
+    result = {
+        'file_name': None,
+        'height': None,
+        'width': None,
+        'size_error': None,
+        'annotations': [],
+        'warnings': [],
+        'error': None
+    }
+    
+    try:
+        # 统一获取文件名
+        if '\\' in data['imagePath']:
+            result['file_name'] = data['imagePath'].split('\\')[-1]
+        else:
+            result['file_name'] = data['imagePath'].split('/')[-1]
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    
+    try:
+        result['height'] = data['imageHeight']
+        result['width'] = data['imageWidth']
+    except Exception as e:
+        result['size_error'] = str(e)
+    
+    return result
+
+def _convert_shapes_serial(converter, data, result):
+    """逐个shape调用 annotations_polygon/annotations_rectangle（批量生成的参考实现）"""
+    try:
+        # 处理标注 - 使用全局转换器的标签映射
+        for shapes in data['shapes']:
+            label = shapes['label']
+            
+            # 检查标签是否在全局映射中存在
+            if label not in converter.label_to_num:
+                result['warnings'].append(f"警告: 标签 '{label}' 不在全局映射中，跳过该标注")
+                continue
+            
+            p_type = shapes.get('shape_type')
+            temp_bbox = None
+            temp_points = None
+            
+            if p_type == 'polygon':
+                points = shapes.get('points', [])
+                if not isinstance(points, list) or len(points) < 3:
+                    continue
+                temp_points = points
+                temp_bbox = list(map(float, converter.get_bbox(data['imageHeight'], data['imageWidth'], points)))
+            elif p_type == 'rectangle':
+                pts = shapes.get('points', [])
+                if not isinstance(pts, list) or len(pts) != 2:
+                    continue
+                (x1, y1), (x2, y2) = pts
+                x1, x2 = sorted([x1, x2])
+                y1, y2 = sorted([y1, y2])
+                temp_points = [[x1, y1], [x2, y2]]  # 只需要对角线两点
+                temp_bbox = [float(x1), float(y1), float(x2 - x1), float(y2 - y1)]
+            else:
+                continue
+            
+            # 校验bbox有效性
+            if temp_bbox is None or temp_bbox[2] <= 0 or temp_bbox[3] <= 0:
+                continue
+            
+            rounded_bbox = tuple(round(v, 2) for v in temp_bbox)
+            category_id = converter.label_to_num[label]
+            
+            # image_id和id在合并时填写
+            if p_type == 'polygon':
+                annotation = converter.annotations_polygon(
+                    data['imageHeight'], data['imageWidth'], temp_points, label, -1, -1
+                )
+            else:  # rectangle
+                annotation = converter.annotations_rectangle(temp_points, label, -1, -1)
+            annotation[SHAPE_TYPE_FIELD] = p_type
+            result['annotations'].append((category_id, rounded_bbox, annotation))
+    except Exception as e:
+        result['error'] = str(e)
+    
+    return result
+
+_NUMBER_TYPES = frozenset((int, float))
+
+def _flat_coordinates(points):
+    """
+    把 [[x, y], ...] 展开为 [x, y, ...]，并返回坐标是否全部为int
+    
+    结构或类型不是普通的二维数值点时返回None，由逐个shape的参考实现处理。
+    """
+    if set(map(type, points)) != {list} or set(map(len, points)) != {2}:
+        return None
+    flat = list(itertools.chain.from_iterable(points))
+    value_types = set(map(type, flat))
+    if not value_types <= _NUMBER_TYPES:
+        return None
+    return flat, float not in value_types
+
+class AnnotationBatchBuilder:
+    """
+    批量生成多边形/矩形标注
+    
+    一个文件（或一个分片内所有文件）的多边形顶点拼成一个不规则数组（顶点数组 + 每个多边形的起始下标），
+    矩形拼成 N x 4 数组，bbox、面积、矩形角点排序和有效性判断一次计算完成，
+    输出普通Python数值，结果与逐个shape调用 annotations_polygon/annotations_rectangle 完全一致：
+    多边形分割坐标全部为int时保持int，否则为float（与 np.asarray(points).flatten() 的dtype一致）。
+    
+    geometric模式下越界的多边形和raster/full模式的多边形仍逐个光栅化；
+    shapes结构不规则（坐标不是数值、点不是二元组、缺少label等）的文件整体退回参考实现。
+    """
+    
+    def __init__(self, converter):
+        self.converter = converter
+        self._files = []          # (data, result, items)，items为None时使用参考实现
+        self._poly_coords = []    # 所有多边形的顶点坐标 x0, y0, x1, y1, ...
+        self._poly_starts = []    # 每个多边形第一个顶点的序号
+        self._poly_sizes = []     # 每个多边形所在图片的 (height, width)
+        self._rect_coords = []    # 每个矩形的 x1, y1, x2, y2
+    
+    def add_file(self, data):
+        """加入一个文件的labelme数据，build后按加入顺序返回转换结果"""
+        result = _new_conversion_result(data)
+        items = None
+        if result['error'] is None:
+            items = self._collect_shapes(data, result)
+        self._files.append((data, result, items))
+    
+    def _collect_shapes(self, data, result):
+        """
+        按shapes顺序收集待计算的多边形/矩形
+        
+        Returns:
+            list: [('warning', 文本) | ('polygon', 序号, category_id, 坐标, 全部为int, points)
+                   | ('rectangle', 序号, category_id, 坐标, 全部为int)]；需要退回参考实现时返回None
+        """
+        if result['size_error'] is not None:
+            return None
+        height, width = result['height'], result['width']
+        if type(height) is not int or type(width) is not int:
+            return None
+        
+        label_to_num = self.converter.label_to_num
+        items = []
+        poly_count = len(self._poly_starts)
+        rect_count = len(self._rect_coords) // 4
+        poly_coords, poly_starts, poly_sizes, rect_coords = [], [], [], []
+        try:
+            for shape in data['shapes']:
+                label = shape['label']
+                if label not in label_to_num:
+                    items.append(('warning', f"警告: 标签 '{label}' 不在全局映射中，跳过该标注"))
+                    continue
+                
+                p_type = shape.get('shape_type')
+                if p_type == 'polygon':
+                    points = shape.get('points', [])
+                    if not isinstance(points, list) or len(points) < 3:
+                        continue
+                    flat = _flat_coordinates(points)
+                    if flat is None:
+                        return None
+                    coords, all_int = flat
+                    poly_starts.append((len(self._poly_coords) + len(poly_coords)) // 2)
+                    poly_coords.extend(coords)
+                    poly_sizes.append((height, width))
+                    items.append(('polygon', poly_count, label_to_num[label], coords, all_int, points))
+                    poly_count += 1
+                elif p_type == 'rectangle':
+                    pts = shape.get('points', [])
+                    if not isinstance(pts, list) or len(pts) != 2:
+                        continue
+                    flat = _flat_coordinates(pts)
+                    if flat is None:
+                        return None
+                    coords, all_int = flat
+                    rect_coords.extend(coords)
+                    items.append(('rectangle', rect_count, label_to_num[label], coords, all_int))
+                    rect_count += 1
+        except Exception:
+            return None
+        
+        self._poly_coords.extend(poly_coords)
+        self._poly_starts.extend(poly_starts)
+        self._poly_sizes.extend(poly_sizes)
+        self._rect_coords.extend(rect_coords)
+        return items
+    
+    def _polygon_bboxes(self):
+        """
+        geometric模式下顶点全部在图像内的多边形：外接框为取整后顶点的最小/最大值
+        
+        Returns:
+            tuple: (可直接使用的标记, x, y, w, h, area)，均为Python列表
+        """
+        count = len(self._poly_starts)
+        if count == 0:
+            return [], [], [], [], [], []
+        if self.converter.bbox_mode != 'geometric' or not _PIL_POLYGON_TRUNCATES_VERTICES:
+            return [False] * count, None, None, None, None, None
+        
+        # math.floor返回int，-0.0取整后是0；加0.0把np.floor得到的-0.0变成0.0
+        vertices = np.floor(np.array(self._poly_coords, dtype=np.float64).reshape(-1, 2)) + 0.0
+        starts = np.array(self._poly_starts, dtype=np.intp)
+        sizes = np.array(self._poly_sizes, dtype=np.float64)
+        min_x = np.minimum.reduceat(vertices[:, 0], starts)
+        max_x = np.maximum.reduceat(vertices[:, 0], starts)
+        min_y = np.minimum.reduceat(vertices[:, 1], starts)
+        max_y = np.maximum.reduceat(vertices[:, 1], starts)
+        inside = (min_x >= 0) & (min_y >= 0) & (max_x < sizes[:, 1]) & (max_y < sizes[:, 0])
+        w = max_x - min_x
+        h = max_y - min_y
+        return inside.tolist(), min_x.tolist(), min_y.tolist(), w.tolist(), h.tolist(), (w * h).tolist()
+    
+    def _rectangle_bboxes(self):
+        """
+        矩形按 sorted([x1, x2])、sorted([y1, y2]) 排序角点后的外接框
+        
+        Returns:
+            tuple: (x交换标记, y交换标记, x, y, w, h, area)，均为Python列表
+        """
+        if not self._rect_coords:
+            return [], [], [], [], [], [], []
+        rects = np.array(self._rect_coords, dtype=np.float64).reshape(-1, 4)
+        x1, y1, x2, y2 = rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+        # sorted([a, b]) 只在 b < a 时交换
+        swap_x = x2 < x1
+        swap_y = y2 < y1
+        left = np.where(swap_x, x2, x1)
+        right = np.where(swap_x, x1, x2)
+        top = np.where(swap_y, y2, y1)
+        bottom = np.where(swap_y, y1, y2)
+        w = right - left
+        h = bottom - top
+        return (swap_x.tolist(), swap_y.tolist(), left.tolist(), top.tolist(),
+                w.tolist(), h.tolist(), (w * h).tolist())
+    
+    def build(self):
+        """
+        计算所有文件的标注
+        
+        Returns:
+            list: 与add_file顺序一致的转换结果（格式同 convert_labelme_data）
+        """
+        poly_inside, poly_x, poly_y, poly_w, poly_h, poly_area = self._polygon_bboxes()
+        swap_x, swap_y, rect_x, rect_y, rect_w, rect_h, rect_area = self._rectangle_bboxes()
+        converter = self.converter
+        
+        results = []
+        for data, result, items in self._files:
+            results.append(result)
+            if result['error'] is not None:
+                continue
+            if items is None:
+                _convert_shapes_serial(converter, data, result)
+                continue
+            
+            annotations = result['annotations']
+            try:
+                for item in items:
+                    kind = item[0]
+                    if kind == 'warning':
+                        result['warnings'].append(item[1])
+                        continue
+                    
+                    _, index, category_id, coords, all_int = item[:5]
+                    if kind == 'polygon':
+                        if poly_inside[index]:
+                            bbox = [poly_x[index], poly_y[index], poly_w[index], poly_h[index]]
+                            area = poly_area[index]
+                            # 取整后的外接框都是整数值，保留两位小数不改变数值
+                            rounded_bbox = tuple(bbox)
+                        else:
+                            bbox = list(map(float, converter.get_bbox(result['height'], result['width'], item[5])))
+                            area = bbox[2] * bbox[3]
+                            rounded_bbox = None
+                        if bbox[2] <= 0 or bbox[3] <= 0:
+                            continue
+                        segmentation = coords if all_int else [float(v) for v in coords]
+                    else:
+                        bbox = [rect_x[index], rect_y[index], rect_w[index], rect_h[index]]
+                        if bbox[2] <= 0 or bbox[3] <= 0:
+                            continue
+                        rounded_bbox = None
+                        area = rect_area[index]
+                        x1, y1, x2, y2 = coords
+                        if swap_x[index]:
+                            x1, x2 = x2, x1
+                        if swap_y[index]:
+                            y1, y2 = y2, y1
+                        # 左上 -> 右上 -> 右下 -> 左下
+                        segmentation = [x1, y1, x2, y1, x2, y2, x1, y2]
+                        if not all_int:
+                            segmentation = [float(v) for v in segmentation]
+                    
+                    # image_id和id在合并时填写；shape_type只供其他格式的输出使用
+                    annotation = {
+                        'segmentation': [segmentation],
+                        'iscrowd': 0,
+                        'image_id': 0,
+                        'bbox': bbox,
+                        'area': area,
+                        'category_id': category_id,
+                        'id': 0,
+                        SHAPE_TYPE_FIELD: kind
+                    }
+                    if rounded_bbox is None:
+                        rounded_bbox = tuple(round(v, 2) for v in bbox)
+                    annotations.append((category_id, rounded_bbox, annotation))
+            except Exception as e:
+                result['error'] = str(e)
+        
+        self._files = []
+        self._poly_coords, self._poly_starts, self._poly_sizes, self._rect_coords = [], [], [], []
+        return results
+
+def convert_labelme_data(converter, data):
+    """
+    把一个labelme文件的数据转换为候选标注（尚未分配image_id和annotation id）
+    
+    串行与多进程转换共用该函数，保证两条路径的结果完全一致。
+    
+    Args:
+        converter: 已建立全局标签映射的 SimpleLabelme2COCO
+        data: labelme JSON数据
+        
+    Returns:
+        dict: file_name/height/width、size_error（图片尺寸字段缺失时的异常信息）、
+              annotations（[(category_id, rounded_bbox, annotation)]）、warnings、error
+    """
+    builder = AnnotationBatchBuilder(converter)
+    builder.add_file(data)
+    return builder.build()[0]
+
+def convert_labelme_files(converter, label_files):
+    """
+    多进程worker：读取并转换一批labelme文件，整个分片的shapes一起批量计算
+    
+    Returns:
+        list: 与label_files一一对应，文件不存在时为None
+    """
+    results = [None] * len(label_files)
+    builder = AnnotationBatchBuilder(converter)
+    batched = []
+    for i, label_file in enumerate(label_files):
+        try:
+            data = json_codec.load(label_file)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            results[i] = failed_conversion_result(str(e))
+            continue
+        builder.add_file(data)
+        batched.append(i)
+    for i, result in zip(batched, builder.build()):
+        results[i] = result
+    return results
+
+def failed_conversion_result(error):
+    """JSON无法读取时的转换结果"""
+    return {
+        'file_name': None,
+        'height': None,
+        'width': None,
+        'size_error': None,
+        'annotations': [],
+        'warnings': [],
+        'error': error
+    }
+
+def coco_info():
+    """COCO格式必需的info字段"""
+    return {
+        "description": "Converted from Labelme format",
+        "version": "1.0",
+        "year": 2024,
+        "contributor": "Labelme to COCO Converter",
+        "date_created": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    }
+
+class StreamingCocoWriter:
+    """
+    流式写出COCO标注文件，内存占用与子集大小无关
+    
+    images直接写入同目录的临时文件（finish时替换目标文件，出错或取消时原有输出保持不变），
+    annotations先按列写入同目录下的ColumnarAnnotationStore（np.memmap），
+    finish时依次写出categories、annotations和info，各类别标注数也从列存储统计。对象通过json_codec序列化，
+    indent=2时输出与 json.dump(data, indent=2, ensure_ascii=False) 逐字节一致
+    （orjson后端下极大/极小浮点数的指数写法除外）；compact=True时不缩进、不加空格。
+    """
+    
+    def __init__(self, json_path, compact=False):
+        self.json_path = json_path
+        self.compact = compact
+        self.num_images = 0
+        
+        self._tmp_path = json_path + '.tmp'
+        self._file = open(self._tmp_path, 'wb')
+        self.store = ColumnarAnnotationStore(os.path.dirname(json_path) or None)
+        self._file.write(b'{' + self._key('images') + b'[')
+    
+    def _dumps(self, obj):
+        if self.compact:
+            return json_codec.dumps(obj)
+        # 数组元素位于第2层，续行缩进4个空格
+        return json_codec.dumps(obj, indent=True).replace(b'\n', b'\n    ')
+    
+    def _key(self, name):
+        if self.compact:
+            return f'"{name}":'.encode('utf-8')
+        return f'\n  "{name}": '.encode('utf-8')
+    
+    def _item(self, f, index, obj):
+        if self.compact:
+            f.write((b'' if index == 0 else b',') + self._dumps(obj))
+        else:
+            f.write((b'\n    ' if index == 0 else b',\n    ') + self._dumps(obj))
+    
+    def _close_array(self, count):
+        if count and not self.compact:
+            return b'\n  ]'
+        return b']'
+    
+    def add_image(self, image):
+        self._item(self._file, self.num_images, image)
+        self.num_images += 1
+    
+    @property
+    def num_annotations(self):
+        return len(self.store)
+    
+    def add_annotation(self, annotation):
+        self.store.append(annotation)
+    
+    def finish(self, categories, info):
+        """
+        写出剩余部分并关闭文件
+        
+        Returns:
+            dict: images/annotations数量、categories和各category_id的标注数
+        """
+        f = self._file
+        f.write(self._close_array(self.num_images) + b',')
+        
+        f.write(self._key('categories') + b'[')
+        for index, category in enumerate(categories):
+            self._item(f, index, category)
+        f.write(self._close_array(len(categories)) + b',')
+        
+        f.write(self._key('annotations') + b'[')
+        for index, annotation in enumerate(self.store.iter_annotations(numpy_segmentation=True)):
+            self._item(f, index, annotation)
+        f.write(self._close_array(self.num_annotations) + b',')
+        
+        if self.compact:
+            f.write(self._key('info') + json_codec.dumps(info) + b'}')
+        else:
+            f.write(self._key('info') + json_codec.dumps(info, indent=True).replace(b'\n', b'\n  ') + b'\n}')
+        
+        summary = {
+            'images': self.num_images,
+            'annotations': self.num_annotations,
+            'categories': categories,
+            'category_counts': self.store.category_counts(),
+            'area': self.store.area_summary()
+        }
+        self.store.close()
+        self._file.close()
+        os.replace(self._tmp_path, self.json_path)
+        return summary
+    
+    def close(self):
+        """关闭并删除临时文件和列存储（出错时调用，原有的JSON保持不变）"""
+        self.store.close()
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+SHARD_FORMAT = 'labelme2coco-shards'
+SHARD_FORMAT_VERSION = 1
+SHARD_META_FILENAME = 'meta.json'
+SHARD_INDEX_FILENAME = 'index.bin'
+SHARD_INDEX_MAGIC = b'L2CIDX01'
+# 索引记录：image_id, 分片序号, 字节偏移, 字节长度（小端、无填充）
+SHARD_INDEX_DTYPE = np.dtype([('image_id', '<i8'), ('shard', '<u4'), ('offset', '<u8'), ('length', '<u8')])
+
+def sharded_split_dir(annotations_dir, split_name):
+    """分片输出目录，与 instance_{split_name}.json 同级"""
+    return osp.join(annotations_dir, f'instance_{split_name}')
+
+class ShardedCocoWriter:
+    """
+    分片写出COCO标注，接口与StreamingCocoWriter相同
+    
+    目录结构：
+        meta.json               格式版本、categories、info、分片列表和数量统计
+        shard-00000.jsonl ...   每行一张图片：{"image": {...}, "annotations": [...]}
+        index.bin               8字节魔数 + 记录数(uint64) + 按image_id排序的 SHARD_INDEX_DTYPE 记录
+    
+    同名图片的标注来自不相邻的文件时，后来的标注另写一行 {"image_id": id, "annotations": [...]}，
+    索引中同一image_id有多条记录。按行顺序依次读取即得到与instance_*.json相同顺序的images和annotations。
+    先写入 .tmp 目录，finish时替换原有目录。
+    """
+    
+    def __init__(self, split_dir, shard_bytes=256 * 1024 * 1024):
+        self.split_dir = split_dir
+        self.shard_bytes = shard_bytes
+        self.num_images = 0
+        self.num_annotations = 0
+        self.category_counts = Counter()
+        
+        self._tmp_dir = split_dir + '.tmp'
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+        os.makedirs(self._tmp_dir)
+        self._shards = []
+        self._shard_file = None
+        self._shard_size = 0
+        self._index = []
+        self._pending = None
+        self._pending_id = None
+    
+    def add_image(self, image):
+        self._flush()
+        self._pending = {'image': image, 'annotations': []}
+        self._pending_id = image['id']
+        self.num_images += 1
+    
+    def add_annotation(self, annotation):
+        if self._pending is None or annotation['image_id'] != self._pending_id:
+            self._flush()
+            self._pending = {'image_id': annotation['image_id'], 'annotations': []}
+            self._pending_id = annotation['image_id']
+        self._pending['annotations'].append(annotation)
+        self.num_annotations += 1
+        self.category_counts[annotation['category_id']] += 1
+    
+    def _flush(self):
+        if self._pending is None:
+            return
+        line = json_codec.dumps(self._pending) + b'\n'
+        if self._shard_file is None or self._shard_size >= self.shard_bytes:
+            self._open_shard()
+        self._index.append((self._pending_id, len(self._shards) - 1, self._shard_size, len(line)))
+        self._shard_file.write(line)
+        self._shard_size += len(line)
+        self._pending = None
+    
+    def _open_shard(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+        name = f'shard-{len(self._shards):05d}.jsonl'
+        self._shards.append(name)
+        self._shard_file = open(osp.join(self._tmp_dir, name), 'wb')
+        self._shard_size = 0
+    
+    def finish(self, categories, info):
+        """
+        写出索引和meta.json，替换原有分片目录
+        
+        Returns:
+            dict: images/annotations数量、categories和各category_id的标注数
+        """
+        self._flush()
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+        
+        index = np.array(self._index, dtype=SHARD_INDEX_DTYPE)
+        index = index[np.argsort(index['image_id'], kind='stable')]
+        with open(osp.join(self._tmp_dir, SHARD_INDEX_FILENAME), 'wb') as f:
+            f.write(SHARD_INDEX_MAGIC + np.array(len(index), dtype='<u8').tobytes())
+            f.write(index.tobytes())
+        
+        json_codec.dump({
+            'format': SHARD_FORMAT,
+            'version': SHARD_FORMAT_VERSION,
+            'images': self.num_images,
+            'annotations': self.num_annotations,
+            'shards': self._shards,
+            'categories': categories,
+            'info': info
+        }, osp.join(self._tmp_dir, SHARD_META_FILENAME))
+        
+        if os.path.isdir(self.split_dir):
+            shutil.rmtree(self.split_dir)
+        os.replace(self._tmp_dir, self.split_dir)
+        
+        return {
+            'images': self.num_images,
+            'annotations': self.num_annotations,
+            'categories': categories,
+            'category_counts': dict(self.category_counts)
+        }
+    
+    def close(self):
+        """放弃写出（出错时调用），删除临时目录"""
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._shard_file = None
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+class ShardedCocoReader:
+    """
+    读取ShardedCocoWriter写出的分片目录
+    
+    get(image_id) 按索引二分查找，通常一次seek读出该图片及其全部标注。
+    """
+    
+    def __init__(self, split_dir):
+        self.split_dir = split_dir
+        self.meta = json_codec.load(osp.join(split_dir, SHARD_META_FILENAME))
+        if self.meta.get('format') != SHARD_FORMAT or self.meta.get('version') != SHARD_FORMAT_VERSION:
+            raise ValueError(f"不支持的分片格式: {split_dir}")
+        
+        with open(osp.join(split_dir, SHARD_INDEX_FILENAME), 'rb') as f:
+            header = f.read(16)
+            if header[:8] != SHARD_INDEX_MAGIC:
+                raise ValueError(f"索引文件格式不正确: {split_dir}")
+            count = int(np.frombuffer(header[8:], dtype='<u8')[0])
+            self.index = np.frombuffer(f.read(count * SHARD_INDEX_DTYPE.itemsize), dtype=SHARD_INDEX_DTYPE)
+        if len(self.index) != count:
+            raise ValueError(f"索引文件不完整: {split_dir}")
+        self._files = {}
+    
+    @property
+    def categories(self):
+        return self.meta['categories']
+    
+    @property
+    def info(self):
+        return self.meta['info']
+    
+    def image_ids(self):
+        return np.unique(self.index['image_id']).tolist()
+    
+    def _read(self, shard, offset, length):
+        f = self._files.get(shard)
+        if f is None:
+            f = self._files[shard] = open(osp.join(self.split_dir, self.meta['shards'][shard]), 'rb')
+        f.seek(offset)
+        return json_codec.loads(f.read(length))
+    
+    def get(self, image_id):
+        """
+        Returns:
+            tuple: (image, annotations)，image_id不存在时返回 (None, [])
+        """
+        start, stop = np.searchsorted(self.index['image_id'], [image_id, image_id + 1])
+        image = None
+        annotations = []
+        for entry in self.index[start:stop]:
+            record = self._read(int(entry['shard']), int(entry['offset']), int(entry['length']))
+            image = record.get('image', image)
+            annotations.extend(record['annotations'])
+        return image, annotations
+    
+    def iter_records(self):
+        """按写出顺序逐行产出分片记录"""
+        for name in self.meta['shards']:
+            with open(osp.join(self.split_dir, name), 'rb') as f:
+                for line in f:
+                    yield json_codec.loads(line)
+    
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def shards_to_coco(split_dir, json_path, compact=False):
+    """
+    由分片目录重新生成标准COCO文件，images和annotations的顺序与直接写出的instance_*.json相同
+    
+    Returns:
+        dict: 同 StreamingCocoWriter.finish
+    """
+    with ShardedCocoReader(split_dir) as reader:
+        writer = StreamingCocoWriter(json_path, compact=compact)
+        try:
+            for record in reader.iter_records():
+                if 'image' in record:
+                    writer.add_image(record['image'])
+                for annotation in record['annotations']:
+                    writer.add_annotation(annotation)
+        except Exception:
+            writer.close()
+            raise
+        return writer.finish(reader.categories, reader.info)
+
+def load_split_coco(annotations_dir, split_name):
+    """
+    读取子集的完整COCO数据，instance_*.json 不存在时从分片目录组装
+    
+    Raises:
+        OSError: 两种输出都不存在
+    """
+    json_path = osp.join(annotations_dir, f'instance_{split_name}.json')
+    split_dir = sharded_split_dir(annotations_dir, split_name)
+    if os.path.exists(json_path) or not os.path.isdir(split_dir):
+        return json_codec.load(json_path)
+    
+    with ShardedCocoReader(split_dir) as reader:
+        images = []
+        annotations = []
+        for record in reader.iter_records():
+            if 'image' in record:
+                images.append(record['image'])
+            annotations.extend(record['annotations'])
+        return {'images': images, 'categories': reader.categories, 'annotations': annotations, 'info': reader.info}
+
+def load_split_categories(annotations_dir, split_name):
+    """子集的categories，分片输出只读取meta.json；都不存在时返回None"""
+    json_path = osp.join(annotations_dir, f'instance_{split_name}.json')
+    if os.path.exists(json_path):
+        return json_codec.load(json_path)['categories']
+    meta_path = osp.join(sharded_split_dir(annotations_dir, split_name), SHARD_META_FILENAME)
+    if os.path.exists(meta_path):
+        return json_codec.load(meta_path)['categories']
+    return None
+
+def bbox_iou(a, b):
+    """两个 [x, y, w, h] 外接框的IoU"""
+    ix = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    iy = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    return inter / (a[2] * a[3] + b[2] * b[3] - inter)
+
+class ImageAnnotationDeduper:
+    """
+    单张图片的标注去重状态，图片处理完即可释放
+    
+    默认只去掉 类别+保留两位小数的bbox 完全相同的标注；
+    指定iou_threshold（0.5~1）时同类别、IoU不低于阈值的标注也视为重复（例如误双击留下的近似重复框），保留先出现的一个。
+    近似重复通过多尺度空间哈希查找：最长边在 [2^(e-1), 2^e) 的框按中心点放入边长2^e的网格，
+    IoU >= 0.5 的两个框最长边相差不到一倍、中心距离小于一个网格，只需检查相邻尺度的3x3个网格，
+    每个标注的查找代价与图片中标注总数无关。
+    """
+    
+    def __init__(self, iou_threshold=None):
+        if iou_threshold is not None and not 0.5 <= iou_threshold <= 1:
+            raise ValueError(f"IoU阈值必须在0.5到1之间，当前为{iou_threshold}")
+        self.iou_threshold = iou_threshold
+        self._keys = set()   # (category_id, rounded_bbox)
+        self._grid = {}      # (category_id, 尺度, 网格x, 网格y) -> [bbox]
+    
+    @staticmethod
+    def _cell(bbox, exponent):
+        cx = bbox[0] + bbox[2] / 2
+        cy = bbox[1] + bbox[3] / 2
+        return math.floor(math.ldexp(cx, -exponent)), math.floor(math.ldexp(cy, -exponent))
+    
+    def check(self, category_id, rounded_bbox, bbox):
+        """
+        判断标注是否与之前的标注重复，不重复时记录下来
+        
+        Returns:
+            str: 'exact'（完全重复）、'near'（IoU近似重复）或None（不重复）
+        """
+        key = (category_id, rounded_bbox)
+        if key in self._keys:
+            return 'exact'
+        
+        if self.iou_threshold is not None:
+            exponent = math.frexp(max(bbox[2], bbox[3]))[1]
+            for level in (exponent - 1, exponent, exponent + 1):
+                gx, gy = self._cell(bbox, level)
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        for other in self._grid.get((category_id, level, gx + dx, gy + dy), ()):
+                            if bbox_iou(bbox, other) >= self.iou_threshold:
+                                return 'near'
+            gx, gy = self._cell(bbox, exponent)
+            self._grid.setdefault((category_id, exponent, gx, gy), []).append(bbox)
+        
+        self._keys.add(key)
+        return None
+
+class CocoSplitBuilder:
+    """
+    按输入顺序合并单文件转换结果，分配image_id/annotation id并去重
+    
+    指定writer时images/annotations直接交给StreamingCocoWriter写出，不在内存中保留。
+    去重状态只保留当前图片（ImageAnnotationDeduper），切换到下一张图片时释放；
+    同名图片的标注分散在不相邻的文件中时，跨文件去重只在相邻文件之间生效。
+    """
+    
+    def __init__(self, writer=None, iou_threshold=None):
+        self.writer = writer
+        self.iou_threshold = iou_threshold
+        self.images_list = []
+        self.annotations_list = []
+        self.image_num = -1
+        self.object_num = -1
+        # 当前图片的去重状态
+        self._dedupe_image_id = None
+        self._deduper = None
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        # 文件名到image_id的映射
+        self.file_name_to_image_id = {}
+        # 最近一次add_file分配的image_id和annotation id，供增量转换清单记录
+        self.last_image_id = None
+        self.last_annotation_ids = []
+    
+    def add_file(self, result):
+        """
+        合并一个文件的转换结果
+        
+        Returns:
+            tuple: (warnings, error) 需要记录的警告和错误信息
+        """
+        self.last_image_id = None
+        self.last_annotation_ids = []
+        current_file_name = result['file_name']
+        if current_file_name is None:
+            return [], result['error']
+        
+        # 分配image_id
+        if current_file_name in self.file_name_to_image_id:
+            current_image_id = self.file_name_to_image_id[current_file_name]
+        else:
+            self.image_num = self.image_num + 1
+            current_image_id = self.image_num + 1
+            self.file_name_to_image_id[current_file_name] = current_image_id
+            
+            if result['size_error'] is not None:
+                return [], result['size_error']
+            
+            # 添加图片信息
+            image = {
+                'height': result['height'],
+                'width': result['width'],
+                'id': current_image_id,
+                'file_name': current_file_name
+            }
+            if self.writer is not None:
+                self.writer.add_image(image)
+            else:
+                self.images_list.append(image)
+        
+        self.last_image_id = current_image_id
+        warnings = result['warnings']
+        if current_image_id != self._dedupe_image_id:
+            if current_image_id <= self.image_num and result['annotations']:
+                # 之前出现过的图片，其去重状态已释放
+                warnings = warnings + [f"警告: 图片 {current_file_name} 的标注来自不相邻的多个文件，只在相邻文件之间去重"]
+            self._dedupe_image_id = current_image_id
+            self._deduper = ImageAnnotationDeduper(self.iou_threshold)
+        
+        for category_id, rounded_bbox, annotation in result['annotations']:
+            # 去重
+            duplicate = self._deduper.check(category_id, rounded_bbox, annotation['bbox'])
+            if duplicate == 'exact':
+                self.exact_duplicates += 1
+                continue
+            if duplicate == 'near':
+                self.near_duplicates += 1
+                continue
+            
+            self.object_num = self.object_num + 1
+            annotation['image_id'] = current_image_id
+            annotation['id'] = self.object_num + 1
+            self.last_annotation_ids.append(annotation['id'])
+            if self.writer is not None:
+                self.writer.add_annotation(annotation)
+            else:
+                annotation.pop(SHAPE_TYPE_FIELD, None)
+                self.annotations_list.append(annotation)
+        
+        return warnings, result['error']
+    
+    def to_coco(self, converter):
+        """
+        生成COCO数据，使用全局转换器的categories_list确保标签ID一致
+        
+        流式模式下完成写出并返回统计信息（见 StreamingCocoWriter.finish）
+        """
+        if self.writer is not None:
+            return self.writer.finish(converter.categories_list, coco_info())
+        
+        data_coco = {}
+        data_coco['images'] = self.images_list
+        data_coco['categories'] = converter.categories_list
+        data_coco['annotations'] = self.annotations_list
+        
+        # 添加COCO格式必需的info字段
+        data_coco['info'] = coco_info()
+        
+        return data_coco
+
+# 标签一致性检查的问题类型 -> 说明
+LABEL_CHECK_ISSUES = {
+    'unknown_category': "category_id不在全局标签映射中",
+    'orphan_annotation': "标注的image_id不是本子集已写出的图片",
+    'image_id_order': "image_id没有递增（重复）",
+    'annotation_id_order': "标注id没有递增（重复）",
+    'invalid_bbox': "bbox宽或高不大于0",
+    'category_mismatch': "categories中的标签ID与全局映射不一致"
+}
+
+class SplitLabelCheck:
+    """
+    单个子集（或_partNN）的标签一致性检查，作为FanOutWriter的一个输出接收写出的图片和标注
+    
+    只累计计数，finish时检查categories；不返回导出统计（FanOutWriter忽略None）。
+    """
+    
+    def __init__(self, split_name, label_to_num):
+        self.split_name = split_name
+        self.label_to_num = label_to_num
+        self.valid_category_ids = set(label_to_num.values())
+        self.images = 0
+        self.annotations = 0
+        self.issues = Counter()
+        self.category_counts = Counter()
+        self.unknown_category_ids = Counter()
+        self.mismatched_labels = []   # [(标签, 期望ID, 实际ID)]
+        self.finished = False
+        self._image_ids = set()
+        self._last_image_id = 0
+        self._last_annotation_id = 0
+    
+    def add_image(self, image):
+        image_id = image['id']
+        if image_id <= self._last_image_id:
+            self.issues['image_id_order'] += 1
+        self._last_image_id = max(self._last_image_id, image_id)
+        self._image_ids.add(image_id)
+        self.images += 1
+    
+    def add_annotation(self, annotation):
+        self.annotations += 1
+        category_id = annotation['category_id']
+        self.category_counts[category_id] += 1
+        if category_id not in self.valid_category_ids:
+            self.issues['unknown_category'] += 1
+            self.unknown_category_ids[category_id] += 1
+        if annotation['image_id'] not in self._image_ids:
+            self.issues['orphan_annotation'] += 1
+        if annotation['id'] <= self._last_annotation_id:
+            self.issues['annotation_id_order'] += 1
+        self._last_annotation_id = max(self._last_annotation_id, annotation['id'])
+        bbox = annotation['bbox']
+        if not (bbox[2] > 0 and bbox[3] > 0):
+            self.issues['invalid_bbox'] += 1
+    
+    def finish(self, categories, info):
+        written = {category['name']: category['id'] for category in categories}
+        for label in sorted(set(written) | set(self.label_to_num)):
+            if written.get(label) != self.label_to_num.get(label):
+                self.mismatched_labels.append((label, self.label_to_num.get(label), written.get(label)))
+        self.issues['category_mismatch'] += len(self.mismatched_labels)
+        self.issues = +self.issues
+        self.finished = True
+        self._image_ids = set()
+        return None
+    
+    def close(self):
+        self._image_ids = set()
+
+class LabelConsistencyValidator:
+    """
+    生成标注时检查标签和ID的不变量，代替写出后重新读取 instance_*.json
+    
+    每个写出的子集（包括 _partNN）通过 for_split 得到一个 SplitLabelCheck，汇总后用于全局验证。
+    """
+    
+    def __init__(self, label_to_num):
+        self.label_to_num = dict(label_to_num)
+        self.splits = {}  # 子集名 -> SplitLabelCheck，按写出顺序
+    
+    def for_split(self, split_name):
+        check = SplitLabelCheck(split_name, self.label_to_num)
+        self.splits[split_name] = check
+        return check
+    
+    def checked_splits(self):
+        return [check for check in self.splits.values() if check.finished]
+    
+    def issue_counts(self):
+        total = Counter()
+        for check in self.checked_splits():
+            total.update(check.issues)
+        return total
+    
+    def category_counts(self):
+        total = Counter()
+        for check in self.checked_splits():
+            total.update(check.category_counts)
+        return total
+
+# 文件数少于该值时不启用多进程，避免进程启动开销大于收益
+PARALLEL_CONVERSION_MIN_FILES = 200
+# 多进程转换时每个进程最多同时在途的分片数
+MAX_PENDING_SHARDS_PER_WORKER = 2
+
+def shard_file_list(files, num_workers, max_shard_size=500):
+    """把文件列表按顺序切成若干连续分片"""
+    if not files:
+        return []
+    shard_size = max(1, min(max_shard_size, math.ceil(len(files) / (num_workers * 4))))
+    return [files[i:i + shard_size] for i in range(0, len(files), shard_size)]
+
+# 图片放置方式：模式 -> 显示名称
+PLACEMENT_MODES = {
+    'copy': '复制',
+    'hardlink': '硬链接',
+    'reflink': '写时复制(reflink)',
+    'symlink': '符号链接'
+}
+
+# Linux ioctl FICLONE，Btrfs/XFS等文件系统支持块级共享复制
+_FICLONE = 0x40049409
+
+def _reflink_file(src, dst):
+    """使用FICLONE创建reflink副本，不支持时抛出OSError"""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("当前平台不支持reflink")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+    shutil.copystat(src, dst)
+
+def place_file(src, dst, mode='copy'):
+    """
+    按指定方式把图片放到输出目录
+    
+    hardlink/reflink/symlink失败（跨设备、文件系统或权限不支持）时自动退回复制。
+    目标已存在时先删除，避免写穿上次生成的链接而修改源文件。
+    
+    Returns:
+        str: 实际使用的放置方式
+    """
+    if mode not in PLACEMENT_MODES:
+        raise ValueError(f"未知的图片放置方式: {mode}，可选: {', '.join(PLACEMENT_MODES)}")
+    
+    if os.path.lexists(dst):
+        os.remove(dst)
+    
+    if mode != 'copy':
+        try:
+            if mode == 'hardlink':
+                os.link(src, dst)
+            elif mode == 'reflink':
+                _reflink_file(src, dst)
+            else:  # symlink
+                os.symlink(os.path.abspath(src), dst)
+            return mode
+        except OSError:
+            pass
+    
+    copy_file_fast(src, dst)
+    return 'copy'
+
+# 单次内核复制/读写的块大小
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+def _kernel_copy(src_fd, dst_fd, size):
+    """
+    优先用copy_file_range，其次sendfile在内核中复制，返回已复制的字节数
+    
+    copy_file_range在NFS 4.2/SMB上可由服务端完成复制，在Btrfs/XFS上可能直接共享数据块。
+    两者都不可用时返回0，由调用方改用普通读写。
+    """
+    offset = 0
+    for name in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, name):
+            continue
+        try:
+            while offset < size:
+                count = min(COPY_BUFFER_SIZE, size - offset)
+                if name == 'copy_file_range':
+                    sent = os.copy_file_range(src_fd, dst_fd, count)
+                else:
+                    sent = os.sendfile(dst_fd, src_fd, offset, count)
+                if sent == 0:
+                    break
+                offset += sent
+            return offset
+        except OSError:
+            # 已经复制了部分数据时不能换方式重来
+            if offset:
+                raise
+    return offset
+
+def copy_file_fast(src, dst):
+    """大块复制文件内容并保留元数据，语义同shutil.copy2"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = _kernel_copy(fsrc.fileno(), fdst.fileno(), size)
+        if copied < size:
+            fsrc.seek(copied)
+            fdst.seek(copied)
+            shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+    shutil.copystat(src, dst)
+
+class ParallelFileCopier:
+    """
+    有界线程池图片放置引擎
+    
+    网络存储上单个文件的延迟远大于带宽开销，多线程并发可以掩盖延迟。
+    同时在途的任务数限制为线程数的4倍；单个文件失败时重试，重试耗尽后取消剩余任务并抛出异常。
+    进度回调按固定间隔合并，不会每个文件都刷新界面。
+    """
+    
+    def __init__(self, mode='copy', max_workers=8, retries=2, progress_interval=0.1):
+        if mode not in PLACEMENT_MODES:
+            raise ValueError(f"未知的图片放置方式: {mode}，可选: {', '.join(PLACEMENT_MODES)}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.retries = max(0, retries)
+        self.progress_interval = progress_interval
+        
+        # 累计统计，多次run共用
+        self.files = 0
+        self.bytes = 0
+        self.retried = 0
+        self.elapsed = 0.0
+        self.mode_counts = Counter()
+    
+    def _place(self, src, dst):
+        for attempt in range(self.retries + 1):
+            try:
+                actual_mode = place_file(src, dst, self.mode)
+                return actual_mode, os.stat(src).st_size, attempt
+            except OSError:
+                if attempt == self.retries:
+                    raise
+                time.sleep(0.2 * (attempt + 1))
+    
+    def run(self, tasks, progress_callback=None):
+        """
+        并发放置文件
+        
+        Args:
+            tasks: [(源路径, 目标路径)]
+            progress_callback: callback(已完成数, 总数)，最多每progress_interval秒调用一次，完成时必定调用
+        """
+        total = len(tasks)
+        if total == 0:
+            return
+        
+        start_time = time.perf_counter()
+        last_report = start_time
+        done = 0
+        max_in_flight = self.max_workers * 4
+        task_iter = iter(tasks)
+        pending = set()
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def fill():
+                for src, dst in itertools.islice(task_iter, max_in_flight - len(pending)):
+                    pending.add(executor.submit(self._place, src, dst))
+            
+            try:
+                fill()
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        actual_mode, size, retried = future.result()
+                        self.mode_counts[actual_mode] += 1
+                        self.bytes += size
+                        self.retried += retried
+                        done += 1
+                    fill()
+                    
+                    now = time.perf_counter()
+                    if progress_callback and (done == total or now - last_report >= self.progress_interval):
+                        last_report = now
+                        progress_callback(done, total)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+            finally:
+                self.files += done
+                self.elapsed += time.perf_counter() - start_time
+    
+    def summary(self):
+        """吞吐量统计文本"""
+        elapsed = max(self.elapsed, 1e-6)
+        size_mb = self.bytes / (1024 * 1024)
+        text = (f"{self.files} 个文件, {size_mb:.1f} MB, 用时 {self.elapsed:.2f}s, "
+                f"{self.files / elapsed:.1f} 文件/s, {size_mb / elapsed:.1f} MB/s")
+        if self.retried:
+            text += f", 重试 {self.retried} 次"
+        return text
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# 图片列表按扩展名分组的顺序（与之前逐个glob的顺序相同，同样的随机种子得到同样的切分）；
+# 扩展名经os.path.normcase查找：Windows下glob不区分大小写，.JPG/.Jpg与.jpg同组，POSIX下保持原有顺序
+_IMAGE_ORDER = {ext: rank for rank, ext in enumerate(['.jpg', '.jpeg', '.png', '.bmp', '.JPG', '.JPEG', '.PNG'])}
+
+class FolderScan:
+    """
+    一次 os.scandir 得到的文件夹内容
+    
+    图片和labelme JSON按文件名（不含扩展名）在内存中配对，扩展名不区分大小写，以.开头的隐藏文件跳过；
+    之后判断JSON是否存在、查找JSON对应的图片都不再访问磁盘。
+    """
+    
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.images = []        # 图片路径
+        self.label_files = []   # JSON路径
+        self._labels_by_stem = {}
+        self._images_by_stem = {}
+        
+        entries = []
+        with os.scandir(folder_path) as it:
+            for i, entry in enumerate(it):
+                # 与glob一致跳过隐藏文件（如macOS的 ._xxx.jpg）
+                if entry.name.startswith('.'):
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                lower_ext = ext.lower()
+                if lower_ext != '.json' and lower_ext not in IMAGE_EXTENSIONS:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                key = os.path.normcase(stem)
+                if lower_ext == '.json':
+                    self.label_files.append(entry.path)
+                    self._labels_by_stem.setdefault(key, entry.path)
+                else:
+                    entries.append((_IMAGE_ORDER.get(os.path.normcase(ext), len(_IMAGE_ORDER)), i, key, entry.path))
+        
+        entries.sort()
+        for _, _, key, path in entries:
+            self.images.append(path)
+            self._images_by_stem.setdefault(key, path)
+    
+    def label_file_for(self, img_file):
+        """图片对应的JSON路径，没有时返回None"""
+        stem = os.path.splitext(os.path.basename(img_file))[0]
+        return self._labels_by_stem.get(os.path.normcase(stem))
+    
+    def image_for(self, label_file):
+        """JSON对应的第一张图片，没有时返回None"""
+        stem = os.path.splitext(os.path.basename(label_file))[0]
+        return self._images_by_stem.get(os.path.normcase(stem))
+    
+    def images_without_labels(self):
+        return [img_file for img_file in self.images if self.label_file_for(img_file) is None]
+    
+    def orphan_label_files(self):
+        """没有同名图片的JSON"""
+        return [label_file for label_file in self.label_files if self.image_for(label_file) is None]
+
+class DatasetIndex:
+    """按文件夹缓存FolderScan，转换和检查阶段直接从内存查询图片对应的JSON（可在多个线程中扫描不同文件夹）"""
+    
+    def __init__(self):
+        self._scans = {}
+        self._label_for_image = {}  # 图片路径 -> JSON路径（没有时为None）
+        self._lock = threading.Lock()
+    
+    def scan(self, folder_path):
+        """重新扫描文件夹（一次scandir）并替换缓存"""
+        folder_scan = FolderScan(folder_path)
+        labels = {img_file: folder_scan.label_file_for(img_file) for img_file in folder_scan.images}
+        with self._lock:
+            self._discard(folder_path)
+            self._scans[folder_path] = folder_scan
+            self._label_for_image.update(labels)
+        return folder_scan
+    
+    def get(self, folder_path):
+        """已缓存的扫描结果，没有扫描过时返回None"""
+        return self._scans.get(folder_path)
+    
+    def label_file_for(self, img_file):
+        """
+        图片对应的labelme JSON路径
+        
+        图片来自已扫描的文件夹时按扫描结果回答（没有JSON返回None），否则按同名规则拼出路径
+        """
+        if img_file in self._label_for_image:
+            return self._label_for_image[img_file]
+        return label_file_for_image(img_file)
+    
+    def discard(self, folder_path):
+        with self._lock:
+            self._discard(folder_path)
+    
+    def _discard(self, folder_path):
+        folder_scan = self._scans.pop(folder_path, None)
+        if folder_scan is not None:
+            for img_file in folder_scan.images:
+                self._label_for_image.pop(img_file, None)
+    
+    def clear(self):
+        with self._lock:
+            self._scans.clear()
+            self._label_for_image.clear()
+
+def get_image_files(input_dir, dataset_index=None):
+    """获取输入目录中的所有图片文件，传入dataset_index时同时缓存扫描结果"""
+    if dataset_index is not None:
+        return list(dataset_index.scan(input_dir).images)
+    return FolderScan(input_dir).images
+
+class FolderIngestor:
+    """
+    后台添加文件夹：每个文件夹一个任务，最多max_workers个同时扫描
+    
+    任务扫描图片、解析JSON收集标签，结果为dict：folder、image_files、labels、errors；
+    cancel后未开始的任务不再运行，运行中的任务在下一个检查点返回None。
+    进度回调 progress_callback(folder, done, total) 在工作线程中调用，GUI需要自己转到界面线程。
+    """
+    
+    # 每解析多少个文件报告一次进度并检查是否取消
+    PROGRESS_INTERVAL = 200
+    
+    def __init__(self, dataset_index, annotation_index, max_workers=4):
+        self.dataset_index = dataset_index
+        self.annotation_index = annotation_index
+        self.max_workers = max(1, max_workers)
+        self._cancel_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest')
+    
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+    
+    def submit(self, folder_path, progress_callback=None):
+        """提交一个文件夹，返回Future"""
+        return self._executor.submit(self.ingest, folder_path, progress_callback)
+    
+    def ingest(self, folder_path, progress_callback=None):
+        """扫描一个文件夹，取消时返回None"""
+        if self.cancelled:
+            return None
+        image_files = get_image_files(folder_path, self.dataset_index)
+        labels = set()
+        errors = []
+        total = len(image_files)
+        for done, img_file in enumerate(image_files):
+            if done % self.PROGRESS_INTERVAL == 0:
+                if self.cancelled:
+                    return None
+                if progress_callback:
+                    progress_callback(folder_path, done, total)
+            
+            label_file = self.dataset_index.label_file_for(img_file)
+            if label_file is None:
+                continue
+            record = self.annotation_index.get(label_file)
+            if record is None:
+                continue
+            if record.error or record.labels_error:
+                errors.append(f"{label_file}: {record.error or record.labels_error}")
+                continue
+            labels.update(record.labels)
+        
+        if progress_callback:
+            progress_callback(folder_path, total, total)
+        return {'folder': folder_path, 'image_files': image_files, 'labels': labels, 'errors': errors}
+    
+    def cancel(self):
+        """取消：排队中的任务直接取消，运行中的任务尽快返回None"""
+        self._cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+def build_label_mapping(input_folders, annotation_index, converter, log_callback=None, folder_names=None,
+                        dataset_index=None):
+    """
+    统一扫描所有文件夹的标签，按首次出现的顺序建立全局标签映射（避免重复）
+    
+    Args:
+        input_folders: 文件夹路径到图片文件列表的字典
+        annotation_index: AnnotationIndex
+        converter: 写入映射的 SimpleLabelme2COCO
+        log_callback: 日志回调函数
+        folder_names: 文件夹路径到显示名称的字典
+        dataset_index: DatasetIndex，传入时直接按扫描结果跳过没有JSON的图片
+        
+    Returns:
+        dict: 每个标签出现的次数
+    """
+    def log(message):
+        if log_callback:
+            log_callback(message)
+    
+    folder_names = folder_names or {}
+    seen_labels = set(converter.labels_list)
+    label_count = {}  # 统计每个标签出现的次数
+    
+    log("开始统一扫描所有文件夹建立标签映射...")
+    
+    # 扫描所有文件夹
+    for folder_path, image_files in input_folders.items():
+        folder_name = folder_names.get(folder_path, os.path.basename(folder_path))
+        log(f"扫描文件夹: {folder_name} ({len(image_files)} 个文件)")
+        
+        for img_file in image_files:
+            if dataset_index is not None:
+                label_file = dataset_index.label_file_for(img_file)
+                if label_file is None:
+                    continue
+            else:
+                img_label = os.path.splitext(os.path.basename(img_file))[0]
+                label_file = osp.join(folder_path, img_label + '.json')
+            
+            record = annotation_index.get(label_file)
+            if record is None:
+                continue
+                
+            try:
+                if record.error or record.labels_error:
+                    raise ValueError(record.error or record.labels_error)
+                
+                for label in record.labels:
+                    # 统计标签出现次数
+                    if label not in label_count:
+                        label_count[label] = 0
+                    label_count[label] += 1
+                    
+                    # 只有未见过的标签才添加到全局映射
+                    if label not in seen_labels:
+                        seen_labels.add(label)
+                        converter.categories_list.append(converter.categories(label))
+                        converter.labels_list.append(label)
+                        converter.label_to_num[label] = len(converter.labels_list)
+                        log(f"  发现新标签: '{label}' -> ID {len(converter.labels_list)}")
+                        
+            except Exception as e:
+                log(f"建立标签映射时处理文件 {label_file} 出错: {e}")
+                continue
+    
+    # 输出标签统计信息
+    log(f"\n标签统计信息:")
+    for label, count in sorted(label_count.items()):
+        label_id = converter.label_to_num[label]
+        log(f"  {label_id:2d}: {label} (出现 {count} 次)")
+    
+    log(f"\n统一标签映射建立完成，共 {len(converter.labels_list)} 个标签")
+    return label_count
+
+def load_label_mapping(file_path, bbox_mode='geometric'):
+    """
+    加载GUI"保存映射"导出的标签映射文件
+    
+    Returns:
+        tuple: (SimpleLabelme2COCO, 标签出现次数)
+    """
+    mapping_data = json_codec.load(file_path)
+    
+    # 验证数据完整性
+    required_keys = ['labels', 'label_to_num', 'categories', 'label_count']
+    if not all(key in mapping_data for key in required_keys):
+        raise ValueError("标签映射文件格式不正确")
+    
+    converter = SimpleLabelme2COCO(bbox_mode)
+    converter.labels_list = mapping_data['labels']
+    converter.label_to_num = mapping_data['label_to_num']
+    converter.categories_list = mapping_data['categories']
+    return converter, mapping_data['label_count']
+
+LABEL_JOURNAL_FILENAME = 'journal.jsonl'
+
+def write_file_atomic(path, data):
+    """先写同目录临时文件再替换，中途失败时原文件保持不变"""
+    folder = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class LabelRewriter:
+    """
+    批量修改labelme文件中的标签
+    
+    先在原始字节中查找源标签，不包含任何源标签的文件不解析（正则模式无法预筛选，所有文件都解析）；
+    需要修改的文件由线程池并行改写，写临时文件后替换原文件。
+    指定备份目录时只备份实际修改的文件，并在目录中记录回滚日志 journal.jsonl。
+    """
+    
+    def __init__(self, modification_rules, use_regex=False, case_sensitive=True, max_workers=8):
+        self.modification_rules = dict(modification_rules)
+        self.use_regex = use_regex
+        self.case_sensitive = case_sensitive
+        self.max_workers = max(1, max_workers)
+        
+        self.compiled_patterns = []
+        if use_regex:
+            flags = 0 if case_sensitive else re.IGNORECASE
+            try:
+                for old_pattern, new_pattern in self.modification_rules.items():
+                    self.compiled_patterns.append((re.compile(old_pattern, flags), new_pattern))
+            except re.error as e:
+                raise ValueError(f"正则表达式编译失败: {e}")
+        elif case_sensitive:
+            # 标签在JSON中的两种写法：直接UTF-8和\uXXXX转义
+            self.needles = set()
+            for old_label in self.modification_rules:
+                self.needles.add(json.dumps(old_label, ensure_ascii=False).encode('utf-8'))
+                self.needles.add(json.dumps(old_label).encode('utf-8'))
+        else:
+            self.lower_rules = {}
+            # 按JSON中转义后的写法查找（标签含 " 或 \ 时原始文本中是转义形式）
+            self.lower_needles = set()
+            for old_label, replacement in self.modification_rules.items():
+                self.lower_rules.setdefault(old_label.lower(), replacement)
+                self.lower_needles.add(json.dumps(old_label, ensure_ascii=False).lower())
+        
+        self._journal_lock = threading.Lock()
+        self._backup_dir = None
+        self._journal_path = None
+    
+    def map_label(self, label):
+        """返回修改后的标签，不需要修改时返回None"""
+        if self.use_regex:
+            for compiled_regex, replacement in self.compiled_patterns:
+                if compiled_regex.search(label):
+                    return compiled_regex.sub(replacement, label)
+            return None
+        if self.case_sensitive:
+            return self.modification_rules.get(label)
+        return self.lower_rules.get(label.lower())
+    
+    def may_match(self, raw):
+        """原始字节中可能包含需要修改的标签时返回True"""
+        if self.use_regex:
+            return True
+        if self.case_sensitive:
+            # 大写十六进制等其他转义写法无法逐字匹配，交给解析判断
+            return b'\\u' in raw or any(needle in raw for needle in self.needles)
+        text = raw.decode('utf-8', 'replace').lower()
+        return '\\u' in text or any(needle in text for needle in self.lower_needles)
+    
+    def _backup(self, json_file):
+        """备份即将修改的文件并追加回滚日志（先于替换原文件）"""
+        backup_file = osp.join(self._backup_dir, os.path.basename(json_file))
+        with self._journal_lock:
+            os.makedirs(self._backup_dir, exist_ok=True)
+            shutil.copy2(json_file, backup_file)
+            entry = {'file': os.path.abspath(json_file), 'backup': os.path.basename(backup_file)}
+            with open(self._journal_path, 'ab') as f:
+                f.write(json_codec.dumps(entry) + b'\n')
+    
+    def rewrite_file(self, json_file):
+        """
+        修改单个文件
+        
+        Returns:
+            list: [(原标签, 新标签)]，文件未修改时为空列表，被预筛选跳过时为None
+        """
+        with open(json_file, 'rb') as f:
+            raw = f.read()
+        if not self.may_match(raw):
+            return None
+        
+        data = json_codec.loads(raw)
+        changes = []
+        if 'shapes' in data:
+            for shape in data['shapes']:
+                if 'label' not in shape:
+                    continue
+                original_label = shape['label']
+                new_label = self.map_label(original_label)
+                if new_label and new_label != original_label:
+                    shape['label'] = new_label
+                    changes.append((original_label, new_label))
+        
+        if changes:
+            if self._backup_dir:
+                self._backup(json_file)
+            write_file_atomic(json_file, json_codec.dumps(data, indent=True))
+        return changes
+    
+    def _rewrite_or_error(self, json_file):
+        try:
+            return self.rewrite_file(json_file), None
+        except Exception as e:
+            return [], str(e)
+    
+    def run(self, json_files, backup_dir=None, progress_callback=None):
+        """
+        并行修改文件
+        
+        Args:
+            json_files: labelme文件列表
+            backup_dir: 备份目录，None时不备份；没有文件被修改时不会创建
+            progress_callback: callback(已完成数, 总数)
+            
+        Returns:
+            dict: modified（[(文件, [(原标签, 新标签)])]，按输入顺序）、errors（[(文件, 错误信息)]）、
+                  scanned（通过预筛选并解析的文件数）、journal（回滚日志路径，没有备份时为None）
+        """
+        self._backup_dir = backup_dir
+        self._journal_path = osp.join(backup_dir, LABEL_JOURNAL_FILENAME) if backup_dir else None
+        
+        total = len(json_files)
+        results = [None] * total
+        done = 0
+        max_in_flight = self.max_workers * 4
+        task_iter = iter(enumerate(json_files))
+        pending = {}
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def fill():
+                for index, json_file in itertools.islice(task_iter, max_in_flight - len(pending)):
+                    pending[executor.submit(self._rewrite_or_error, json_file)] = index
+            
+            fill()
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[pending.pop(future)] = future.result()
+                    done += 1
+                fill()
+                if progress_callback:
+                    progress_callback(done, total)
+        
+        modified = []
+        errors = []
+        scanned = 0
+        for json_file, (changes, error) in zip(json_files, results):
+            if changes is not None:
+                scanned += 1
+            if error is not None:
+                errors.append((json_file, error))
+            elif changes:
+                modified.append((json_file, changes))
+        
+        journal = self._journal_path if self._journal_path and os.path.exists(self._journal_path) else None
+        return {'modified': modified, 'errors': errors, 'scanned': scanned, 'journal': journal}
+
+def rollback_label_modification(journal_path, log_callback=None):
+    """
+    按回滚日志用备份文件恢复被修改的labelme文件
+    
+    Returns:
+        tuple: (恢复的文件列表, [(文件, 错误信息)])
+    """
+    def log(message):
+        if log_callback:
+            log_callback(message)
+    
+    backup_dir = os.path.dirname(journal_path)
+    restored = []
+    errors = []
+    with open(journal_path, 'rb') as f:
+        entries = [json_codec.loads(line) for line in f if line.strip()]
+    
+    for entry in entries:
+        json_file = entry['file']
+        backup_file = osp.join(backup_dir, entry['backup'])
+        try:
+            with open(backup_file, 'rb') as f:
+                write_file_atomic(json_file, f.read())
+            shutil.copystat(backup_file, json_file)
+            restored.append(json_file)
+        except OSError as e:
+            errors.append((json_file, str(e)))
+            log(f"  错误: 恢复 {os.path.basename(json_file)} 失败: {e}")
+    
+    log(f"已从 {backup_dir} 恢复 {len(restored)} 个文件")
+    return restored, errors
+
+IMAGE_SIZE_REPORT_FILENAME = 'image_size_report.txt'
+
+# 日志中最多逐条列出的问题数，完整列表写入报告文件
+MAX_LOGGED_ISSUES = 20
+
+class ImageSizeVerifier:
+    """
+    核对labelme JSON中的 imageWidth/imageHeight 与图片的实际尺寸
+    
+    实际尺寸只读文件头（image_header.read_image_size），JSON字段来自AnnotationIndex的缓存，
+    图片对应的JSON按DatasetIndex的扫描结果查找（扩展名不区分大小写）；
+    图片按CHUNK_SIZE分块交给线程池，每块一个任务，10万张图片的调度开销也只有几百个任务。
+    fix=True时把不一致的JSON改成实际尺寸（写临时文件后替换原文件）。
+    """
+    
+    CHUNK_SIZE = 256
+    
+    def __init__(self, annotation_index=None, max_workers=16, dataset_index=None):
+        self.annotation_index = annotation_index if annotation_index is not None else AnnotationIndex()
+        self.dataset_index = dataset_index if dataset_index is not None else DatasetIndex()
+        self.max_workers = max(1, max_workers)
+    
+    def check_file(self, img_file):
+        """
+        核对单张图片
+        
+        Returns:
+            tuple: (JSON中的(宽, 高), 实际的(宽, 高))；没有JSON或JSON缺少尺寸字段时为None（由转换阶段报告）
+        """
+        label_file = self.dataset_index.label_file_for(img_file)
+        record = self.annotation_index.get(label_file) if label_file is not None else None
+        if record is None:
+            return None
+        if record.error is not None:
+            raise ValueError(f"JSON读取失败: {record.error}")
+        image_size = record.image_size
+        if image_size is None:
+            return None
+        height, width = image_size
+        return (width, height), read_image_size(img_file)
+    
+    def fix_file(self, img_file, width, height):
+        """把JSON中的尺寸改成实际尺寸"""
+        label_file = self.dataset_index.label_file_for(img_file)
+        data = json_codec.load(label_file)
+        data['imageWidth'] = width
+        data['imageHeight'] = height
+        write_file_atomic(label_file, json_codec.dumps(data, indent=True))
+        self.annotation_index.invalidate(label_file)
+    
+    def _check_chunk(self, image_files, fix):
+        mismatches = []
+        errors = []
+        for img_file in image_files:
+            try:
+                sizes = self.check_file(img_file)
+                if sizes is None or tuple(sizes[0]) == tuple(sizes[1]):
+                    continue
+                mismatches.append((img_file, sizes[0], tuple(sizes[1])))
+                if fix:
+                    self.fix_file(img_file, *sizes[1])
+            except (OSError, ValueError) as e:
+                errors.append((img_file, str(e)))
+        return mismatches, errors
+    
+    def run(self, image_files, fix=False, progress_callback=None):
+        """
+        并行核对图片尺寸
+        
+        Args:
+            image_files: 图片文件列表（对应的JSON与图片同名，没有JSON的图片跳过）
+            fix: 是否修正不一致的JSON
+            progress_callback: callback(已完成数, 总数)
+        
+        Returns:
+            dict: mismatches（[(图片, JSON中的(宽, 高), 实际的(宽, 高))]，按输入顺序）、
+                  errors（[(图片, 错误信息)]）、checked（核对的图片数）、fixed（修正的JSON数）
+        """
+        total = len(image_files)
+        chunks = [image_files[i:i + self.CHUNK_SIZE] for i in range(0, total, self.CHUNK_SIZE)]
+        results = [None] * len(chunks)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(self._check_chunk, chunk, fix): index for index, chunk in enumerate(chunks)}
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index = pending.pop(future)
+                    results[index] = future.result()
+                    done += len(chunks[index])
+                if progress_callback:
+                    progress_callback(done, total)
+        
+        mismatches = [item for chunk_mismatches, _ in results for item in chunk_mismatches]
+        errors = [item for _, chunk_errors in results for item in chunk_errors]
+        fixed = 0
+        if fix:
+            failed = {img_file for img_file, _ in errors}
+            fixed = sum(1 for img_file, _, _ in mismatches if img_file not in failed)
+        return {'mismatches': mismatches, 'errors': errors, 'checked': total, 'fixed': fixed}
+
+class ConversionConfig:
+    """转换配置，字段与JSON配置文件的键、命令行参数一一对应"""
+    
+    DEFAULTS = {
+        'input_folders': [],
+        'output_dir': '',
+        'train_ratio': 0.8,
+        'test_ratio': 0.1,
+        'verify_ratio': 0.1,
+        'seed': None,                   # None为随机切分
+        'max_images_per_folder': 2000,
+        'auto_split': True,
+        'bbox_mode': 'geometric',
+        'label_mapping': None,          # 标签映射文件，None时扫描所有文件夹建立
+        'parallel_conversion': True,
+        'conversion_workers': None,     # None为CPU核数
+        'compact_json': False,
+        'placement_mode': 'copy',
+        'copy_workers': 8,
+        'incremental': False,           # 按输出目录中的转换清单只处理变化的文件
+        'dedupe_iou': None,             # 同一图片内同类别IoU不低于该值的标注视为重复，None只去除完全相同的
+        'sharded_output': False,        # 标注写成JSONL分片+偏移索引，代替单个instance_*.json
+        'shard_size_mb': 256,           # 每个分片的大致大小
+        'trace_memory': False,          # 用tracemalloc记录各阶段Python内存分配峰值（较慢）
+        'profile_dir': None,            # 每个阶段的cProfile结果写入该目录，None不做性能剖析
+        'resume': False,                # 按输出目录中的任务日志继续上次中断或取消的转换
+        'verify_image_sizes': False,    # 转换前用图片文件头核对JSON中的imageWidth/imageHeight
+        'fix_image_sizes': False,       # 核对时把不一致的JSON改成实际尺寸（隐含verify_image_sizes）
+        'export_formats': []            # 与COCO标注同时导出的其他格式：'yolo'、'hik'
+    }
+    
+    def __init__(self, **values):
+        unknown = set(values) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"未知的配置项: {', '.join(sorted(unknown))}")
+        for key, default in self.DEFAULTS.items():
+            value = values.get(key, default)
+            setattr(self, key, list(value) if isinstance(value, list) else value)
+    
+    @classmethod
+    def load(cls, file_path):
+        """从JSON配置文件加载"""
+        values = json_codec.load(file_path)
+        if not isinstance(values, dict):
+            raise ValueError(f"配置文件格式不正确: {file_path}")
+        return cls(**values)
+    
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.DEFAULTS}
+    
+    def save(self, file_path):
+        json_codec.dump(self.to_dict(), file_path)
+    
+    def validate(self):
+        """检查配置，发现问题时抛出ValueError"""
+        if not self.output_dir:
+            raise ValueError("请指定输出目录")
+        
+        ratios = (self.train_ratio, self.test_ratio, self.verify_ratio)
+        if any(ratio < 0 for ratio in ratios):
+            raise ValueError("切分比例不能为负数")
+        total = sum(ratios)
+        if abs(total - 1.0) > 0.001:
+            raise ValueError(f"比例总和必须为1，当前为{total}")
+        
+        if self.seed is not None and not isinstance(self.seed, int):
+            raise ValueError("随机种子必须是整数")
+        if not isinstance(self.max_images_per_folder, int) or self.max_images_per_folder <= 0:
+            raise ValueError("每文件夹最大图片数量必须是大于0的整数")
+        if self.bbox_mode not in BBOX_MODES:
+            raise ValueError(f"不支持的bbox计算模式: {self.bbox_mode}")
+        if self.placement_mode not in PLACEMENT_MODES:
+            raise ValueError(f"未知的图片放置方式: {self.placement_mode}，可选: {', '.join(PLACEMENT_MODES)}")
+        if self.conversion_workers is not None and self.conversion_workers <= 0:
+            raise ValueError("进程数必须大于0")
+        if self.copy_workers <= 0:
+            raise ValueError("复制线程数必须大于0")
+        if self.dedupe_iou is not None and not 0.5 <= self.dedupe_iou <= 1:
+            raise ValueError("去重IoU阈值必须在0.5到1之间")
+        if self.shard_size_mb <= 0:
+            raise ValueError("分片大小必须大于0")
+        unknown_formats = set(self.export_formats) - set(EXPORT_FORMATS)
+        if unknown_formats:
+            raise ValueError(f"未知的导出格式: {', '.join(sorted(unknown_formats))}，可选: {', '.join(EXPORT_FORMATS)}")
+
+MANIFEST_FILENAME = 'conversion_manifest.json'
+MANIFEST_VERSION = 1
+
+# 这些设置变化后原有切分不再有效，增量转换退回完整转换
+MANIFEST_SPLIT_SETTINGS = ('train_ratio', 'test_ratio', 'verify_ratio', 'seed', 'max_images_per_folder', 'auto_split')
+
+JOURNAL_FILENAME = 'conversion_journal.jsonl'
+JOURNAL_VERSION = 1
+
+# 这些设置变化后已经写出的文件不再有效，不能继续上次的转换
+JOURNAL_OUTPUT_SETTINGS = ('bbox_mode', 'dedupe_iou', 'compact_json', 'sharded_output', 'shard_size_mb', 'placement_mode',
+                           'export_formats')
+
+# 每个复制批次的图片数，完成的批次记入任务日志
+COPY_BATCH_SIZE = 1000
+
+# 生成标注时每处理多少个文件检查一次是否取消
+CANCEL_CHECK_INTERVAL = 1000
+
+def label_file_for_image(img_file):
+    """图片对应的labelme JSON文件路径"""
+    return osp.join(os.path.dirname(img_file), os.path.splitext(os.path.basename(img_file))[0] + '.json')
+
+def file_signature(path):
+    """文件的 [大小, 修改时间(ns)]，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+def file_sha1(path):
+    """文件内容的SHA-1，文件不存在时返回None"""
+    sha1 = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(chunk)
+    except OSError:
+        return None
+    return sha1.hexdigest()
+
+def iter_split_subset_parts(split_subsets):
+    """按输出目录名展开分割后的子集：(train 或 train_part01, 文件列表)"""
+    for subset_name, parts_list in split_subsets.items():
+        if len(parts_list) == 1:
+            yield subset_name, parts_list[0]
+        else:
+            for i, part_files in enumerate(parts_list):
+                yield f"{subset_name}_part{i+1:02d}", part_files
+
+class ConversionManifest:
+    """
+    增量转换清单，保存在输出目录的 conversion_manifest.json
+    
+    记录每张源图片及其labelme文件的大小、修改时间、JSON内容哈希、所属输出子集，
+    以及写入 instance_*.json 时分配的image_id和annotation id。
+    """
+    
+    def __init__(self, settings=None, bbox_mode=None, labels=None, subsets=None, files=None, dedupe_iou=None):
+        self.settings = settings or {}
+        self.bbox_mode = bbox_mode
+        self.dedupe_iou = dedupe_iou
+        self.labels = labels or {}      # 标签 -> category_id
+        self.subsets = subsets or {}    # 输出子集目录名 -> 图片路径列表（即写入顺序）
+        self.files = files or {}        # 图片路径 -> 文件记录
+    
+    @staticmethod
+    def split_settings(config):
+        return {key: getattr(config, key) for key in MANIFEST_SPLIT_SETTINGS}
+    
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中的清单，不存在或无法解析时返回None"""
+        path = osp.join(output_dir, MANIFEST_FILENAME)
+        try:
+            data = json_codec.load(path)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(data.get('settings'), data.get('bbox_mode'), data.get('labels'),
+                   data.get('subsets'), data.get('files'), data.get('dedupe_iou'))
+    
+    def save(self, output_dir):
+        """先写临时文件再替换，中途失败不会留下残缺的清单"""
+        path = osp.join(output_dir, MANIFEST_FILENAME)
+        data = {
+            'version': MANIFEST_VERSION,
+            'generated': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'settings': self.settings,
+            'bbox_mode': self.bbox_mode,
+            'dedupe_iou': self.dedupe_iou,
+            'labels': self.labels,
+            'subsets': self.subsets,
+            'files': self.files
+        }
+        tmp_path = path + '.tmp'
+        json_codec.dump(data, tmp_path, indent=False)
+        os.replace(tmp_path, path)
+        return path
+    
+    def incompatible_reason(self, config):
+        """切分设置与本次配置不同时返回原因，可以增量转换时返回None"""
+        if self.settings != self.split_settings(config):
+            return "切分设置与上次转换不同"
+        return None
+    
+    def json_changed(self, record, label_file, signature):
+        """labelme文件是否变化：大小和修改时间相同视为未变，否则比较内容哈希"""
+        if signature == record.get('json_signature'):
+            return False
+        if signature is None or record.get('json_signature') is None:
+            return True
+        sha1 = file_sha1(label_file)
+        if sha1 != record.get('json_sha1'):
+            return True
+        # 只是修改时间变了（例如重新保存），更新记录下次不再计算哈希
+        record['json_signature'] = signature
+        return False
+    
+    @staticmethod
+    def make_record(img_file, subset_name, image_id, annotation_ids, image_signature=None):
+        label_file = label_file_for_image(img_file)
+        return {
+            'json': label_file,
+            'subset': subset_name,
+            'image_signature': image_signature or file_signature(img_file),
+            'json_signature': file_signature(label_file),
+            'json_sha1': file_sha1(label_file),
+            'image_id': image_id,
+            'annotation_ids': list(annotation_ids)
+        }
+
+def peak_rss_mb():
+    """进程到目前为止的内存峰值（MB），平台不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def existing_split_info_file(output_dir, auto_split):
+    """输出目录中完整转换生成的分割信息文件（自动分割时为subset_split_info.txt），没有时返回None"""
+    path = osp.join(output_dir, "subset_split_info.txt" if auto_split else "folder_split_info.txt")
+    return path if os.path.exists(path) else None
+
+def output_size(path):
+    """文件或目录（递归）的字节数"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(osp.join(root, filename)) for filename in filenames)
+    return total
+
+def output_signature(path):
+    """标注文件的 [大小, 修改时间(ns)]，分片目录为 [总字节数, meta.json修改时间]；不存在时返回None"""
+    if not os.path.isdir(path):
+        return file_signature(path)
+    meta_signature = file_signature(osp.join(path, SHARD_META_FILENAME))
+    if meta_signature is None:
+        return None
+    return [output_size(path), meta_signature[1]]
+
+def placed_intact(src, dst):
+    """目标文件存在且大小与源文件相同"""
+    try:
+        return os.stat(dst).st_size == os.stat(src).st_size
+    except OSError:
+        return False
+
+class ConversionCancelled(Exception):
+    """转换被取消，已完成的部分记录在任务日志中"""
+
+class ConversionJournal:
+    """
+    转换任务日志，保存在输出目录的 conversion_journal.jsonl
+    
+    第一行是切分方案和影响输出的设置，之后每完成一个复制批次或一个子集的标注文件追加一行；
+    每行写入后立即flush和fsync，进程在任何时刻退出最多丢失正在进行的那一批。转换成功后删除。
+    """
+    
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.copied_batches = set()
+        self.finished_outputs = {}  # 子集目录名 -> 写完时的output_signature
+        self._file = None
+    
+    @property
+    def plan(self):
+        return self.header['plan']
+    
+    @staticmethod
+    def settings_for(config, converter):
+        """记录在日志中的设置，经过一次JSON往返以便与读取的日志直接比较"""
+        settings = ConversionManifest.split_settings(config)
+        settings.update({key: getattr(config, key) for key in JOURNAL_OUTPUT_SETTINGS})
+        settings['labels'] = dict(converter.label_to_num)
+        return json_codec.loads(json_codec.dumps(settings))
+    
+    @staticmethod
+    def exists(output_dir):
+        return os.path.exists(osp.join(output_dir, JOURNAL_FILENAME))
+    
+    @classmethod
+    def create(cls, output_dir, settings, plan):
+        """开始新的任务日志（覆盖旧的）"""
+        journal = cls(osp.join(output_dir, JOURNAL_FILENAME), {
+            'version': JOURNAL_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'settings': settings,
+            'plan': plan
+        })
+        journal._file = open(journal.path, 'wb')
+        journal._append(journal.header)
+        return journal
+    
+    @classmethod
+    def load(cls, output_dir):
+        """读取未完成的任务日志，不存在或首行无法解析时返回None；末尾写了一半的行被忽略"""
+        path = osp.join(output_dir, JOURNAL_FILENAME)
+        try:
+            with open(path, 'rb') as f:
+                lines = f.read().split(b'\n')
+            header = json_codec.loads(lines[0])
+        except (OSError, ValueError):
+            return None
+        if not isinstance(header, dict) or header.get('version') != JOURNAL_VERSION or 'plan' not in header:
+            return None
+        
+        journal = cls(path, header)
+        for line in lines[1:]:
+            try:
+                entry = json_codec.loads(line)
+            except ValueError:
+                continue
+            if entry.get('type') == 'copy':
+                journal.copied_batches.add(entry['batch'])
+            elif entry.get('type') == 'output':
+                journal.finished_outputs[entry['split']] = entry['signature']
+        return journal
+    
+    def incompatible_reason(self, settings, input_folders):
+        """设置或输入文件与日志不同时返回原因，可以继续时返回None"""
+        if self.header.get('settings') != settings:
+            return "转换设置或标签映射与中断的任务不同"
+        planned = set()
+        for subset in ('train', 'test', 'verify'):
+            planned.update(self.plan[subset])
+        current = set()
+        for files in input_folders.values():
+            current.update(files)
+        if planned != current:
+            return "输入文件与中断的任务不同"
+        return None
+    
+    def reopen(self):
+        """继续追加记录；上次中断时写了一半的行先补上换行"""
+        self._file = open(self.path, 'ab')
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write(b'\n')
+    
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+    
+    def _append(self, entry):
+        self._file.write(json_codec.dumps(entry) + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+    
+    def record_copy_batch(self, batch_id):
+        self.copied_batches.add(batch_id)
+        self._append({'type': 'copy', 'batch': batch_id})
+    
+    def record_output(self, split_name, signature):
+        self.finished_outputs[split_name] = signature
+        self._append({'type': 'output', 'split': split_name, 'signature': signature})
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def remove(self):
+        """转换完成后删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class DatasetConversionEngine:
+    """
+    多文件夹数据集切分与COCO转换引擎
+    
+    日志和进度通过回调输出，GUI传入log_message和progress_var.set，命令行传入print。
+    cancel()可以在其他线程调用，转换在下一个检查点抛出ConversionCancelled，之后可以用resume继续。
+    """
+    
+    def __init__(self, config, log_callback=None, progress_callback=None, annotation_index=None):
+        self.config = config
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        # JSON解析结果缓存，GUI传入自己的索引以复用扫描阶段的结果
+        self.annotation_index = annotation_index if annotation_index is not None else AnnotationIndex()
+        # 每个输入文件夹只scandir一次，图片与JSON的配对在内存中查询
+        self.dataset_index = DatasetIndex()
+        # 各阶段统计：[{'stage', 'seconds', 'files', 'files_per_second', 'bytes_written',
+        #              'peak_rss_mb', 'rss_growth_mb', 'traced_peak_mb'}]
+        # peak_rss_mb是进程启动以来的峰值，rss_growth_mb是该阶段内峰值的增长
+        self.stage_timings = []
+        self._current_stage = None
+        self._stage_rss_start = None
+        self._stage_files = 0
+        self._stage_bytes = 0
+        self._stage_profiler = None
+        
+        # 任务日志（完整转换时使用）和取消标志
+        self.journal = None
+        self._cancel_event = threading.Event()
+        
+        self.input_folders = {}  # 文件夹路径 -> 文件列表的映射
+        self.folder_names = {}   # 文件夹路径 -> 显示名称的映射
+        self.global_converter = None
+        self.label_count = {}
+        
+        self.placement_mode = config.placement_mode  # 本次转换的图片放置方式
+        self.placement_stats = Counter()  # 实际放置方式 -> 图片数量
+        
+        self._conversion_executor = None
+        self._conversion_workers = 1
+        
+        # 增量转换时记录每张图片写出的 (image_id, annotation id列表)
+        self.emitted_ids = None
+    
+        # 本次转换写出的每个子集的标签一致性检查结果
+        self.label_validator = None
+    
+    def log_message(self, message):
+        if self.log_callback:
+            self.log_callback(message)
+    
+    def set_progress(self, value):
+        if self.progress_callback:
+            self.progress_callback(value)
+    
+    def set_input_folders(self, input_folders, folder_names=None):
+        """使用调用方已经扫描好的文件夹和图片列表"""
+        self.input_folders = dict(input_folders)
+        self.folder_names = dict(folder_names or {})
+    
+    def set_label_mapping(self, converter, label_count=None):
+        """使用调用方已经建立（可能经过手动调整）的标签映射"""
+        self.global_converter = converter
+        self.label_count = label_count or {}
+    
+    def load_input_folders(self):
+        """扫描配置中的输入文件夹"""
+        for directory in self.config.input_folders:
+            folder_name = os.path.basename(os.path.normpath(directory)) or directory
+            if not os.path.isdir(directory):
+                self.log_message(f"警告: 文件夹 {directory} 不存在，已跳过")
+                continue
+            
+            image_files = get_image_files(directory, self.dataset_index)
+            if not image_files:
+                self.log_message(f"警告: 文件夹 {folder_name} 中没有找到图片文件")
+                continue
+            
+            self.input_folders[directory] = image_files
+            self.folder_names[directory] = folder_name
+            self.log_message(f"添加文件夹: {folder_name} ({len(image_files)} 个图片文件)")
+    
+    def build_label_mapping(self):
+        """加载配置中的标签映射文件，未指定时扫描所有文件夹建立"""
+        if self.config.label_mapping:
+            self.global_converter, self.label_count = load_label_mapping(self.config.label_mapping, self.config.bbox_mode)
+            self.log_message(f"标签映射已从文件加载: {self.config.label_mapping}")
+        else:
+            self.global_converter = SimpleLabelme2COCO(self.config.bbox_mode)
+            self.label_count = build_label_mapping(self.input_folders, self.annotation_index, self.global_converter,
+                                                   self.log_message, self.folder_names, self.dataset_index)
+        
+        if not self.global_converter.labels_list:
+            raise ValueError("没有找到任何标签，无法建立标签映射")
+    
+    def verify_image_sizes(self, output_dir):
+        """核对（并按配置修正）JSON中的图片尺寸，不一致的完整列表写入输出目录的报告"""
+        fix = self.config.fix_image_sizes
+        image_files = [img_file for files in self.input_folders.values() for img_file in files]
+        self.log_message(f"\n=== 核对图片尺寸（只读文件头）: {len(image_files)} 张图片 ===")
+        start = time.perf_counter()
+        verifier = ImageSizeVerifier(self.annotation_index, max_workers=self.config.copy_workers,
+                                     dataset_index=self.dataset_index)
+        result = verifier.run(image_files, fix=fix)
+        elapsed = time.perf_counter() - start
+        self.count_stage_io(files=len(image_files))
+        
+        mismatches = result['mismatches']
+        self.log_message(f"核对完成: {len(image_files)} 张图片，用时 {elapsed:.2f}s，"
+                         f"尺寸不一致 {len(mismatches)} 个，无法核对 {len(result['errors'])} 个")
+        for img_file, (json_width, json_height), (width, height) in mismatches[:MAX_LOGGED_ISSUES]:
+            self.log_message(f"  ⚠️ {os.path.basename(img_file)}: JSON {json_width}x{json_height}，图片 {width}x{height}")
+        for img_file, error in result['errors'][:MAX_LOGGED_ISSUES]:
+            self.log_message(f"  错误: {os.path.basename(img_file)}: {error}")
+        if fix and mismatches:
+            self.log_message(f"已把 {result['fixed']} 个JSON的 imageWidth/imageHeight 改为图片实际尺寸")
+        
+        if mismatches or result['errors']:
+            report_file = osp.join(output_dir, IMAGE_SIZE_REPORT_FILENAME)
+            with open(report_file, 'w', encoding='utf-8') as f:
+                f.write(f"图片尺寸核对 {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"核对 {len(image_files)} 张图片，尺寸不一致 {len(mismatches)} 个"
+                        f"{'（已修正JSON）' if fix else ''}，无法核对 {len(result['errors'])} 个\n\n")
+                for img_file, (json_width, json_height), (width, height) in mismatches:
+                    f.write(f"{img_file}\tJSON {json_width}x{json_height}\t图片 {width}x{height}\n")
+                for img_file, error in result['errors']:
+                    f.write(f"{img_file}\t错误: {error}\n")
+            self.log_message(f"完整列表已写入: {report_file}")
+        return result
+    
+    def run(self):
+        """执行数据集切分和格式转换：文件夹输入，train/test/verify子集和COCO标注输出"""
+        config = self.config
+        config.validate()
+        output_dir = config.output_dir
+        random_seed = config.seed
+        self.stage_timings = []
+        # 调用方已经在跟踪时沿用，只停止自己启动的跟踪
+        started_tracing = config.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        split_info_file = None
+        self.journal = None
+        self.label_validator = None
+        try:
+            self.log_message("=== 开始多文件夹数据集切分和格式转换 ===")
+            self.log_message(f"输出目录: {output_dir}")
+            
+            # 获取切分比例
+            train_ratio = config.train_ratio
+            test_ratio = config.test_ratio
+            verify_ratio = config.verify_ratio
+            
+            self.log_message(f"切分比例: 训练集{train_ratio:.1%}, 测试集{test_ratio:.1%}, 验证集{verify_ratio:.1%}")
+            if random_seed is not None:
+                self.log_message(f"切分策略: 固定切分 (种子: {random_seed})")
+            else:
+                self.log_message("切分策略: 随机切分")
+            
+            # 检查是否已添加文件夹
+            self.enter_stage('scan')
+            if not self.input_folders:
+                self.load_input_folders()
+            if not self.input_folders:
+                raise ValueError("请先添加至少一个输入文件夹")
+            input_file_count = sum(len(files) for files in self.input_folders.values())
+            self.count_stage_io(files=input_file_count)
+            
+            # 没有预先建立（或加载）标签映射时扫描所有文件夹建立
+            self.enter_stage('label_mapping')
+            if self.global_converter is None or not self.global_converter.labels_list:
+                self.build_label_mapping()
+                if not self.config.label_mapping:
+                    self.count_stage_io(files=input_file_count)
+            
+            os.makedirs(output_dir, exist_ok=True)
+            
+            # 用图片文件头核对JSON中的尺寸
+            if config.verify_image_sizes or config.fix_image_sizes:
+                self.enter_stage('image_sizes')
+                self.verify_image_sizes(output_dir)
+            
+            # 获取数量限制设置
+            max_images_per_folder = config.max_images_per_folder
+            auto_split = config.auto_split
+            
+            self.log_message(f"数量限制设置: 每文件夹最多 {max_images_per_folder} 张图片，自动分割: {'启用' if auto_split else '禁用'}")
+            
+            # 图片放置方式
+            self.placement_mode = config.placement_mode
+            self.placement_stats = Counter()
+            self.log_message(f"图片放置方式: {PLACEMENT_MODES[self.placement_mode]}")
+            
+            # 增量转换：有可用的转换清单时只处理变化的文件
+            if config.incremental:
+                manifest = ConversionManifest.load(output_dir)
+                reason = "输出目录中没有可用的转换清单" if manifest is None else manifest.incompatible_reason(config)
+                if reason is None:
+                    self.enter_stage('incremental')
+                    self.run_incremental(output_dir, manifest)
+                    self.end_stage()
+                    self.log_stage_summary(existing_split_info_file(output_dir, config.auto_split))
+                    return
+                self.log_message(f"增量转换: {reason}，执行完整转换并生成清单")
+                self.emitted_ids = {}
+            
+            # 获取文件夹信息
+            self.enter_stage('split')
+            folder_files_dict = self.input_folders.copy()
+            total_folders = len(folder_files_dict)
+            total_files = sum(len(files) for files in folder_files_dict.values())
+            
+            self.log_message(f"处理 {total_folders} 个文件夹，共 {total_files} 个图片文件")
+            self.count_stage_io(files=total_files)
+            
+            # 显示每个文件夹的文件数量
+            for folder_path, image_files in folder_files_dict.items():
+                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                self.log_message(f"  {folder_name}: {len(image_files)} 个文件")
+            
+            # 创建多文件夹数据集切分器
+            splitter = MultiFolderDatasetSplitter(train_ratio, test_ratio, verify_ratio, max_images_per_folder, auto_split)
+            
+            # 检查并分割大文件夹
+            if auto_split:
+                self.log_message("\n=== 检查文件夹大小并分割 ===")
+                
+                # 先检查哪些文件夹需要分割
+                folders_to_split = []
+                for folder_path, files in folder_files_dict.items():
+                    if len(files) > max_images_per_folder:
+                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                        folders_to_split.append((folder_name, len(files)))
+                
+                if folders_to_split:
+                    self.log_message(f"发现 {len(folders_to_split)} 个文件夹需要分割:")
+                    for folder_name, file_count in folders_to_split:
+                        num_parts = (file_count + max_images_per_folder - 1) // max_images_per_folder
+                        self.log_message(f"  {folder_name}: {file_count} 张 → 分割为 {num_parts} 个部分")
+                else:
+                    self.log_message("所有文件夹都在大小限制内，无需分割")
+                
+                folder_files_dict = splitter.split_large_folders(folder_files_dict, self.log_message)
+                
+                # 重新统计分割后的信息
+                new_total_folders = len(folder_files_dict)
+                new_total_files = sum(len(files) for files in folder_files_dict.values())
+                self.log_message(f"分割后: {new_total_folders} 个文件夹，共 {new_total_files} 个图片文件")
+            else:
+                # 检查是否有文件夹超过限制
+                large_folders = []
+                for folder_path, files in folder_files_dict.items():
+                    if len(files) > max_images_per_folder:
+                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                        large_folders.append((folder_name, len(files)))
+                
+                if large_folders:
+                    self.log_message("⚠️ 警告: 发现超过大小限制的文件夹，但自动分割已禁用:")
+                    for folder_name, file_count in large_folders:
+                        self.log_message(f"  {folder_name}: {file_count} 张图片 (超过限制 {max_images_per_folder} 张)")
+                    self.log_message("建议启用自动分割功能或手动调整文件夹大小")
+                else:
+                    self.log_message("已禁用自动分割功能，所有文件夹都在大小限制内")
+            
+            # 获取切分预览信息
+            self.log_message("\n=== 切分预览 ===")
+            split_info = splitter.get_folder_split_info(folder_files_dict, random_seed)
+            for folder_path, info in split_info.items():
+                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                self.log_message(f"  {folder_name}: 训练集{info['train']}个, 测试集{info['test']}个, 验证集{info['verify']}个")
+            
+            # 切分数据集
+            self.log_message("\n开始切分数据集...")
+            split_result = splitter.split_multiple_folders(folder_files_dict, random_seed)
+            
+            train_files = split_result['train']
+            test_files = split_result['test']
+            verify_files = split_result['verify']
+            
+            self.log_message(f"切分完成: 训练集{len(train_files)}个, 测试集{len(test_files)}个, 验证集{len(verify_files)}个")
+            
+            # 初始化分割结果变量
+            split_subsets = None
+            
+            # 检查并分割输出子集
+            if auto_split:
+                self.log_message("\n=== 检查输出子集大小并分割 ===")
+                
+                # 检查每个子集是否超过限制
+                subsets = {
+                    'train': train_files,
+                    'test': test_files, 
+                    'verify': verify_files
+                }
+                
+                split_subsets = {}
+                for subset_name, files in subsets.items():
+                    if len(files) > max_images_per_folder:
+                        self.log_message(f"{subset_name}集有 {len(files)} 张图片，超过上限 {max_images_per_folder}，开始分割...")
+                        
+                        # 计算需要分割成多少个部分
+                        num_parts = (len(files) + max_images_per_folder - 1) // max_images_per_folder
+                        self.log_message(f"  {subset_name}集将分割为 {num_parts} 个部分")
+                        
+                        # 随机打乱文件列表
+                        shuffled_files = files.copy()
+                        random.shuffle(shuffled_files)
+                        
+                        # 分割文件
+                        split_parts = []
+                        for i in range(num_parts):
+                            start_idx = i * max_images_per_folder
+                            end_idx = min((i + 1) * max_images_per_folder, len(shuffled_files))
+                            part_files = shuffled_files[start_idx:end_idx]
+                            split_parts.append(part_files)
+                            self.log_message(f"    {subset_name}_part{i+1:02d}: {len(part_files)} 张图片")
+                        
+                        split_subsets[subset_name] = split_parts
+                    else:
+                        self.log_message(f"{subset_name}集有 {len(files)} 张图片，在限制内无需分割")
+                        split_subsets[subset_name] = [files]  # 包装成列表以保持一致性
+                
+                # 记录切分方案（继续上次的转换时使用日志中的方案）
+                plan = self.open_journal(output_dir, {'train': train_files, 'test': test_files,
+                                                      'verify': verify_files, 'split_subsets': split_subsets})
+                train_files, test_files, verify_files = plan['train'], plan['test'], plan['verify']
+                split_subsets = plan['split_subsets']
+                
+                # 创建分割后的输出目录结构
+                self.enter_stage('copy')
+                self.create_split_output_directories(output_dir, split_subsets, max_images_per_folder)
+                
+                # 复制文件到分割后的目录
+                self.copy_files_to_split_output_dirs(output_dir, split_subsets, folder_files_dict)
+                self.log_placement_stats()
+                split_info_file = osp.join(output_dir, "subset_split_info.txt")
+                self.append_placement_info(split_info_file)
+                
+                # 为每个分割后的子集生成COCO格式标注
+                self.enter_stage('coco')
+                self.generate_coco_annotations_for_split_subsets(output_dir, split_subsets)
+                subset_files = dict(iter_split_subset_parts(split_subsets))
+                
+            else:
+                # 原有的处理流程（不分割）
+                # 检查是否有子集超过限制
+                large_subsets = []
+                if len(train_files) > max_images_per_folder:
+                    large_subsets.append(f"训练集({len(train_files)}张)")
+                if len(test_files) > max_images_per_folder:
+                    large_subsets.append(f"测试集({len(test_files)}张)")
+                if len(verify_files) > max_images_per_folder:
+                    large_subsets.append(f"验证集({len(verify_files)}张)")
+                
+                if large_subsets:
+                    self.log_message("⚠️ 警告: 发现超过大小限制的子集，但自动分割已禁用:")
+                    for subset_info in large_subsets:
+                        self.log_message(f"  {subset_info} (超过限制 {max_images_per_folder} 张)")
+                    self.log_message("建议启用自动分割功能")
+                
+                # 记录切分方案（继续上次的转换时使用日志中的方案）
+                plan = self.open_journal(output_dir, {'train': train_files, 'test': test_files,
+                                                      'verify': verify_files, 'folder_files': folder_files_dict})
+                train_files, test_files, verify_files = plan['train'], plan['test'], plan['verify']
+                folder_files_dict = plan['folder_files']
+                
+                # 创建输出目录结构
+                self.enter_stage('copy')
+                self.create_output_directories(output_dir, folder_files_dict)
+                
+                # 复制文件到对应目录（支持多文件夹）
+                self.copy_files_to_split_dirs_multi(output_dir, train_files, test_files, verify_files, folder_files_dict)
+                self.log_placement_stats()
+                folder_split_info_file = osp.join(output_dir, "folder_split_info.txt")
+                if os.path.exists(folder_split_info_file):
+                    split_info_file = folder_split_info_file
+                    self.append_placement_info(folder_split_info_file)
+                
+                # 为每个子集生成COCO格式标注（使用已建立的标签映射）
+                self.enter_stage('coco')
+                self.generate_coco_annotations_multi(output_dir, train_files, test_files, verify_files)
+                subset_files = {'train': train_files, 'test': test_files, 'verify': verify_files}
+            
+            self.set_progress(1.0)
+            self.log_message("✓ 多文件夹数据集切分和转换完成！")
+            self.log_message(f"输出目录: {output_dir}")
+            
+            # 根据是否分割显示不同的总结信息
+            if auto_split and any(len(parts) > 1 for parts in split_subsets.values()):
+                self.log_message("\n=== 分割后的子集信息 ===")
+                for subset_name, parts_list in split_subsets.items():
+                    total_images = sum(len(part) for part in parts_list)
+                    if len(parts_list) == 1:
+                        self.log_message(f"{subset_name}集: {total_images} 张图片 (未分割)")
+                    else:
+                        self.log_message(f"{subset_name}集: {total_images} 张图片 (分割为 {len(parts_list)} 个部分)")
+                        for i, part_files in enumerate(parts_list):
+                            self.log_message(f"  └─ {subset_name}_part{i+1:02d}: {len(part_files)} 张图片")
+            else:
+                self.log_message(f"训练集: {len(train_files)} 张图片")
+                self.log_message(f"测试集: {len(test_files)} 张图片")
+                self.log_message(f"验证集: {len(verify_files)} 张图片")
+            
+            # 显示最终标签映射信息
+            self.log_message("\n=== 最终标签映射 ===")
+            for i, label in enumerate(self.global_converter.labels_list):
+                label_id = self.global_converter.label_to_num[label]
+                count = self.label_count.get(label, 0)
+                self.log_message(f"  {label_id:2d}: {label} (出现 {count} 次)")
+            
+            # 全局验证标签ID一致性
+            self.enter_stage('validation')
+            self.global_validation(output_dir, self.global_converter, list(subset_files))
+            
+            if config.incremental:
+                self.enter_stage('manifest')
+                self.save_manifest(output_dir, subset_files)
+            
+            # 全部完成，不再需要任务日志
+            self.journal.remove()
+            self.journal = None
+            
+            self.end_stage()
+            self.log_stage_summary(split_info_file)
+            
+        except BaseException:
+            # 取消或出错时不再等待排队中的转换分片
+            self._shutdown_conversion_executor(cancel=True)
+            raise
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+            self.end_stage()
+            if started_tracing:
+                tracemalloc.stop()
+            self._shutdown_conversion_executor()
+    
+    def enter_stage(self, name):
+        """
+        开始一个新阶段并结束上一个阶段
+        
+        各阶段的耗时、处理文件数、写入字节数和内存峰值记录在stage_timings。
+        tracemalloc和cProfile只覆盖主进程，多进程转换时子进程中的解析不计入。
+        """
+        self.check_cancelled()
+        self.end_stage()
+        self._stage_files = 0
+        self._stage_bytes = 0
+        self._stage_rss_start = peak_rss_mb()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        if self.config.profile_dir:
+            self._stage_profiler = cProfile.Profile()
+            self._stage_profiler.enable()
+        # 上一阶段的剖析结果写完后再开始计时
+        self._current_stage = (name, time.perf_counter())
+    
+    def end_stage(self):
+        if self._current_stage is None:
+            return
+        now = time.perf_counter()
+        profiler, self._stage_profiler = self._stage_profiler, None
+        if profiler is not None:
+            profiler.disable()
+        name, start = self._current_stage
+        self._current_stage = None
+        seconds = now - start
+        peak_rss = peak_rss_mb()
+        self.stage_timings.append({
+            'stage': name,
+            'seconds': seconds,
+            'files': self._stage_files,
+            'files_per_second': self._stage_files / seconds if self._stage_files and seconds > 0 else None,
+            'bytes_written': self._stage_bytes,
+            'peak_rss_mb': peak_rss,
+            'rss_growth_mb': peak_rss - self._stage_rss_start if peak_rss is not None else None,
+            'traced_peak_mb': tracemalloc.get_traced_memory()[1] / (1024 * 1024) if tracemalloc.is_tracing() else None
+        })
+        if profiler is not None:
+            self.dump_stage_profile(profiler, name)
+    
+    def cancel(self):
+        """请求取消转换（可在其他线程调用）"""
+        self._cancel_event.set()
+    
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise ConversionCancelled("转换已取消，已完成的部分记录在任务日志中，可以选择继续上次的转换")
+    
+    def open_journal(self, output_dir, plan):
+        """
+        开始记录任务日志，返回本次使用的切分方案
+        
+        配置了resume且输出目录中有设置和输入文件都相同的未完成日志时，沿用其中的切分方案和已完成记录
+        """
+        settings = ConversionJournal.settings_for(self.config, self.global_converter)
+        if self.config.resume:
+            journal = ConversionJournal.load(output_dir)
+            reason = ("输出目录中没有未完成的转换任务" if journal is None
+                      else journal.incompatible_reason(settings, self.input_folders))
+            if reason is None:
+                journal.reopen()
+                self.journal = journal
+                self.log_message(f"继续上次中断的转换: 使用日志中的切分方案，已完成 {len(journal.copied_batches)} 个复制批次、"
+                                 f"{len(journal.finished_outputs)} 个标注文件")
+                return journal.plan
+            self.log_message(f"无法继续上次的转换: {reason}，重新开始")
+        self.journal = ConversionJournal.create(output_dir, settings, plan)
+        return plan
+    
+    def count_stage_io(self, files=0, bytes_written=0):
+        """累计当前阶段处理的文件数和写入的字节数"""
+        self._stage_files += files
+        self._stage_bytes += bytes_written
+    
+    def dump_stage_profile(self, profiler, name):
+        """把一个阶段的cProfile结果写入 profile_dir/<序号>_<阶段>.prof"""
+        profile_dir = self.config.profile_dir
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            path = osp.join(profile_dir, f"{len(self.stage_timings):02d}_{name}.prof")
+            profiler.dump_stats(path)
+            self.log_message(f"  {name}阶段性能剖析已保存到: {path}")
+        except OSError as e:
+            self.log_message(f"保存{name}阶段性能剖析失败: {e}")
+    
+    def format_stage_summary(self):
+        """各阶段统计表，每行一个字符串"""
+        def cell(value, spec='.1f'):
+            return '-' if value is None else format(value, spec)
+        
+        def pad(text, width, left=False):
+            # 中文按两个字符宽度对齐
+            fill = ' ' * max(0, width - sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text))
+            return text + fill if left else fill + text
+        
+        # 进程RSS峰值从进程启动起累计；阶段内的内存用量看RSS峰值增长和分配峰值（tracemalloc）
+        rows = [['阶段', '耗时(s)', '文件数', '文件/s', '写入MB', '进程RSS峰值MB', 'RSS峰值增长MB', '分配峰值MB']]
+        for timing in self.stage_timings:
+            written = timing['bytes_written']
+            rows.append([timing['stage'], f"{timing['seconds']:.2f}", str(timing['files'] or '-'),
+                         cell(timing['files_per_second']), cell(written / (1024 * 1024) if written else None),
+                         cell(timing['peak_rss_mb']), cell(timing['rss_growth_mb']), cell(timing['traced_peak_mb'])])
+        rows.append(['总计', f"{sum(timing['seconds'] for timing in self.stage_timings):.2f}"])
+        widths = (14, 10, 10, 10, 10, 16, 16, 12)
+        return [''.join(pad(text, width, i == 0) for i, (text, width) in enumerate(zip(row, widths))).rstrip()
+                for row in rows]
+    
+    def log_stage_summary(self, split_info_file=None):
+        """在日志中输出各阶段统计表，并追加到分割信息文件末尾"""
+        if not self.stage_timings:
+            return
+        lines = self.format_stage_summary()
+        self.log_message("\n=== 各阶段耗时 ===")
+        for line in lines:
+            self.log_message(line)
+        
+        if split_info_file is None:
+            return
+        try:
+            with open(split_info_file, 'a', encoding='utf-8') as f:
+                f.write("\n各阶段耗时:\n")
+                f.write("-" * 30 + "\n")
+                for line in lines:
+                    f.write(line + "\n")
+            self.log_message(f"✓ 各阶段耗时已记录到: {split_info_file}")
+        except Exception as e:
+            self.log_message(f"记录各阶段耗时失败: {e}")
+    
+    def save_manifest(self, output_dir, subset_files):
+        """完整转换后为所有文件生成转换清单"""
+        manifest = ConversionManifest(ConversionManifest.split_settings(self.config), self.config.bbox_mode,
+                                      dict(self.global_converter.label_to_num), dedupe_iou=self.config.dedupe_iou)
+        for subset_name, files in subset_files.items():
+            manifest.subsets[subset_name] = list(files)
+            for img_file in files:
+                image_id, annotation_ids = self.emitted_ids.get(img_file, (None, []))
+                manifest.files[img_file] = ConversionManifest.make_record(img_file, subset_name, image_id, annotation_ids)
+        
+        path = manifest.save(output_dir)
+        self.count_stage_io(files=len(manifest.files), bytes_written=os.path.getsize(path))
+        self.log_message(f"✓ 转换清单已保存到: {path} ({len(manifest.files)} 个文件)")
+    
+    def run_incremental(self, output_dir, manifest):
+        """
+        按转换清单增量转换
+        
+        沿用上次的子集分配；新增文件按切分比例分到各子集的最后一个部分；
+        只放置新增或变化的图片，只重写包含新增、变化或删除文件的 instance_*.json，
+        其中未变化文件的标注直接从原JSON复用，不再解析。
+        """
+        config = self.config
+        self.log_message("\n=== 增量转换 ===")
+        
+        # 标签映射、bbox计算方式或去重方式变化时所有标注都需要重新生成，子集分配仍然沿用
+        relabel = (manifest.labels != self.global_converter.label_to_num or manifest.bbox_mode != config.bbox_mode
+                   or manifest.dedupe_iou != config.dedupe_iou)
+        if relabel:
+            self.log_message("标签映射、bbox计算方式或去重方式与上次不同，所有子集的标注将重新生成")
+        
+        # 对比当前文件与清单
+        current_files = {}
+        for folder_path, image_files in self.input_folders.items():
+            for img_file in image_files:
+                current_files[img_file] = folder_path
+        
+        new_files = {}
+        changed_json = set()
+        changed_image = set()
+        image_signatures = {}
+        for img_file, folder_path in current_files.items():
+            image_signatures[img_file] = file_signature(img_file)
+            record = manifest.files.get(img_file)
+            if record is None:
+                new_files.setdefault(folder_path, []).append(img_file)
+                continue
+            label_file = label_file_for_image(img_file)
+            if relabel or manifest.json_changed(record, label_file, file_signature(label_file)):
+                changed_json.add(img_file)
+            if image_signatures[img_file] != record.get('image_signature'):
+                changed_image.add(img_file)
+        removed_files = [img_file for img_file in manifest.files if img_file not in current_files]
+        new_count = sum(len(files) for files in new_files.values())
+        
+        self.log_message(f"新增 {new_count} 个文件, 标注变化 {len(changed_json)} 个, 图片变化 {len(changed_image)} 个, "
+                         f"删除 {len(removed_files)} 个")
+        
+        # 沿用上次的子集分配，去掉已删除的文件
+        subsets = {}
+        affected = set()
+        removed_set = set(removed_files)
+        for subset_name, files in manifest.subsets.items():
+            kept = [img_file for img_file in files if img_file not in removed_set]
+            if len(kept) != len(files):
+                affected.add(subset_name)
+            subsets[subset_name] = kept
+        for img_file in changed_json:
+            affected.add(manifest.files[img_file]['subset'])
+        
+        # 新增文件按比例切分后追加到对应子集
+        added = {}
+        if new_files:
+            splitter = MultiFolderDatasetSplitter(config.train_ratio, config.test_ratio, config.verify_ratio,
+                                                  config.max_images_per_folder, config.auto_split)
+            split_result = splitter.split_multiple_folders(new_files, config.seed)
+            for base_name, files in split_result.items():
+                if not files:
+                    continue
+                subset_name = self.incremental_target_subset(subsets, base_name)
+                subsets.setdefault(subset_name, []).extend(files)
+                affected.add(subset_name)
+                for img_file in files:
+                    added[img_file] = subset_name
+                self.log_message(f"  新增 {len(files)} 个文件 → {subset_name}")
+                if len(subsets[subset_name]) > config.max_images_per_folder:
+                    self.log_message(f"⚠️ 警告: {subset_name} 已有 {len(subsets[subset_name])} 张图片，超过上限 "
+                                     f"{config.max_images_per_folder} 张，需要重新分割时请执行完整转换")
+        
+        # 标注文件缺失（或输出格式改变）的子集同样需要重写
+        for subset_name in subsets:
+            annotations_dir = osp.join(output_dir, subset_name, 'annotations')
+            if config.sharded_output:
+                output_path = osp.join(sharded_split_dir(annotations_dir, subset_name), SHARD_META_FILENAME)
+            else:
+                output_path = osp.join(annotations_dir, f'instance_{subset_name}.json')
+            if not os.path.exists(output_path):
+                affected.add(subset_name)
+        
+        for subset_name in subsets:
+            os.makedirs(osp.join(output_dir, subset_name, 'images'), exist_ok=True)
+            os.makedirs(osp.join(output_dir, subset_name, 'annotations'), exist_ok=True)
+        
+        # 删除已不存在的源文件对应的输出图片
+        for img_file in removed_files:
+            subset_name = manifest.files[img_file]['subset']
+            base_name = os.path.basename(img_file)
+            if any(os.path.basename(f) == base_name for f in subsets.get(subset_name, [])):
+                continue
+            dst = osp.join(output_dir, subset_name, 'images', base_name)
+            if os.path.lexists(dst):
+                os.remove(dst)
+        
+        # 只放置新增和变化的图片
+        place_files = [img_file for img_file in current_files if img_file in added or img_file in changed_image]
+        self.log_message(f"放置图片: {len(place_files)} 个")
+        copier = self.create_file_copier()
+        tasks = []
+        for img_file in place_files:
+            subset_name = added.get(img_file) or manifest.files[img_file]['subset']
+            tasks.append((img_file, osp.join(output_dir, subset_name, 'images', os.path.basename(img_file))))
+        self.run_copy_tasks(copier, tasks, 0.6, 0.9)
+        self.finish_file_copier(copier)
+        self.log_placement_stats()
+        
+        # 只重写受影响子集的标注
+        affected_names = [subset_name for subset_name in subsets if subset_name in affected]
+        self.log_message(f"重写 {len(affected_names)} 个标注文件，跳过 {len(subsets) - len(affected_names)} 个未变化的子集")
+        new_records = {}
+        for i, subset_name in enumerate(affected_names):
+            files = subsets[subset_name]
+            annotations_dir = osp.join(output_dir, subset_name, 'annotations')
+            reuse_results = {} if relabel else self.load_reusable_results(annotations_dir, manifest, subset_name, files,
+                                                                          changed_json)
+            self.log_message(f"生成{subset_name}COCO标注: 复用 {len(reuse_results)} 个文件, 解析 {len(files) - len(reuse_results)} 个文件")
+            
+            self.emitted_ids = {}
+            self.write_split_coco_json(self.global_converter, files, subset_name, annotations_dir, reuse_results)
+            for img_file in files:
+                image_id, annotation_ids = self.emitted_ids.get(img_file, (None, []))
+                new_records[img_file] = ConversionManifest.make_record(img_file, subset_name, image_id, annotation_ids,
+                                                                       image_signatures.get(img_file))
+            self.set_progress(0.9 + 0.1 * (i + 1) / len(affected_names))
+        self.emitted_ids = None
+        
+        # 更新清单：未重写子集中的文件只刷新图片签名
+        for img_file in removed_files:
+            del manifest.files[img_file]
+        for img_file in changed_image:
+            manifest.files[img_file]['image_signature'] = image_signatures[img_file]
+        manifest.files.update(new_records)
+        manifest.subsets = subsets
+        manifest.labels = dict(self.global_converter.label_to_num)
+        manifest.bbox_mode = config.bbox_mode
+        manifest.dedupe_iou = config.dedupe_iou
+        manifest.save(output_dir)
+        
+        self.set_progress(1.0)
+        self.log_message("✓ 增量转换完成！")
+        for subset_name, files in subsets.items():
+            self.log_message(f"{subset_name}: {len(files)} 张图片")
+        
+        self.global_validation(output_dir, self.global_converter, list(subsets))
+    
+    @staticmethod
+    def incremental_target_subset(subsets, base_name):
+        """新增文件放入的子集：未分割时为train/test/verify本身，分割过时为最后一个部分"""
+        candidates = sorted(name for name in subsets if name == base_name or name.startswith(base_name + '_part'))
+        return candidates[-1] if candidates else base_name
+    
+    def load_reusable_results(self, annotations_dir, manifest, subset_name, files, changed_json):
+        """
+        从已有的 instance_*.json（或分片输出）取出未变化文件的image和标注，组装成与解析结果相同的格式
+        
+        同一image_id对应多个源文件（文件名重复）时无法区分各自的标注，这些文件重新解析。
+        """
+        try:
+            coco_data = load_split_coco(annotations_dir, subset_name)
+        except (OSError, ValueError) as e:
+            self.log_message(f"读取 {subset_name} 的标注失败，该子集全部重新解析: {e}")
+            return {}
+        
+        images = {image['id']: image for image in coco_data.get('images', [])}
+        annotations = {annotation['id']: annotation for annotation in coco_data.get('annotations', [])}
+        previous_files = manifest.subsets.get(subset_name, [])
+        image_id_counts = Counter(manifest.files[img_file]['image_id'] for img_file in previous_files
+                                  if img_file in manifest.files)
+        
+        reuse_results = {}
+        for img_file in files:
+            record = manifest.files.get(img_file)
+            if img_file in changed_json or record is None or record.get('subset') != subset_name:
+                continue
+            image = images.get(record.get('image_id'))
+            if image is None or image_id_counts[image['id']] > 1:
+                continue
+            file_annotations = [annotations.get(annotation_id) for annotation_id in record.get('annotation_ids', [])]
+            if any(annotation is None for annotation in file_annotations):
+                continue
+            reuse_results[img_file] = {
+                'file_name': image['file_name'],
+                'height': image['height'],
+                'width': image['width'],
+                'size_error': None,
+                'annotations': [(annotation['category_id'], tuple(round(v, 2) for v in annotation['bbox']), annotation)
+                                for annotation in file_annotations],
+                'warnings': [],
+                'error': None
+            }
+        return reuse_results
+    
+    def global_validation(self, output_dir, global_converter, subset_names=None):
+        """
+        全局验证：汇总写出各子集（包括 _partNN）时的标签一致性检查，不重新读取输出文件
+        
+        subset_names为本次输出的全部子集，其中没有在本次转换中写出的（增量转换未变化、继续转换时已完成）
+        没有保存之前的检查结果，本次不做验证，只在日志中列出。
+        """
+        self.log_message("=== 全局标签ID一致性验证 ===")
+        
+        validator = self.label_validator
+        checks = validator.checked_splits() if validator is not None else []
+        checked_names = [check.split_name for check in checks]
+        self.log_message(f"本次写出并检查 {len(checks)} 个子集: {', '.join(checked_names) or '无'}")
+        unchecked = [name for name in subset_names or [] if name not in checked_names]
+        if unchecked:
+            self.log_message(f"警告: 以下子集未在本次转换中写出，本次没有验证其标签ID一致性: {', '.join(unchecked)}")
+        
+        issues = validator.issue_counts() if validator is not None else Counter()
+        global_errors = sum(issues.values())
+        for issue, count in issues.items():
+            splits = [check.split_name for check in checks if check.issues.get(issue)]
+            self.log_message(f"错误: {count} 处{LABEL_CHECK_ISSUES[issue]}（{', '.join(splits)}）")
+        
+        if global_errors == 0:
+            images = sum(check.images for check in checks)
+            annotations = sum(check.annotations for check in checks)
+            self.log_message(f"✓ 全局标签ID一致性验证通过！{images} 张图片、{annotations} 个标注的category_id都在全局映射中，"
+                             f"{'本次写出的' if unchecked else ''}各子集categories与全局映射一致")
+        else:
+            self.log_message(f"⚠ 全局标签ID一致性验证失败，发现 {global_errors} 个问题")
+        
+        # 输出全局标签映射表
+        self.log_message("\n=== 全局标签映射表 ===")
+        for label in global_converter.labels_list:
+            label_id = global_converter.label_to_num[label]
+            self.log_message(f"{label_id:2d}: {label}")
+        
+        # 保存标签映射信息到文件
+        mapping_file = osp.join(output_dir, "label_mapping.txt")
+        try:
+            with open(mapping_file, 'w', encoding='utf-8') as f:
+                f.write("Labelme to COCO 标签映射表\n")
+                f.write("=" * 50 + "\n\n")
+                f.write(f"总标签数量: {len(global_converter.labels_list)}\n\n")
+                f.write("标签ID映射:\n")
+                for label in global_converter.labels_list:
+                    label_id = global_converter.label_to_num[label]
+                    f.write(f"{label_id:2d}: {label}\n")
+                
+                f.write("\n" + "=" * 50 + "\n")
+                f.write("说明: 此文件记录了转换过程中建立的标签ID映射关系\n")
+                f.write("确保所有子集(train/test/verify)中的相同标签具有相同的ID\n")
+            
+            self.log_message(f"✓ 标签映射信息已保存到: {mapping_file}")
+        except Exception as e:
+            self.log_message(f"保存标签映射文件失败: {e}")
+        
+        self.log_message("=== 验证完成 ===")
+    
+    def create_output_directories(self, output_dir, folder_files_dict=None):
+        """创建输出目录结构"""
+        split_dirs = ['train', 'test', 'verify']
+        
+        for split_name in split_dirs:
+            # 创建主目录
+            split_dir = osp.join(output_dir, split_name)
+            os.makedirs(split_dir, exist_ok=True)
+            
+            # 创建子目录
+            images_dir = osp.join(split_dir, 'images')
+            annotations_dir = osp.join(split_dir, 'annotations')
+            
+            os.makedirs(images_dir, exist_ok=True)
+            os.makedirs(annotations_dir, exist_ok=True)
+            
+            self.log_message(f"创建目录: {split_dir}")
+        
+        # 如果启用了文件夹分割，创建分割信息文件
+        if folder_files_dict and any("_part" in key for key in folder_files_dict.keys()):
+            self.create_split_info_file(output_dir, folder_files_dict)
+    
+    def create_split_info_file(self, output_dir, folder_files_dict):
+        """创建分割信息文件，记录文件夹分割的详细信息"""
+        split_info_file = osp.join(output_dir, "folder_split_info.txt")
+        
+        try:
+            with open(split_info_file, 'w', encoding='utf-8') as f:
+                f.write("文件夹分割信息\n")
+                f.write("=" * 50 + "\n\n")
+                f.write(f"生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+                
+                # 统计原始文件夹和分割后的文件夹
+                original_folders = {}
+                split_folders = {}
+                
+                for folder_key, files in folder_files_dict.items():
+                    if "_part" in folder_key:
+                        # 分割后的子文件夹
+                        original_path = folder_key.split("_part")[0]
+                        part_num = folder_key.split("_part")[1]
+                        
+                        if original_path not in split_folders:
+                            split_folders[original_path] = []
+                        split_folders[original_path].append((part_num, len(files)))
+                    else:
+                        # 未分割的原始文件夹
+                        original_folders[folder_key] = len(files)
+                
+                # 写入未分割的文件夹信息
+                if original_folders:
+                    f.write("未分割的文件夹:\n")
+                    f.write("-" * 30 + "\n")
+                    for folder_path, file_count in original_folders.items():
+                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                        f.write(f"{folder_name}: {file_count} 张图片\n")
+                    f.write("\n")
+                
+                # 写入分割的文件夹信息
+                if split_folders:
+                    f.write("分割的文件夹:\n")
+                    f.write("-" * 30 + "\n")
+                    for original_path, parts_info in split_folders.items():
+                        folder_name = self.folder_names.get(original_path, os.path.basename(original_path))
+                        total_files = sum(count for _, count in parts_info)
+                        f.write(f"{folder_name} (总计 {total_files} 张图片，分割为 {len(parts_info)} 个部分):\n")
+                        
+                        for part_num, file_count in sorted(parts_info):
+                            f.write(f"  └─ {folder_name}_part{part_num}: {file_count} 张图片\n")
+                        f.write("\n")
+                
+                f.write("说明:\n")
+                f.write("- 当文件夹中的图片数量超过设定上限时，会自动分割成多个部分\n")
+                f.write("- 分割后的各部分在训练、测试、验证集中保持相同的标签映射\n")
+                f.write("- 分割是随机进行的，确保数据的均匀分布\n")
+            
+            self.log_message(f"✓ 分割信息已保存到: {split_info_file}")
+            
+        except Exception as e:
+                        self.log_message(f"保存分割信息文件失败: {e}")
+    
+    def create_split_output_directories(self, output_dir, split_subsets, max_images_per_folder):
+        """为分割后的子集创建输出目录结构"""
+        self.log_message("创建分割后的输出目录结构...")
+        
+        for subset_name, parts_list in split_subsets.items():
+            if len(parts_list) == 1:
+                # 未分割的子集，创建标准目录
+                subset_dir = osp.join(output_dir, subset_name)
+                os.makedirs(subset_dir, exist_ok=True)
+                
+                images_dir = osp.join(subset_dir, 'images')
+                annotations_dir = osp.join(subset_dir, 'annotations')
+                
+                os.makedirs(images_dir, exist_ok=True)
+                os.makedirs(annotations_dir, exist_ok=True)
+                
+                self.log_message(f"创建目录: {subset_dir}")
+            else:
+                # 分割后的子集，为每个部分创建目录
+                for i, part_files in enumerate(parts_list):
+                    part_name = f"{subset_name}_part{i+1:02d}"
+                    part_dir = osp.join(output_dir, part_name)
+                    os.makedirs(part_dir, exist_ok=True)
+                    
+                    images_dir = osp.join(part_dir, 'images')
+                    annotations_dir = osp.join(part_dir, 'annotations')
+                    
+                    os.makedirs(images_dir, exist_ok=True)
+                    os.makedirs(annotations_dir, exist_ok=True)
+                    
+                    self.log_message(f"创建分割目录: {part_dir} ({len(part_files)} 张图片)")
+        
+        # 创建分割信息文件
+        self.create_subset_split_info_file(output_dir, split_subsets, max_images_per_folder)
+    
+    def create_subset_split_info_file(self, output_dir, split_subsets, max_images_per_folder):
+        """创建子集分割信息文件"""
+        split_info_file = osp.join(output_dir, "subset_split_info.txt")
+        
+        try:
+            with open(split_info_file, 'w', encoding='utf-8') as f:
+                f.write("数据集子集分割信息\n")
+                f.write("=" * 50 + "\n\n")
+                f.write(f"生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"分割上限: 每个子集最多 {max_images_per_folder} 张图片\n")
+                f.write(f"图片放置方式: {PLACEMENT_MODES[self.placement_mode]}\n\n")
+                
+                for subset_name, parts_list in split_subsets.items():
+                    if len(parts_list) == 1:
+                        f.write(f"{subset_name}集: {len(parts_list[0])} 张图片 (未分割)\n")
+                    else:
+                        total_images = sum(len(part) for part in parts_list)
+                        f.write(f"{subset_name}集: 总计 {total_images} 张图片，分割为 {len(parts_list)} 个部分:\n")
+                        for i, part_files in enumerate(parts_list):
+                            f.write(f"  └─ {subset_name}_part{i+1:02d}: {len(part_files)} 张图片\n")
+                    f.write("\n")
+                
+                f.write("说明:\n")
+                f.write("- 当训练集/测试集/验证集的图片数量超过设定上限时，会自动分割成多个部分\n")
+                f.write("- 每个部分都有独立的images和annotations目录\n")
+                f.write("- 所有部分使用相同的标签映射，确保一致性\n")
+                f.write("- 分割是随机进行的，确保数据的均匀分布\n")
+            
+            self.log_message(f"✓ 子集分割信息已保存到: {split_info_file}")
+            
+        except Exception as e:
+            self.log_message(f"保存子集分割信息文件失败: {e}")
+    
+    def create_file_copier(self):
+        """按配置创建图片放置引擎"""
+        return ParallelFileCopier(self.placement_mode, max_workers=self.config.copy_workers)
+    
+    def run_copy_tasks(self, copier, tasks, progress_start, progress_end):
+        """
+        执行一批放置任务，进度映射到 [progress_start, progress_end] 区间
+        
+        任务按COPY_BATCH_SIZE分批，每批完成后记入任务日志。继续上次的转换时，日志中已完成的批次
+        只检查目标文件大小，与源文件不同的（写了一半或源文件已变化）重新放置；未完成的批次整批重新放置。
+        """
+        total = len(tasks)
+        for batch_start in range(0, total, COPY_BATCH_SIZE):
+            self.check_cancelled()
+            batch = tasks[batch_start:batch_start + COPY_BATCH_SIZE]
+            batch_size = len(batch)
+            batch_id = None
+            if self.journal is not None:
+                batch_dir = osp.relpath(osp.dirname(batch[0][1]), self.config.output_dir).replace(os.sep, '/')
+                batch_id = f"{batch_dir}#{batch_start // COPY_BATCH_SIZE}"
+                if batch_id in self.journal.copied_batches:
+                    batch = [(src, dst) for src, dst in batch if not placed_intact(src, dst)]
+                    if batch:
+                        self.log_message(f"  {batch_id}: {len(batch)} 个文件不完整，重新放置")
+            
+            def on_progress(done, batch_total, batch_start=batch_start, batch_size=batch_size):
+                done_in_tasks = batch_start + done / batch_total * batch_size
+                self.set_progress(progress_start + done_in_tasks / total * (progress_end - progress_start))
+            
+            copier.run(batch, on_progress)
+            if batch_id is not None and batch_id not in self.journal.copied_batches:
+                self.journal.record_copy_batch(batch_id)
+        self.set_progress(progress_end)
+    
+    def finish_file_copier(self, copier):
+        """输出吞吐量并汇总实际放置方式"""
+        self.log_message(f"图片放置完成 ({copier.max_workers} 线程): {copier.summary()}")
+        self.placement_stats.update(copier.mode_counts)
+        self.count_stage_io(files=copier.files, bytes_written=copier.bytes)
+    
+    def log_placement_stats(self):
+        """输出图片实际放置方式统计，退回复制时提示原因"""
+        for mode, count in self.placement_stats.items():
+            self.log_message(f"  {PLACEMENT_MODES[mode]}: {count} 张图片")
+        if self.placement_mode != 'copy' and self.placement_stats.get('copy'):
+            self.log_message(f"  ⚠ 部分图片无法使用{PLACEMENT_MODES[self.placement_mode]}（跨设备或文件系统不支持），已改为复制")
+    
+    def append_placement_info(self, split_info_file):
+        """在分割信息文件末尾记录图片放置方式"""
+        try:
+            with open(split_info_file, 'a', encoding='utf-8') as f:
+                f.write("\n图片放置方式:\n")
+                f.write("-" * 30 + "\n")
+                f.write(f"选择: {PLACEMENT_MODES[self.placement_mode]} ({self.placement_mode})\n")
+                for mode, count in self.placement_stats.items():
+                    f.write(f"实际 {PLACEMENT_MODES[mode]} ({mode}): {count} 张图片\n")
+            
+            self.log_message(f"✓ 图片放置方式已记录到: {split_info_file}")
+        except Exception as e:
+            self.log_message(f"记录图片放置方式失败: {e}")
+    
+    def copy_files_to_split_output_dirs(self, output_dir, split_subsets, folder_files_dict):
+        """复制文件到分割后的输出目录"""
+        self.log_message("复制文件到分割后的输出目录...")
+        
+        total_progress_steps = sum(len(parts_list) for parts_list in split_subsets.values())
+        current_step = 0
+        copier = self.create_file_copier()
+        
+        for subset_name, parts_list in split_subsets.items():
+            if len(parts_list) == 1:
+                # 未分割的子集
+                subset_dir = osp.join(output_dir, subset_name, 'images')
+                files = parts_list[0]
+                
+                self.log_message(f"复制{subset_name}集文件: {len(files)} 张图片")
+                
+                tasks = [(img_file, osp.join(subset_dir, os.path.basename(img_file))) for img_file in files]
+                # 60%-90%的进度区间
+                self.run_copy_tasks(copier, tasks,
+                                    0.6 + 0.3 * current_step / total_progress_steps,
+                                    0.6 + 0.3 * (current_step + 1) / total_progress_steps)
+                
+                current_step += 1
+                self.log_message(f"✓ {subset_name}集文件复制完成")
+            else:
+                # 分割后的子集
+                for i, part_files in enumerate(parts_list):
+                    part_name = f"{subset_name}_part{i+1:02d}"
+                    part_images_dir = osp.join(output_dir, part_name, 'images')
+                    
+                    self.log_message(f"复制{part_name}文件: {len(part_files)} 张图片")
+                    
+                    tasks = [(img_file, osp.join(part_images_dir, os.path.basename(img_file))) for img_file in part_files]
+                    self.run_copy_tasks(copier, tasks,
+                                        0.6 + 0.3 * current_step / total_progress_steps,
+                                        0.6 + 0.3 * (current_step + 1) / total_progress_steps)
+                    
+                    current_step += 1
+                    self.log_message(f"✓ {part_name}文件复制完成")
+        
+        self.finish_file_copier(copier)
+    
+    def generate_coco_annotations_for_split_subsets(self, output_dir, split_subsets):
+        """为分割后的子集生成COCO格式标注"""
+        self.log_message("为分割后的子集生成COCO格式标注...")
+        
+        # 使用已建立的全局标签映射
+        global_converter = self.global_converter
+        self.log_message(f"使用已建立的标签映射，共{len(global_converter.labels_list)}个标签:")
+        for label in global_converter.labels_list:
+            label_id = global_converter.label_to_num[label]
+            self.log_message(f"  {label_id}: {label}")
+        
+        total_parts = sum(len(parts_list) for parts_list in split_subsets.values())
+        current_part = 0
+        
+        for subset_name, parts_list in split_subsets.items():
+            if len(parts_list) == 1:
+                # 未分割的子集
+                files = parts_list[0]
+                self.log_message(f"生成{subset_name}集COCO标注...")
+                
+                annotations_dir = osp.join(output_dir, subset_name, 'annotations')
+                self.write_split_coco_json(global_converter, files, subset_name, annotations_dir)
+                
+                current_part += 1
+            else:
+                # 分割后的子集
+                for i, part_files in enumerate(parts_list):
+                    part_name = f"{subset_name}_part{i+1:02d}"
+                    self.log_message(f"生成{part_name}COCO标注...")
+                    
+                    annotations_dir = osp.join(output_dir, part_name, 'annotations')
+                    self.write_split_coco_json(global_converter, part_files, part_name, annotations_dir)
+                    
+                    current_part += 1
+                    
+                    # 更新进度条
+                    progress = current_part / total_parts
+                    self.set_progress(progress * 0.1 + 0.9)  # 90%-100%的进度区间
+    
+    def copy_files_to_split_dirs_multi(self, output_dir, train_files, test_files, verify_files, folder_files_dict=None):
+        """复制文件到对应的切分目录（多文件夹版本）"""
+        self.log_message("复制文件到切分目录...")
+        
+        copier = self.create_file_copier()
+        
+        # 复制训练集文件
+        self.copy_files_to_dir_multi(output_dir, 'train', train_files, 0.0, 0.3, folder_files_dict, copier)
+        
+        # 复制测试集文件
+        self.copy_files_to_dir_multi(output_dir, 'test', test_files, 0.3, 0.6, folder_files_dict, copier)
+        
+        # 复制验证集文件
+        self.copy_files_to_dir_multi(output_dir, 'verify', verify_files, 0.6, 0.9, folder_files_dict, copier)
+        
+        self.finish_file_copier(copier)
+    
+    def copy_files_to_dir_multi(self, output_dir, split_name, files, progress_start, progress_end, folder_files_dict=None, copier=None):
+        """复制文件到指定目录（多文件夹版本，支持分割后的文件夹结构）"""
+        split_dir = osp.join(output_dir, split_name, 'images')
+        
+        # 统计每个文件夹的文件数量
+        folder_stats = {}
+        
+        # 如果提供了folder_files_dict，使用它来确定文件夹归属
+        if folder_files_dict:
+            # 创建文件到文件夹的映射
+            file_to_folder = {}
+            for folder_key, folder_files in folder_files_dict.items():
+                for file_path in folder_files:
+                    file_to_folder[file_path] = folder_key
+            
+            # 统计每个分割后文件夹的文件数量
+            for img_file in files:
+                folder_key = file_to_folder.get(img_file)
+                if folder_key:
+                    # 处理分割后的文件夹名称显示
+                    if "_part" in folder_key:
+                        # 这是分割后的子文件夹
+                        original_path = folder_key.split("_part")[0]
+                        part_num = folder_key.split("_part")[1]
+                        original_name = self.folder_names.get(original_path, os.path.basename(original_path))
+                        display_name = f"{original_name}_part{part_num}"
+                    else:
+                        # 原始文件夹
+                        display_name = self.folder_names.get(folder_key, os.path.basename(folder_key))
+                    
+                    if display_name not in folder_stats:
+                        folder_stats[display_name] = 0
+                    folder_stats[display_name] += 1
+                else:
+                    # 找不到对应文件夹，使用原始路径
+                    folder_path = os.path.dirname(img_file)
+                    folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                    if folder_name not in folder_stats:
+                        folder_stats[folder_name] = 0
+                    folder_stats[folder_name] += 1
+        else:
+            # 原始逻辑，按文件路径统计
+            for img_file in files:
+                folder_path = os.path.dirname(img_file)
+                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+                if folder_name not in folder_stats:
+                    folder_stats[folder_name] = 0
+                folder_stats[folder_name] += 1
+        
+        self.log_message(f"开始复制{split_name}集文件...")
+        for folder_name, count in folder_stats.items():
+            self.log_message(f"  {folder_name}: {count} 个文件")
+        
+        # 复制文件
+        own_copier = copier is None
+        if own_copier:
+            copier = self.create_file_copier()
+        tasks = [(img_file, osp.join(split_dir, os.path.basename(img_file))) for img_file in files]
+        self.run_copy_tasks(copier, tasks, progress_start, progress_end)
+        if own_copier:
+            self.finish_file_copier(copier)
+        
+        self.log_message(f"✓ {split_name}集文件复制完成: {len(files)} 个文件")
+    
+    def generate_coco_annotations_multi(self, output_dir, train_files, test_files, verify_files):
+        """为每个子集生成COCO格式标注（多文件夹版本）"""
+        self.log_message("生成COCO格式标注文件...")
+        
+        # 使用已建立的全局标签映射
+        global_converter = self.global_converter
+        self.log_message(f"使用已建立的标签映射，共{len(global_converter.labels_list)}个标签:")
+        for label in global_converter.labels_list:
+            label_id = global_converter.label_to_num[label]
+            self.log_message(f"  {label_id}: {label}")
+        
+        # 生成训练集标注
+        self.generate_split_coco_annotations_multi(output_dir, 'train', train_files, global_converter, 0.9, 0.95)
+        
+        # 生成测试集标注
+        self.generate_split_coco_annotations_multi(output_dir, 'test', test_files, global_converter, 0.95, 0.98)
+        
+        # 生成验证集标注
+        self.generate_split_coco_annotations_multi(output_dir, 'verify', verify_files, global_converter, 0.98, 1.0)
+    
+    def generate_split_coco_annotations_multi(self, output_dir, split_name, files, global_converter, progress_start, progress_end):
+        """为指定子集生成COCO格式标注（多文件夹版本）"""
+        self.log_message(f"生成{split_name}集COCO标注...")
+        
+        # 使用全局转换器，确保标签ID一致
+        # 注意：这里不再创建新的converter实例
+        
+        # 处理文件并流式写出COCO JSON文件
+        annotations_dir = osp.join(output_dir, split_name, 'annotations')
+        self.write_split_coco_json(global_converter, files, split_name, annotations_dir)
+    
+    def write_split_coco_json(self, global_converter, files, split_name, annotations_dir, reuse_results=None):
+        """
+        转换子集文件并流式写出 instance_{split_name}.json（或分片目录），完成后验证标签ID一致性
+        
+        配置了export_formats时同一次转换的结果同时交给YOLO、海康等输出（FanOutWriter），不重复解析；
+        reuse_results为 图片路径 -> 转换结果，其中的文件不再重新解析（增量转换）
+        """
+        self.check_cancelled()
+        json_filename = f'instance_{split_name}.json'
+        json_path = osp.join(annotations_dir, json_filename)
+        split_dir = sharded_split_dir(annotations_dir, split_name)
+        output_path = split_dir if self.config.sharded_output else json_path
+        output_name = os.path.basename(split_dir) + '/' if self.config.sharded_output else json_filename
+        
+        # 继续上次的转换：日志中已完成、且大小和修改时间没变的标注文件直接沿用
+        # （增量清单需要每张图片的id，生成清单时仍重新转换）
+        if self.journal is not None and self.emitted_ids is None:
+            signature = self.journal.finished_outputs.get(split_name)
+            if signature is not None and signature == output_signature(output_path):
+                self.log_message(f"✓ {split_name}集COCO标注已在上次转换中完成，跳过: {output_name}")
+                return None
+        
+        if self.config.sharded_output:
+            writer = ShardedCocoWriter(split_dir, int(self.config.shard_size_mb * 1024 * 1024))
+        else:
+            writer = StreamingCocoWriter(json_path, compact=self.config.compact_json)
+        # 标签一致性在写出的同时检查，不再重新读取输出
+        if self.label_validator is None:
+            self.label_validator = LabelConsistencyValidator(global_converter.label_to_num)
+        label_check = self.label_validator.for_split(split_name)
+        sinks = self.create_export_sinks(global_converter, annotations_dir)
+        writer = FanOutWriter(writer, sinks + [label_check])
+        try:
+            summary = self.process_split_json_files_multi(global_converter, files, split_name, writer, reuse_results)
+        except BaseException:
+            # 删除临时文件，上次的输出保持不变
+            writer.close()
+            raise
+        
+        # 删除另一种格式的旧输出，避免两份标注并存
+        if self.config.sharded_output:
+            if os.path.exists(json_path):
+                os.remove(json_path)
+        elif os.path.isdir(split_dir):
+            shutil.rmtree(split_dir)
+        
+        self.count_stage_io(files=len(files), bytes_written=output_size(output_path) + sum(
+            output_size(sink.output_path) for sink in sinks))
+        if 'yolo' in self.config.export_formats:
+            write_yolo_classes(osp.join(self.config.output_dir, YOLO_CLASSES_FILENAME), summary['categories'])
+        if self.journal is not None:
+            self.journal.record_output(split_name, output_signature(output_path))
+        self.log_message(f"✓ {split_name}集COCO标注生成完成: {output_name}")
+        self.log_message(f"  - 图片数量: {summary['images']}")
+        self.log_message(f"  - 标注数量: {summary['annotations']}")
+        self.log_message(f"  - 类别数量: {len(summary['categories'])}")
+        area = summary.get('area')
+        if area and area['count']:
+            self.log_message(f"  - 标注面积: 最小 {area['min']:.1f}, 平均 {area['mean']:.1f}, 最大 {area['max']:.1f}")
+        for export in summary.get('exports', []):
+            path = osp.relpath(export['path'], self.config.output_dir)
+            self.log_message(f"  - {export['format']}: {path} ({export['images']} 张图片, {export['annotations']} 个标注)")
+            if export.get('skipped'):
+                self.log_message(f"    {export['skipped']} 个标注裁剪到图像范围后为空，未写入")
+        
+        # 标签ID一致性（写出时已检查）
+        self.verify_label_consistency(label_check)
+        return summary
+    
+    def create_export_sinks(self, global_converter, annotations_dir):
+        """按配置创建子集的其他格式输出，与 annotations 目录同级"""
+        subset_dir = os.path.dirname(annotations_dir)
+        sinks = []
+        if 'yolo' in self.config.export_formats:
+            sinks.append(YoloLabelWriter(osp.join(subset_dir, 'labels')))
+        if 'hik' in self.config.export_formats:
+            category_names = {category_id: label for label, category_id in global_converter.label_to_num.items()}
+            sinks.append(HikFrameInfoWriter(osp.join(subset_dir, HIK_RESULT_DIRNAME, HIK_RESULT_FILENAME), category_names))
+        return sinks
+    
+    def verify_label_consistency(self, label_check):
+        """输出一个子集的标签一致性检查结果：没有问题时只输出一行，有问题时按类型汇总"""
+        split_name = label_check.split_name
+        if not label_check.issues:
+            self.log_message(f"  ✓ {split_name}集标签ID一致: {label_check.annotations} 个标注，"
+                             f"{len(label_check.category_counts)} 个类别")
+            return
+        for issue, count in label_check.issues.items():
+            self.log_message(f"  错误: {split_name}集 {count} 处{LABEL_CHECK_ISSUES[issue]}")
+        for category_id, count in label_check.unknown_category_ids.most_common(MAX_LOGGED_ISSUES):
+            self.log_message(f"    category_id {category_id}: {count} 个标注")
+        for label, expected_id, actual_id in label_check.mismatched_labels[:MAX_LOGGED_ISSUES]:
+            self.log_message(f"    标签 '{label}': 期望{expected_id}, 实际{actual_id}")
+    
+    def process_split_json_files_multi(self, converter, files, split_name, writer=None, reuse_results=None):
+        """
+        处理指定子集的JSON文件（多文件夹版本）
+        
+        指定writer（StreamingCocoWriter）时边转换边写出，返回统计信息而不是完整COCO数据；
+        reuse_results中的文件直接使用已有结果，只有其余文件会被解析
+        """
+        builder = CocoSplitBuilder(writer, self.config.dedupe_iou)
+        
+        # 使用传入的全局转换器，不再重新创建标签映射
+        # 注意：converter.labels_list 和 converter.label_to_num 已经在全局映射中建立
+        
+        # 按文件夹分组处理文件
+        folder_files = {}
+        for img_file in files:
+            folder_path = os.path.dirname(img_file)
+            if folder_path not in folder_files:
+                folder_files[folder_path] = []
+            folder_files[folder_path].append(img_file)
+        
+        self.log_message(f"处理{split_name}集，按文件夹分组:")
+        for folder_path, folder_file_list in folder_files.items():
+            folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+            self.log_message(f"  {folder_name}: {len(folder_file_list)} 个文件")
+        
+        # 没有JSON的图片按扫描结果直接跳过，不再逐个检查文件是否存在
+        label_files = [self.dataset_index.label_file_for(img_file) for img_file in files]
+        reuse_results = reuse_results or {}
+        to_convert = [label_file for img_file, label_file in zip(files, label_files)
+                      if label_file is not None and img_file not in reuse_results]
+        converted = self._iter_conversion_results(converter, to_convert)
+        
+        def iter_results():
+            for index, (img_file, label_file) in enumerate(zip(files, label_files)):
+                if index % CANCEL_CHECK_INTERVAL == 0:
+                    self.check_cancelled()
+                if img_file in reuse_results:
+                    yield reuse_results[img_file]
+                elif label_file is None:
+                    yield None
+                else:
+                    yield next(converted)
+        
+        # 按输入顺序合并，保证image_id/annotation id与单进程完全一致
+        try:
+            for img_file, label_file, result in zip(files, label_files, iter_results()):
+                if result is None:
+                    self.log_message(f"警告: 找不到对应的JSON文件 {label_file or label_file_for_image(img_file)}")
+                    if self.emitted_ids is not None:
+                        self.emitted_ids[img_file] = (None, [])
+                    continue
+                
+                warnings, error = builder.add_file(result)
+                if self.emitted_ids is not None:
+                    self.emitted_ids[img_file] = (builder.last_image_id, builder.last_annotation_ids)
+                for warning in warnings:
+                    self.log_message(warning)
+                if error is not None:
+                    self.log_message(f"处理文件 {label_file} 时出错: {error}")
+        finally:
+            # 取消或出错时立即关闭转换生成器，撤回尚未开始的分片
+            converted.close()
+        
+        if builder.exact_duplicates or builder.near_duplicates:
+            message = f"  去除重复标注: {builder.exact_duplicates} 个"
+            if self.config.dedupe_iou is not None:
+                message += f"，IoU≥{self.config.dedupe_iou} 的近似重复: {builder.near_duplicates} 个"
+            self.log_message(message)
+        
+        return builder.to_coco(converter)
+    
+    def _convert_file_serial(self, converter, label_file):
+        """单进程转换一个文件，JSON从共享的标注索引读取"""
+        record = self.annotation_index.get(label_file)
+        if record is None:
+            return None
+        if record.error is not None:
+            return failed_conversion_result(record.error)
+        return convert_labelme_data(converter, record.data)
+    
+    def _iter_conversion_results(self, converter, label_files):
+        """
+        按输入顺序逐个产出每个文件的转换结果
+        
+        文件较多且启用多进程时分片提交到进程池，同时在途的分片不超过进程数的
+        MAX_PENDING_SHARDS_PER_WORKER 倍，每产出一个分片再提交下一个，写出较慢时结果不会在内存中堆积；
+        进程池出错时剩余分片改用单进程转换。
+        """
+        executor = self._get_conversion_executor() if len(label_files) >= PARALLEL_CONVERSION_MIN_FILES else None
+        if executor is None:
+            for label_file in label_files:
+                yield self._convert_file_serial(converter, label_file)
+            return
+        
+        shards = shard_file_list(label_files, self._conversion_workers)
+        self.log_message(f"  多进程转换: {self._conversion_workers} 个进程, {len(shards)} 个分片")
+        max_pending = MAX_PENDING_SHARDS_PER_WORKER * self._conversion_workers
+        pending = deque()
+        submitted_shards = 0
+        done_shards = 0
+        try:
+            while done_shards < len(shards):
+                while submitted_shards < len(shards) and len(pending) < max_pending:
+                    pending.append(executor.submit(convert_labelme_files, converter, shards[submitted_shards]))
+                    submitted_shards += 1
+                shard_results = pending.popleft().result()
+                done_shards += 1
+                yield from shard_results
+        except Exception as e:
+            self.log_message(f"多进程转换失败，剩余文件改用单进程: {e}")
+            self._shutdown_conversion_executor(cancel=True)
+            for shard in shards[done_shards:]:
+                for label_file in shard:
+                    yield self._convert_file_serial(converter, label_file)
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def _get_conversion_executor(self):
+        """按需创建转换进程池（整次转换复用），未启用多进程时返回None"""
+        if self._conversion_executor is not None:
+            return self._conversion_executor
+        
+        if not self.config.parallel_conversion:
+            return None
+        workers = self.config.conversion_workers or os.cpu_count() or 1
+        if workers <= 1:
+            return None
+        
+        self._conversion_workers = workers
+        self._conversion_executor = ProcessPoolExecutor(max_workers=workers)
+        return self._conversion_executor
+    
+    def _shutdown_conversion_executor(self, cancel=False):
+        """关闭转换进程池；cancel为True时撤回排队中的分片并且不等待运行中的分片"""
+        executor = self._conversion_executor
+        self._conversion_executor = None
+        if executor is None:
+            return
+        if cancel:
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            executor.shutdown(wait=True)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="labelme → COCO 数据集切分与格式转换（无界面版本）",
+        epilog="命令行参数优先于配置文件中的同名配置项")
+    parser.add_argument('-c', '--config', help="JSON配置文件，键与ConversionConfig字段相同")
+    parser.add_argument('-i', '--input', dest='input_folders', action='append', help="输入文件夹，可重复指定")
+    parser.add_argument('-o', '--output', dest='output_dir', help="输出目录")
+    parser.add_argument('--train-ratio', type=float, help="训练集比例")
+    parser.add_argument('--test-ratio', type=float, help="测试集比例")
+    parser.add_argument('--verify-ratio', type=float, help="验证集比例")
+    parser.add_argument('--seed', type=int, help="随机种子，不指定时随机切分")
+    parser.add_argument('--max-images', dest='max_images_per_folder', type=int, help="每个子集最多图片数量")
+    parser.add_argument('--no-auto-split', dest='auto_split', action='store_const', const=False,
+                        help="不自动分割超过上限的子集")
+    parser.add_argument('--bbox-mode', choices=BBOX_MODES, help="bbox计算模式")
+    parser.add_argument('--label-mapping', help="GUI导出的标签映射文件，保证每次构建的标签ID一致")
+    parser.add_argument('--no-parallel', dest='parallel_conversion', action='store_const', const=False,
+                        help="单进程生成COCO标注")
+    parser.add_argument('--workers', dest='conversion_workers', type=int, help="生成COCO标注的进程数")
+    parser.add_argument('--compact', dest='compact_json', action='store_const', const=True,
+                        help="紧凑COCO JSON（不缩进）")
+    parser.add_argument('--placement', dest='placement_mode', choices=list(PLACEMENT_MODES), help="图片放置方式")
+    parser.add_argument('--copy-workers', type=int, help="复制线程数")
+    parser.add_argument('--incremental', action='store_const', const=True,
+                        help=f"增量转换：按输出目录中的 {MANIFEST_FILENAME} 只处理新增、变化和删除的文件")
+    parser.add_argument('--sharded', dest='sharded_output', action='store_const', const=True,
+                        help="标注写成JSONL分片和偏移索引（instance_<子集>/ 目录），用 rebuild_coco_json.py 可重新生成标准COCO文件")
+    parser.add_argument('--shard-size-mb', type=float, help="每个分片的大致大小（MB）")
+    parser.add_argument('--dedupe-iou', type=float, metavar='IOU',
+                        help="同一图片内同类别IoU不低于该值(0.5~1)的标注视为重复，只保留第一个")
+    parser.add_argument('--trace-memory', action='store_const', const=True,
+                        help="用tracemalloc记录各阶段主进程的内存分配峰值（转换明显变慢）")
+    parser.add_argument('--profile-dir', metavar='DIR',
+                        help="把每个阶段主进程的cProfile结果写入 DIR/<序号>_<阶段>.prof，可用 python -m pstats 查看")
+    parser.add_argument('--resume', action='store_const', const=True,
+                        help=f"按输出目录中的 {JOURNAL_FILENAME} 继续上次中断的转换，跳过已完成的复制批次和标注文件")
+    parser.add_argument('--verify-image-sizes', action='store_const', const=True,
+                        help=f"转换前只读图片文件头核对JSON中的imageWidth/imageHeight，不一致的写入 {IMAGE_SIZE_REPORT_FILENAME}")
+    parser.add_argument('--fix-image-sizes', action='store_const', const=True,
+                        help="核对图片尺寸并把不一致的JSON改成实际尺寸")
+    parser.add_argument('--export', dest='export_formats', action='append', choices=list(EXPORT_FORMATS),
+                        help="同时导出其他格式，可重复指定: yolo（<子集>/labels/*.txt）、"
+                             f"hik（<子集>/{HIK_RESULT_DIRNAME}/{HIK_RESULT_FILENAME}）")
+    parser.add_argument('--write-config', metavar='PATH', help="把合并后的配置写入文件后退出，不执行转换")
+    return parser
+
+def main(argv=None):
+    """命令行入口"""
+    args = build_arg_parser().parse_args(argv)
+    
+    try:
+        values = ConversionConfig.load(args.config).to_dict() if args.config else {}
+        for key in ConversionConfig.DEFAULTS:
+            value = getattr(args, key, None)
+            if value is not None:
+                values[key] = value
+        config = ConversionConfig(**values)
+        
+        if args.write_config:
+            config.save(args.write_config)
+            print(f"配置已保存到: {args.write_config}")
+            return 0
+        
+        config.validate()
+    except (OSError, ValueError) as e:
+        print(f"配置错误: {e}", file=sys.stderr)
+        return 2
+    
+    reported = [-1]
+    
+    def report_progress(value):
+        # 每10%输出一次
+        step = int(value * 10)
+        if step > reported[0]:
+            reported[0] = step
+            print(f"[进度 {step * 10:3d}%]", flush=True)
+    
+    engine = DatasetConversionEngine(config, lambda message: print(message, flush=True), report_progress)
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        print("已中断，使用 --resume 可以继续这次转换", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"处理失败: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    # 多进程转换在Windows下以spawn方式启动子进程，打包后需要freeze_support
+    multiprocessing.freeze_support()
+    sys.exit(main())
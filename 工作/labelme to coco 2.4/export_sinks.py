@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+COCO之外的标注输出
+
+CocoSplitBuilder 把去重并分配好id的图片和标注依次交给writer（add_image/add_annotation/finish/close）。
+FanOutWriter 把同一串调用转发给COCO writer和这里的输出，每个labelme文件只解析一次，
+所有输出共用同一个子集划分、image_id和全局标签映射：
+
+- YoloLabelWriter: <子集>/labels/<图片名>.txt，每行 "类别序号 cx cy w h"（归一化，类别序号为category_id-1）
+- HikFrameInfoWriter: <子集>/Result/merged_annotations.json，海康 calibInfo/mapFrameInfos 格式
+  （与 labelme to hik格式转换 的单检测模式相同：按labelme的shape_type，矩形 TargetType=1，多边形 TargetType=3）
+
+转换结果的每个标注带有非COCO字段 SHAPE_TYPE_FIELD（labelme的shape_type），
+FanOutWriter先交给这里的输出，再去掉该字段交给COCO writer。
+
+标注按图片攒着，切换到下一张图片时写出，内存占用与子集大小无关。
+"""
+
+import os
+
+import json_codec
+
+EXPORT_FORMATS = {
+    'yolo': 'YOLO txt（<子集>/labels）',
+    'hik': '海康 mapFrameInfos（<子集>/Result/merged_annotations.json）'
+}
+
+HIK_RESULT_DIRNAME = 'Result'
+HIK_RESULT_FILENAME = 'merged_annotations.json'
+HIK_TARGET_RECTANGLE = 1
+HIK_TARGET_POLYGON = 3
+
+YOLO_CLASSES_FILENAME = 'classes.txt'
+
+# 转换结果中标注的labelme shape_type，不写入COCO
+SHAPE_TYPE_FIELD = 'shape_type'
+
+def _is_rectangle(coords):
+    """annotations_rectangle 生成的四个角点：左上、右上、右下、左下"""
+    if len(coords) != 8:
+        return False
+    x1, y1, x2, y2, x3, y3, x4, y4 = coords
+    return y1 == y2 and x2 == x3 and y3 == y4 and x4 == x1
+
+def hik_target_type(annotation):
+    """
+    按labelme的shape_type确定海康TargetType
+    
+    没有shape_type的标注（增量转换沿用的上次输出）按顶点是否为annotations_rectangle的角点判断
+    """
+    shape_type = annotation.get(SHAPE_TYPE_FIELD)
+    if shape_type == 'rectangle':
+        return HIK_TARGET_RECTANGLE
+    if shape_type is None and _is_rectangle(annotation['segmentation'][0]):
+        return HIK_TARGET_RECTANGLE
+    return HIK_TARGET_POLYGON
+
+def write_yolo_classes(path, categories):
+    """按category_id顺序写出YOLO类别名，第n行对应类别序号n-1"""
+    names = [category['name'] for category in sorted(categories, key=lambda category: category['id'])]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(name + '\n' for name in names))
+
+class _PerImageWriter:
+    """按图片攒标注，图片切换时交给_flush_image写出"""
+    
+    def __init__(self):
+        self.images = {}          # image_id -> image（file_name/width/height）
+        self._current_id = None
+        self._current_annotations = []
+        self._flushed = set()     # 已写出的image_id
+    
+    def add_image(self, image):
+        self.images[image['id']] = {'file_name': image['file_name'], 'width': image['width'],
+                                    'height': image['height']}
+        self._switch_to(image['id'])
+    
+    def add_annotation(self, annotation):
+        self._switch_to(annotation['image_id'])
+        self._current_annotations.append(annotation)
+    
+    def _switch_to(self, image_id):
+        if image_id == self._current_id:
+            return
+        self._flush_current()
+        self._current_id = image_id
+    
+    def _flush_current(self):
+        if self._current_id is None:
+            return
+        image_id = self._current_id
+        if image_id not in self.images:
+            # 图片尺寸字段缺失时COCO中没有这张图片，其他输出同样跳过
+            self._current_id = None
+            self._current_annotations = []
+            return
+        self._flush_image(self.images[image_id], self._current_annotations, image_id in self._flushed)
+        self._flushed.add(image_id)
+        self._current_id = None
+        self._current_annotations = []
+    
+    def _flush_image(self, image, annotations, again):
+        raise NotImplementedError
+
+class YoloLabelWriter(_PerImageWriter):
+    """
+    YOLO检测标注：每张图片一个txt，没有标注的图片写空文件（作为负样本）
+    
+    bbox按图像范围裁剪后归一化，裁剪后为空的标注跳过。
+    同名图片的标注分散在不相邻的文件中时，后来的标注追加到已写出的txt末尾。
+    """
+    
+    def __init__(self, labels_dir):
+        super().__init__()
+        self.labels_dir = labels_dir
+        self.output_path = labels_dir
+        self.num_labels = 0
+        self.skipped = 0
+        os.makedirs(labels_dir, exist_ok=True)
+    
+    def _flush_image(self, image, annotations, again):
+        width, height = image['width'], image['height']
+        lines = []
+        for annotation in annotations:
+            x, y, w, h = annotation['bbox']
+            x1, y1 = max(0.0, x), max(0.0, y)
+            x2, y2 = min(float(width), x + w), min(float(height), y + h)
+            if x2 <= x1 or y2 <= y1:
+                self.skipped += 1
+                continue
+            lines.append(f"{annotation['category_id'] - 1} {(x1 + x2) / 2 / width:.6f} {(y1 + y2) / 2 / height:.6f} "
+                         f"{(x2 - x1) / width:.6f} {(y2 - y1) / height:.6f}\n")
+        stem = os.path.splitext(image['file_name'])[0]
+        with open(os.path.join(self.labels_dir, stem + '.txt'), 'a' if again else 'w', encoding='utf-8') as f:
+            f.write(''.join(lines))
+        self.num_labels += len(lines)
+    
+    def finish(self, categories, info):
+        self._flush_current()
+        return {'format': 'yolo', 'path': self.labels_dir, 'images': len(self._flushed),
+                'annotations': self.num_labels, 'skipped': self.skipped}
+    
+    def close(self):
+        self._current_id = None
+        self._current_annotations = []
+
+class HikFrameInfoWriter(_PerImageWriter):
+    """
+    海康 mapFrameInfos 合并标注，每张图片一个frame，流式写出
+    
+    顶点坐标按图片宽高归一化；PropertyPageDescript为全局标签映射中的标签名。
+    先写同目录的临时文件，finish时替换目标文件，出错或取消时原有输出保持不变。
+    同名图片的标注分散在不相邻的文件中时，后来的标注写成同一FrameNum的另一个frame。
+    """
+    
+    def __init__(self, json_path, category_names):
+        super().__init__()
+        self.json_path = json_path
+        self.output_path = json_path
+        self.category_names = category_names   # category_id -> 标签名
+        self.num_frames = 0
+        self.num_targets = 0
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        self._tmp_path = json_path + '.tmp'
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(b'{"calibInfo": {"VideoChannels": [{"VideoInfo": {"mapFrameInfos": [')
+    
+    def add_annotation(self, annotation):
+        # FanOutWriter之后会去掉shape_type，这里先确定TargetType
+        self._switch_to(annotation['image_id'])
+        self._current_annotations.append((annotation, hik_target_type(annotation)))
+    
+    def _flush_image(self, image, annotations, again):
+        width, height = image['width'], image['height']
+        targets = []
+        for annotation, target_type in annotations:
+            coords = [float(value) for value in annotation['segmentation'][0]]
+            vertices = [{'fX': coords[i] / width, 'fY': coords[i + 1] / height} for i in range(0, len(coords) - 1, 2)]
+            targets.append({'value': {
+                'TargetType': target_type,
+                'Vertex': vertices,
+                'PropertyPages': [{'PropertyPageDescript': self.category_names[annotation['category_id']]}]
+            }})
+        frame = {'value': {'FrameNum': image['file_name'], 'mapTargets': targets}}
+        self._file.write((b'\n' if self.num_frames == 0 else b',\n') + json_codec.dumps(frame))
+        self.num_frames += 1
+        self.num_targets += len(targets)
+    
+    def finish(self, categories, info):
+        self._flush_current()
+        self._file.write(b'\n]}}]}}')
+        self._file.close()
+        os.replace(self._tmp_path, self.json_path)
+        return {'format': 'hik', 'path': self.json_path, 'images': self.num_frames, 'annotations': self.num_targets}
+    
+    def close(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+class FanOutWriter:
+    """
+    把CocoSplitBuilder的输出同时交给COCO writer和其他输出
+    
+    finish返回COCO writer的统计信息，其他输出的统计信息放在 'exports' 中（finish返回None的输出不列入，如检查器）。
+    标注先交给其他输出，再去掉 SHAPE_TYPE_FIELD 交给COCO writer。
+    """
+    
+    def __init__(self, coco_writer, sinks):
+        self.coco_writer = coco_writer
+        self.sinks = list(sinks)
+    
+    def add_image(self, image):
+        self.coco_writer.add_image(image)
+        for sink in self.sinks:
+            sink.add_image(image)
+    
+    def add_annotation(self, annotation):
+        for sink in self.sinks:
+            sink.add_annotation(annotation)
+        annotation.pop(SHAPE_TYPE_FIELD, None)
+        self.coco_writer.add_annotation(annotation)
+    
+    def finish(self, categories, info):
+        exports = [export for export in (sink.finish(categories, info) for sink in self.sinks) if export is not None]
+        summary = self.coco_writer.finish(categories, info)
+        summary['exports'] = exports
+        return summary
+    
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.coco_writer.close()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+只读文件头获取图片尺寸
+
+labelme JSON中的 imageWidth/imageHeight 决定get_bbox光栅化用的掩码大小，写错时bbox被悄悄截断。
+核对尺寸不需要解码像素：
+
+- JPEG: 逐个跳过段，读到SOF段的宽高；APP1中的EXIF方向为5-8时宽高互换（与labelme加载图片时一致）
+- PNG: 签名后的IHDR块
+- BMP: 信息头中的宽高（高度为负表示自上而下存储）
+
+每张图片只读几十到几百字节，其他格式交给PIL的Image.open（同样只解析文件头）。
+"""
+
+import struct
+
+from PIL import Image
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# 带宽高的SOF段：C0-CF中除去DHT(C4)、JPG(C8)、DAC(CC)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# 不带长度的独立标记：TEM、RST0-7
+JPEG_STANDALONE_MARKERS = frozenset([0x01, *range(0xD0, 0xD8)])
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+class ImageHeaderError(ValueError):
+    """文件头无法解析"""
+
+def _exif_orientation(segment):
+    """APP1段内容中的EXIF方向，没有时返回1"""
+    if not segment.startswith(b'Exif\x00\x00') or len(segment) < 14:
+        return 1
+    tiff = segment[6:]
+    if tiff[:2] == b'II':
+        endian = '<'
+    elif tiff[:2] == b'MM':
+        endian = '>'
+    else:
+        return 1
+    ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+    if ifd_offset + 2 > len(tiff):
+        return 1
+    entry_count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+    for i in range(entry_count):
+        entry = tiff[ifd_offset + 2 + i * 12:ifd_offset + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag, = struct.unpack(endian + 'H', entry[:2])
+        if tag == EXIF_ORIENTATION_TAG:
+            return struct.unpack(endian + 'H', entry[8:10])[0]
+    return 1
+
+def _jpeg_size(f):
+    orientation = 1
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ImageHeaderError("JPEG段标记错误")
+        code = marker[1]
+        while code == 0xFF:  # 填充字节
+            fill = f.read(1)
+            if not fill:
+                raise ImageHeaderError("JPEG文件不完整")
+            code = fill[0]
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code in (0xD9, 0xDA):
+            raise ImageHeaderError("JPEG中没有SOF段")
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise ImageHeaderError("JPEG文件不完整")
+        length, = struct.unpack('>H', length_bytes)
+        if length < 2:
+            raise ImageHeaderError("JPEG段长度错误")
+        if code in JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                raise ImageHeaderError("JPEG文件不完整")
+            height, width = struct.unpack('>HH', data[1:5])
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return width, height
+        if code == 0xE1 and orientation == 1:
+            orientation = _exif_orientation(f.read(length - 2))
+        else:
+            f.seek(length - 2, 1)
+
+def _png_size(f):
+    header = f.read(24)
+    if len(header) < 24 or header[12:16] != b'IHDR':
+        raise ImageHeaderError("PNG中没有IHDR块")
+    return struct.unpack('>II', header[16:24])
+
+def _bmp_size(f):
+    header = f.read(26)
+    if len(header) < 26:
+        raise ImageHeaderError("BMP文件不完整")
+    header_size, = struct.unpack('<I', header[14:18])
+    if header_size == 12:
+        return struct.unpack('<HH', header[18:22])
+    width, height = struct.unpack('<ii', header[18:26])
+    return width, abs(height)
+
+def read_image_size(path):
+    """
+    读取图片尺寸
+    
+    Returns:
+        tuple: (宽, 高)
+    
+    Raises:
+        OSError: 文件无法读取
+        ImageHeaderError: 文件头无法解析
+    """
+    with open(path, 'rb') as f:
+        signature = f.read(8)
+        f.seek(0)
+        if signature[:2] == b'\xff\xd8':
+            f.seek(2)
+            return _jpeg_size(f)
+        if signature == PNG_SIGNATURE:
+            return _png_size(f)
+        if signature[:2] == b'BM':
+            return _bmp_size(f)
+        try:
+            with Image.open(f) as image:
+                return image.size
+        except Exception as e:
+            raise ImageHeaderError(f"无法识别的图片格式: {e}")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+JSON编解码层
+
+安装了orjson时使用orjson，否则退回标准库json。labelme文件读取、COCO写出、
+标签映射和转换清单都通过这里读写，保证两种后端的输出格式一致：
+
+- 不转义非ASCII字符（等同 ensure_ascii=False）
+- indent=True 时为2空格缩进，与 json.dump(indent=2) 相同；否则为无空格的紧凑格式
+- numpy标量和数组按对应的Python数值/列表写出
+
+两种后端只在极大/极小浮点数的指数写法上不同（orjson写 1e16，标准库写 1e+16），解析结果相同。
+设置环境变量 LABELME2COCO_JSON=json 可以强制使用标准库。
+"""
+
+import os
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('orjson', 'json') if orjson is not None else ('json',)
+
+# 解析失败时抛出的异常（orjson.JSONDecodeError 是 json.JSONDecodeError 的子类）
+JSONDecodeError = json.JSONDecodeError
+
+def _default(obj):
+    """标准库后端无法序列化的numpy类型"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _select_backend():
+    name = os.environ.get('LABELME2COCO_JSON', '').strip().lower()
+    if name in BACKENDS:
+        return name
+    return BACKENDS[0]
+
+backend = _select_backend()
+
+def set_backend(name):
+    """切换后端（基准测试用），返回之前的后端"""
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"JSON后端不可用: {name}，可选: {', '.join(BACKENDS)}")
+    previous, backend = backend, name
+    return previous
+
+def loads(data):
+    """解析JSON文本（bytes或str）"""
+    if backend == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+def load(path):
+    """读取并解析JSON文件（UTF-8）"""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+def dumps(obj, indent=False):
+    """序列化为UTF-8编码的bytes"""
+    if backend == 'orjson':
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+    if indent:
+        text = json.dumps(obj, indent=2, ensure_ascii=False, default=_default)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default)
+    return text.encode('utf-8')
+
+def dump(obj, path, indent=True):
+    """序列化并写入文件，默认2空格缩进"""
+    data = dumps(obj, indent)
+    with open(path, 'wb') as f:
+        f.write(data)
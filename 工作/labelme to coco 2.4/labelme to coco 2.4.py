@@ -2,319 +2,131 @@
 # coding: utf-8
 
 import os
-import json
-import glob
-import shutil
 import os.path as osp
-import numpy as np
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from tqdm import tqdm
 import threading
-from PIL import Image, ImageTk, ImageDraw
+import multiprocessing
+from PIL import ImageTk
 import webbrowser
-import random
 import datetime
+import queue
 
-class SimpleLabelme2COCO:
-    def __init__(self):
-        self.label_to_num = {}
-        self.categories_list = []
-        self.labels_list = []
-        
-    def images_labelme(self, data, num):
-        image = {}
-        image['height'] = data['imageHeight']
-        image['width'] = data['imageWidth']
-        image['id'] = num + 1
-        if '\\' in data['imagePath']:
-            image['file_name'] = data['imagePath'].split('\\')[-1]
-        else:
-            image['file_name'] = data['imagePath'].split('/')[-1]
-        return image
+import json_codec
+
+from coco_engine import (
+    SimpleLabelme2COCO, AnnotationIndex, PLACEMENT_MODES,
+    ConversionConfig, DatasetConversionEngine, get_image_files, build_label_mapping,
+    LabelRewriter, LABEL_JOURNAL_FILENAME, rollback_label_modification, LabelFileIndex, DatasetIndex,
+    FolderIngestor, ConversionCancelled, ConversionJournal, JOURNAL_FILENAME, EXPORT_FORMATS
+)
+from virtual_tree import VirtualTreeRows
+
+class LogSink:
+    """
+    线程安全的日志队列
     
-    def categories(self, label):
-        category = {}
-        category['supercategory'] = 'component'
-        category['id'] = len(self.labels_list) + 1
-        category['name'] = label
-        return category
+    任意线程调用put只入队，不接触Tk控件；界面线程定时调用drain批量取出。
+    所有消息都会写入日志文件（如果已设置），只有达到显示级别的消息返回给界面。
+    工作线程需要更新界面（进度条、状态栏、按钮、消息框）时调用call，与日志按顺序由界面线程执行。
+    """
     
-    def annotations_polygon(self, height, width, points, label, image_num, object_num):
-        annotation = {}
-        annotation['segmentation'] = [list(np.asarray(points).flatten())]
-        annotation['iscrowd'] = 0
-        annotation['image_id'] = image_num + 1
-        annotation['bbox'] = list(map(float, self.get_bbox(height, width, points)))
-        annotation['area'] = annotation['bbox'][2] * annotation['bbox'][3]
-        annotation['category_id'] = self.label_to_num[label]
-        annotation['id'] = object_num + 1
-        return annotation
+    LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+    # 队列中界面更新项的标记，drain返回 (UI_CALL, (func, args))
+    UI_CALL = 'UI'
     
-    def annotations_rectangle(self, points, label, image_num, object_num):
-        annotation = {}
-        # 正确处理矩形的四个顶点，按逆时针顺序：左上->右上->右下->左下
-        # points[0] = [x1, y1] 左上角, points[1] = [x2, y2] 右下角
-        x1, y1 = points[0]
-        x2, y2 = points[1]
-        
-        # 确保按逆时针顺序排列顶点
-        rect_points = [
-            [x1, y1],  # 左上
-            [x2, y1],  # 右上
-            [x2, y2],  # 右下
-            [x1, y2]   # 左下
-        ]
-        
-        annotation['segmentation'] = [list(np.asarray(rect_points).flatten())]
-        annotation['iscrowd'] = 0
-        annotation['image_id'] = image_num + 1
-        annotation['bbox'] = list(
-            map(float, [
-                points[0][0], points[0][1], points[1][0] - points[0][0], points[1][1] - points[0][1]
-            ]))
-        annotation['area'] = annotation['bbox'][2] * annotation['bbox'][3]
-        annotation['category_id'] = self.label_to_num[label]
-        annotation['id'] = object_num + 1
-        return annotation
+    # 未指定级别时按关键字判断
+    ERROR_KEYWORDS = ('错误', '失败', '出错')
+    WARNING_KEYWORDS = ('警告', '⚠')
     
-    def get_bbox(self, height, width, points):
-        polygons = points
-        mask = np.zeros([height, width], dtype=np.uint8)
-        mask = Image.fromarray(mask)
-        xy = list(map(tuple, polygons))
-        ImageDraw.Draw(mask).polygon(xy=xy, outline=1, fill=1)
-        mask = np.array(mask, dtype=bool)
-        index = np.argwhere(mask == 1)
-        rows = index[:, 0]
-        clos = index[:, 1]
-        left_top_r = np.min(rows)
-        left_top_c = np.min(clos)
-        right_bottom_r = np.max(rows)
-        right_bottom_c = np.max(clos)
-        return [
-            left_top_c, left_top_r, right_bottom_c - left_top_c,
-            right_bottom_r - left_top_r
-        ]
-
-class DatasetSplitter:
-    """数据集切分类"""
+    def __init__(self, level='INFO'):
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self.log_file = None
+        self.level = level
     
-    def __init__(self, train_ratio=0.8, test_ratio=0.1, verify_ratio=0.1):
-        """
-        初始化数据集切分器
-        
-        Args:
-            train_ratio: 训练集比例
-            test_ratio: 测试集比例  
-            verify_ratio: 验证集比例
-        """
-        self.train_ratio = train_ratio
-        self.test_ratio = test_ratio
-        self.verify_ratio = verify_ratio
-        
-        # 验证比例总和是否为1
-        total = train_ratio + test_ratio + verify_ratio
-        if abs(total - 1.0) > 0.001:
-            raise ValueError(f"比例总和必须为1，当前为{total}")
+    @classmethod
+    def classify(cls, message):
+        if any(keyword in message for keyword in cls.ERROR_KEYWORDS):
+            return 'ERROR'
+        if any(keyword in message for keyword in cls.WARNING_KEYWORDS):
+            return 'WARNING'
+        return 'INFO'
     
-    def split_dataset(self, file_list, random_seed=None):
-        """
-        切分数据集
-        
-        Args:
-            file_list: 文件列表
-            random_seed: 随机种子，确保结果可重现
-            
-        Returns:
-            dict: 包含train、test、verify三个列表的字典
-        """
-        if random_seed is not None:
-            random.seed(random_seed)
-        
-        # 随机打乱文件列表
-        shuffled_files = file_list.copy()
-        random.shuffle(shuffled_files)
-        
-        total_files = len(shuffled_files)
-        train_count = int(total_files * self.train_ratio)
-        test_count = int(total_files * self.test_ratio)
-        
-        # 分配文件
-        train_files = shuffled_files[:train_count]
-        test_files = shuffled_files[train_count:train_count + test_count]
-        verify_files = shuffled_files[train_count + test_count:]
-        
-        return {
-            'train': train_files,
-            'test': test_files,
-            'verify': verify_files
-        }
-
-class MultiFolderDatasetSplitter:
-    """多文件夹数据集切分类"""
+    def put(self, message, level=None):
+        self._queue.put((datetime.datetime.now(), level or self.classify(message), message))
     
-    def __init__(self, train_ratio=0.8, test_ratio=0.1, verify_ratio=0.1, max_images_per_folder=2000, auto_split=True):
-        """
-        初始化多文件夹数据集切分器
-        
-        Args:
-            train_ratio: 训练集比例
-            test_ratio: 测试集比例  
-            verify_ratio: 验证集比例
-            max_images_per_folder: 每个文件夹最大图片数量
-            auto_split: 是否自动分割大文件夹
-        """
-        self.train_ratio = train_ratio
-        self.test_ratio = test_ratio
-        self.verify_ratio = verify_ratio
-        self.max_images_per_folder = max_images_per_folder
-        self.auto_split = auto_split
-        
-        # 验证比例总和是否为1
-        total = train_ratio + test_ratio + verify_ratio
-        if abs(total - 1.0) > 0.001:
-            raise ValueError(f"比例总和必须为1，当前为{total}")
+    def call(self, func, *args):
+        """请界面线程在取出队列时执行func(*args)（任意线程可调用）"""
+        self._queue.put((None, self.UI_CALL, (func, args)))
     
-    def split_multiple_folders(self, folder_files_dict, random_seed=None):
-        """
-        对多个文件夹分别进行切分
-        
-        Args:
-            folder_files_dict: 文件夹路径到文件列表的字典
-            random_seed: 随机种子，确保结果可重现
-            
-        Returns:
-            dict: 包含train、test、verify三个列表的字典，每个列表包含所有文件夹的文件
-        """
-        if random_seed is not None:
-            random.seed(random_seed)
-        
-        all_train_files = []
-        all_test_files = []
-        all_verify_files = []
-        
-        # 为每个文件夹单独切分
-        for folder_path, file_list in folder_files_dict.items():
-            if not file_list:
-                continue
-                
-            # 随机打乱当前文件夹的文件列表
-            shuffled_files = file_list.copy()
-            random.shuffle(shuffled_files)
-            
-            total_files = len(shuffled_files)
-            train_count = int(total_files * self.train_ratio)
-            test_count = int(total_files * self.test_ratio)
-            
-            # 分配文件
-            folder_train_files = shuffled_files[:train_count]
-            folder_test_files = shuffled_files[train_count:train_count + test_count]
-            folder_verify_files = shuffled_files[train_count + test_count:]
-            
-            # 添加到总列表
-            all_train_files.extend(folder_train_files)
-            all_test_files.extend(folder_test_files)
-            all_verify_files.extend(folder_verify_files)
-        
-        return {
-            'train': all_train_files,
-            'test': all_test_files,
-            'verify': all_verify_files
-        }
+    def set_level(self, level):
+        if level not in self.LEVELS:
+            raise ValueError(f"未知的日志级别: {level}")
+        self.level = level
     
-    def get_folder_split_info(self, folder_files_dict, random_seed=None):
-        """
-        获取每个文件夹的切分信息
-        
-        Args:
-            folder_files_dict: 文件夹路径到文件列表的字典
-            random_seed: 随机种子
-            
-        Returns:
-            dict: 每个文件夹的切分详细信息
-        """
-        if random_seed is not None:
-            random.seed(random_seed)
-        
-        folder_info = {}
-        
-        for folder_path, file_list in folder_files_dict.items():
-            if not file_list:
-                folder_info[folder_path] = {'train': 0, 'test': 0, 'verify': 0, 'total': 0}
-                continue
-            
-            # 随机打乱当前文件夹的文件列表
-            shuffled_files = file_list.copy()
-            random.shuffle(shuffled_files)
-            
-            total_files = len(shuffled_files)
-            train_count = int(total_files * self.train_ratio)
-            test_count = int(total_files * self.test_ratio)
-            
-            folder_info[folder_path] = {
-                'train': train_count,
-                'test': test_count,
-                'verify': total_files - train_count - test_count,
-                'total': total_files
-            }
-        
-        return folder_info
+    def set_log_file(self, log_file):
+        """设置日志文件（追加写入），None表示不写文件"""
+        self.close()
+        if log_file:
+            self._file = open(log_file, 'a', encoding='utf-8')
+            self.log_file = log_file
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self.log_file = None
     
-    def split_large_folders(self, folder_files_dict, log_callback=None):
+    def drain(self, limit=2000):
         """
-        分割大文件夹，确保每个文件夹不超过最大图片数量
+        取出最多limit条消息
         
-        Args:
-            folder_files_dict: 文件夹路径到文件列表的字典
-            log_callback: 日志回调函数
-            
         Returns:
-            dict: 分割后的文件夹字典，可能包含子文件夹
+            tuple: (需要显示的 [(级别, 消息)]，其中界面更新项为 (UI_CALL, (func, args))，不写入日志文件,
+                    队列中是否还有剩余)
         """
-        if not self.auto_split:
-            return folder_files_dict
-        
-        def log(message):
-            if log_callback:
-                log_callback(message)
-        
-        split_folders_dict = {}
+        min_level = self.LEVELS.index(self.level)
+        visible = []
+        file_lines = []
+        for _ in range(limit):
+            try:
+                timestamp, level, message = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if level == self.UI_CALL:
+                visible.append((level, message))
+                continue
+            if self._file is not None:
+                file_lines.append(f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')} [{level}] {message}\n")
+            if self.LEVELS.index(level) >= min_level:
+                visible.append((level, message))
         
-        for folder_path, file_list in folder_files_dict.items():
-            if len(file_list) <= self.max_images_per_folder:
-                # 不需要分割
-                split_folders_dict[folder_path] = file_list
-            else:
-                # 需要分割
-                folder_name = os.path.basename(folder_path)
-                if not folder_name:
-                    folder_name = "folder"
-                
-                log(f"文件夹 {folder_name} 有 {len(file_list)} 张图片，超过上限 {self.max_images_per_folder}，开始分割...")
-                
-                # 计算需要分割成多少个子文件夹
-                num_splits = (len(file_list) + self.max_images_per_folder - 1) // self.max_images_per_folder
-                
-                # 随机打乱文件列表以确保均匀分布
-                shuffled_files = file_list.copy()
-                random.shuffle(shuffled_files)
-                
-                # 分割文件
-                for i in range(num_splits):
-                    start_idx = i * self.max_images_per_folder
-                    end_idx = min((i + 1) * self.max_images_per_folder, len(shuffled_files))
-                    sub_files = shuffled_files[start_idx:end_idx]
-                    
-                    # 创建子文件夹路径标识
-                    sub_folder_key = f"{folder_path}_part{i+1:02d}"
-                    split_folders_dict[sub_folder_key] = sub_files
-                    
-                    log(f"  创建子文件夹 {folder_name}_part{i+1:02d}: {len(sub_files)} 张图片")
+        if file_lines:
+            self._file.writelines(file_lines)
+            self._file.flush()
         
-        return split_folders_dict
+        return visible, not self._queue.empty()
 
 class MaterialDesignGUI:
+    # 日志控件最多保留的行数，超出时删除最早的行（完整日志见日志文件）
+    LOG_MAX_LINES = 5000
+    # 日志刷新间隔（毫秒）
+    LOG_DRAIN_INTERVAL = 100
+    LOG_LEVEL_NAMES = {
+        'DEBUG': '全部',
+        'INFO': '信息',
+        'WARNING': '警告',
+        'ERROR': '错误'
+    }
+    # 显示标签映射时日志中最多列出的标签数
+    MAX_LOGGED_LABELS = 50
+    # 标签映射表格的初始提示行 (key, values)
+    LABELS_PLACEHOLDER_ROW = ('--', ('--', '请先添加文件夹并扫描标签映射', '--', '未建立'))
+    # 后台添加文件夹时同时扫描的文件夹数，以及界面检查进度的间隔（毫秒）
+    INGEST_WORKERS = 4
+    INGEST_POLL_INTERVAL = 100
+    
     def __init__(self):
         try:
             print("开始初始化GUI...")
@@ -412,6 +224,12 @@ class MaterialDesignGUI:
         self.input_folders = {}  # 文件夹路径 -> 文件列表的映射
         self.folder_names = {}   # 文件夹路径 -> 显示名称的映射
         self.folder_labels = {}  # 文件夹路径 -> 标签集合的映射
+        self.annotation_index = AnnotationIndex()  # JSON解析结果缓存，各阶段共用
+        self.dataset_index = DatasetIndex()  # 文件夹扫描结果：图片与JSON的配对
+        self.label_file_indexes = {}  # 文件夹路径 -> LabelFileIndex（标签修改窗口使用）
+        self._ingestion = None  # 正在进行的后台添加文件夹任务
+        self.conversion_engine = None  # 正在运行的转换，取消按钮通过它请求取消
+        self.log_sink = LogSink()  # 日志先入队，由界面线程定时批量显示
         print("多文件夹管理变量初始化完成")
         
         # 设置窗口图标和样式
@@ -427,6 +245,7 @@ class MaterialDesignGUI:
         try:
             print("开始创建主界面...")
             self.create_main_interface()
+            self.root.after(self.LOG_DRAIN_INTERVAL, self._drain_log_queue)
             print("主界面创建完成")
         except Exception as e:
             print(f"主界面创建失败: {e}")
@@ -765,6 +584,7 @@ class MaterialDesignGUI:
         self.create_input_section(content_frame)
         self.create_output_section(content_frame)
         self.create_split_section(content_frame)
+        self.create_performance_section(content_frame)
         self.create_action_section(content_frame)  
     def create_right_panel(self, parent):
         """创建右侧数据面板 - 标签页设计"""
@@ -872,7 +692,7 @@ class MaterialDesignGUI:
         
         # 滚动条
         tree_scrollbar = tk.Scrollbar(parent, orient=tk.VERTICAL, command=self.folders_tree.yview)
-        self.folders_tree.configure(yscrollcommand=tree_scrollbar.set)
+        self.folders_rows = VirtualTreeRows(self.folders_tree, tree_scrollbar)
         
         self.folders_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=(0, 10))
@@ -947,7 +767,7 @@ class MaterialDesignGUI:
         
         # 滚动条
         labels_scrollbar = tk.Scrollbar(parent, orient=tk.VERTICAL, command=self.labels_tree.yview)
-        self.labels_tree.configure(yscrollcommand=labels_scrollbar.set)
+        self.labels_rows = VirtualTreeRows(self.labels_tree, labels_scrollbar)
         
         self.labels_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         labels_scrollbar.pack(side=tk.RIGHT, fill=tk.Y, pady=(0, 10))
@@ -1330,6 +1150,188 @@ class MaterialDesignGUI:
         self.max_images_per_folder_var.trace('w', self.update_settings_summary)
         self.auto_split_var.trace('w', self.update_settings_summary)
     
+    def create_performance_section(self, parent):
+        """创建性能选项区域"""
+        perf_frame = tk.Frame(parent, bg=self.colors['surface_container_high'], relief='flat')
+        perf_frame.pack(fill=tk.X, padx=0, pady=(0, 12))
+        
+        # 标题
+        title_label = tk.Label(perf_frame, 
+                              text="⚡ 性能选项", 
+                              bg=self.colors['surface_container_high'], 
+                              fg=self.colors['on_surface'], 
+                              font=('Segoe UI', 12, 'bold'))
+        title_label.pack(anchor=tk.W, padx=16, pady=(12, 8))
+        
+        # 多进程转换
+        parallel_frame = tk.Frame(perf_frame, bg=self.colors['surface_container_high'])
+        parallel_frame.pack(fill=tk.X, padx=16, pady=(0, 8))
+        
+        self.parallel_conversion_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(parallel_frame,
+                      text="🧮 多进程生成COCO标注",
+                      variable=self.parallel_conversion_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(side=tk.LEFT)
+        
+        self.conversion_workers_var = tk.StringVar(value="")
+        tk.Entry(parallel_frame, textvariable=self.conversion_workers_var,
+                width=6, 
+                bg=self.colors['surface'], 
+                fg=self.colors['on_surface'],
+                font=('Segoe UI', 9),
+                relief='flat',
+                borderwidth=1,
+                highlightcolor=self.colors['primary']).pack(side=tk.RIGHT)
+        tk.Label(parallel_frame, 
+                text="进程数(空=CPU核数)", 
+                bg=self.colors['surface_container_high'], 
+                fg=self.colors['on_surface_variant'],
+                font=('Segoe UI', 8)).pack(side=tk.RIGHT, padx=(0, 4))
+        
+        # 图片放置方式
+        placement_frame = tk.Frame(perf_frame, bg=self.colors['surface_container_high'])
+        placement_frame.pack(fill=tk.X, padx=16, pady=(0, 8))
+        
+        tk.Label(placement_frame, 
+                text="🖼 图片放置方式:", 
+                bg=self.colors['surface_container_high'], 
+                fg=self.colors['on_surface'],
+                font=('Segoe UI', 9)).pack(side=tk.LEFT)
+        self.placement_mode_var = tk.StringVar(value=PLACEMENT_MODES['copy'])
+        ttk.Combobox(placement_frame,
+                    textvariable=self.placement_mode_var,
+                    values=list(PLACEMENT_MODES.values()),
+                    width=16, state='readonly').pack(side=tk.RIGHT)
+        
+        # 复制线程数
+        copy_frame = tk.Frame(perf_frame, bg=self.colors['surface_container_high'])
+        copy_frame.pack(fill=tk.X, padx=16, pady=(0, 8))
+        
+        tk.Label(copy_frame, 
+                text="📂 复制线程数:", 
+                bg=self.colors['surface_container_high'], 
+                fg=self.colors['on_surface'],
+                font=('Segoe UI', 9)).pack(side=tk.LEFT)
+        self.copy_workers_var = tk.StringVar(value="8")
+        tk.Entry(copy_frame, textvariable=self.copy_workers_var,
+                width=6, 
+                bg=self.colors['surface'], 
+                fg=self.colors['on_surface'],
+                font=('Segoe UI', 9),
+                relief='flat',
+                borderwidth=1,
+                highlightcolor=self.colors['primary']).pack(side=tk.RIGHT)
+        tk.Label(copy_frame, 
+                text="网络存储可适当调大", 
+                bg=self.colors['surface_container_high'], 
+                fg=self.colors['on_surface_variant'],
+                font=('Segoe UI', 8)).pack(side=tk.RIGHT, padx=(0, 4))
+        
+        # 紧凑JSON输出
+        self.compact_json_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="📦 紧凑COCO JSON（不缩进，文件更小、写出更快）",
+                      variable=self.compact_json_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        # 增量转换
+        self.incremental_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="🔁 增量转换（沿用上次的切分，只处理新增/修改/删除的文件）",
+                      variable=self.incremental_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        # 分片输出
+        self.sharded_output_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="🗂 分片输出标注（JSONL分片+偏移索引，适合超大子集）",
+                      variable=self.sharded_output_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        # 同一次解析同时导出其他格式
+        self.export_format_vars = {}
+        for export_format, description in EXPORT_FORMATS.items():
+            self.export_format_vars[export_format] = tk.BooleanVar(value=False)
+            tk.Checkbutton(perf_frame,
+                          text=f"📤 同时导出 {description}",
+                          variable=self.export_format_vars[export_format],
+                          bg=self.colors['surface_container_high'],
+                          fg=self.colors['on_surface'],
+                          selectcolor=self.colors['primary'],
+                          font=('Segoe UI', 9),
+                          relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        # 阶段性能剖析
+        self.stage_profiling_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="📈 性能剖析（各阶段内存分配峰值，cProfile结果保存到输出目录/profile）",
+                      variable=self.stage_profiling_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        # 图片尺寸核对
+        self.verify_image_sizes_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="📐 转换前核对图片尺寸（只读文件头，与JSON中的imageWidth/imageHeight比较）",
+                      variable=self.verify_image_sizes_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=16, pady=(0, 4))
+        
+        self.fix_image_sizes_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame,
+                      text="🩹 把尺寸不一致的JSON改成图片实际尺寸",
+                      variable=self.fix_image_sizes_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(anchor=tk.W, padx=32, pady=(0, 4))
+        
+        # 近似重复标注合并
+        dedupe_frame = tk.Frame(perf_frame, bg=self.colors['surface_container_high'])
+        dedupe_frame.pack(fill=tk.X, padx=16, pady=(0, 12))
+        
+        self.dedupe_iou_enabled_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(dedupe_frame,
+                      text="🧹 合并近似重复标注（同类别IoU ≥）",
+                      variable=self.dedupe_iou_enabled_var,
+                      bg=self.colors['surface_container_high'],
+                      fg=self.colors['on_surface'],
+                      selectcolor=self.colors['primary'],
+                      font=('Segoe UI', 9),
+                      relief='flat').pack(side=tk.LEFT)
+        self.dedupe_iou_var = tk.StringVar(value="0.9")
+        tk.Entry(dedupe_frame, textvariable=self.dedupe_iou_var,
+                width=6, 
+                bg=self.colors['surface'], 
+                fg=self.colors['on_surface'],
+                font=('Segoe UI', 9),
+                relief='flat',
+                borderwidth=1,
+                highlightcolor=self.colors['primary']).pack(side=tk.RIGHT)
+    
     def create_action_section(self, parent):
         """创建操作按钮区域"""
         # 创建操作区域
@@ -1356,6 +1358,18 @@ class MaterialDesignGUI:
                                     padx=20, pady=8)
         self.convert_btn.pack(pady=8, padx=16)
         
+        # 取消按钮：已完成的部分记录在任务日志中，下次转换时可以继续
+        self.cancel_conversion_btn = tk.Button(action_frame,
+                                               text="⏹ 取消转换",
+                                               command=self.cancel_conversion,
+                                               bg=self.colors['surface_container_high'],
+                                               fg=self.colors['on_surface'],
+                                               font=('Segoe UI', 9),
+                                               relief='flat',
+                                               cursor='hand2',
+                                               state='disabled')
+        self.cancel_conversion_btn.pack(pady=(0, 8), padx=16)
+        
         # 进度条标签
         tk.Label(action_frame, 
                 text="处理进度:", 
@@ -1489,7 +1503,7 @@ class MaterialDesignGUI:
         
         # 滚动条
         tree_scrollbar = ttk.Scrollbar(folders_frame, orient=tk.VERTICAL, command=self.folders_tree.yview)
-        self.folders_tree.configure(yscrollcommand=tree_scrollbar.set)
+        self.folders_rows = VirtualTreeRows(self.folders_tree, tree_scrollbar)
         
         self.folders_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -1551,7 +1565,7 @@ class MaterialDesignGUI:
         
         # 滚动条
         labels_scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.labels_tree.yview)
-        self.labels_tree.configure(yscrollcommand=labels_scrollbar.set)
+        self.labels_rows = VirtualTreeRows(self.labels_tree, labels_scrollbar)
         
         self.labels_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         labels_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -1565,12 +1579,47 @@ class MaterialDesignGUI:
         log_frame = ttk.Frame(parent, style='MaterialCard.TFrame')
         log_frame.pack(fill=tk.BOTH, expand=True, padx=16, pady=16)
         
-        # 日志标题
-        log_title = ttk.Label(log_frame,
+        # 日志标题和控制
+        header_frame = ttk.Frame(log_frame, style='MaterialCard.TFrame')
+        header_frame.pack(fill=tk.X, pady=(0, 8))
+        
+        log_title = ttk.Label(header_frame,
                             text="实时日志",
                             style='MaterialBody.TLabel',
                             font=('Segoe UI', 12, 'bold'))
-        log_title.pack(anchor=tk.W, pady=(0, 8))
+        log_title.pack(side=tk.LEFT)
+        
+        tk.Button(header_frame,
+                 text="🗑️ 清空",
+                 command=self.clear_log,
+                 bg=self.colors['tertiary'],
+                 fg=self.colors['on_tertiary'],
+                 font=('Segoe UI', 9),
+                 relief='flat',
+                 cursor='hand2').pack(side=tk.RIGHT)
+        
+        tk.Button(header_frame,
+                 text="📄 日志文件",
+                 command=self.select_log_file,
+                 bg=self.colors['secondary'],
+                 fg=self.colors['on_secondary'],
+                 font=('Segoe UI', 9),
+                 relief='flat',
+                 cursor='hand2').pack(side=tk.RIGHT, padx=(0, 8))
+        
+        self.log_file_var = tk.StringVar(value="未写入文件")
+        ttk.Label(header_frame,
+                 textvariable=self.log_file_var,
+                 style='MaterialBody.TLabel',
+                 font=('Segoe UI', 8)).pack(side=tk.RIGHT, padx=(0, 8))
+        
+        self.log_level_var = tk.StringVar(value=self.LOG_LEVEL_NAMES[self.log_sink.level])
+        log_level_combobox = ttk.Combobox(header_frame,
+                                          textvariable=self.log_level_var,
+                                          values=list(self.LOG_LEVEL_NAMES.values()),
+                                          width=8, state='readonly')
+        log_level_combobox.pack(side=tk.RIGHT, padx=(0, 8))
+        log_level_combobox.bind('<<ComboboxSelected>>', self.on_log_level_change)
         
         # 日志文本框
         self.log_text = tk.Text(log_frame,
@@ -1590,6 +1639,10 @@ class MaterialDesignGUI:
         self.log_text.configure(yscrollcommand=log_scrollbar.set)
         
         self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.log_text.tag_configure('WARNING', foreground=self.colors['warning'])
+        self.log_text.tag_configure('ERROR', foreground=self.colors['error'])
+    
     def create_status_bar(self, parent):
         """创建底部状态栏"""
         status_card = self.create_elevated_card(parent, elevation=1)[1]
@@ -1624,9 +1677,7 @@ class MaterialDesignGUI:
         self.change_history.append(history_entry)
         
         # 在日志中显示
-        if hasattr(self, 'log_text'):
-            self.log_text.insert(tk.END, history_entry + "\n")
-            self.log_text.see(tk.END)
+        self.log_message(history_entry)
     
     def update_folders_detail_display(self):
         """更新文件夹标签详情显示（兼容方法）"""
@@ -1750,11 +1801,8 @@ class MaterialDesignGUI:
         
         # 清空标签映射表格
         if hasattr(self, 'labels_tree'):
-            for item in self.labels_tree.get_children():
-                self.labels_tree.delete(item)
-            
             # 显示初始提示
-            self.labels_tree.insert('', 'end', values=('--', '请先添加文件夹并扫描标签映射', '--', '未建立'))
+            self.labels_rows.set_rows([self.LABELS_PLACEHOLDER_ROW])
             
             # 绑定选择事件
             self.labels_tree.bind('<<TreeviewSelect>>', self.on_label_select)
@@ -1825,15 +1873,12 @@ class MaterialDesignGUI:
         self.log_message(f"开始扫描 {len(all_files)} 个文件建立标签映射...")
         
         for i, img_file in enumerate(all_files):
-            img_label = os.path.splitext(os.path.basename(img_file))[0]
-            label_file = osp.join(input_dir, img_label + '.json')
-            
-            if not os.path.exists(label_file):
+            label_file = self.dataset_index.label_file_for(img_file)
+            if label_file is None:
                 continue
                 
             try:
-                with open(label_file, encoding='utf-8') as f:
-                    data = json.load(f)
+                data = json_codec.load(label_file)
                 
                 for shapes in data['shapes']:
                     label = shapes['label']
@@ -1867,57 +1912,8 @@ class MaterialDesignGUI:
     
     def build_unified_label_mapping(self):
         """统一建立所有文件夹的标签映射（避免重复）"""
-        seen_labels = set()
-        label_count = {}  # 统计每个标签出现的次数
-        
-        self.log_message("开始统一扫描所有文件夹建立标签映射...")
-        
-        # 扫描所有文件夹
-        for folder_path, image_files in self.input_folders.items():
-            folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-            self.log_message(f"扫描文件夹: {folder_name} ({len(image_files)} 个文件)")
-            
-            for img_file in image_files:
-                img_label = os.path.splitext(os.path.basename(img_file))[0]
-                label_file = osp.join(folder_path, img_label + '.json')
-                
-                if not os.path.exists(label_file):
-                    continue
-                    
-                try:
-                    with open(label_file, encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    for shapes in data['shapes']:
-                        label = shapes['label']
-                        
-                        # 统计标签出现次数
-                        if label not in label_count:
-                            label_count[label] = 0
-                        label_count[label] += 1
-                        
-                        # 只有未见过的标签才添加到全局映射
-                        if label not in seen_labels:
-                            seen_labels.add(label)
-                            self.global_converter.categories_list.append(self.global_converter.categories(label))
-                            self.global_converter.labels_list.append(label)
-                            self.global_converter.label_to_num[label] = len(self.global_converter.labels_list)
-                            self.log_message(f"  发现新标签: '{label}' -> ID {len(self.global_converter.labels_list)}")
-                            
-                except Exception as e:
-                    self.log_message(f"建立标签映射时处理文件 {label_file} 出错: {e}")
-                    continue
-        
-        # 保存标签统计信息
-        self.label_count = label_count
-        
-        # 输出标签统计信息
-        self.log_message(f"\n标签统计信息:")
-        for label, count in sorted(label_count.items()):
-            label_id = self.global_converter.label_to_num[label]
-            self.log_message(f"  {label_id:2d}: {label} (出现 {count} 次)")
-        
-        self.log_message(f"\n统一标签映射建立完成，共 {len(self.global_converter.labels_list)} 个标签")
+        self.label_count = build_label_mapping(self.input_folders, self.annotation_index, self.global_converter,
+                                               self.log_message, self.folder_names, self.dataset_index)
     
     def display_label_mapping(self):
         """显示标签映射表格"""
@@ -1928,26 +1924,25 @@ class MaterialDesignGUI:
             
         self.log_message("开始更新标签映射显示...")
         
-        # 清空现有数据并添加新数据
+        # 只更新变化的行
         try:
-            for item in self.labels_tree.get_children():
-                self.labels_tree.delete(item)
-            
-            # 添加标签数据
             if hasattr(self, 'global_converter') and hasattr(self, 'label_count'):
                 if self.global_converter.labels_list:
-                    self.log_message(f"显示 {len(self.global_converter.labels_list)} 个标签:")
-                    for i, label in enumerate(self.global_converter.labels_list):
+                    self.labels_rows.set_rows(self.label_mapping_rows())
+                    labels_list = self.global_converter.labels_list
+                    self.log_message(f"显示 {len(labels_list)} 个标签:")
+                    # 标签很多时日志只列出前面一部分，完整映射在表格中
+                    for label in labels_list[:self.MAX_LOGGED_LABELS]:
                         label_id = self.global_converter.label_to_num[label]
-                        count = self.label_count.get(label, 0)
-                        self.labels_tree.insert('', 'end', values=(label_id, label, count, "已建立"))
-                        self.log_message(f"  {label_id}: {label} (出现 {count} 次)")
+                        self.log_message(f"  {label_id}: {label} (出现 {self.label_count.get(label, 0)} 次)")
+                    if len(labels_list) > self.MAX_LOGGED_LABELS:
+                        self.log_message(f"  ... 其余 {len(labels_list) - self.MAX_LOGGED_LABELS} 个标签见标签映射表格")
                 else:
                     self.log_message("没有发现任何标签")
-                    self.labels_tree.insert('', 'end', values=('--', '暂无标签数据', '--', '未扫描'))
+                    self.labels_rows.set_rows([('--', ('--', '暂无标签数据', '--', '未扫描'))])
             else:
                 self.log_message("全局转换器或标签计数未初始化")
-                self.labels_tree.insert('', 'end', values=('--', '请先添加文件夹并扫描标签', '--', '未建立'))
+                self.labels_rows.set_rows([('--', ('--', '请先添加文件夹并扫描标签', '--', '未建立'))])
             
             # 绑定选择事件
             self.labels_tree.bind('<<TreeviewSelect>>', self.on_label_select)
@@ -1964,6 +1959,14 @@ class MaterialDesignGUI:
         
         self.log_message("标签映射显示更新完成")
     
+    def label_mapping_rows(self, status_overrides=None):
+        """标签映射表格的行：标签名 -> (ID, 标签, 出现次数, 状态)"""
+        status_overrides = status_overrides or {}
+        label_to_num = self.global_converter.label_to_num
+        return [(label, (label_to_num[label], label, self.label_count.get(label, 0),
+                         status_overrides.get(label, "已建立")))
+                for label in self.global_converter.labels_list]
+    
     def display_label_mapping_with_changes(self, changed_label=None, old_id=None, new_id=None):
         """显示标签映射表格，并标记变更"""
         if not hasattr(self, 'labels_info_label'):
@@ -1998,24 +2001,11 @@ class MaterialDesignGUI:
             if hasattr(self, 'labels_summary_label'):
                 self.labels_summary_label.config(text=f"标签分布: {', '.join(label_distribution[:5])}{'...' if len(label_distribution) > 5 else ''}")
         
-        # 清空现有数据
+        # 只更新变化的行（通常只有被修改的标签）
         if hasattr(self, 'labels_tree'):
-            for item in self.labels_tree.get_children():
-                self.labels_tree.delete(item)
-            
-            # 添加标签数据
             if hasattr(self, 'global_converter'):
-                for i, label in enumerate(self.global_converter.labels_list):
-                    label_id = self.global_converter.label_to_num[label]
-                    count = self.label_count.get(label, 0)
-                    
-                    # 标记状态
-                    if changed_label and label == changed_label:
-                        status = f"已修改 ({old_id}→{new_id})"
-                    else:
-                        status = "已建立"
-                    
-                    self.labels_tree.insert('', 'end', values=(label_id, label, count, status))
+                changed_status = {changed_label: f"已修改 ({old_id}→{new_id})"} if changed_label else None
+                self.labels_rows.set_rows(self.label_mapping_rows(changed_status))
             
             # 绑定选择事件
             self.labels_tree.bind('<<TreeviewSelect>>', self.on_label_select)
@@ -2135,13 +2125,11 @@ class MaterialDesignGUI:
             next_index = (current_index + 1) % len(self.global_converter.labels_list)
             next_label = self.global_converter.labels_list[next_index]
             
-            # 在表格中找到并选择下一个标签
-            for item in self.labels_tree.get_children():
-                values = self.labels_tree.item(item)['values']
-                if values and values[1] == next_label:
-                    self.labels_tree.selection_set(item)
-                    self.labels_tree.see(item)  # 确保标签可见
-                    break
+            # 在表格中找到并选择下一个标签（还没有填充到时先填充）
+            item = self.labels_rows.iid_for(next_label)
+            if item is not None:
+                self.labels_tree.selection_set(item)
+                self.labels_tree.see(item)  # 确保标签可见
                     
         except (ValueError, IndexError):
             # 如果出现错误，不进行选择
@@ -2363,8 +2351,7 @@ class MaterialDesignGUI:
                     'timestamp': str(datetime.datetime.now())
                 }
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(mapping_data, f, indent=2, ensure_ascii=False)
+                json_codec.dump(mapping_data, file_path)
                 
                 self.log_message(f"标签映射已保存到: {file_path}")
                 messagebox.showinfo("成功", f"标签映射已保存到:\n{file_path}")
@@ -2382,8 +2369,7 @@ class MaterialDesignGUI:
         
         if file_path:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    mapping_data = json.load(f)
+                mapping_data = json_codec.load(file_path)
                 
                 # 验证数据完整性
                 required_keys = ['labels', 'label_to_num', 'categories', 'label_count']
@@ -2509,21 +2495,86 @@ class MaterialDesignGUI:
             if hasattr(self, 'settings_summary_label'):
                 self.settings_summary_label.config(text="设置更新中...")
             
-    def log_message(self, message):
-        """添加日志消息"""
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    def log_message(self, message, level=None):
+        """添加日志消息（线程安全，由 _drain_log_queue 批量显示）"""
+        self.log_sink.put(message, level)
+    
+    def call_in_ui(self, func, *args):
+        """在界面线程中执行func(*args)（线程安全，经由日志队列，与之前的日志保持顺序）"""
+        self.log_sink.call(func, *args)
+    
+    def _drain_log_queue(self):
+        """把队列中的日志批量写入日志控件并执行界面更新，裁剪超出上限的旧日志"""
+        try:
+            visible, has_more = self.log_sink.drain()
+            logged = False
+            for level, message in visible:
+                if level == LogSink.UI_CALL:
+                    func, args = message
+                    try:
+                        func(*args)
+                    except Exception as e:
+                        print(f"更新界面失败: {e}")
+                    continue
+                if not hasattr(self, 'log_text'):
+                    continue
+                if level in ('WARNING', 'ERROR'):
+                    self.log_text.insert(tk.END, f"{message}\n", level)
+                else:
+                    self.log_text.insert(tk.END, f"{message}\n")
+                logged = True
+            
+            if logged:
+                line_count = int(self.log_text.index('end-1c').split('.')[0])
+                if line_count > self.LOG_MAX_LINES:
+                    self.log_text.delete('1.0', f'{line_count - self.LOG_MAX_LINES + 1}.0')
+                self.log_text.see(tk.END)
+        except Exception as e:
+            print(f"刷新日志失败: {e}")
+            has_more = False
+        
+        # 积压时尽快继续处理
+        self.root.after(10 if has_more else self.LOG_DRAIN_INTERVAL, self._drain_log_queue)
+    
+    def on_log_level_change(self, event=None):
+        """切换日志显示级别（只影响之后的消息，日志文件始终完整记录）"""
+        for level, name in self.LOG_LEVEL_NAMES.items():
+            if name == self.log_level_var.get():
+                self.log_sink.set_level(level)
+                break
+    
+    def select_log_file(self):
+        """选择日志文件，完整日志追加写入该文件"""
+        file_path = filedialog.asksaveasfilename(
+            title="选择日志文件",
+            defaultextension=".log",
+            filetypes=[("Log files", "*.log"), ("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        
+        if file_path:
+            try:
+                self.log_sink.set_log_file(file_path)
+                self.log_file_var.set(os.path.basename(file_path))
+                self.log_message(f"完整日志将写入: {file_path}")
+            except Exception as e:
+                self.log_message(f"打开日志文件失败: {e}")
+                messagebox.showerror("错误", f"打开日志文件失败: {e}")
+    
+
+    def _rebuild_state_and_refresh_ui(self, reason=None, rescan_labels=True):
+        """
+        基于当前输入文件夹重建标签映射并刷新界面
         
-    def _rebuild_state_and_refresh_ui(self, reason=None):
-        """基于当前输入文件夹重建标签映射并刷新界面"""
+        rescan_labels=False时沿用folder_labels（后台添加文件夹时已经扫描过）
+        """
         try:
             if reason:
                 self.log_message(f"自动刷新: {reason} 后重建标签映射与界面")
             # 重新扫描每个文件夹的标签
-            self.folder_labels = {}
-            for folder_path in list(self.input_folders.keys()):
-                self.folder_labels[folder_path] = self.scan_folder_labels(folder_path)
+            if rescan_labels:
+                self.folder_labels = {}
+                for folder_path in list(self.input_folders.keys()):
+                    self.folder_labels[folder_path] = self.scan_folder_labels(folder_path)
 
             # 根据当前文件夹重建全局标签映射
             if self.input_folders:
@@ -2539,9 +2590,7 @@ class MaterialDesignGUI:
                 self.label_count = {}
                 # 只有在没有文件夹时才显示初始状态
                 if hasattr(self, 'labels_tree'):
-                    for item in self.labels_tree.get_children():
-                        self.labels_tree.delete(item)
-                    self.labels_tree.insert('', 'end', values=('--', '请先添加文件夹并扫描标签映射', '--', '未建立'))
+                    self.labels_rows.set_rows([self.LABELS_PLACEHOLDER_ROW])
 
             # 刷新文件夹区域与统计
             self.update_folders_display()
@@ -2607,1113 +2656,159 @@ class MaterialDesignGUI:
     
     # 旧的start_conversion方法已删除，使用新的多文件夹版本
         
-    def process_dataset(self, input_dir, output_dir, random_seed):
-        """处理数据集：切分和转换"""
+    def process_dataset(self, config, folder_files, label_count):
+        """
+        处理数据集：切分和转换（由 DatasetConversionEngine 执行，界面只负责收集设置和显示结果）
+        
+        在工作线程中运行，不直接接触Tk控件：进度、状态和结果都经由call_in_ui交给界面线程。
+        """
         try:
-            self.log_message("=== 开始多文件夹数据集切分和格式转换 ===")
-            self.log_message(f"输出目录: {output_dir}")
-            
-            # 获取切分比例
-            train_ratio = self.train_ratio_var.get()
-            test_ratio = self.test_ratio_var.get()
-            verify_ratio = self.verify_ratio_var.get()
-            
-            self.log_message(f"切分比例: 训练集{train_ratio:.1%}, 测试集{test_ratio:.1%}, 验证集{verify_ratio:.1%}")
-            if random_seed is not None:
-                self.log_message(f"切分策略: 固定切分 (种子: {random_seed})")
-            else:
-                self.log_message("切分策略: 随机切分")
-            
-            # 检查是否已添加文件夹
-            if not self.input_folders:
-                raise ValueError("请先添加至少一个输入文件夹")
-            
-            # 获取数量限制设置
-            max_images_per_folder = 2000  # 默认值
-            auto_split = True  # 默认启用
-            
-            try:
-                max_images_str = self.max_images_per_folder_var.get().strip()
-                if max_images_str:
-                    max_images_per_folder = int(max_images_str)
-                    if max_images_per_folder <= 0:
-                        raise ValueError("数量必须大于0")
-                auto_split = self.auto_split_var.get()
-            except (ValueError, AttributeError) as e:
-                self.log_message(f"数量限制设置错误，使用默认值2000: {e}")
-                max_images_per_folder = 2000
-                auto_split = True
-            
-            self.log_message(f"数量限制设置: 每文件夹最多 {max_images_per_folder} 张图片，自动分割: {'启用' if auto_split else '禁用'}")
-            
-            # 获取文件夹信息
-            folder_files_dict = self.get_folder_files_dict()
-            total_folders = len(folder_files_dict)
-            total_files = sum(len(files) for files in folder_files_dict.values())
-            
-            self.log_message(f"处理 {total_folders} 个文件夹，共 {total_files} 个图片文件")
-            
-            # 显示每个文件夹的文件数量
-            for folder_path, image_files in folder_files_dict.items():
-                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                self.log_message(f"  {folder_name}: {len(image_files)} 个文件")
-            
-            # 创建多文件夹数据集切分器
-            splitter = MultiFolderDatasetSplitter(train_ratio, test_ratio, verify_ratio, max_images_per_folder, auto_split)
-            
-            # 检查并分割大文件夹
-            if auto_split:
-                self.log_message("\n=== 检查文件夹大小并分割 ===")
-                
-                # 先检查哪些文件夹需要分割
-                folders_to_split = []
-                for folder_path, files in folder_files_dict.items():
-                    if len(files) > max_images_per_folder:
-                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                        folders_to_split.append((folder_name, len(files)))
-                
-                if folders_to_split:
-                    self.log_message(f"发现 {len(folders_to_split)} 个文件夹需要分割:")
-                    for folder_name, file_count in folders_to_split:
-                        num_parts = (file_count + max_images_per_folder - 1) // max_images_per_folder
-                        self.log_message(f"  {folder_name}: {file_count} 张 → 分割为 {num_parts} 个部分")
-                else:
-                    self.log_message("所有文件夹都在大小限制内，无需分割")
-                
-                folder_files_dict = splitter.split_large_folders(folder_files_dict, self.log_message)
-                
-                # 重新统计分割后的信息
-                new_total_folders = len(folder_files_dict)
-                new_total_files = sum(len(files) for files in folder_files_dict.values())
-                self.log_message(f"分割后: {new_total_folders} 个文件夹，共 {new_total_files} 个图片文件")
-            else:
-                # 检查是否有文件夹超过限制
-                large_folders = []
-                for folder_path, files in folder_files_dict.items():
-                    if len(files) > max_images_per_folder:
-                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                        large_folders.append((folder_name, len(files)))
-                
-                if large_folders:
-                    self.log_message("⚠️ 警告: 发现超过大小限制的文件夹，但自动分割已禁用:")
-                    for folder_name, file_count in large_folders:
-                        self.log_message(f"  {folder_name}: {file_count} 张图片 (超过限制 {max_images_per_folder} 张)")
-                    self.log_message("建议启用自动分割功能或手动调整文件夹大小")
-                else:
-                    self.log_message("已禁用自动分割功能，所有文件夹都在大小限制内")
-            
-            # 获取切分预览信息
-            self.log_message("\n=== 切分预览 ===")
-            split_info = splitter.get_folder_split_info(folder_files_dict, random_seed)
-            for folder_path, info in split_info.items():
-                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                self.log_message(f"  {folder_name}: 训练集{info['train']}个, 测试集{info['test']}个, 验证集{info['verify']}个")
-            
-            # 切分数据集
-            self.log_message("\n开始切分数据集...")
-            split_result = splitter.split_multiple_folders(folder_files_dict, random_seed)
-            
-            train_files = split_result['train']
-            test_files = split_result['test']
-            verify_files = split_result['verify']
-            
-            self.log_message(f"切分完成: 训练集{len(train_files)}个, 测试集{len(test_files)}个, 验证集{len(verify_files)}个")
-            
-            # 初始化分割结果变量
-            split_subsets = None
-            
-            # 检查并分割输出子集
-            if auto_split:
-                self.log_message("\n=== 检查输出子集大小并分割 ===")
-                
-                # 检查每个子集是否超过限制
-                subsets = {
-                    'train': train_files,
-                    'test': test_files, 
-                    'verify': verify_files
-                }
-                
-                split_subsets = {}
-                for subset_name, files in subsets.items():
-                    if len(files) > max_images_per_folder:
-                        self.log_message(f"{subset_name}集有 {len(files)} 张图片，超过上限 {max_images_per_folder}，开始分割...")
-                        
-                        # 计算需要分割成多少个部分
-                        num_parts = (len(files) + max_images_per_folder - 1) // max_images_per_folder
-                        self.log_message(f"  {subset_name}集将分割为 {num_parts} 个部分")
-                        
-                        # 随机打乱文件列表
-                        shuffled_files = files.copy()
-                        random.shuffle(shuffled_files)
-                        
-                        # 分割文件
-                        split_parts = []
-                        for i in range(num_parts):
-                            start_idx = i * max_images_per_folder
-                            end_idx = min((i + 1) * max_images_per_folder, len(shuffled_files))
-                            part_files = shuffled_files[start_idx:end_idx]
-                            split_parts.append(part_files)
-                            self.log_message(f"    {subset_name}_part{i+1:02d}: {len(part_files)} 张图片")
-                        
-                        split_subsets[subset_name] = split_parts
-                    else:
-                        self.log_message(f"{subset_name}集有 {len(files)} 张图片，在限制内无需分割")
-                        split_subsets[subset_name] = [files]  # 包装成列表以保持一致性
-                
-                # 创建分割后的输出目录结构
-                self.create_split_output_directories(output_dir, split_subsets, max_images_per_folder)
-                
-                # 复制文件到分割后的目录
-                self.copy_files_to_split_output_dirs(output_dir, split_subsets, folder_files_dict)
-                
-                # 为每个分割后的子集生成COCO格式标注
-                self.generate_coco_annotations_for_split_subsets(output_dir, split_subsets)
-                
-            else:
-                # 原有的处理流程（不分割）
-                # 检查是否有子集超过限制
-                large_subsets = []
-                if len(train_files) > max_images_per_folder:
-                    large_subsets.append(f"训练集({len(train_files)}张)")
-                if len(test_files) > max_images_per_folder:
-                    large_subsets.append(f"测试集({len(test_files)}张)")
-                if len(verify_files) > max_images_per_folder:
-                    large_subsets.append(f"验证集({len(verify_files)}张)")
-                
-                if large_subsets:
-                    self.log_message("⚠️ 警告: 发现超过大小限制的子集，但自动分割已禁用:")
-                    for subset_info in large_subsets:
-                        self.log_message(f"  {subset_info} (超过限制 {max_images_per_folder} 张)")
-                    self.log_message("建议启用自动分割功能")
-                
-                # 创建输出目录结构
-                self.create_output_directories(output_dir, folder_files_dict)
-                
-                # 复制文件到对应目录（支持多文件夹）
-                self.copy_files_to_split_dirs_multi(output_dir, train_files, test_files, verify_files, folder_files_dict)
-                
-                # 为每个子集生成COCO格式标注（使用已建立的标签映射）
-                self.generate_coco_annotations_multi(output_dir, train_files, test_files, verify_files)
-            
-            self.progress_var.set(1.0)
-            self.log_message("✓ 多文件夹数据集切分和转换完成！")
-            self.log_message(f"输出目录: {output_dir}")
-            
-            # 根据是否分割显示不同的总结信息
-            if auto_split and any(len(parts) > 1 for parts in split_subsets.values()):
-                self.log_message("\n=== 分割后的子集信息 ===")
-                for subset_name, parts_list in split_subsets.items():
-                    total_images = sum(len(part) for part in parts_list)
-                    if len(parts_list) == 1:
-                        self.log_message(f"{subset_name}集: {total_images} 张图片 (未分割)")
-                    else:
-                        self.log_message(f"{subset_name}集: {total_images} 张图片 (分割为 {len(parts_list)} 个部分)")
-                        for i, part_files in enumerate(parts_list):
-                            self.log_message(f"  └─ {subset_name}_part{i+1:02d}: {len(part_files)} 张图片")
-            else:
-                self.log_message(f"训练集: {len(train_files)} 张图片")
-                self.log_message(f"测试集: {len(test_files)} 张图片")
-                self.log_message(f"验证集: {len(verify_files)} 张图片")
-            
-            # 显示最终标签映射信息
-            self.log_message("\n=== 最终标签映射 ===")
-            for i, label in enumerate(self.global_converter.labels_list):
-                label_id = self.global_converter.label_to_num[label]
-                count = self.label_count.get(label, 0)
-                self.log_message(f"  {label_id:2d}: {label} (出现 {count} 次)")
-            
-            # 全局验证标签ID一致性
-            self.global_validation(output_dir, self.global_converter)
-            
-            self.status_var.set("处理完成")
-            messagebox.showinfo("成功", "多文件夹数据集切分和转换完成！")
-            
+            engine = DatasetConversionEngine(config, self.log_message,
+                                             lambda value: self.call_in_ui(self.progress_var.set, value),
+                                             self.annotation_index)
+            engine.set_input_folders(folder_files, self.folder_names)
+            engine.set_label_mapping(self.global_converter, label_count)
+            self.conversion_engine = engine
+            engine.run()
+            
+            self.call_in_ui(self.status_var.set, "处理完成")
+            self.call_in_ui(messagebox.showinfo, "成功", "多文件夹数据集切分和转换完成！")
+            
+        except ConversionCancelled as e:
+            self.log_message(str(e))
+            self.call_in_ui(self.status_var.set, "已取消")
+            self.call_in_ui(messagebox.showinfo, "已取消",
+                            "转换已取消。\n再次开始转换时可以选择继续，已完成的复制批次和标注文件会被跳过。")
         except Exception as e:
             self.log_message(f"处理失败: {e}")
-            self.status_var.set("处理失败")
-            messagebox.showerror("错误", f"处理失败: {e}")
+            self.call_in_ui(self.status_var.set, "处理失败")
+            self.call_in_ui(messagebox.showerror, "错误", f"处理失败: {e}")
         finally:
-            self.convert_btn.config(state='normal')
+            self.conversion_engine = None
+            self.call_in_ui(self.convert_btn.config, {'state': 'normal'})
+            self.call_in_ui(self.cancel_conversion_btn.config, {'state': 'disabled'})
     
-    def global_validation(self, output_dir, global_converter):
-        """全局验证：确保所有子集的标签ID一致"""
-        self.log_message("=== 全局标签ID一致性验证 ===")
-        
-        split_names = ['train', 'test', 'verify']
-        all_categories = {}
-        
-        # 收集所有子集的categories信息
-        for split_name in split_names:
-            json_path = osp.join(output_dir, split_name, 'annotations', f'instance_{split_name}.json')
-            if os.path.exists(json_path):
-                try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        coco_data = json.load(f)
-                    
-                    for category in coco_data['categories']:
-                        label_name = category['name']
-                        category_id = category['id']
-                        
-                        if label_name not in all_categories:
-                            all_categories[label_name] = {}
-                        
-                        all_categories[label_name][split_name] = category_id
-                        
-                except Exception as e:
-                    self.log_message(f"读取{split_name}集JSON文件失败: {e}")
-        
-        # 验证每个标签在所有子集中的ID是否一致
-        global_errors = 0
-        for label_name, split_ids in all_categories.items():
-            expected_id = global_converter.label_to_num.get(label_name)
-            if expected_id is None:
-                self.log_message(f"错误: 标签 '{label_name}' 在全局映射中未找到")
-                global_errors += 1
-                continue
-            
-            # 检查所有子集中的ID是否一致
-            inconsistent_splits = []
-            for split_name, category_id in split_ids.items():
-                if category_id != expected_id:
-                    inconsistent_splits.append(f"{split_name}:{category_id}")
-            
-            if inconsistent_splits:
-                self.log_message(f"错误: 标签 '{label_name}' ID不一致 - 期望{expected_id}, 实际: {', '.join(inconsistent_splits)}")
-                global_errors += 1
-            else:
-                self.log_message(f"✓ 标签 '{label_name}' 在所有子集中ID一致: {expected_id}")
-        
-        if global_errors == 0:
-            self.log_message("✓ 全局标签ID一致性验证通过！")
-        else:
-            self.log_message(f"⚠ 全局标签ID一致性验证失败，发现 {global_errors} 个问题")
-        
-        # 输出全局标签映射表
-        self.log_message("\n=== 全局标签映射表 ===")
-        for label in global_converter.labels_list:
-            label_id = global_converter.label_to_num[label]
-            self.log_message(f"{label_id:2d}: {label}")
+    def cancel_conversion(self):
+        """请求取消正在进行的转换，引擎在下一个复制批次或标注文件之前停止"""
+        engine = self.conversion_engine
+        if engine is None:
+            return
+        self.log_message("正在取消转换，等待当前批次完成...")
+        self.status_var.set("正在取消...")
+        engine.cancel()
+        self.cancel_conversion_btn.config(state='disabled')
+    
+    def build_conversion_config(self, output_dir, random_seed, resume=False):
+        """从界面设置生成转换配置"""
+        # 获取数量限制设置
+        max_images_per_folder = 2000  # 默认值
+        auto_split = True  # 默认启用
         
-        # 保存标签映射信息到文件
-        mapping_file = osp.join(output_dir, "label_mapping.txt")
         try:
-            with open(mapping_file, 'w', encoding='utf-8') as f:
-                f.write("Labelme to COCO 标签映射表\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"总标签数量: {len(global_converter.labels_list)}\n\n")
-                f.write("标签ID映射:\n")
-                for label in global_converter.labels_list:
-                    label_id = global_converter.label_to_num[label]
-                    f.write(f"{label_id:2d}: {label}\n")
-                
-                f.write("\n" + "=" * 50 + "\n")
-                f.write("说明: 此文件记录了转换过程中建立的标签ID映射关系\n")
-                f.write("确保所有子集(train/test/verify)中的相同标签具有相同的ID\n")
-            
-            self.log_message(f"✓ 标签映射信息已保存到: {mapping_file}")
-        except Exception as e:
-            self.log_message(f"保存标签映射文件失败: {e}")
+            max_images_str = self.max_images_per_folder_var.get().strip()
+            if max_images_str:
+                max_images_per_folder = int(max_images_str)
+                if max_images_per_folder <= 0:
+                    raise ValueError("数量必须大于0")
+            auto_split = self.auto_split_var.get()
+        except (ValueError, AttributeError) as e:
+            self.log_message(f"数量限制设置错误，使用默认值2000: {e}")
+            max_images_per_folder = 2000
+            auto_split = True
         
-        self.log_message("=== 验证完成 ===")
+        conversion_workers = None
+        try:
+            workers_str = self.conversion_workers_var.get().strip()
+            if workers_str:
+                conversion_workers = int(workers_str)
+                if conversion_workers <= 0:
+                    raise ValueError("进程数必须大于0")
+        except (ValueError, AttributeError, tk.TclError) as e:
+            self.log_message(f"进程数设置错误，使用CPU核数: {e}")
+            conversion_workers = None
+        
+        copy_workers = 8
+        try:
+            workers_str = self.copy_workers_var.get().strip()
+            if workers_str:
+                copy_workers = int(workers_str)
+                if copy_workers <= 0:
+                    raise ValueError("线程数必须大于0")
+        except (ValueError, AttributeError, tk.TclError) as e:
+            self.log_message(f"复制线程数设置错误，使用默认值8: {e}")
+            copy_workers = 8
+        
+        # 近似重复标注的IoU阈值
+        dedupe_iou = None
+        if self.dedupe_iou_enabled_var.get():
+            try:
+                dedupe_iou = float(self.dedupe_iou_var.get().strip())
+                if not 0.5 <= dedupe_iou <= 1:
+                    raise ValueError("IoU阈值必须在0.5到1之间")
+            except (ValueError, tk.TclError) as e:
+                self.log_message(f"去重IoU阈值设置错误，只去除完全相同的标注: {e}")
+                dedupe_iou = None
+        
+        return ConversionConfig(
+            input_folders=list(self.input_folders),
+            output_dir=output_dir,
+            train_ratio=self.train_ratio_var.get(),
+            test_ratio=self.test_ratio_var.get(),
+            verify_ratio=self.verify_ratio_var.get(),
+            seed=random_seed,
+            max_images_per_folder=max_images_per_folder,
+            auto_split=auto_split,
+            bbox_mode=self.global_converter.bbox_mode,
+            parallel_conversion=self.parallel_conversion_var.get(),
+            conversion_workers=conversion_workers,
+            compact_json=self.compact_json_var.get(),
+            placement_mode=self.get_placement_mode(),
+            copy_workers=copy_workers,
+            incremental=self.incremental_var.get(),
+            dedupe_iou=dedupe_iou,
+            sharded_output=self.sharded_output_var.get(),
+            trace_memory=self.stage_profiling_var.get(),
+            profile_dir=osp.join(output_dir, 'profile') if self.stage_profiling_var.get() else None,
+            resume=resume,
+            verify_image_sizes=self.verify_image_sizes_var.get(),
+            fix_image_sizes=self.fix_image_sizes_var.get(),
+            export_formats=[export_format for export_format, var in self.export_format_vars.items() if var.get()]
+        )
     
     def get_image_files(self, input_dir):
-        """获取输入目录中的所有图片文件"""
-        raw_image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.JPG', '*.JPEG', '*.PNG']:
-            raw_image_files.extend(glob.glob(osp.join(input_dir, ext)))
-        
-        # 去重
-        image_files = []
-        seen_paths = set()
-        for p in raw_image_files:
-            key = os.path.normcase(os.path.abspath(p))
-            if key not in seen_paths:
-                seen_paths.add(key)
-                image_files.append(p)
-        
-        return image_files
+        """获取输入目录中的所有图片文件（重新扫描并缓存图片与JSON的配对）"""
+        return get_image_files(input_dir, self.dataset_index)
+    
+    def get_placement_mode(self):
+        """获取界面上选择的图片放置方式"""
+        display_name = self.placement_mode_var.get()
+        for mode, name in PLACEMENT_MODES.items():
+            if name == display_name:
+                return mode
+        return 'copy'
+    
+    # ==================== 多文件夹管理方法 ====================
+    
+    def add_input_folder(self):
+        """添加输入文件夹"""
+        directory = filedialog.askdirectory(title="选择包含JSON文件和图片的文件夹")
+        if directory:
+            if directory in self.input_folders:
+                messagebox.showwarning("警告", "该文件夹已经添加过了")
+                return
+            self.start_folder_ingestion([directory], reason="添加文件夹")
     
-    def create_output_directories(self, output_dir, folder_files_dict=None):
-        """创建输出目录结构"""
-        split_dirs = ['train', 'test', 'verify']
+    def add_multiple_folders(self):
+        """添加多个输入文件夹"""
+        import tkinter.filedialog as fd
         
-        for split_name in split_dirs:
-            # 创建主目录
-            split_dir = osp.join(output_dir, split_name)
-            os.makedirs(split_dir, exist_ok=True)
-            
-            # 创建子目录
-            images_dir = osp.join(split_dir, 'images')
-            annotations_dir = osp.join(split_dir, 'annotations')
-            
-            os.makedirs(images_dir, exist_ok=True)
-            os.makedirs(annotations_dir, exist_ok=True)
-            
-            self.log_message(f"创建目录: {split_dir}")
+        if self._ingestion is not None:
+            messagebox.showwarning("警告", "正在添加文件夹，请等待完成或先取消")
+            return
         
-        # 如果启用了文件夹分割，创建分割信息文件
-        if folder_files_dict and any("_part" in key for key in folder_files_dict.keys()):
-            self.create_split_info_file(output_dir, folder_files_dict)
-    
-    def create_split_info_file(self, output_dir, folder_files_dict):
-        """创建分割信息文件，记录文件夹分割的详细信息"""
-        split_info_file = osp.join(output_dir, "folder_split_info.txt")
-        
-        try:
-            with open(split_info_file, 'w', encoding='utf-8') as f:
-                f.write("文件夹分割信息\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                
-                # 统计原始文件夹和分割后的文件夹
-                original_folders = {}
-                split_folders = {}
-                
-                for folder_key, files in folder_files_dict.items():
-                    if "_part" in folder_key:
-                        # 分割后的子文件夹
-                        original_path = folder_key.split("_part")[0]
-                        part_num = folder_key.split("_part")[1]
-                        
-                        if original_path not in split_folders:
-                            split_folders[original_path] = []
-                        split_folders[original_path].append((part_num, len(files)))
-                    else:
-                        # 未分割的原始文件夹
-                        original_folders[folder_key] = len(files)
-                
-                # 写入未分割的文件夹信息
-                if original_folders:
-                    f.write("未分割的文件夹:\n")
-                    f.write("-" * 30 + "\n")
-                    for folder_path, file_count in original_folders.items():
-                        folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                        f.write(f"{folder_name}: {file_count} 张图片\n")
-                    f.write("\n")
-                
-                # 写入分割的文件夹信息
-                if split_folders:
-                    f.write("分割的文件夹:\n")
-                    f.write("-" * 30 + "\n")
-                    for original_path, parts_info in split_folders.items():
-                        folder_name = self.folder_names.get(original_path, os.path.basename(original_path))
-                        total_files = sum(count for _, count in parts_info)
-                        f.write(f"{folder_name} (总计 {total_files} 张图片，分割为 {len(parts_info)} 个部分):\n")
-                        
-                        for part_num, file_count in sorted(parts_info):
-                            f.write(f"  └─ {folder_name}_part{part_num}: {file_count} 张图片\n")
-                        f.write("\n")
-                
-                f.write("说明:\n")
-                f.write("- 当文件夹中的图片数量超过设定上限时，会自动分割成多个部分\n")
-                f.write("- 分割后的各部分在训练、测试、验证集中保持相同的标签映射\n")
-                f.write("- 分割是随机进行的，确保数据的均匀分布\n")
-            
-            self.log_message(f"✓ 分割信息已保存到: {split_info_file}")
-            
-        except Exception as e:
-                        self.log_message(f"保存分割信息文件失败: {e}")
-    
-    def create_split_output_directories(self, output_dir, split_subsets, max_images_per_folder):
-        """为分割后的子集创建输出目录结构"""
-        self.log_message("创建分割后的输出目录结构...")
-        
-        for subset_name, parts_list in split_subsets.items():
-            if len(parts_list) == 1:
-                # 未分割的子集，创建标准目录
-                subset_dir = osp.join(output_dir, subset_name)
-                os.makedirs(subset_dir, exist_ok=True)
-                
-                images_dir = osp.join(subset_dir, 'images')
-                annotations_dir = osp.join(subset_dir, 'annotations')
-                
-                os.makedirs(images_dir, exist_ok=True)
-                os.makedirs(annotations_dir, exist_ok=True)
-                
-                self.log_message(f"创建目录: {subset_dir}")
-            else:
-                # 分割后的子集，为每个部分创建目录
-                for i, part_files in enumerate(parts_list):
-                    part_name = f"{subset_name}_part{i+1:02d}"
-                    part_dir = osp.join(output_dir, part_name)
-                    os.makedirs(part_dir, exist_ok=True)
-                    
-                    images_dir = osp.join(part_dir, 'images')
-                    annotations_dir = osp.join(part_dir, 'annotations')
-                    
-                    os.makedirs(images_dir, exist_ok=True)
-                    os.makedirs(annotations_dir, exist_ok=True)
-                    
-                    self.log_message(f"创建分割目录: {part_dir} ({len(part_files)} 张图片)")
-        
-        # 创建分割信息文件
-        self.create_subset_split_info_file(output_dir, split_subsets, max_images_per_folder)
-    
-    def create_subset_split_info_file(self, output_dir, split_subsets, max_images_per_folder):
-        """创建子集分割信息文件"""
-        split_info_file = osp.join(output_dir, "subset_split_info.txt")
-        
-        try:
-            with open(split_info_file, 'w', encoding='utf-8') as f:
-                f.write("数据集子集分割信息\n")
-                f.write("=" * 50 + "\n\n")
-                f.write(f"生成时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"分割上限: 每个子集最多 {max_images_per_folder} 张图片\n\n")
-                
-                for subset_name, parts_list in split_subsets.items():
-                    if len(parts_list) == 1:
-                        f.write(f"{subset_name}集: {len(parts_list[0])} 张图片 (未分割)\n")
-                    else:
-                        total_images = sum(len(part) for part in parts_list)
-                        f.write(f"{subset_name}集: 总计 {total_images} 张图片，分割为 {len(parts_list)} 个部分:\n")
-                        for i, part_files in enumerate(parts_list):
-                            f.write(f"  └─ {subset_name}_part{i+1:02d}: {len(part_files)} 张图片\n")
-                    f.write("\n")
-                
-                f.write("说明:\n")
-                f.write("- 当训练集/测试集/验证集的图片数量超过设定上限时，会自动分割成多个部分\n")
-                f.write("- 每个部分都有独立的images和annotations目录\n")
-                f.write("- 所有部分使用相同的标签映射，确保一致性\n")
-                f.write("- 分割是随机进行的，确保数据的均匀分布\n")
-            
-            self.log_message(f"✓ 子集分割信息已保存到: {split_info_file}")
-            
-        except Exception as e:
-            self.log_message(f"保存子集分割信息文件失败: {e}")
-    
-    def copy_files_to_split_output_dirs(self, output_dir, split_subsets, folder_files_dict):
-        """复制文件到分割后的输出目录"""
-        self.log_message("复制文件到分割后的输出目录...")
-        
-        total_progress_steps = sum(len(parts_list) for parts_list in split_subsets.values())
-        current_step = 0
-        
-        for subset_name, parts_list in split_subsets.items():
-            if len(parts_list) == 1:
-                # 未分割的子集
-                subset_dir = osp.join(output_dir, subset_name, 'images')
-                files = parts_list[0]
-                
-                self.log_message(f"复制{subset_name}集文件: {len(files)} 张图片")
-                
-                for i, img_file in enumerate(files):
-                    filename = os.path.basename(img_file)
-                    dest_path = osp.join(subset_dir, filename)
-                    shutil.copy2(img_file, dest_path)
-                    
-                    # 更新进度条
-                    progress = (current_step + (i + 1) / len(files)) / total_progress_steps
-                    self.progress_var.set(progress * 0.3 + 0.6)  # 60%-90%的进度区间
-                
-                current_step += 1
-                self.log_message(f"✓ {subset_name}集文件复制完成")
-            else:
-                # 分割后的子集
-                for i, part_files in enumerate(parts_list):
-                    part_name = f"{subset_name}_part{i+1:02d}"
-                    part_images_dir = osp.join(output_dir, part_name, 'images')
-                    
-                    self.log_message(f"复制{part_name}文件: {len(part_files)} 张图片")
-                    
-                    for j, img_file in enumerate(part_files):
-                        filename = os.path.basename(img_file)
-                        dest_path = osp.join(part_images_dir, filename)
-                        shutil.copy2(img_file, dest_path)
-                        
-                        # 更新进度条
-                        progress = (current_step + (j + 1) / len(part_files)) / total_progress_steps
-                        self.progress_var.set(progress * 0.3 + 0.6)  # 60%-90%的进度区间
-                    
-                    current_step += 1
-                    self.log_message(f"✓ {part_name}文件复制完成")
-    
-    def generate_coco_annotations_for_split_subsets(self, output_dir, split_subsets):
-        """为分割后的子集生成COCO格式标注"""
-        self.log_message("为分割后的子集生成COCO格式标注...")
-        
-        # 使用已建立的全局标签映射
-        global_converter = self.global_converter
-        self.log_message(f"使用已建立的标签映射，共{len(global_converter.labels_list)}个标签:")
-        for label in global_converter.labels_list:
-            label_id = global_converter.label_to_num[label]
-            self.log_message(f"  {label_id}: {label}")
-        
-        total_parts = sum(len(parts_list) for parts_list in split_subsets.values())
-        current_part = 0
-        
-        for subset_name, parts_list in split_subsets.items():
-            if len(parts_list) == 1:
-                # 未分割的子集
-                files = parts_list[0]
-                self.log_message(f"生成{subset_name}集COCO标注...")
-                
-                coco_data = self.process_split_json_files_multi(global_converter, files, subset_name)
-                
-                annotations_dir = osp.join(output_dir, subset_name, 'annotations')
-                json_filename = f'instance_{subset_name}.json'
-                json_path = osp.join(annotations_dir, json_filename)
-                
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(coco_data, f, indent=2, ensure_ascii=False)
-                
-                self.log_message(f"✓ {subset_name}集COCO标注生成完成: {json_filename}")
-                self.log_message(f"  - 图片数量: {len(coco_data['images'])}")
-                self.log_message(f"  - 标注数量: {len(coco_data['annotations'])}")
-                self.log_message(f"  - 类别数量: {len(coco_data['categories'])}")
-                
-                # 验证标签ID一致性
-                self.verify_label_consistency(coco_data, global_converter, subset_name)
-                
-                current_part += 1
-            else:
-                # 分割后的子集
-                for i, part_files in enumerate(parts_list):
-                    part_name = f"{subset_name}_part{i+1:02d}"
-                    self.log_message(f"生成{part_name}COCO标注...")
-                    
-                    coco_data = self.process_split_json_files_multi(global_converter, part_files, part_name)
-                    
-                    annotations_dir = osp.join(output_dir, part_name, 'annotations')
-                    json_filename = f'instance_{part_name}.json'
-                    json_path = osp.join(annotations_dir, json_filename)
-                    
-                    with open(json_path, 'w', encoding='utf-8') as f:
-                        json.dump(coco_data, f, indent=2, ensure_ascii=False)
-                    
-                    self.log_message(f"✓ {part_name}COCO标注生成完成: {json_filename}")
-                    self.log_message(f"  - 图片数量: {len(coco_data['images'])}")
-                    self.log_message(f"  - 标注数量: {len(coco_data['annotations'])}")
-                    self.log_message(f"  - 类别数量: {len(coco_data['categories'])}")
-                    
-                    # 验证标签ID一致性
-                    self.verify_label_consistency(coco_data, global_converter, part_name)
-                    
-                    current_part += 1
-                    
-                    # 更新进度条
-                    progress = current_part / total_parts
-                    self.progress_var.set(progress * 0.1 + 0.9)  # 90%-100%的进度区间
-      
-    def copy_files_to_split_dirs(self, input_dir, output_dir, train_files, test_files, verify_files):
-        """复制文件到对应的切分目录（单文件夹版本，保持兼容性）"""
-        self.log_message("复制文件到切分目录...")
-        
-        # 复制训练集文件
-        self.copy_files_to_dir(input_dir, output_dir, 'train', train_files, 0.0, 0.3)
-        
-        # 复制测试集文件
-        self.copy_files_to_dir(input_dir, output_dir, 'test', test_files, 0.3, 0.6)
-        
-        # 复制验证集文件
-        self.copy_files_to_dir(input_dir, output_dir, 'verify', verify_files, 0.6, 0.9)
-    
-    def copy_files_to_split_dirs_multi(self, output_dir, train_files, test_files, verify_files, folder_files_dict=None):
-        """复制文件到对应的切分目录（多文件夹版本）"""
-        self.log_message("复制文件到切分目录...")
-        
-        # 复制训练集文件
-        self.copy_files_to_dir_multi(output_dir, 'train', train_files, 0.0, 0.3, folder_files_dict)
-        
-        # 复制测试集文件
-        self.copy_files_to_dir_multi(output_dir, 'test', test_files, 0.3, 0.6, folder_files_dict)
-        
-        # 复制验证集文件
-        self.copy_files_to_dir_multi(output_dir, 'verify', verify_files, 0.6, 0.9, folder_files_dict)
-    
-    def copy_files_to_dir(self, input_dir, output_dir, split_name, files, progress_start, progress_end):
-        """复制文件到指定目录（单文件夹版本，保持兼容性）"""
-        split_dir = osp.join(output_dir, split_name, 'images')
-        
-        for i, img_file in enumerate(files):
-            filename = os.path.basename(img_file)
-            dest_path = osp.join(split_dir, filename)
-            shutil.copy2(img_file, dest_path)
-            
-            # 更新进度条
-            progress = progress_start + (i + 1) / len(files) * (progress_end - progress_start)
-            self.progress_var.set(progress)
-        
-        self.log_message(f"✓ {split_name}集文件复制完成: {len(files)} 个文件")
-    
-    def copy_files_to_dir_multi(self, output_dir, split_name, files, progress_start, progress_end, folder_files_dict=None):
-        """复制文件到指定目录（多文件夹版本，支持分割后的文件夹结构）"""
-        split_dir = osp.join(output_dir, split_name, 'images')
-        
-        # 统计每个文件夹的文件数量
-        folder_stats = {}
-        
-        # 如果提供了folder_files_dict，使用它来确定文件夹归属
-        if folder_files_dict:
-            # 创建文件到文件夹的映射
-            file_to_folder = {}
-            for folder_key, folder_files in folder_files_dict.items():
-                for file_path in folder_files:
-                    file_to_folder[file_path] = folder_key
-            
-            # 统计每个分割后文件夹的文件数量
-            for img_file in files:
-                folder_key = file_to_folder.get(img_file)
-                if folder_key:
-                    # 处理分割后的文件夹名称显示
-                    if "_part" in folder_key:
-                        # 这是分割后的子文件夹
-                        original_path = folder_key.split("_part")[0]
-                        part_num = folder_key.split("_part")[1]
-                        original_name = self.folder_names.get(original_path, os.path.basename(original_path))
-                        display_name = f"{original_name}_part{part_num}"
-                    else:
-                        # 原始文件夹
-                        display_name = self.folder_names.get(folder_key, os.path.basename(folder_key))
-                    
-                    if display_name not in folder_stats:
-                        folder_stats[display_name] = 0
-                    folder_stats[display_name] += 1
-                else:
-                    # 找不到对应文件夹，使用原始路径
-                    folder_path = os.path.dirname(img_file)
-                    folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                    if folder_name not in folder_stats:
-                        folder_stats[folder_name] = 0
-                    folder_stats[folder_name] += 1
-        else:
-            # 原始逻辑，按文件路径统计
-            for img_file in files:
-                folder_path = os.path.dirname(img_file)
-                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                if folder_name not in folder_stats:
-                    folder_stats[folder_name] = 0
-                folder_stats[folder_name] += 1
-        
-        self.log_message(f"开始复制{split_name}集文件...")
-        for folder_name, count in folder_stats.items():
-            self.log_message(f"  {folder_name}: {count} 个文件")
-        
-        # 复制文件
-        for i, img_file in enumerate(files):
-            filename = os.path.basename(img_file)
-            dest_path = osp.join(split_dir, filename)
-            shutil.copy2(img_file, dest_path)
-            
-            # 更新进度条
-            progress = progress_start + (i + 1) / len(files) * (progress_end - progress_start)
-            self.progress_var.set(progress)
-        
-        self.log_message(f"✓ {split_name}集文件复制完成: {len(files)} 个文件")
-    
-    def generate_coco_annotations(self, output_dir, train_files, test_files, verify_files, input_dir):
-        """为每个子集生成COCO格式标注（单文件夹版本，保持兼容性）"""
-        self.log_message("生成COCO格式标注文件...")
-        
-        # 使用已建立的全局标签映射
-        global_converter = self.global_converter
-        self.log_message(f"使用已建立的标签映射，共{len(global_converter.labels_list)}个标签:")
-        for label in global_converter.labels_list:
-            label_id = global_converter.label_to_num[label]
-            self.log_message(f"  {label_id}: {label}")
-        
-        # 生成训练集标注
-        self.generate_split_coco_annotations(output_dir, 'train', train_files, input_dir, global_converter, 0.9, 0.95)
-        
-        # 生成测试集标注
-        self.generate_split_coco_annotations(output_dir, 'test', test_files, input_dir, global_converter, 0.95, 0.98)
-        
-        # 生成验证集标注
-        self.generate_split_coco_annotations(output_dir, 'verify', verify_files, input_dir, global_converter, 0.98, 1.0)
-    
-    def generate_coco_annotations_multi(self, output_dir, train_files, test_files, verify_files):
-        """为每个子集生成COCO格式标注（多文件夹版本）"""
-        self.log_message("生成COCO格式标注文件...")
-        
-        # 使用已建立的全局标签映射
-        global_converter = self.global_converter
-        self.log_message(f"使用已建立的标签映射，共{len(global_converter.labels_list)}个标签:")
-        for label in global_converter.labels_list:
-            label_id = global_converter.label_to_num[label]
-            self.log_message(f"  {label_id}: {label}")
-        
-        # 生成训练集标注
-        self.generate_split_coco_annotations_multi(output_dir, 'train', train_files, global_converter, 0.9, 0.95)
-        
-        # 生成测试集标注
-        self.generate_split_coco_annotations_multi(output_dir, 'test', test_files, global_converter, 0.95, 0.98)
-        
-        # 生成验证集标注
-        self.generate_split_coco_annotations_multi(output_dir, 'verify', verify_files, global_converter, 0.98, 1.0)
-    
-    def generate_split_coco_annotations(self, output_dir, split_name, files, input_dir, global_converter, progress_start, progress_end):
-        """为指定子集生成COCO格式标注（单文件夹版本，保持兼容性）"""
-        self.log_message(f"生成{split_name}集COCO标注...")
-        
-        # 使用全局转换器，确保标签ID一致
-        # 注意：这里不再创建新的converter实例
-        
-        # 处理文件
-        coco_data = self.process_split_json_files(global_converter, input_dir, files, split_name)
-        
-        # 保存COCO JSON文件
-        annotations_dir = osp.join(output_dir, split_name, 'annotations')
-        json_filename = f'instance_{split_name}.json'
-        json_path = osp.join(annotations_dir, json_filename)
-        
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(coco_data, f, indent=2, ensure_ascii=False)
-        
-        self.log_message(f"✓ {split_name}集COCO标注生成完成: {json_filename}")
-        self.log_message(f"  - 图片数量: {len(coco_data['images'])}")
-        self.log_message(f"  - 标注数量: {len(coco_data['annotations'])}")
-        self.log_message(f"  - 类别数量: {len(coco_data['categories'])}")
-        
-        # 验证标签ID一致性
-        self.verify_label_consistency(coco_data, global_converter, split_name)
-    
-    def generate_split_coco_annotations_multi(self, output_dir, split_name, files, global_converter, progress_start, progress_end):
-        """为指定子集生成COCO格式标注（多文件夹版本）"""
-        self.log_message(f"生成{split_name}集COCO标注...")
-        
-        # 使用全局转换器，确保标签ID一致
-        # 注意：这里不再创建新的converter实例
-        
-        # 处理文件
-        coco_data = self.process_split_json_files_multi(global_converter, files, split_name)
-        
-        # 保存COCO JSON文件
-        annotations_dir = osp.join(output_dir, split_name, 'annotations')
-        json_filename = f'instance_{split_name}.json'
-        json_path = osp.join(annotations_dir, json_filename)
-        
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(coco_data, f, indent=2, ensure_ascii=False)
-        
-        self.log_message(f"✓ {split_name}集COCO标注生成完成: {json_filename}")
-        self.log_message(f"  - 图片数量: {len(coco_data['images'])}")
-        self.log_message(f"  - 标注数量: {len(coco_data['annotations'])}")
-        self.log_message(f"  - 类别数量: {len(coco_data['categories'])}")
-        
-        # 验证标签ID一致性
-        self.verify_label_consistency(coco_data, global_converter, split_name)
-    
-    def verify_label_consistency(self, coco_data, global_converter, split_name):
-        """验证标签ID一致性"""
-        self.log_message(f"验证{split_name}集标签ID一致性...")
-        
-        # 检查categories中的标签ID
-        for category in coco_data['categories']:
-            label_name = category['name']
-            category_id = category['id']
-            expected_id = global_converter.label_to_num.get(label_name)
-            
-            if expected_id is None:
-                self.log_message(f"  警告: 标签 '{label_name}' 在全局映射中未找到")
-            elif expected_id != category_id:
-                self.log_message(f"  错误: 标签 '{label_name}' ID不匹配 - 期望{expected_id}, 实际{category_id}")
-            else:
-                self.log_message(f"  ✓ 标签 '{label_name}' ID一致: {category_id}")
-        
-        # 检查annotations中的category_id
-        invalid_annotations = 0
-        valid_category_ids = set(global_converter.label_to_num.values())
-        for annotation in coco_data['annotations']:
-            category_id = annotation['category_id']
-            if category_id not in valid_category_ids:
-                invalid_annotations += 1
-                self.log_message(f"  错误: 标注ID {annotation['id']} 的category_id {category_id} 不在有效范围内 {sorted(valid_category_ids)}")
-        
-        if invalid_annotations == 0:
-            self.log_message(f"  ✓ {split_name}集所有标注的category_id都有效")
-        else:
-            self.log_message(f"  ⚠ {split_name}集有 {invalid_annotations} 个标注的category_id无效")
-    
-    def process_split_json_files(self, converter, input_dir, files, split_name):
-        """处理指定子集的JSON文件"""
-        data_coco = {}
-        images_list = []
-        annotations_list = []
-        image_num = -1
-        object_num = -1
-        processed_annotations_set = set()
-        
-        # 文件名到image_id的映射
-        file_name_to_image_id = {}
-        
-        # 使用传入的全局转换器，不再重新创建标签映射
-        # 注意：converter.labels_list 和 converter.label_to_num 已经在全局映射中建立
-        
-        for i, img_file in enumerate(files):
-            img_label = os.path.splitext(os.path.basename(img_file))[0]
-            label_file = osp.join(input_dir, img_label + '.json')
-            
-            if not os.path.exists(label_file):
-                self.log_message(f"警告: 找不到对应的JSON文件 {label_file}")
-                continue
-            
-            try:
-                with open(label_file, encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 统一获取文件名
-                if '\\' in data['imagePath']:
-                    current_file_name = data['imagePath'].split('\\')[-1]
-                else:
-                    current_file_name = data['imagePath'].split('/')[-1]
-                
-                # 分配image_id
-                if current_file_name in file_name_to_image_id:
-                    current_image_id = file_name_to_image_id[current_file_name]
-                    image_num_for_converter = current_image_id - 1
-                else:
-                    image_num = image_num + 1
-                    current_image_id = image_num + 1
-                    file_name_to_image_id[current_file_name] = current_image_id
-                    
-                    # 添加图片信息
-                    images_list.append({
-                        'height': data['imageHeight'],
-                        'width': data['imageWidth'],
-                        'id': current_image_id,
-                        'file_name': current_file_name
-                    })
-                    image_num_for_converter = image_num
-                
-                # 处理标注 - 使用全局转换器的标签映射
-                for shapes in data['shapes']:
-                    label = shapes['label']
-                    
-                    # 检查标签是否在全局映射中存在
-                    if label not in converter.label_to_num:
-                        self.log_message(f"警告: 标签 '{label}' 不在全局映射中，跳过该标注")
-                        continue
-                    
-                    p_type = shapes.get('shape_type')
-                    temp_bbox = None
-                    temp_points = None
-                    
-                    if p_type == 'polygon':
-                        points = shapes.get('points', [])
-                        if not isinstance(points, list) or len(points) < 3:
-                            continue
-                        temp_points = points
-                        temp_bbox = list(map(float, converter.get_bbox(data['imageHeight'], data['imageWidth'], points)))
-                    elif p_type == 'rectangle':
-                        pts = shapes.get('points', [])
-                        if not isinstance(pts, list) or len(pts) != 2:
-                            continue
-                        (x1, y1), (x2, y2) = pts
-                        x1, x2 = sorted([x1, x2])
-                        y1, y2 = sorted([y1, y2])
-                        temp_points = [[x1, y1], [x2, y2]]  # 只需要对角线两点
-                        temp_bbox = [float(x1), float(y1), float(x2 - x1), float(y2 - y1)]
-                    else:
-                        continue
-                    
-                    # 校验bbox有效性
-                    if temp_bbox is None or temp_bbox[2] <= 0 or temp_bbox[3] <= 0:
-                        continue
-                    
-                    # 去重
-                    rounded_bbox = tuple(round(v, 2) for v in temp_bbox)
-                    category_id = converter.label_to_num[label]
-                    ann_key = (current_image_id, category_id, rounded_bbox)
-                    if ann_key in processed_annotations_set:
-                        continue
-                    processed_annotations_set.add(ann_key)
-                    
-                    # 生成annotation
-                    object_num = object_num + 1
-                    if p_type == 'polygon':
-                        annotations_list.append(
-                            converter.annotations_polygon(
-                                data['imageHeight'], data['imageWidth'], temp_points, label, image_num_for_converter, object_num
-                            )
-                        )
-                    else:  # rectangle
-                        annotations_list.append(
-                            converter.annotations_rectangle(temp_points, label, image_num_for_converter, object_num)
-                        )
-                        
-            except Exception as e:
-                self.log_message(f"处理文件 {label_file} 时出错: {e}")
-                continue
-        
-        # 使用全局转换器的categories_list，确保标签ID一致
-        data_coco['images'] = images_list
-        data_coco['categories'] = converter.categories_list
-        data_coco['annotations'] = annotations_list
-        
-        # 添加COCO格式必需的info字段
-        data_coco['info'] = {
-            "description": "Converted from Labelme format", 
-            "version": "1.0",
-            "year": 2024,
-            "contributor": "Labelme to COCO Converter",
-            "date_created": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        }
-        
-        return data_coco
-    
-    def process_json_files(self, converter, input_dir, total_files):
-        """处理JSON文件并转换为COCO格式"""
-        data_coco = {}
-        images_list = []
-        annotations_list = []
-        image_num = -1
-        object_num = -1
-        # 新增：已处理标注集合，防止重复（按 image_id, category_id, rounded_bbox 去重）
-        processed_annotations_set = set()
-        
-        # 获取所有图片文件并去重
-        raw_image_files = []
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.JPG', '*.JPEG', '*.PNG']:
-            raw_image_files.extend(glob.glob(osp.join(input_dir, ext)))
-        image_files = []
-        seen_paths = set()
-        for p in raw_image_files:
-            key = os.path.normcase(os.path.abspath(p))
-            if key not in seen_paths:
-                seen_paths.add(key)
-                image_files.append(p)
-        
-        processed_count = 0
-        # 新增：文件名到image_id的映射，防止同名图片重复加入
-        file_name_to_image_id = {}
-        for img_file in image_files:
-            img_label = os.path.splitext(os.path.basename(img_file))[0]
-            label_file = osp.join(input_dir, img_label + '.json')
-            
-            if not os.path.exists(label_file):
-                self.log_message(f"警告: 找不到对应的JSON文件 {label_file}")
-                continue
-                
-            self.log_message(f'处理文件: {label_file}')
-            # 读取JSON以确定 file_name 和尺寸
-            
-            try:
-                with open(label_file, encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 统一获取文件名（兼容不同分隔符）
-                if '\\' in data['imagePath']:
-                    current_file_name = data['imagePath'].split('\\')[-1]
-                else:
-                    current_file_name = data['imagePath'].split('/')[-1]
-                
-                # 分配/复用 image_id，确保同名图片只出现一次
-                if current_file_name in file_name_to_image_id:
-                    current_image_id = file_name_to_image_id[current_file_name]
-                    # 覆盖本次用于annotation的 image_num（converter内部用 image_num+1），保持一致
-                    image_num_for_converter = current_image_id - 1
-                else:
-                    image_num = image_num + 1
-                    current_image_id = image_num + 1
-                    file_name_to_image_id[current_file_name] = current_image_id
-                    # 添加图片信息
-                    images_list.append({
-                        'height': data['imageHeight'],
-                        'width': data['imageWidth'],
-                        'id': current_image_id,
-                        'file_name': current_file_name
-                    })
-                    image_num_for_converter = image_num
-                
-                # 处理标注
-                for shapes in data['shapes']:
-                    label = shapes['label']
-                    
-                    if label not in converter.labels_list:
-                        converter.categories_list.append(converter.categories(label))
-                        converter.labels_list.append(label)
-                        converter.label_to_num[label] = len(converter.labels_list)
-                    
-                    p_type = shapes.get('shape_type')
-                    temp_bbox = None
-                    temp_points = None
-                    
-                    if p_type == 'polygon':
-                        points = shapes.get('points', [])
-                        if not isinstance(points, list) or len(points) < 3:
-                            self.log_message("警告: 多边形标注点数量不足，跳过该标注")
-                            continue
-                        temp_points = points
-                        temp_bbox = list(map(float, converter.get_bbox(data['imageHeight'], data['imageWidth'], points)))
-                    elif p_type == 'rectangle':
-                        pts = shapes.get('points', [])
-                        if not isinstance(pts, list) or len(pts) != 2:
-                            self.log_message("警告: 矩形标注点数量不正确，跳过该标注")
-                            continue
-                        (x1, y1), (x2, y2) = pts
-                        x1, x2 = sorted([x1, x2])
-                        y1, y2 = sorted([y1, y2])
-                        # 正确生成矩形的四个顶点，按逆时针顺序排列
-                        temp_points = [[x1, y1], [x2, y2]]  # 只需要对角线两点，annotations_rectangle会处理
-                        temp_bbox = [float(x1), float(y1), float(x2 - x1), float(y2 - y1)]
-                    else:
-                        self.log_message(f"警告: 不支持的形状类型 '{p_type}'，跳过该标注")
-                        continue
-                    
-                    # 校验bbox有效性
-                    if temp_bbox is None or temp_bbox[2] <= 0 or temp_bbox[3] <= 0:
-                        self.log_message(f"警告: 无效的bbox {temp_bbox}，跳过该标注")
-                        continue
-                    
-                    # 去重：按 image_id, category_id, 取两位小数的bbox
-                    rounded_bbox = tuple(round(v, 2) for v in temp_bbox)
-                    # 当前 image_id 已统一
-                    category_id = converter.label_to_num[label]
-                    ann_key = (current_image_id, category_id, rounded_bbox)
-                    if ann_key in processed_annotations_set:
-                        # 已存在，跳过重复
-                        continue
-                    processed_annotations_set.add(ann_key)
-                    
-                    # 生成并添加annotation（只在确定添加时递增object_num）
-                    object_num = object_num + 1
-                    if p_type == 'polygon':
-                        annotations_list.append(
-                            converter.annotations_polygon(
-                                data['imageHeight'], data['imageWidth'], temp_points, label, image_num_for_converter, object_num
-                            )
-                        )
-                    else:  # rectangle
-                        annotations_list.append(
-                            converter.annotations_rectangle(temp_points, label, image_num_for_converter, object_num)
-                        )
-                              
-            except Exception as e:
-                self.log_message(f"处理文件 {label_file} 时出错: {e}")
-                continue
-            
-            processed_count += 1
-            self.progress_var.set(0.3 + (processed_count / total_files) * 0.7)  # 剩余70%进度用于处理
-        
-        data_coco['images'] = images_list
-        data_coco['categories'] = converter.categories_list
-        data_coco['annotations'] = annotations_list
-        
-        # 添加COCO格式必需的info字段
-        data_coco['info'] = {
-            "description": "Converted from Labelme format",
-            "version": "1.0",
-            "year": 2024,
-            "contributor": "Labelme to COCO Converter",
-            "date_created": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        }
-        
-        return data_coco
-    
-    # ==================== 多文件夹管理方法 ====================
-    
-    def add_input_folder(self):
-        """添加输入文件夹"""
-        directory = filedialog.askdirectory(title="选择包含JSON文件和图片的文件夹")
-        if directory:
-            self._add_single_folder(directory)
-    
-    def add_multiple_folders(self):
-        """添加多个输入文件夹"""
-        import tkinter.filedialog as fd
-        
-        # 创建一个简单的多选文件夹对话框
-        root_temp = tk.Toplevel(self.root)
-        root_temp.withdraw()  # 隐藏临时窗口
+        # 创建一个简单的多选文件夹对话框
+        root_temp = tk.Toplevel(self.root)
+        root_temp.withdraw()  # 隐藏临时窗口
         
         try:
             # 使用循环方式让用户选择多个文件夹
@@ -3750,75 +2845,190 @@ class MaterialDesignGUI:
             if not selected_folders:
                 return
             
-            # 添加所有选中的文件夹
+            # 在后台扫描所有选中的文件夹，全部完成后统一刷新界面
             self.log_message(f"开始添加 {len(selected_folders)} 个文件夹...")
-            
-            added_count = 0
-            for directory in selected_folders:
-                if self._add_single_folder(directory, batch_mode=True):
-                    added_count += 1
-            
-            # 批量更新完成后统一刷新界面
-            if added_count > 0:
-                self.update_folders_display()
-                self.update_folders_stats()
-                self._rebuild_state_and_refresh_ui(reason="批量添加文件夹")
-                
-                self.log_message(f"批量添加完成: 成功添加 {added_count} 个文件夹")
-                messagebox.showinfo("完成", f"成功添加 {added_count} 个文件夹")
-            else:
-                self.log_message("批量添加取消: 没有添加任何文件夹")
+            self.start_folder_ingestion(selected_folders, reason="批量添加文件夹")
                 
         except Exception as e:
             root_temp.destroy()
             self.log_message(f"批量添加文件夹时出错: {e}")
             messagebox.showerror("错误", f"批量添加文件夹时出错: {e}")
     
-    def _add_single_folder(self, directory, batch_mode=False):
-        """添加单个文件夹的内部方法"""
+    def start_folder_ingestion(self, directories, reason):
+        """
+        在后台扫描文件夹（每个文件夹一个任务，最多INGEST_WORKERS个同时进行）
+        
+        每个文件夹完成后立即加入input_folders/folder_labels，全部完成或取消后只重建一次标签映射。
+        """
+        if self._ingestion is not None:
+            messagebox.showwarning("警告", "正在添加文件夹，请等待完成或先取消")
+            return
+        
+        ingestor = FolderIngestor(self.dataset_index, self.annotation_index, max_workers=self.INGEST_WORKERS)
+        events = queue.Queue()  # 工作线程只入队，界面线程定时取出
+        self._ingestion = job = {
+            'ingestor': ingestor,
+            'events': events,
+            'reason': reason,
+            'folders': list(directories),
+            'pending': set(directories),
+            'added': [],
+            'empty': [],
+            'errors': []
+        }
+        self.create_ingestion_dialog(job)
+        
+        def on_progress(folder, done, total):
+            events.put(('progress', folder, done, total))
+        
+        for directory in directories:
+            future = ingestor.submit(directory, on_progress)
+            future.add_done_callback(lambda future, folder=directory: events.put(('done', folder, future)))
+        self.root.after(self.INGEST_POLL_INTERVAL, self._poll_folder_ingestion)
+    
+    def create_ingestion_dialog(self, job):
+        """添加文件夹进度窗口：每个文件夹一个进度条，底部是取消按钮"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("添加文件夹")
+        dialog.configure(bg=self.colors['background'])
+        dialog.transient(self.root)
+        dialog.protocol("WM_DELETE_WINDOW", self.cancel_folder_ingestion)
+        
+        ttk.Label(dialog,
+                 text=f"正在扫描 {len(job['folders'])} 个文件夹（同时 {job['ingestor'].max_workers} 个）",
+                 style='Material.TLabel').pack(anchor=tk.W, padx=20, pady=(16, 8))
+        
+        # 文件夹很多时在可滚动区域中显示
+        list_frame = tk.Frame(dialog, bg=self.colors['background'])
+        list_frame.pack(fill=tk.BOTH, expand=True, padx=20)
+        canvas = tk.Canvas(list_frame, bg=self.colors['background'], highlightthickness=0, width=520,
+                           height=min(len(job['folders']), 12) * 28)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=canvas.yview)
+        rows_frame = tk.Frame(canvas, bg=self.colors['background'])
+        rows_frame.bind('<Configure>', lambda e: canvas.configure(scrollregion=canvas.bbox('all')))
+        canvas.create_window((0, 0), window=rows_frame, anchor='nw')
+        canvas.configure(yscrollcommand=scrollbar.set)
+        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        if len(job['folders']) > 12:
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        job['rows'] = {}
+        for directory in job['folders']:
+            row = tk.Frame(rows_frame, bg=self.colors['background'])
+            row.pack(fill=tk.X, pady=2)
+            tk.Label(row, text=os.path.basename(directory) or directory, width=22, anchor='w',
+                     bg=self.colors['background'], fg=self.colors['on_surface'],
+                     font=('Segoe UI', 9)).pack(side=tk.LEFT)
+            bar = ttk.Progressbar(row, length=220, mode='determinate', maximum=1.0)
+            bar.pack(side=tk.LEFT, padx=8)
+            status = tk.Label(row, text="等待中", width=14, anchor='w',
+                              bg=self.colors['background'], fg=self.colors['on_surface'],
+                              font=('Segoe UI', 9))
+            status.pack(side=tk.LEFT)
+            job['rows'][directory] = (bar, status)
+        
+        job['cancel_button'] = ttk.Button(dialog, text="取消", command=self.cancel_folder_ingestion,
+                                          style='Material.TButton')
+        job['cancel_button'].pack(pady=12)
+        job['dialog'] = dialog
+    
+    def cancel_folder_ingestion(self):
+        """取消后台添加：已完成的文件夹保留，其余的不再添加"""
+        job = self._ingestion
+        if job is None or job['ingestor'].cancelled:
+            return
+        self.log_message("正在取消添加文件夹...")
+        job['ingestor'].cancel()
+        job['cancel_button'].config(state='disabled')
+    
+    def _poll_folder_ingestion(self):
+        """取出工作线程的进度和结果，全部完成后收尾"""
+        job = self._ingestion
+        if job is None:
+            return
         try:
-            # 检查文件夹是否已经添加
-            if directory in self.input_folders:
-                if not batch_mode:
-                    messagebox.showwarning("警告", "该文件夹已经添加过了")
-                return False
-            
-            # 获取文件夹名称（显示用）
-            folder_name = os.path.basename(directory)
-            if not folder_name:
-                folder_name = directory
-            
-            # 扫描文件夹中的图片文件
-            image_files = self.get_image_files(directory)
-            
-            if not image_files:
-                self.log_message(f"警告: 文件夹 {folder_name} 中没有找到图片文件")
-                if not batch_mode:
-                    messagebox.showwarning("警告", f"文件夹 {folder_name} 中没有找到图片文件")
-                return False
-            
-            # 添加到文件夹列表
-            self.input_folders[directory] = image_files
-            self.folder_names[directory] = folder_name
-            
-            # 扫描该文件夹的标签
-            folder_labels = self.scan_folder_labels(directory)
-            self.folder_labels[directory] = folder_labels
-            
-            # 非批量模式时立即更新显示
-            if not batch_mode:
-                self.update_folders_display()
-                self.update_folders_stats()
-                self._rebuild_state_and_refresh_ui(reason="添加文件夹")
-            
-            self.log_message(f"添加文件夹: {folder_name} ({len(image_files)} 个图片文件, {len(folder_labels)} 个标签)")
-            return True
-            
+            while True:
+                event = job['events'].get_nowait()
+                if event[0] == 'progress':
+                    _, folder, done, total = event
+                    bar, status = job['rows'][folder]
+                    bar['value'] = done / total if total else 1.0
+                    status.config(text=f"{done}/{total}")
+                else:
+                    self._merge_ingested_folder(job, event[1], event[2])
+        except queue.Empty:
+            pass
         except Exception as e:
-            self.log_message(f"添加文件夹 {directory} 时出错: {e}")
-            if not batch_mode:
-                messagebox.showerror("错误", f"添加文件夹时出错: {e}")
-            return False
+            self.log_message(f"更新添加文件夹进度时出错: {e}")
+        
+        if job['pending']:
+            self.root.after(self.INGEST_POLL_INTERVAL, self._poll_folder_ingestion)
+        else:
+            self._finish_folder_ingestion(job)
+    
+    def _merge_ingested_folder(self, job, folder, future):
+        """一个文件夹扫描结束：成功时加入文件夹列表"""
+        job['pending'].discard(folder)
+        bar, status = job['rows'][folder]
+        folder_name = os.path.basename(folder) or folder
+        
+        result = None
+        if not future.cancelled():
+            try:
+                result = future.result()
+            except Exception as e:
+                self.log_message(f"添加文件夹 {folder} 时出错: {e}")
+                job['errors'].append(f"{folder_name}: {e}")
+                status.config(text="出错")
+                return
+        if result is None:
+            # 取消时丢弃未完成文件夹的扫描结果
+            self.dataset_index.discard(folder)
+            status.config(text="已取消")
+            return
+        
+        for error in result['errors']:
+            self.log_message(f"扫描文件夹 {folder} 标签时出错: {error}")
+        image_files = result['image_files']
+        if not image_files:
+            self.log_message(f"警告: 文件夹 {folder_name} 中没有找到图片文件")
+            job['empty'].append(folder_name)
+            status.config(text="没有图片")
+            return
+        
+        self.input_folders[folder] = image_files
+        self.folder_names[folder] = folder_name
+        self.folder_labels[folder] = result['labels']
+        job['added'].append(folder)
+        bar['value'] = 1.0
+        status.config(text=f"完成 ({len(image_files)})")
+        self.update_folders_display()
+        self.log_message(f"添加文件夹: {folder_name} ({len(image_files)} 个图片文件, {len(result['labels'])} 个标签)")
+    
+    def _finish_folder_ingestion(self, job):
+        """所有文件夹完成或取消后关闭进度窗口，只重建一次标签映射"""
+        self._ingestion = None
+        job['ingestor'].shutdown()
+        job['dialog'].destroy()
+        
+        added = job['added']
+        if added:
+            self._rebuild_state_and_refresh_ui(reason=job['reason'], rescan_labels=False)
+        if job['ingestor'].cancelled:
+            self.log_message(f"添加文件夹已取消: 已完成的 {len(added)} 个文件夹已添加")
+            return
+        
+        if len(job['folders']) == 1:
+            # 单个文件夹保持原来的提示方式
+            if job['errors']:
+                messagebox.showerror("错误", f"添加文件夹时出错: {job['errors'][0]}")
+            elif job['empty']:
+                messagebox.showwarning("警告", f"文件夹 {job['empty'][0]} 中没有找到图片文件")
+        elif added:
+            self.log_message(f"批量添加完成: 成功添加 {len(added)} 个文件夹")
+            messagebox.showinfo("完成", f"成功添加 {len(added)} 个文件夹")
+        else:
+            self.log_message("批量添加取消: 没有添加任何文件夹")
     
     def remove_input_folder(self):
         """移除选中的输入文件夹"""
@@ -3842,6 +3052,9 @@ class MaterialDesignGUI:
             if folder_path_to_remove:
                 # 从字典中移除
                 del self.input_folders[folder_path_to_remove]
+                self.annotation_index.discard_folder(folder_path_to_remove)
+                self.dataset_index.discard(folder_path_to_remove)
+                self.label_file_indexes.pop(folder_path_to_remove, None)
                 if folder_path_to_remove in self.folder_names:
                     del self.folder_names[folder_path_to_remove]
                 if folder_path_to_remove in self.folder_labels:
@@ -3866,6 +3079,9 @@ class MaterialDesignGUI:
             self.input_folders.clear()
             self.folder_names.clear()
             self.folder_labels.clear()
+            self.annotation_index.clear()
+            self.dataset_index.clear()
+            self.label_file_indexes.clear()
             
             # 更新显示
             self.update_folders_display()
@@ -3887,14 +3103,12 @@ class MaterialDesignGUI:
                     label_count = len(self.folder_labels.get(folder_path, set()))
                     self.folders_listbox.insert(tk.END, f"{folder_name} ({len(files)}个文件, {label_count}个标签)")
         
-        # 更新详细表格
+        # 更新详细表格：只更新变化的行
         if hasattr(self, 'folders_tree'):
-            for item in self.folders_tree.get_children():
-                self.folders_tree.delete(item)
-            
             if not self.input_folders:
-                self.folders_tree.insert('', 'end', values=('请添加文件夹', '--', '--', '--', '未添加'))
+                self.folders_rows.set_rows([('--', ('请添加文件夹', '--', '--', '--', '未添加'))])
             else:
+                rows = []
                 for folder_path, image_files in self.input_folders.items():
                     folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
                     file_count = len(image_files)
@@ -3908,7 +3122,8 @@ class MaterialDesignGUI:
                         labels_display = f"{label_count}个 (无标签)"
                     status = "已添加"
                     
-                    self.folders_tree.insert('', 'end', values=(folder_name, folder_path, file_count, labels_display, status))
+                    rows.append((folder_path, (folder_name, folder_path, file_count, labels_display, status)))
+                self.folders_rows.set_rows(rows)
     
     def update_folders_stats(self):
         """更新文件夹统计信息"""
@@ -3929,71 +3144,63 @@ class MaterialDesignGUI:
         self.update_folders_detail_display()
     
     def update_folders_detail_display(self):
-        """更新文件夹标签详情显示"""
+        """更新文件夹标签详情显示（内容没有变化时不重绘）"""
         if not hasattr(self, 'folders_detail_text'):
             return
-            
-        # 清空现有内容
+        
+        text = self.format_folders_detail()
+        if text == getattr(self, '_folders_detail_rendered', None):
+            return
+        self._folders_detail_rendered = text
+        
+        # 整段文本一次插入，不再逐个标签调用insert
         self.folders_detail_text.config(state=tk.NORMAL)
         self.folders_detail_text.delete(1.0, tk.END)
-        
+        self.folders_detail_text.insert(tk.END, text)
+        self.folders_detail_text.config(state=tk.DISABLED)
+    
+    @staticmethod
+    def format_label_lines(labels, indent):
+        """每行最多5个标签，续行按indent缩进"""
+        labels = sorted(labels)
+        return f", \n{indent}".join(', '.join(labels[i:i + 5]) for i in range(0, len(labels), 5))
+    
+    def format_folders_detail(self):
+        """文件夹标签详情文本"""
         if not self.input_folders:
-            self.folders_detail_text.insert(tk.END, "请先添加文件夹，然后查看各文件夹的标签详情。\n\n")
-            self.folders_detail_text.insert(tk.END, "操作说明：\n")
-            self.folders_detail_text.insert(tk.END, "1. 点击'添加文件夹'按钮添加包含JSON文件的文件夹\n")
-            self.folders_detail_text.insert(tk.END, "2. 系统会自动扫描每个文件夹中的标签\n")
-            self.folders_detail_text.insert(tk.END, "3. 在此处查看每个文件夹的标签详情")
-        else:
-            self.folders_detail_text.insert(tk.END, f"文件夹标签详情统计 (共 {len(self.input_folders)} 个文件夹)\n")
-            self.folders_detail_text.insert(tk.END, "=" * 60 + "\n\n")
+            return ("请先添加文件夹，然后查看各文件夹的标签详情。\n\n"
+                    "操作说明：\n"
+                    "1. 点击'添加文件夹'按钮添加包含JSON文件的文件夹\n"
+                    "2. 系统会自动扫描每个文件夹中的标签\n"
+                    "3. 在此处查看每个文件夹的标签详情")
+        
+        parts = [f"文件夹标签详情统计 (共 {len(self.input_folders)} 个文件夹)\n", "=" * 60 + "\n\n"]
+        for i, (folder_path, image_files) in enumerate(self.input_folders.items(), 1):
+            folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
+            labels = self.folder_labels.get(folder_path, set())
             
-            for i, (folder_path, image_files) in enumerate(self.input_folders.items(), 1):
-                folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-                labels = self.folder_labels.get(folder_path, set())
-                
-                self.folders_detail_text.insert(tk.END, f"{i}. {folder_name}\n")
-                self.folders_detail_text.insert(tk.END, f"   路径: {folder_path}\n")
-                self.folders_detail_text.insert(tk.END, f"   文件数量: {len(image_files)} 个\n")
-                self.folders_detail_text.insert(tk.END, f"   标签数量: {len(labels)} 个\n")
-                
-                if labels:
-                    self.folders_detail_text.insert(tk.END, "   标签列表: ")
-                    sorted_labels = sorted(labels)
-                    # 每行显示最多5个标签
-                    for j, label in enumerate(sorted_labels):
-                        if j > 0 and j % 5 == 0:
-                            self.folders_detail_text.insert(tk.END, f"\n             ")
-                        self.folders_detail_text.insert(tk.END, f"{label}")
-                        if j < len(sorted_labels) - 1:
-                            self.folders_detail_text.insert(tk.END, ", ")
-                    self.folders_detail_text.insert(tk.END, "\n")
-                else:
-                    self.folders_detail_text.insert(tk.END, "   标签列表: 暂无标签\n")
-                
-                self.folders_detail_text.insert(tk.END, "\n")
-            
-            # 添加全局标签统计
-            all_labels = set()
-            for labels in self.folder_labels.values():
-                all_labels.update(labels)
-            
-            self.folders_detail_text.insert(tk.END, "全局标签汇总\n")
-            self.folders_detail_text.insert(tk.END, "=" * 30 + "\n")
-            self.folders_detail_text.insert(tk.END, f"去重后总标签数: {len(all_labels)} 个\n")
-            
-            if all_labels:
-                self.folders_detail_text.insert(tk.END, "全部标签: ")
-                sorted_all_labels = sorted(all_labels)
-                for j, label in enumerate(sorted_all_labels):
-                    if j > 0 and j % 5 == 0:
-                        self.folders_detail_text.insert(tk.END, f"\n          ")
-                    self.folders_detail_text.insert(tk.END, f"{label}")
-                    if j < len(sorted_all_labels) - 1:
-                        self.folders_detail_text.insert(tk.END, ", ")
-                self.folders_detail_text.insert(tk.END, "\n")
+            parts.append(f"{i}. {folder_name}\n")
+            parts.append(f"   路径: {folder_path}\n")
+            parts.append(f"   文件数量: {len(image_files)} 个\n")
+            parts.append(f"   标签数量: {len(labels)} 个\n")
+            if labels:
+                parts.append(f"   标签列表: {self.format_label_lines(labels, ' ' * 13)}\n")
+            else:
+                parts.append("   标签列表: 暂无标签\n")
+            parts.append("\n")
         
-        self.folders_detail_text.config(state=tk.DISABLED)
-    
+        # 添加全局标签统计
+        all_labels = set()
+        for labels in self.folder_labels.values():
+            all_labels.update(labels)
+        
+        parts.append("全局标签汇总\n")
+        parts.append("=" * 30 + "\n")
+        parts.append(f"去重后总标签数: {len(all_labels)} 个\n")
+        if all_labels:
+            parts.append(f"全部标签: {self.format_label_lines(all_labels, ' ' * 10)}\n")
+        return ''.join(parts)
+
     def scan_all_folders(self):
         """扫描所有文件夹建立标签映射"""
         if not self.input_folders:
@@ -4062,19 +3269,18 @@ class MaterialDesignGUI:
         image_files = self.input_folders.get(folder_path, [])
         
         for img_file in image_files:
-            img_label = os.path.splitext(os.path.basename(img_file))[0]
-            label_file = osp.join(folder_path, img_label + '.json')
+            label_file = self.dataset_index.label_file_for(img_file)
+            if label_file is None:
+                continue
             
-            if not os.path.exists(label_file):
+            record = self.annotation_index.get(label_file)
+            if record is None:
                 continue
                 
             try:
-                with open(label_file, encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                for shapes in data['shapes']:
-                    label = shapes['label']
-                    labels.add(label)
+                if record.error or record.labels_error:
+                    raise ValueError(record.error or record.labels_error)
+                labels.update(record.labels)
                         
             except Exception as e:
                 self.log_message(f"扫描文件夹 {folder_path} 标签时出错: {e}")
@@ -4106,6 +3312,9 @@ class MaterialDesignGUI:
                 self.log_message(f"  {folder_name}: {len(image_files)} 个文件, {len(folder_labels)} 个标签")
             else:
                 # 文件夹不存在，从列表中移除
+                self.annotation_index.discard_folder(folder_path)
+                self.dataset_index.discard(folder_path)
+                self.label_file_indexes.pop(folder_path, None)
                 folder_name = self.folder_names.get(folder_path, folder_path)
                 self.log_message(f"  文件夹不存在，已移除: {folder_name}")
                 if folder_path in self.folder_names:
@@ -4132,7 +3341,7 @@ class MaterialDesignGUI:
         
         total_issues = 0
         
-        for folder_path, image_files in self.input_folders.items():
+        for folder_path in self.input_folders:
             folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
             self.log_message(f"\n检查文件夹: {folder_name}")
             self.log_message(f"路径: {folder_path}")
@@ -4142,45 +3351,39 @@ class MaterialDesignGUI:
             missing_image_files = []
             invalid_json_files = []
             
+            # 一次扫描得到图片与JSON的配对，不再逐个检查文件是否存在
+            try:
+                folder_scan = self.dataset_index.scan(folder_path)
+            except OSError as e:
+                self.log_message(f"  ❌ 无法读取文件夹: {e}")
+                total_issues += 1
+                continue
+            
             # 检查图片对应的JSON文件
-            for img_file in image_files:
+            for img_file in folder_scan.images:
                 img_label = os.path.splitext(os.path.basename(img_file))[0]
-                json_file = os.path.join(folder_path, img_label + '.json')
+                json_file = folder_scan.label_file_for(img_file)
                 
-                if not os.path.exists(json_file):
+                record = self.annotation_index.get(json_file) if json_file is not None else None
+                if record is None:
                     missing_json_files.append(img_label + '.json')
                     folder_issues += 1
+                elif record.error is not None:
+                    # JSON文件无法解析
+                    invalid_json_files.append(f"{img_label}.json (解析错误: {record.error})")
+                    folder_issues += 1
                 else:
-                    # 检查JSON文件是否有效
-                    try:
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                        # 检查必要字段
-                        required_fields = ['imagePath', 'imageHeight', 'imageWidth', 'shapes']
-                        for field in required_fields:
-                            if field not in data:
-                                invalid_json_files.append(f"{img_label}.json (缺少字段: {field})")
-                                folder_issues += 1
-                                break
-                    except Exception as e:
-                        invalid_json_files.append(f"{img_label}.json (解析错误: {str(e)})")
+                    # 检查必要字段
+                    missing_field = record.missing_field()
+                    if missing_field is not None:
+                        invalid_json_files.append(f"{img_label}.json (缺少字段: {missing_field})")
                         folder_issues += 1
             
             # 检查JSON文件对应的图片
-            json_files = glob.glob(os.path.join(folder_path, '*.json'))
-            for json_file in json_files:
+            for json_file in folder_scan.orphan_label_files():
                 json_basename = os.path.splitext(os.path.basename(json_file))[0]
-                # 查找对应的图片文件
-                found_image = False
-                for ext in ['.jpg', '.jpeg', '.png', '.bmp', '.JPG', '.JPEG', '.PNG', '.BMP']:
-                    img_path = os.path.join(folder_path, json_basename + ext)
-                    if os.path.exists(img_path):
-                        found_image = True
-                        break
-                
-                if not found_image:
-                    missing_image_files.append(json_basename + '.jpg/.png')
-                    folder_issues += 1
+                missing_image_files.append(json_basename + '.jpg/.png')
+                folder_issues += 1
             
             # 输出检查结果
             if folder_issues == 0:
@@ -4395,27 +3598,19 @@ class MaterialDesignGUI:
         button_row = tk.Frame(rule_control_frame, bg=self.colors['surface_container'])
         button_row.pack(fill=tk.X)
         
+        # 本窗口中已刷新过索引的文件夹，之后的统计直接查索引
+        refreshed_folders = set()
+        
+        def get_folder_index(folder_path):
+            index = self.get_label_file_index(folder_path, refresh=folder_path not in refreshed_folders)
+            refreshed_folders.add(folder_path)
+            return index
+        
         def count_label_occurrences(folder_path, label_name):
             """统计标签在文件夹中的出现次数"""
             if not os.path.exists(folder_path):
                 return 0
-            
-            count = 0
-            json_files = glob.glob(os.path.join(folder_path, '*.json'))
-            
-            for json_file in json_files:
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    if 'shapes' in data:
-                        for shape in data['shapes']:
-                            if 'label' in shape and shape['label'] == label_name:
-                                count += 1
-                except:
-                    continue
-            
-            return count
+            return get_folder_index(folder_path).count(label_name)
         
         def refresh_label_preview():
             """刷新标签预览统计"""
@@ -4768,7 +3963,10 @@ class MaterialDesignGUI:
             confirm_msg += f"  正则表达式: {'启用' if self.use_regex_var.get() else '禁用'}\n"
             confirm_msg += f"  大小写敏感: {'是' if self.case_sensitive_var.get() else '否'}\n"
             confirm_msg += f"  创建备份: {'是' if self.create_backup_var.get() else '否'}\n\n"
-            confirm_msg += "此操作不可撤销！"
+            if self.create_backup_var.get():
+                confirm_msg += "被修改的文件会备份，可通过“回滚修改”恢复"
+            else:
+                confirm_msg += "此操作不可撤销！"
             
             if not messagebox.askyesno("确认修改", confirm_msg):
                 return
@@ -4846,38 +4044,31 @@ class MaterialDesignGUI:
                 old_label, new_label = values[0], values[1]
                 modification_rules[old_label] = new_label
             
-            # 扫描文件并预览修改
-            json_files = glob.glob(os.path.join(selected_folder_path, '*.json'))
-            total_changes = 0
+            # 从标签索引得到会被修改的文件（与执行修改使用相同的匹配选项）
+            try:
+                rewriter = LabelRewriter(modification_rules,
+                                         use_regex=self.use_regex_var.get(),
+                                         case_sensitive=self.case_sensitive_var.get())
+            except ValueError as e:
+                preview_text.insert(tk.END, f"错误: {e}\n")
+                preview_text.config(state=tk.DISABLED)
+                return
+            index = get_folder_index(selected_folder_path)
+            file_changes = index.preview_changes(rewriter.map_label)
+            total_changes = sum(count for changes in file_changes.values() for _, _, count in changes)
             
-            for json_file in json_files[:20]:  # 限制预览文件数量
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    file_changes = []
-                    if 'shapes' in data:
-                        for i, shape in enumerate(data['shapes']):
-                            if 'label' in shape and shape['label'] in modification_rules:
-                                old_label = shape['label']
-                                new_label = modification_rules[old_label]
-                                file_changes.append((i, old_label, new_label))
-                    
-                    if file_changes:
-                        preview_text.insert(tk.END, f"文件: {os.path.basename(json_file)}\n")
-                        for idx, old_label, new_label in file_changes:
-                            preview_text.insert(tk.END, f"  标注 {idx+1}: {old_label} → {new_label}\n")
-                            total_changes += 1
-                        preview_text.insert(tk.END, "\n")
-                
-                except Exception as e:
-                    preview_text.insert(tk.END, f"错误: 无法读取文件 {os.path.basename(json_file)}: {e}\n\n")
+            for json_file, changes in list(file_changes.items())[:20]:  # 限制预览文件数量
+                preview_text.insert(tk.END, f"文件: {os.path.basename(json_file)}\n")
+                for old_label, new_label, count in changes:
+                    preview_text.insert(tk.END, f"  {old_label} → {new_label} ({count}个标注)\n")
+                preview_text.insert(tk.END, "\n")
             
-            if len(json_files) > 20:
-                preview_text.insert(tk.END, f"... 还有 {len(json_files) - 20} 个文件未显示\n\n")
+            if len(file_changes) > 20:
+                preview_text.insert(tk.END, f"... 还有 {len(file_changes) - 20} 个文件未显示\n\n")
             
             preview_text.insert(tk.END, f"预览总结:\n")
-            preview_text.insert(tk.END, f"  总文件数: {len(json_files)}\n")
+            preview_text.insert(tk.END, f"  总文件数: {len(index)}\n")
+            preview_text.insert(tk.END, f"  将修改文件: {len(file_changes)}\n")
             preview_text.insert(tk.END, f"  预计修改: {total_changes} 个标注\n")
             
             preview_text.config(state=tk.DISABLED)
@@ -4897,6 +4088,13 @@ class MaterialDesignGUI:
                                cursor='hand2', padx=20, pady=8)
         execute_btn.pack(side=tk.RIGHT, padx=(10, 0))
         
+        rollback_btn = tk.Button(button_frame, text="↩️ 回滚修改",
+                                command=lambda: self.rollback_label_modification_dialog(modify_window),
+                                bg=self.colors['tertiary'], fg=self.colors['on_tertiary'],
+                                font=('Segoe UI', 11), relief='flat',
+                                cursor='hand2', padx=20, pady=8)
+        rollback_btn.pack(side=tk.LEFT)
+        
         cancel_btn = tk.Button(button_frame, text="❌ 取消",
                               command=modify_window.destroy,
                               bg=self.colors['secondary'], fg=self.colors['on_secondary'],
@@ -4938,97 +4136,46 @@ class MaterialDesignGUI:
         self.log_message(f"  大小写敏感: {'是' if advanced_options['case_sensitive'] else '否'}")
         self.log_message(f"  创建备份: {'是' if advanced_options['create_backup'] else '否'}")
         
-        modified_files = 0
-        total_modifications = 0
-        error_files = []
-        
-        # 获取文件夹中的所有JSON文件
-        json_files = glob.glob(os.path.join(folder_path, '*.json'))
-        
-        self.log_message(f"找到 {len(json_files)} 个JSON文件")
-        
-        # 创建备份目录
+        # 备份目录在第一个文件被修改时才创建，只备份实际修改的文件
         backup_dir = None
         if advanced_options['create_backup']:
             backup_dir = os.path.join(folder_path, f"backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
-            os.makedirs(backup_dir, exist_ok=True)
-            self.log_message(f"创建备份目录: {backup_dir}")
         
-        # 处理正则表达式
-        import re
-        compiled_patterns = {}
+        try:
+            rewriter = LabelRewriter(modification_rules,
+                                     use_regex=advanced_options['use_regex'],
+                                     case_sensitive=advanced_options['case_sensitive'])
+        except ValueError as e:
+            raise Exception(str(e))
         if advanced_options['use_regex']:
-            try:
-                for old_pattern, new_pattern in modification_rules.items():
-                    flags = 0 if advanced_options['case_sensitive'] else re.IGNORECASE
-                    compiled_patterns[old_pattern] = (re.compile(old_pattern, flags), new_pattern)
-                self.log_message("正则表达式编译成功")
-            except Exception as e:
-                raise Exception(f"正则表达式编译失败: {e}")
+            self.log_message("正则表达式编译成功")
         
-        for json_file in json_files:
-            try:
-                # 备份原文件
-                if backup_dir:
-                    backup_file = os.path.join(backup_dir, os.path.basename(json_file))
-                    shutil.copy2(json_file, backup_file)
-                
-                # 读取JSON文件
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 检查是否有需要修改的标签
-                file_modified = False
-                file_modifications = 0
-                modification_details = []
-                
-                if 'shapes' in data:
-                    for shape in data['shapes']:
-                        if 'label' in shape:
-                            original_label = shape['label']
-                            new_label = None
-                            
-                            if advanced_options['use_regex']:
-                                # 正则表达式模式匹配
-                                for old_pattern, (compiled_regex, replacement) in compiled_patterns.items():
-                                    if compiled_regex.search(original_label):
-                                        new_label = compiled_regex.sub(replacement, original_label)
-                                        break
-                            else:
-                                # 普通字符串匹配
-                                for old_label, replacement in modification_rules.items():
-                                    if advanced_options['case_sensitive']:
-                                        if original_label == old_label:
-                                            new_label = replacement
-                                            break
-                                    else:
-                                        if original_label.lower() == old_label.lower():
-                                            new_label = replacement
-                                            break
-                            
-                            # 应用修改
-                            if new_label and new_label != original_label:
-                                shape['label'] = new_label
-                                file_modified = True
-                                file_modifications += 1
-                                modification_details.append(f"{original_label} → {new_label}")
-                
-                # 如果文件被修改，保存文件
-                if file_modified:
-                    with open(json_file, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, indent=2, ensure_ascii=False)
-                    
-                    modified_files += 1
-                    total_modifications += file_modifications
-                    
-                    # 详细日志
-                    self.log_message(f"  {os.path.basename(json_file)}: {file_modifications} 个修改")
-                    for detail in modification_details:
-                        self.log_message(f"    {detail}")
-
-            except Exception as e:
-                error_files.append((os.path.basename(json_file), str(e)))
-                self.log_message(f"  错误: 处理文件 {os.path.basename(json_file)} 时出错: {e}")
+        # 只处理标签索引中包含待修改标签的文件
+        index = self.get_label_file_index(folder_path)
+        json_files = list(index.preview_changes(rewriter.map_label))
+        self.log_message(f"找到 {len(index)} 个JSON文件，其中 {len(json_files)} 个包含需要修改的标签")
+        
+        result = rewriter.run(json_files, backup_dir)
+        
+        modified_files = len(result['modified'])
+        total_modifications = 0
+        for json_file, changes in result['modified']:
+            # 同秒内写入且大小不变时mtime可能无法区分，主动使缓存失效
+            self.annotation_index.invalidate(json_file)
+            total_modifications += len(changes)
+            
+            # 详细日志
+            self.log_message(f"  {os.path.basename(json_file)}: {len(changes)} 个修改")
+            for original_label, new_label in changes:
+                self.log_message(f"    {original_label} → {new_label}")
+        
+        error_files = []
+        for json_file, error in result['errors']:
+            error_files.append((os.path.basename(json_file), error))
+            self.log_message(f"  错误: 处理文件 {os.path.basename(json_file)} 时出错: {error}")
+        
+        # 增量更新标签索引
+        index.update_files([json_file for json_file, _ in result['modified']])
         
         # 记录修改结果
         self.log_message(f"\n=== 高级修改完成 ===")
@@ -5040,8 +4187,9 @@ class MaterialDesignGUI:
             for filename, error in error_files:
                 self.log_message(f"  {filename}: {error}")
         
-        if backup_dir:
-            self.log_message(f"备份文件保存在: {backup_dir}")
+        if result['journal']:
+            self.log_message(f"备份文件保存在: {backup_dir}（仅包含被修改的文件）")
+            self.log_message(f"回滚日志: {result['journal']}")
         
         # 如果有错误文件但也有成功修改的文件，仍然返回成功
         if error_files and modified_files == 0:
@@ -5049,6 +4197,51 @@ class MaterialDesignGUI:
         
         return modified_files, total_modifications
 
+    def get_label_file_index(self, folder_path, refresh=True):
+        """获取文件夹的标签倒排索引，首次使用时建立；refresh时重新索引变化的文件"""
+        index = self.label_file_indexes.get(folder_path)
+        if index is None:
+            index = LabelFileIndex(folder_path, self.annotation_index, self.dataset_index)
+            self.label_file_indexes[folder_path] = index
+            refresh = True
+        if refresh:
+            index.refresh()
+        return index
+    
+    def rollback_label_modification_dialog(self, parent=None):
+        """选择备份目录中的回滚日志，恢复标签修改前的文件"""
+        journal_path = filedialog.askopenfilename(
+            parent=parent,
+            title="选择回滚日志（备份目录中的 journal.jsonl）",
+            filetypes=[("回滚日志", LABEL_JOURNAL_FILENAME), ("All files", "*.*")]
+        )
+        if not journal_path:
+            return
+        
+        if not messagebox.askyesno("确认回滚", f"确定用以下备份恢复被修改的文件吗？\n\n{os.path.dirname(journal_path)}", parent=parent):
+            return
+        
+        try:
+            self.log_message(f"=== 回滚标签修改: {journal_path} ===")
+            restored, errors = rollback_label_modification(journal_path, self.log_message)
+            for json_file in restored:
+                self.annotation_index.invalidate(json_file)
+            restored_folders = {os.path.normcase(os.path.dirname(json_file)) for json_file in restored}
+            for folder_path, index in self.label_file_indexes.items():
+                if os.path.normcase(os.path.abspath(folder_path)) in restored_folders:
+                    index.refresh()
+            
+            result_msg = f"已恢复 {len(restored)} 个文件"
+            if errors:
+                result_msg += f"，{len(errors)} 个文件恢复失败，详情请查看日志"
+            messagebox.showinfo("回滚完成", result_msg, parent=parent)
+            
+            if parent is not None:
+                parent.destroy()
+            self._rebuild_state_and_refresh_ui(reason="回滚标签修改")
+        except Exception as e:
+            messagebox.showerror("回滚失败", f"回滚标签修改时发生错误:\n{str(e)}", parent=parent)
+    
     def show_folder_labels_detail(self, event):
         """显示文件夹标签详情"""
         selection = self.folders_tree.selection()
@@ -5167,147 +4360,6 @@ class MaterialDesignGUI:
     
     # ==================== 多文件夹处理方法 ====================
     
-    def process_split_json_files_multi(self, converter, files, split_name):
-        """处理指定子集的JSON文件（多文件夹版本）"""
-        data_coco = {}
-        images_list = []
-        annotations_list = []
-        image_num = -1
-        object_num = -1
-        processed_annotations_set = set()
-        
-        # 文件名到image_id的映射
-        file_name_to_image_id = {}
-        
-        # 使用传入的全局转换器，不再重新创建标签映射
-        # 注意：converter.labels_list 和 converter.label_to_num 已经在全局映射中建立
-        
-        # 按文件夹分组处理文件
-        folder_files = {}
-        for img_file in files:
-            folder_path = os.path.dirname(img_file)
-            if folder_path not in folder_files:
-                folder_files[folder_path] = []
-            folder_files[folder_path].append(img_file)
-        
-        self.log_message(f"处理{split_name}集，按文件夹分组:")
-        for folder_path, folder_file_list in folder_files.items():
-            folder_name = self.folder_names.get(folder_path, os.path.basename(folder_path))
-            self.log_message(f"  {folder_name}: {len(folder_file_list)} 个文件")
-        
-        for i, img_file in enumerate(files):
-            img_label = os.path.splitext(os.path.basename(img_file))[0]
-            folder_path = os.path.dirname(img_file)
-            label_file = osp.join(folder_path, img_label + '.json')
-            
-            if not os.path.exists(label_file):
-                self.log_message(f"警告: 找不到对应的JSON文件 {label_file}")
-                continue
-            
-            try:
-                with open(label_file, encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 统一获取文件名
-                if '\\' in data['imagePath']:
-                    current_file_name = data['imagePath'].split('\\')[-1]
-                else:
-                    current_file_name = data['imagePath'].split('/')[-1]
-                
-                # 分配image_id
-                if current_file_name in file_name_to_image_id:
-                    current_image_id = file_name_to_image_id[current_file_name]
-                    image_num_for_converter = current_image_id - 1
-                else:
-                    image_num = image_num + 1
-                    current_image_id = image_num + 1
-                    file_name_to_image_id[current_file_name] = current_image_id
-                    
-                    # 添加图片信息
-                    images_list.append({
-                        'height': data['imageHeight'],
-                        'width': data['imageWidth'],
-                        'id': current_image_id,
-                        'file_name': current_file_name
-                    })
-                    image_num_for_converter = image_num
-                
-                # 处理标注 - 使用全局转换器的标签映射
-                for shapes in data['shapes']:
-                    label = shapes['label']
-                    
-                    # 检查标签是否在全局映射中存在
-                    if label not in converter.label_to_num:
-                        self.log_message(f"警告: 标签 '{label}' 不在全局映射中，跳过该标注")
-                        continue
-                    
-                    p_type = shapes.get('shape_type')
-                    temp_bbox = None
-                    temp_points = None
-                    
-                    if p_type == 'polygon':
-                        points = shapes.get('points', [])
-                        if not isinstance(points, list) or len(points) < 3:
-                            continue
-                        temp_points = points
-                        temp_bbox = list(map(float, converter.get_bbox(data['imageHeight'], data['imageWidth'], points)))
-                    elif p_type == 'rectangle':
-                        pts = shapes.get('points', [])
-                        if not isinstance(pts, list) or len(pts) != 2:
-                            continue
-                        (x1, y1), (x2, y2) = pts
-                        x1, x2 = sorted([x1, x2])
-                        y1, y2 = sorted([y1, y2])
-                        temp_points = [[x1, y1], [x2, y2]]  # 只需要对角线两点
-                        temp_bbox = [float(x1), float(y1), float(x2 - x1), float(y2 - y1)]
-                    else:
-                        continue
-                    
-                    # 校验bbox有效性
-                    if temp_bbox is None or temp_bbox[2] <= 0 or temp_bbox[3] <= 0:
-                        continue
-                    
-                    # 去重
-                    rounded_bbox = tuple(round(v, 2) for v in temp_bbox)
-                    category_id = converter.label_to_num[label]
-                    ann_key = (current_image_id, category_id, rounded_bbox)
-                    if ann_key in processed_annotations_set:
-                        continue
-                    processed_annotations_set.add(ann_key)
-                    
-                    # 生成annotation
-                    object_num = object_num + 1
-                    if p_type == 'polygon':
-                        annotations_list.append(
-                            converter.annotations_polygon(
-                                data['imageHeight'], data['imageWidth'], temp_points, label, image_num_for_converter, object_num
-                            )
-                        )
-                    else:  # rectangle
-                        annotations_list.append(
-                            converter.annotations_rectangle(temp_points, label, image_num_for_converter, object_num)
-                        )
-                        
-            except Exception as e:
-                self.log_message(f"处理文件 {label_file} 时出错: {e}")
-                continue
-        
-        # 使用全局转换器的categories_list，确保标签ID一致
-        data_coco['images'] = images_list
-        data_coco['categories'] = converter.categories_list
-        data_coco['annotations'] = annotations_list
-        
-        # 添加COCO格式必需的info字段
-        data_coco['info'] = {
-            "description": "Converted from Labelme format",
-            "version": "1.0",
-            "year": 2024,
-            "contributor": "Labelme to COCO Converter",
-            "date_created": str(datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        }
-        
-        return data_coco
-    
     def start_conversion(self):
         """开始转换（多文件夹版本）"""
         if not self.validate_split_ratios():
@@ -5348,19 +4400,48 @@ class MaterialDesignGUI:
                 return
         # 如果没填写种子，random_seed保持None，就是随机切分
         
-        # 在新线程中执行转换
+        # 输出目录中有中断或取消的转换时询问是否继续
+        resume = False
+        if ConversionJournal.exists(output_dir):
+            answer = messagebox.askyesnocancel(
+                "继续上次的转换",
+                f"输出目录中有未完成的转换（{JOURNAL_FILENAME}）。\n\n"
+                "是：继续上次的转换，沿用原来的切分，跳过已完成的部分\n"
+                "否：重新开始转换")
+            if answer is None:
+                return
+            resume = answer
+        
+        # 未选择日志文件时，把本次转换的完整日志写到输出目录
+        if self.log_sink.log_file is None:
+            log_file = osp.join(output_dir, f"conversion_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+            try:
+                self.log_sink.set_log_file(log_file)
+                self.log_file_var.set(os.path.basename(log_file))
+                self.log_message(f"完整日志将写入: {log_file}")
+            except OSError as e:
+                self.log_message(f"打开日志文件失败: {e}")
+        
+        # 界面设置在界面线程中读取，转换在新线程中执行
+        config = self.build_conversion_config(output_dir, random_seed, resume)
         self.convert_btn.config(state='disabled')
+        self.cancel_conversion_btn.config(state='normal')
         self.progress_var.set(0)
         self.status_var.set("处理中...")
         
         thread = threading.Thread(target=self.process_dataset, 
-                                args=(None, output_dir, random_seed))
+                                args=(config, self.get_folder_files_dict(), dict(getattr(self, 'label_count', {}))))
         thread.daemon = True
         thread.start()
     
     def run(self):
         """运行GUI应用"""
         self.root.mainloop()
+        
+        # 窗口关闭后把剩余日志写入文件
+        while self.log_sink.drain()[1]:
+            pass
+        self.log_sink.close()
 
 def main():
     """主函数"""
@@ -5368,4 +4449,6 @@ def main():
     app.run()
 
 if __name__ == '__main__':
+    # 多进程转换在Windows下以spawn方式启动子进程，打包后需要freeze_support
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
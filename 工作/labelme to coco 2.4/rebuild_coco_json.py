@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+由分片输出（--sharded）重新生成标准COCO标注文件
+
+    python rebuild_coco_json.py 输出目录/train/annotations/instance_train
+    python rebuild_coco_json.py 输出目录/train/annotations/instance_train -o train.json --compact
+
+不指定 -o 时写到分片目录同级的 instance_<子集>.json。
+"""
+
+import sys
+import argparse
+
+from coco_engine import shards_to_coco
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="由JSONL分片和偏移索引重新生成标准COCO文件")
+    parser.add_argument('split_dir', help="分片目录（包含meta.json、index.bin和shard-*.jsonl）")
+    parser.add_argument('-o', '--output', help="输出的COCO文件，默认为 <分片目录>.json")
+    parser.add_argument('--compact', action='store_true', help="紧凑COCO JSON（不缩进）")
+    args = parser.parse_args(argv)
+
+    split_dir = args.split_dir.rstrip('/\\')
+    json_path = args.output or split_dir + '.json'
+    try:
+        summary = shards_to_coco(split_dir, json_path, compact=args.compact)
+    except (OSError, ValueError) as e:
+        print(f"生成失败: {e}", file=sys.stderr)
+        return 1
+
+    print(f"已生成 {json_path}: {summary['images']} 张图片, {summary['annotations']} 个标注, "
+          f"{len(summary['categories'])} 个类别")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量标注生成：与逐个shape的参考实现输出完全一致
+"""
+
+import random
+
+import coco_engine
+import json_codec
+
+
+def build_fixture_files(rng, count):
+    """随机labelme数据：浮点/整数/混合坐标、角点顺序颠倒的矩形、越界多边形、未知标签和不规则shape"""
+    files = []
+    for i in range(count):
+        height, width = rng.randint(5, 120), rng.randint(5, 120)
+        shapes = []
+        for _ in range(rng.randint(0, 8)):
+            label = rng.choice(['cat', 'dog', 'unknown'])
+            kind = rng.random()
+            if kind < 0.45:
+                points = [[rng.uniform(-10, width + 10), rng.uniform(-10, height + 10)] for _ in range(rng.randint(2, 9))]
+                if rng.random() < 0.3:
+                    points = [[int(x), int(y)] for x, y in points]
+                elif rng.random() < 0.2:
+                    points[0] = [int(points[0][0]), points[0][1]]
+                shapes.append({'label': label, 'shape_type': 'polygon', 'points': points})
+            elif kind < 0.9:
+                points = [[rng.uniform(0, width), rng.uniform(0, height)] for _ in range(2)]
+                if rng.random() < 0.3:
+                    points = [[int(x), int(y)] for x, y in points]
+                if rng.random() < 0.1:
+                    points[1][0] = points[0][0]
+                shapes.append({'label': label, 'shape_type': 'rectangle', 'points': points})
+            else:
+                shapes.append({'label': label, 'shape_type': 'circle', 'points': [[1.0, 2.0], [3.0, 4.0]]})
+        data = {'imagePath': f'dir\\img_{i}.jpg', 'imageHeight': height, 'imageWidth': width, 'shapes': shapes}
+        # 缺少尺寸或结构不规则的文件整体退回参考实现
+        if i % 50 == 0:
+            del data['imageHeight']
+        elif i % 50 == 25:
+            shapes.append({'label': 'cat', 'shape_type': 'rectangle', 'points': [[1.0, 2.0, 3.0], [4.0, 5.0]]})
+        files.append(data)
+    # 负零坐标：math.floor(-0.0)为0
+    files.append({'imagePath': 'zero.jpg', 'imageHeight': 20, 'imageWidth': 20,
+                  'shapes': [{'label': 'cat', 'shape_type': 'polygon', 'points': [[-0.0, -0.0], [5.5, 0.0], [3.0, 4.0]]}]})
+    return files
+
+
+def reference_result(converter, data):
+    result = coco_engine._new_conversion_result(data)
+    if result['error'] is None:
+        coco_engine._convert_shapes_serial(converter, data, result)
+    return result
+
+
+def test_batch_builder_matches_reference():
+    rng = random.Random(20240704)
+    files = build_fixture_files(rng, 400)
+    for bbox_mode in coco_engine.BBOX_MODES:
+        converter = coco_engine.SimpleLabelme2COCO(bbox_mode)
+        converter.label_to_num = {'cat': 1, 'dog': 2}
+
+        builder = coco_engine.AnnotationBatchBuilder(converter)
+        for data in files:
+            builder.add_file(data)
+        batched = builder.build()
+
+        assert len(batched) == len(files)
+        for i, (data, actual) in enumerate(zip(files, batched)):
+            expected = reference_result(converter, data)
+            assert json_codec.dumps(actual) == json_codec.dumps(expected)
+            # 批量计算的文件输出普通Python数值
+            if i % 25 == 0:
+                continue
+            for _, _, annotation in actual['annotations']:
+                assert all(type(v) in (int, float) for v in annotation['segmentation'][0] + annotation['bbox'])
+
+
+if __name__ == "__main__":
+    test_batch_builder_matches_reference()
+    print("批量标注生成测试通过")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试列式标注存储：还原出的标注与写入的dict序列化后逐字节一致
+"""
+
+import os
+import random
+import tempfile
+
+import numpy as np
+
+import json_codec
+from annotation_store import ColumnarAnnotationStore
+
+
+def build_annotations(rng, count):
+    """浮点/整数/numpy坐标，以及多段segmentation、额外字段等只能整体保存的标注"""
+    annotations = []
+    for i in range(count):
+        n = rng.randint(0, 12) * 2
+        kind = i % 7
+        if kind == 0:
+            segmentation = [rng.randint(-5, 900) for _ in range(n)]
+        elif kind == 1:
+            segmentation = list(np.asarray([rng.uniform(0, 900) for _ in range(n)]))
+        elif kind == 2:
+            segmentation = list(np.asarray([rng.randint(0, 900) for _ in range(n)]))
+        else:
+            segmentation = [rng.uniform(-1e-3, 1e6) for _ in range(n)]
+        bbox = [float(rng.randint(0, 500)), rng.uniform(0, 500), rng.uniform(0, 50), rng.uniform(0, 50)]
+        annotation = {'segmentation': [segmentation], 'iscrowd': 0, 'image_id': i // 3 + 1, 'bbox': bbox,
+                      'area': bbox[2] * bbox[3], 'category_id': i % 4 + 1, 'id': i + 1}
+        if i % 50 == 5:
+            annotation['segmentation'].append([1, 2.5, 3, 4])
+        elif i % 50 == 6:
+            annotation['extra'] = '备注'
+        elif i % 50 == 7 and segmentation:
+            segmentation[0] = 1
+            segmentation[-1] = 2.5
+        annotations.append(annotation)
+    return annotations
+
+
+def test_store_roundtrip():
+    rng = random.Random(5)
+    annotations = build_annotations(rng, 10000)
+    expected = [json_codec.dumps(annotation) for annotation in annotations]
+
+    temp_dir = tempfile.mkdtemp()
+    store = ColumnarAnnotationStore(temp_dir)
+    try:
+        for annotation in annotations:
+            store.append(annotation)
+        assert len(store) == len(annotations)
+
+        for numpy_segmentation in (False, True):
+            restored = list(store.iter_annotations(chunk_size=777, numpy_segmentation=numpy_segmentation))
+            assert [json_codec.dumps(annotation) for annotation in restored] == expected
+            assert [json_codec.dumps(annotation, indent=True) for annotation in restored] == \
+                [json_codec.dumps(annotation, indent=True) for annotation in annotations]
+
+        # 不带numpy参数还原出的都是普通Python对象
+        first = next(store.iter_annotations())
+        assert type(first['segmentation'][0]) is list and type(first['bbox'][0]) is float
+
+        category_counts = {}
+        for annotation in annotations:
+            category_counts[annotation['category_id']] = category_counts.get(annotation['category_id'], 0) + 1
+        assert store.category_counts() == category_counts
+        assert sum(store.image_counts().values()) == len(annotations)
+    finally:
+        store.close()
+    assert os.listdir(temp_dir) == []
+    os.rmdir(temp_dir)
+
+
+if __name__ == "__main__":
+    test_store_roundtrip()
+    print("列式标注存储测试通过")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试bbox计算引擎：geometric / raster 模式与整幅光栅化结果一致
+"""
+
+import random
+
+import coco_engine
+
+
+def build_fixture_polygons():
+    """构造测试用多边形：随机浮点顶点、半像素顶点、贴边以及越界多边形"""
+    rng = random.Random(20240601)
+    fixtures = [
+        (40, 40, [[2, 2], [10.7, 20], [2, 30]]),
+        (40, 40, [[0, 0], [39, 0], [39, 39], [0, 39]]),
+        (41, 13, [[10.0, 6.0], [18.0, 8.0], [31.5, 1.0]]),
+        (30, 30, [[-5.5, 3.2], [12.4, -7.9], [20.1, 25.6]]),
+        (30, 30, [[25.2, 25.7], [45.0, 28.0], [29.9, 44.4]]),
+        (2160, 3840, [[100.25, 200.75], [3000.5, 150.0], [3839.4, 2159.6], [50.0, 2100.1]]),
+    ]
+    for i in range(3000):
+        height, width = rng.randint(5, 80), rng.randint(5, 80)
+        num_points = rng.randint(3, 10)
+        if i % 3 == 0:
+            # 可能越过图像边界
+            points = [[rng.uniform(-20, width + 20), rng.uniform(-20, height + 20)] for _ in range(num_points)]
+        else:
+            points = [[rng.uniform(0, width - 0.01), rng.uniform(0, height - 0.01)] for _ in range(num_points)]
+        if i % 4 == 0:
+            points = [[round(x * 2) / 2, round(y * 2) / 2] for x, y in points]
+        fixtures.append((height, width, points))
+    return fixtures
+
+
+def full_frame_bbox(converter, height, width, points):
+    """整幅光栅化的参考结果，多边形在图像外时返回None"""
+    try:
+        return [int(v) for v in converter.get_bbox_full_frame(height, width, points)]
+    except ValueError:
+        return None
+
+
+def engine_bbox(converter, height, width, points):
+    try:
+        return [int(v) for v in converter.get_bbox(height, width, points)]
+    except ValueError:
+        return None
+
+
+def test_geometric_matches_full_frame():
+    """geometric 模式与整幅光栅化结果一致"""
+    converter = coco_engine.SimpleLabelme2COCO(bbox_mode='geometric')
+    
+    mismatches = []
+    for height, width, points in build_fixture_polygons():
+        expected = full_frame_bbox(converter, height, width, points)
+        actual = engine_bbox(converter, height, width, points)
+        if expected != actual:
+            mismatches.append((height, width, points, expected, actual))
+    
+    assert not mismatches, f"geometric 模式有 {len(mismatches)} 个结果不一致，例如: {mismatches[0]}"
+
+
+def test_window_raster_matches_full_frame():
+    """raster 模式（窗口光栅化）与整幅光栅化结果一致"""
+    converter = coco_engine.SimpleLabelme2COCO(bbox_mode='raster')
+    
+    mismatches = []
+    for height, width, points in build_fixture_polygons():
+        expected = full_frame_bbox(converter, height, width, points)
+        actual = engine_bbox(converter, height, width, points)
+        if expected != actual:
+            mismatches.append((height, width, points, expected, actual))
+    
+    assert not mismatches, f"raster 模式有 {len(mismatches)} 个结果不一致，例如: {mismatches[0]}"
+
+
+def test_invalid_bbox_mode():
+    """不支持的模式直接报错"""
+    try:
+        coco_engine.SimpleLabelme2COCO(bbox_mode='unknown')
+    except ValueError:
+        return
+    raise AssertionError("未知的bbox_mode应当抛出ValueError")
+
+
+if __name__ == "__main__":
+    test_geometric_matches_full_frame()
+    print("✅ geometric 模式与整幅光栅化一致")
+    test_window_raster_matches_full_frame()
+    print("✅ raster 模式与整幅光栅化一致")
+    test_invalid_bbox_mode()
+    print("✅ 未知模式检查通过")
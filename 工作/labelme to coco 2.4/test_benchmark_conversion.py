@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试转换基准：合成数据集可以被完整转换，报告包含各阶段耗时
+"""
+
+import os
+import shutil
+import tempfile
+
+import json_codec
+import benchmark_conversion
+
+
+def test_benchmark_report():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        report_path = os.path.join(temp_dir, 'report.json')
+        workdir = os.path.join(temp_dir, 'work')
+        assert benchmark_conversion.main([
+            '--workdir', workdir, '-o', report_path, '--folders', '2', '--images', '12', '--shapes', '1-6',
+            '--vertices', '3-12', '--width', '64', '--height', '48', '--no-parallel', '--placement', 'hardlink'
+        ]) == 0
+
+        report = json_codec.load(report_path)
+        assert report['dataset']['total_images'] == 24
+        assert list(report['best_stages']) == ['scan', 'label_mapping', 'split', 'copy', 'coco', 'validation']
+        assert all(seconds >= 0 for seconds in report['best_stages'].values())
+        # 未指定--keep时删除数据集和输出
+        assert os.listdir(workdir) == []
+
+        assert benchmark_conversion.main(['--compare', report_path, report_path]) == 0
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_benchmark_report()
+    print("转换基准测试通过")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试无界面转换引擎：命令行+配置文件完成切分、图片放置和COCO标注生成
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import coco_engine
+
+
+def write_labelme_folder(folder, count, labels):
+    """构造labelme文件夹：每张图片一个多边形和一个矩形"""
+    os.makedirs(folder)
+    for i in range(count):
+        name = f'{os.path.basename(folder)}_{i:03d}'
+        Image.new('RGB', (64, 48)).save(os.path.join(folder, name + '.jpg'))
+        shapes = [
+            {'label': labels[i % len(labels)], 'shape_type': 'polygon',
+             'points': [[2.5, 3.0], [40.2, 5.5], [20.0, 30.7]]},
+            {'label': labels[(i + 1) % len(labels)], 'shape_type': 'rectangle',
+             'points': [[10.0, 12.0], [30.0, 40.0]]},
+        ]
+        data = {'imagePath': name + '.jpg', 'imageHeight': 48, 'imageWidth': 64, 'shapes': shapes}
+        with open(os.path.join(folder, name + '.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+
+def test_cli_with_config_file():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder_a = os.path.join(temp_dir, 'a')
+        folder_b = os.path.join(temp_dir, 'b')
+        write_labelme_folder(folder_a, 30, ['cat', 'dog'])
+        write_labelme_folder(folder_b, 12, ['dog', 'bird'])
+
+        config_path = os.path.join(temp_dir, 'build.json')
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump({'input_folders': [folder_a, folder_b], 'seed': 7,
+                       'max_images_per_folder': 20, 'parallel_conversion': False}, f)
+
+        output_dir = os.path.join(temp_dir, 'out')
+        assert coco_engine.main(['--config', config_path, '-o', output_dir, '--compact',
+                                 '--placement', 'hardlink']) == 0
+
+        # 训练集超过20张，被分割为两个部分
+        total_images = 0
+        for subset in ('train_part01', 'train_part02', 'test', 'verify'):
+            json_path = os.path.join(output_dir, subset, 'annotations', f'instance_{subset}.json')
+            with open(json_path, encoding='utf-8') as f:
+                coco_data = json.load(f)
+            assert sorted(c['name'] for c in coco_data['categories']) == ['bird', 'cat', 'dog']
+            assert len(coco_data['annotations']) == 2 * len(coco_data['images'])
+            assert len(os.listdir(os.path.join(output_dir, subset, 'images'))) == len(coco_data['images'])
+            total_images += len(coco_data['images'])
+        assert total_images == 42
+
+        with open(os.path.join(output_dir, 'subset_split_info.txt'), encoding='utf-8') as f:
+            assert '硬链接' in f.read()
+
+        # 命令行参数覆盖配置文件后写出完整配置
+        merged_path = os.path.join(temp_dir, 'merged.json')
+        assert coco_engine.main(['--config', config_path, '-o', output_dir, '--seed', '9',
+                                 '--write-config', merged_path]) == 0
+        merged = coco_engine.ConversionConfig.load(merged_path)
+        assert merged.seed == 9 and merged.max_images_per_folder == 20 and merged.output_dir == output_dir
+
+        assert coco_engine.main(['--config', config_path, '-o', output_dir, '--train-ratio', '0.5']) == 2
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_stage_instrumentation():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 10, ['cat', 'dog'])
+        output_dir = os.path.join(temp_dir, 'out')
+        profile_dir = os.path.join(temp_dir, 'profile')
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=output_dir, seed=1,
+                                              parallel_conversion=False, trace_memory=True, profile_dir=profile_dir)
+        engine = coco_engine.DatasetConversionEngine(config)
+        engine.run()
+
+        stages = {timing['stage']: timing for timing in engine.stage_timings}
+        assert list(stages) == ['scan', 'label_mapping', 'split', 'copy', 'coco', 'validation']
+        assert stages['copy']['files'] == 10 and stages['copy']['bytes_written'] > 0
+        assert stages['coco']['files'] == 10 and stages['coco']['files_per_second'] > 0
+        assert stages['coco']['bytes_written'] == sum(
+            os.path.getsize(os.path.join(output_dir, subset, 'annotations', f'instance_{subset}.json'))
+            for subset in ('train', 'test', 'verify'))
+        assert all(timing['traced_peak_mb'] is not None for timing in engine.stage_timings)
+        # RSS峰值增长按阶段计算，各阶段之和不超过进程峰值
+        if stages['scan']['peak_rss_mb'] is not None:
+            assert all(timing['rss_growth_mb'] >= 0 for timing in engine.stage_timings)
+            assert sum(timing['rss_growth_mb'] for timing in engine.stage_timings) <= stages['validation']['peak_rss_mb']
+        assert sorted(os.listdir(profile_dir)) == ['01_scan.prof', '02_label_mapping.prof', '03_split.prof',
+                                                   '04_copy.prof', '05_coco.prof', '06_validation.prof']
+
+        with open(os.path.join(output_dir, 'subset_split_info.txt'), encoding='utf-8') as f:
+            info = f.read()
+        assert '各阶段耗时' in info and 'validation' in info
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cancel_and_resume():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 20, ['cat', 'dog'])
+        output_dir = os.path.join(temp_dir, 'out')
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=output_dir, parallel_conversion=False)
+        messages = []
+
+        def cancel_after_train(message):
+            messages.append(message)
+            if message.startswith('✓ train集COCO标注生成完成'):
+                engine.cancel()
+
+        engine = coco_engine.DatasetConversionEngine(config, cancel_after_train)
+        try:
+            engine.run()
+            assert False, "转换应当被取消"
+        except coco_engine.ConversionCancelled:
+            pass
+        assert coco_engine.ConversionJournal.exists(output_dir)
+        assert not os.path.exists(os.path.join(output_dir, 'test', 'annotations', 'instance_test.json'))
+
+        # 模拟写了一半的图片
+        images_dir = os.path.join(output_dir, 'train', 'images')
+        truncated = os.path.join(images_dir, sorted(os.listdir(images_dir))[0])
+        with open(truncated, 'r+b') as f:
+            f.truncate(10)
+
+        # 随机切分，继续时必须沿用日志中的方案
+        messages.clear()
+        config.resume = True
+        coco_engine.DatasetConversionEngine(config, messages.append).run()
+        assert any('已在上次转换中完成' in message for message in messages)
+        assert any('本次没有验证其标签ID一致性: train' in message for message in messages)
+        assert os.path.getsize(truncated) == os.path.getsize(os.path.join(folder, os.path.basename(truncated)))
+        assert not coco_engine.ConversionJournal.exists(output_dir)
+
+        file_names = []
+        for subset in ('train', 'test', 'verify'):
+            with open(os.path.join(output_dir, subset, 'annotations', f'instance_{subset}.json'), encoding='utf-8') as f:
+                coco = json.load(f)
+            names = [image['file_name'] for image in coco['images']]
+            assert sorted(names) == sorted(os.listdir(os.path.join(output_dir, subset, 'images')))
+            file_names.extend(names)
+        assert sorted(file_names) == sorted(name for name in os.listdir(folder) if name.endswith('.jpg'))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_cancel_parallel_split_returns_promptly():
+    temp_dir = tempfile.mkdtemp()
+    original_convert = coco_engine.convert_labelme_files
+    original_interval = coco_engine.CANCEL_CHECK_INTERVAL
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 300, ['cat', 'dog'])
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=os.path.join(temp_dir, 'out'),
+                                              seed=1, placement_mode='hardlink')
+        engine = coco_engine.DatasetConversionEngine(config)
+        # 线程池代替进程池，每个分片转换都很慢，第一个分片完成后取消
+        engine._conversion_executor = ThreadPoolExecutor(max_workers=2)
+        engine._conversion_workers = 2
+        cancelled_at = []
+
+        def slow_convert(converter, label_files):
+            time.sleep(0.5)
+            if not cancelled_at:
+                cancelled_at.append(time.perf_counter())
+                engine.cancel()
+            return original_convert(converter, label_files)
+
+        coco_engine.convert_labelme_files = slow_convert
+        coco_engine.CANCEL_CHECK_INTERVAL = 10
+        try:
+            engine.run()
+            assert False, "转换应当被取消"
+        except coco_engine.ConversionCancelled:
+            pass
+        # 训练集240个文件分成8个分片；取消后不再等待排队和运行中的分片
+        assert time.perf_counter() - cancelled_at[0] < 0.4
+        assert engine._conversion_executor is None
+    finally:
+        coco_engine.convert_labelme_files = original_convert
+        coco_engine.CANCEL_CHECK_INTERVAL = original_interval
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_label_checks_cover_split_parts():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 40, ['cat', 'dog'])
+        output_dir = os.path.join(temp_dir, 'out')
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=output_dir, seed=2,
+                                              max_images_per_folder=10, parallel_conversion=False)
+        messages = []
+        engine = coco_engine.DatasetConversionEngine(config, messages.append)
+        engine.run()
+
+        checks = engine.label_validator.checked_splits()
+        assert [check.split_name for check in checks] == ['train_part01', 'train_part02', 'train_part03',
+                                                          'train_part04', 'test', 'verify']
+        assert sum(check.images for check in checks) == 40 and sum(check.annotations for check in checks) == 80
+        assert not engine.label_validator.issue_counts()
+        assert any(message.startswith('✓ 全局标签ID一致性验证通过') for message in messages)
+
+        # 写出时违反不变量的标注只累计计数
+        check = coco_engine.LabelConsistencyValidator({'cat': 1, 'dog': 2}).for_split('train')
+        check.add_image({'id': 1})
+        check.add_annotation({'id': 1, 'image_id': 1, 'category_id': 3, 'bbox': [0, 0, 1, 1]})
+        check.add_annotation({'id': 1, 'image_id': 2, 'category_id': 1, 'bbox': [0, 0, 0, 1]})
+        check.finish([{'id': 1, 'name': 'cat'}, {'id': 3, 'name': 'dog'}], {})
+        assert check.issues == {'unknown_category': 1, 'orphan_annotation': 1, 'annotation_id_order': 1,
+                                'invalid_bbox': 1, 'category_mismatch': 1}
+        assert check.mismatched_labels == [('dog', 2, 3)]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_cli_with_config_file()
+    test_stage_instrumentation()
+    test_cancel_and_resume()
+    test_cancel_parallel_split_returns_promptly()
+    test_label_checks_cover_split_parts()
+    print("转换引擎测试通过")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件夹扫描：一次scandir完成图片与JSON的配对，图片顺序与之前逐个glob一致
+"""
+
+import os
+import glob
+import ntpath
+import json
+import shutil
+import tempfile
+
+import coco_engine
+
+
+def test_folder_scan_pairs_images_and_labels():
+    folder = tempfile.mkdtemp()
+    try:
+        names = ['a.jpg', 'a.json', 'b.PNG', 'b.JSON', 'c.jpeg', 'd.Bmp', 'd.json',
+                 'orphan.json', 'notes.txt', 'e.JPG', 'f.png',
+                 # 隐藏文件（macOS AppleDouble等）与glob一样跳过
+                 '._a.jpg', '._a.json', '.hidden.png', '.orphan.json']
+        for name in names:
+            with open(os.path.join(folder, name), 'w') as f:
+                f.write('{}')
+        os.mkdir(os.path.join(folder, 'dir.jpg'))
+
+        scan = coco_engine.FolderScan(folder)
+        image_names = [os.path.basename(p) for p in scan.images]
+        assert sorted(image_names) == ['a.jpg', 'b.PNG', 'c.jpeg', 'd.Bmp', 'e.JPG', 'f.png']
+
+        # 原有扩展名的图片顺序与按模式逐个glob相同，新支持的大小写写法排在最后
+        legacy = []
+        for pattern in ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.JPG', '*.JPEG', '*.PNG']:
+            legacy.extend(p for p in glob.glob(os.path.join(folder, pattern)) if os.path.isfile(p))
+        assert scan.images[:len(legacy)] == legacy
+        assert image_names[-1] == 'd.Bmp'
+
+        labels = {os.path.basename(p): scan.label_file_for(p) for p in scan.images}
+        assert labels['a.jpg'] == os.path.join(folder, 'a.json')
+        assert labels['b.PNG'] == os.path.join(folder, 'b.JSON')
+        assert labels['d.Bmp'] == os.path.join(folder, 'd.json')
+        assert sorted(os.path.basename(p) for p in scan.images_without_labels()) == ['c.jpeg', 'e.JPG', 'f.png']
+        assert [os.path.basename(p) for p in scan.orphan_label_files()] == ['orphan.json']
+
+        index = coco_engine.DatasetIndex()
+        images = coco_engine.get_image_files(folder, index)
+        assert images == scan.images
+        assert index.label_file_for(os.path.join(folder, 'c.jpeg')) is None
+        # 未扫描过的文件夹按同名规则拼出路径
+        assert index.label_file_for(os.path.join('other', 'x.jpg')) == os.path.join('other', 'x.json')
+        index.discard(folder)
+        assert index.get(folder) is None
+        assert index.label_file_for(os.path.join(folder, 'c.jpeg')) == os.path.join(folder, 'c.json')
+    finally:
+        shutil.rmtree(folder)
+
+
+def test_mixed_case_extensions_keep_glob_order():
+    folder = tempfile.mkdtemp()
+    original_normcase = os.path.normcase
+    try:
+        for name in ['a.jpg', 'b.JPG', 'c.Jpg', 'd.bmp', 'e.BMP', 'f.png']:
+            open(os.path.join(folder, name), 'wb').close()
+
+        # 本平台：与逐个glob的顺序相同，未列出的大小写写法排在最后
+        legacy = []
+        for pattern in ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.JPG', '*.JPEG', '*.PNG']:
+            legacy.extend(p for p in glob.glob(os.path.join(folder, pattern)) if p not in legacy)
+        images = coco_engine.FolderScan(folder).images
+        assert images[:len(legacy)] == legacy
+        assert sorted(images) == sorted(os.path.join(folder, name) for name in os.listdir(folder))
+
+        # Windows（glob不区分大小写）：.JPG/.Jpg与.jpg同组，.BMP与.bmp同组
+        os.path.normcase = ntpath.normcase
+        names = [os.path.basename(p) for p in coco_engine.FolderScan(folder).images]
+        assert set(names[:3]) == {'a.jpg', 'b.JPG', 'c.Jpg'}
+        assert names[3] == 'f.png'
+        assert set(names[4:]) == {'d.bmp', 'e.BMP'}
+    finally:
+        os.path.normcase = original_normcase
+        shutil.rmtree(folder)
+
+
+def test_folder_ingestor_scans_in_background_and_cancels():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folders = []
+        for i, labels in enumerate([['cat'], ['dog', 'cat'], []]):
+            folder = os.path.join(temp_dir, f'f{i}')
+            os.mkdir(folder)
+            for j in range(5):
+                open(os.path.join(folder, f'{j}.jpg'), 'wb').close()
+                shapes = [{'label': label, 'points': [[0, 0], [1, 1]]} for label in labels]
+                with open(os.path.join(folder, f'{j}.json'), 'w') as f:
+                    json.dump({'shapes': shapes, 'imagePath': f'{j}.jpg', 'imageHeight': 2, 'imageWidth': 2}, f)
+            folders.append(folder)
+        with open(os.path.join(folders[2], '0.json'), 'w') as f:
+            f.write('{broken')
+
+        progress = []
+        ingestor = coco_engine.FolderIngestor(coco_engine.DatasetIndex(), coco_engine.AnnotationIndex(), max_workers=2)
+        futures = [ingestor.submit(folder, lambda *args: progress.append(args)) for folder in folders]
+        results = [future.result() for future in futures]
+        assert [result['labels'] for result in results] == [{'cat'}, {'cat', 'dog'}, set()]
+        assert [len(result['image_files']) for result in results] == [5, 5, 5]
+        assert len(results[2]['errors']) == 1
+        assert (folders[0], 5, 5) in progress
+        ingestor.shutdown()
+
+        # 取消后新任务不再扫描
+        ingestor = coco_engine.FolderIngestor(coco_engine.DatasetIndex(), coco_engine.AnnotationIndex())
+        ingestor.cancel()
+        assert ingestor.cancelled
+        assert ingestor.ingest(folders[0]) is None
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    test_folder_scan_pairs_images_and_labels()
+    test_mixed_case_extensions_keep_glob_order()
+    test_folder_ingestor_scans_in_background_and_cancels()
+    print("文件夹扫描测试通过")
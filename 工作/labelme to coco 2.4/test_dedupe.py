@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按图片去重：完全相同的标注去重结果与暴力比较一致，IoU模式合并近似重复框
+"""
+
+import random
+
+import coco_engine
+
+
+def brute_force_duplicates(boxes, iou_threshold):
+    """逐对比较的参考实现，返回每个框是否被去掉"""
+    kept = []
+    removed = []
+    for category_id, bbox in boxes:
+        rounded = tuple(round(v, 2) for v in bbox)
+        duplicate = any(c == category_id and (tuple(round(v, 2) for v in b) == rounded
+                                              or (iou_threshold is not None
+                                                  and coco_engine.bbox_iou(bbox, b) >= iou_threshold))
+                        for c, b in kept)
+        removed.append(duplicate)
+        if not duplicate:
+            kept.append((category_id, bbox))
+    return removed
+
+
+def test_deduper_matches_brute_force():
+    rng = random.Random(7)
+    for iou_threshold in (None, 0.5, 0.7, 0.95, 1.0):
+        for _ in range(30):
+            boxes = []
+            for _ in range(rng.randint(1, 60)):
+                if boxes and rng.random() < 0.4:
+                    # 在已有框附近抖动，制造近似重复
+                    category_id, (x, y, w, h) = rng.choice(boxes)
+                    jitter = rng.choice([0, 0.5, 2, 10])
+                    bbox = [x + rng.uniform(-jitter, jitter), y + rng.uniform(-jitter, jitter),
+                            max(0.5, w + rng.uniform(-jitter, jitter)), max(0.5, h + rng.uniform(-jitter, jitter))]
+                else:
+                    category_id = rng.randint(1, 3)
+                    bbox = [rng.uniform(0, 500), rng.uniform(0, 500), rng.uniform(0.5, 300), rng.uniform(0.5, 300)]
+                boxes.append((category_id, bbox))
+
+            deduper = coco_engine.ImageAnnotationDeduper(iou_threshold)
+            actual = [deduper.check(c, tuple(round(v, 2) for v in b), b) is not None for c, b in boxes]
+            assert actual == brute_force_duplicates(boxes, iou_threshold)
+
+
+def test_split_builder_dedupes_per_image():
+    converter = coco_engine.SimpleLabelme2COCO()
+    converter.labels_list = ['cat', 'dog']
+    converter.label_to_num = {'cat': 1, 'dog': 2}
+
+    def labelme(name, shapes):
+        return {'imagePath': name, 'imageHeight': 100, 'imageWidth': 100,
+                'shapes': [{'label': label, 'shape_type': 'rectangle', 'points': points} for label, points in shapes]}
+
+    files = [
+        labelme('a.jpg', [('cat', [[10, 10], [50, 50]]),
+                          ('cat', [[10, 10], [50, 50]]),        # 完全重复
+                          ('cat', [[11, 10], [50, 51]]),        # 近似重复
+                          ('dog', [[11, 10], [50, 51]]),        # 类别不同
+                          ('cat', [[60, 60], [90, 90]])]),
+        labelme('b.jpg', [('cat', [[10, 10], [50, 50]])]),      # 其他图片的相同框
+    ]
+
+    for iou_threshold, expected in ((None, 4 + 1), (0.9, 3 + 1)):
+        builder = coco_engine.CocoSplitBuilder(iou_threshold=iou_threshold)
+        for data in files:
+            builder.add_file(coco_engine.convert_labelme_data(converter, data))
+        assert len(builder.annotations_list) == expected
+        assert builder.exact_duplicates == 1
+        assert builder.near_duplicates == (0 if iou_threshold is None else 1)
+        assert [a['id'] for a in builder.annotations_list] == list(range(1, expected + 1))
+
+
+if __name__ == "__main__":
+    test_deduper_matches_brute_force()
+    test_split_builder_dedupes_per_image()
+    print("去重测试通过")
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试一次解析同时导出COCO、YOLO和海康mapFrameInfos：三种输出的图片、类别和框一致
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+import coco_engine
+import export_sinks
+from test_coco_engine import write_labelme_folder
+
+
+def test_fan_out_exports_match_coco():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 30, ['cat', 'dog', 'bird'])
+        # 顶点顺序与矩形角点相同的多边形，海康输出中仍应是多边形
+        for name in os.listdir(folder):
+            if name.endswith('.json'):
+                path = os.path.join(folder, name)
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                data['shapes'].append({'label': 'cat', 'shape_type': 'polygon',
+                                       'points': [[40.0, 5.0], [60.0, 5.0], [60.0, 25.0], [40.0, 25.0]]})
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+        output_dir = os.path.join(temp_dir, 'out')
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=output_dir, seed=3,
+                                              parallel_conversion=False, export_formats=['yolo', 'hik'])
+        engine = coco_engine.DatasetConversionEngine(config)
+        engine.run()
+
+        with open(os.path.join(output_dir, 'classes.txt'), encoding='utf-8') as f:
+            classes = f.read().split()
+        for subset in ('train', 'test', 'verify'):
+            with open(os.path.join(output_dir, subset, 'annotations', f'instance_{subset}.json'), encoding='utf-8') as f:
+                coco = json.load(f)
+            names = {category['id']: category['name'] for category in coco['categories']}
+            assert not any('shape_type' in annotation for annotation in coco['annotations'])
+            assert classes == [names[category_id] for category_id in sorted(names)]
+
+            # YOLO：每张图片一个txt，框与COCO bbox一致
+            labels_dir = os.path.join(output_dir, subset, 'labels')
+            assert sorted(os.listdir(labels_dir)) == sorted(
+                os.path.splitext(image['file_name'])[0] + '.txt' for image in coco['images'])
+            for image in coco['images']:
+                with open(os.path.join(labels_dir, os.path.splitext(image['file_name'])[0] + '.txt')) as f:
+                    lines = [line.split() for line in f]
+                annotations = [a for a in coco['annotations'] if a['image_id'] == image['id']]
+                assert len(lines) == len(annotations)
+                for line, annotation in zip(lines, annotations):
+                    x, y, w, h = annotation['bbox']
+                    assert int(line[0]) == annotation['category_id'] - 1
+                    assert abs(float(line[1]) - (x + w / 2) / image['width']) < 1e-6
+                    assert abs(float(line[4]) - h / image['height']) < 1e-6
+
+            # 海康：每张图片一个frame，labelme矩形为TargetType 1，多边形为3
+            with open(os.path.join(output_dir, subset, 'Result', 'merged_annotations.json'), encoding='utf-8') as f:
+                frames = json.load(f)['calibInfo']['VideoChannels'][0]['VideoInfo']['mapFrameInfos']
+            assert [frame['value']['FrameNum'] for frame in frames] == [image['file_name'] for image in coco['images']]
+            targets = [target['value'] for frame in frames for target in frame['value']['mapTargets']]
+            assert len(targets) == len(coco['annotations'])
+            for target, annotation in zip(targets, coco['annotations']):
+                assert target['PropertyPages'][0]['PropertyPageDescript'] == names[annotation['category_id']]
+                assert target['TargetType'] == (1 if annotation['bbox'] == [10.0, 12.0, 20.0, 28.0] else 3)
+                assert all(0 <= vertex['fX'] <= 1 and 0 <= vertex['fY'] <= 1 for vertex in target['Vertex'])
+
+        stages = {timing['stage']: timing for timing in engine.stage_timings}
+        assert stages['coco']['files'] == 30
+
+        # 中途放弃（出错或取消）时上次的海康输出保持不变，临时文件被删除
+        hik_path = os.path.join(output_dir, 'train', 'Result', 'merged_annotations.json')
+        with open(hik_path, 'rb') as f:
+            previous = f.read()
+        writer = export_sinks.HikFrameInfoWriter(hik_path, {1: 'cat'})
+        writer.add_image({'id': 1, 'file_name': 'x.jpg', 'width': 10, 'height': 10})
+        writer.close()
+        with open(hik_path, 'rb') as f:
+            assert f.read() == previous
+        assert os.listdir(os.path.dirname(hik_path)) == ['merged_annotations.json']
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_fan_out_exports_match_coco()
+    print("多格式导出测试通过")
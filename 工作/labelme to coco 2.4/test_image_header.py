@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试只读文件头获取图片尺寸，以及按实际尺寸核对和修正labelme JSON
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+from PIL import Image
+
+from image_header import read_image_size, ImageHeaderError
+from coco_engine import DatasetIndex, ImageSizeVerifier
+
+
+def test_read_image_size():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cases = {}
+        for name, format_name, mode in (('a.jpg', 'JPEG', 'RGB'), ('b.png', 'PNG', 'RGBA'), ('c.bmp', 'BMP', 'RGB'),
+                                        ('d.gif', 'GIF', 'P'), ('e.jpg', 'JPEG', 'L')):
+            path = os.path.join(temp_dir, name)
+            Image.new(mode, (123, 45)).save(path, format=format_name)
+            cases[path] = (123, 45)
+
+        # EXIF方向6（旋转90°）：labelme加载时会转正，宽高互换
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        rotated = os.path.join(temp_dir, 'rotated.jpg')
+        Image.new('RGB', (123, 45)).save(rotated, exif=exif, icc_profile=b'\0' * 3000)
+        cases[rotated] = (45, 123)
+
+        for path, size in cases.items():
+            assert tuple(read_image_size(path)) == size, path
+
+        broken = os.path.join(temp_dir, 'broken.jpg')
+        with open(os.path.join(temp_dir, 'a.jpg'), 'rb') as f:
+            head = f.read(30)
+        with open(broken, 'wb') as f:
+            f.write(head)
+        try:
+            read_image_size(broken)
+            assert False, "不完整的JPEG应当报错"
+        except ImageHeaderError:
+            pass
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_verify_and_fix_json_sizes():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        image_files = []
+        for i in range(600):
+            name = f'img_{i:03d}'
+            image_file = os.path.join(temp_dir, name + '.png')
+            Image.new('L', (32 + i % 3, 24)).save(image_file)
+            # 每100张有一张JSON中的尺寸写错
+            width = 99 if i % 100 == 7 else 32 + i % 3
+            data = {'imagePath': name + '.png', 'imageHeight': 24, 'imageWidth': width, 'shapes': []}
+            with open(os.path.join(temp_dir, name + '.json'), 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            image_files.append(image_file)
+        # 没有JSON的图片跳过，扩展名大写的JSON照常核对，只有读不出文件头的图片报错
+        os.remove(os.path.join(temp_dir, 'img_010.json'))
+        os.rename(os.path.join(temp_dir, 'img_207.json'), os.path.join(temp_dir, 'img_207.JSON'))
+        with open(os.path.join(temp_dir, 'img_011.png'), 'wb') as f:
+            f.write(b'not an image')
+
+        dataset_index = DatasetIndex()
+        dataset_index.scan(temp_dir)
+        verifier = ImageSizeVerifier(max_workers=4, dataset_index=dataset_index)
+        result = verifier.run(image_files)
+        assert [os.path.basename(img_file) for img_file, _, _ in result['mismatches']] == \
+            [f'img_{i:03d}.png' for i in range(7, 600, 100)]
+        assert result['mismatches'][0][1:] == ((99, 24), (33, 24))
+        assert [os.path.basename(img_file) for img_file, _ in result['errors']] == ['img_011.png']
+        assert result['fixed'] == 0
+
+        result = verifier.run(image_files, fix=True)
+        assert result['fixed'] == 6
+        with open(os.path.join(temp_dir, 'img_107.json'), encoding='utf-8') as f:
+            assert json.load(f)['imageWidth'] == 34
+        with open(os.path.join(temp_dir, 'img_207.JSON'), encoding='utf-8') as f:
+            assert json.load(f)['imageWidth'] == 32
+        assert verifier.run(image_files)['mismatches'] == []
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_read_image_size()
+    test_verify_and_fix_json_sizes()
+    print("图片尺寸核对测试通过")
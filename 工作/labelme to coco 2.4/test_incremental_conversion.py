@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试增量转换：沿用上次的子集分配，只重写受影响的 instance_*.json，结果与重新解析一致
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+from PIL import Image
+
+import coco_engine
+from test_coco_engine import write_labelme_folder
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def instance_path(output_dir, subset_name):
+    return os.path.join(output_dir, subset_name, 'annotations', f'instance_{subset_name}.json')
+
+
+def test_incremental_conversion():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 30, ['cat', 'dog'])
+        output_dir = os.path.join(temp_dir, 'out')
+        args = ['-i', folder, '-o', output_dir, '--seed', '7', '--max-images', '20', '--no-parallel', '--incremental']
+
+        # 第一次：没有清单，完整转换并生成清单
+        assert coco_engine.main(args) == 0
+        manifest = coco_engine.ConversionManifest.load(output_dir)
+        assert len(manifest.files) == 30
+        mtimes = {name: os.stat(instance_path(output_dir, name)).st_mtime_ns for name in manifest.subsets}
+
+        # 修改一个标注、删除一个文件、新增一个文件
+        changed = os.path.join(folder, 'a_003.json')
+        data = read_json(changed)
+        data['shapes'].append({'label': 'cat', 'shape_type': 'rectangle', 'points': [[1.0, 1.0], [8.0, 9.0]]})
+        with open(changed, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        removed = os.path.join(folder, 'a_005.jpg')
+        os.remove(removed)
+        os.remove(os.path.join(folder, 'a_005.json'))
+        Image.new('RGB', (64, 48)).save(os.path.join(folder, 'a_100.jpg'))
+        shutil.copy(os.path.join(folder, 'a_001.json'), os.path.join(folder, 'a_100.json'))
+        data = read_json(os.path.join(folder, 'a_100.json'))
+        data['imagePath'] = 'a_100.jpg'
+        with open(os.path.join(folder, 'a_100.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        assert coco_engine.main(args) == 0
+        updated = coco_engine.ConversionManifest.load(output_dir)
+        # 增量转换的阶段统计同样追加到分割信息文件
+        with open(os.path.join(output_dir, 'subset_split_info.txt'), encoding='utf-8') as f:
+            assert 'incremental' in f.read()
+        added = os.path.join(folder, 'a_100.jpg')
+        assert removed not in updated.files and added in updated.files
+
+        # 已有文件的子集分配不变
+        for img_file, record in updated.files.items():
+            if img_file in manifest.files:
+                assert record['subset'] == manifest.files[img_file]['subset']
+
+        affected = {manifest.files[os.path.join(folder, 'a_003.jpg')]['subset'],
+                    manifest.files[removed]['subset'], updated.files[added]['subset']}
+        assert not os.path.exists(os.path.join(output_dir, manifest.files[removed]['subset'], 'images', 'a_005.jpg'))
+        assert os.path.exists(os.path.join(output_dir, updated.files[added]['subset'], 'images', 'a_100.jpg'))
+
+        # 重写的标注与重新解析全部文件的结果一致，其余子集未被重写
+        config = coco_engine.ConversionConfig(input_folders=[folder], output_dir=output_dir, parallel_conversion=False)
+        engine = coco_engine.DatasetConversionEngine(config)
+        engine.load_input_folders()
+        engine.build_label_mapping()
+        assert engine.global_converter.label_to_num == updated.labels
+        for subset_name, files in updated.subsets.items():
+            if subset_name not in affected:
+                assert os.stat(instance_path(output_dir, subset_name)).st_mtime_ns == mtimes[subset_name]
+            expected = engine.process_split_json_files_multi(engine.global_converter, files, subset_name)
+            actual = read_json(instance_path(output_dir, subset_name))
+            assert actual['images'] == expected['images']
+            assert actual['annotations'] == expected['annotations']
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_incremental_conversion()
+    print("增量转换测试通过")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试JSON编解码层：各后端输出格式一致，numpy数值可直接写出
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+import json_codec
+import benchmark_json_codec
+from test_coco_engine import write_labelme_folder
+
+
+def test_backends_produce_same_output():
+    data = {'imagePath': '图片.jpg', 'shapes': [{'label': '猫', 'points': [[1.5, 2.0], [30.25, 4.0]]}],
+            'flags': {}, 'empty': [], 'imageHeight': 48}
+    expected_indent = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    expected_compact = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    previous = json_codec.backend
+    try:
+        for name in json_codec.BACKENDS:
+            json_codec.set_backend(name)
+            assert json_codec.dumps(data, indent=True) == expected_indent
+            assert json_codec.dumps(data) == expected_compact
+            assert json_codec.loads(expected_indent) == data
+            assert json_codec.loads(expected_indent.decode('utf-8')) == data
+            assert json_codec.loads(json_codec.dumps({'v': np.int64(3), 'a': np.array([1.5, 2.0])})) == {'v': 3, 'a': [1.5, 2.0]}
+            try:
+                json_codec.loads(b'{"shapes": [')
+                assert False, "应当抛出JSONDecodeError"
+            except json_codec.JSONDecodeError:
+                pass
+    finally:
+        json_codec.set_backend(previous)
+
+
+def test_benchmark_runs_on_labelme_folder():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 5, ['cat', 'dog'])
+        assert benchmark_json_codec.main([folder, '--repeat', '1']) == 0
+        assert benchmark_json_codec.main([os.path.join(temp_dir, 'missing')]) == 1
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_backends_produce_same_output()
+    test_benchmark_runs_on_labelme_folder()
+    print("JSON编解码测试通过")
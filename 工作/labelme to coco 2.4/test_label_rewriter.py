@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试标签批量修改：预筛选、只备份被修改的文件、按回滚日志恢复，以及标签倒排索引
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+import coco_engine
+
+
+def write_labels(folder, name, labels, ensure_ascii=False):
+    data = {'imagePath': name + '.jpg', 'imageHeight': 10, 'imageWidth': 10,
+            'shapes': [{'label': label, 'shape_type': 'polygon', 'points': [[1.0, 1.0], [5.0, 1.0], [3.0, 4.0]]}
+                       for label in labels]}
+    path = os.path.join(folder, name + '.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=ensure_ascii)
+    return path
+
+
+def read_labels(path):
+    with open(path, encoding='utf-8') as f:
+        return [shape['label'] for shape in json.load(f)['shapes']]
+
+
+def test_rewrite_backup_and_rollback():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cat_file = write_labels(temp_dir, 'a', ['cat', 'dog'])
+        escaped_file = write_labels(temp_dir, 'b', ['猫'], ensure_ascii=True)
+        untouched_file = write_labels(temp_dir, 'c', ['dog', 'bird'])
+        originals = {}
+        for path in (cat_file, escaped_file, untouched_file):
+            with open(path, 'rb') as f:
+                originals[path] = f.read()
+
+        rewriter = coco_engine.LabelRewriter({'cat': 'kitty', '猫': '小猫'}, max_workers=2)
+        assert not rewriter.may_match(originals[untouched_file])
+        backup_dir = os.path.join(temp_dir, 'backup')
+        result = rewriter.run(sorted(originals), backup_dir)
+
+        assert [path for path, _ in result['modified']] == [cat_file, escaped_file]
+        assert result['scanned'] == 2 and result['errors'] == []
+        assert read_labels(cat_file) == ['kitty', 'dog']
+        assert read_labels(escaped_file) == ['小猫']
+        # 只备份了被修改的文件
+        assert sorted(os.listdir(backup_dir)) == ['a.json', 'b.json', coco_engine.LABEL_JOURNAL_FILENAME]
+        assert not any(name.endswith('.tmp') for name in os.listdir(temp_dir))
+
+        restored, errors = coco_engine.rollback_label_modification(result['journal'])
+        assert sorted(restored) == [cat_file, escaped_file] and errors == []
+        for path, data in originals.items():
+            with open(path, 'rb') as f:
+                assert f.read() == data
+
+        # 大小写不敏感和正则模式；没有文件被修改时不创建备份目录
+        result = coco_engine.LabelRewriter({'CAT': 'Cat'}, case_sensitive=False).run([cat_file], backup_dir + '2')
+        assert read_labels(cat_file) == ['Cat', 'dog'] and result['journal'] is not None
+        # 含引号和反斜杠的标签在JSON中是转义写法，预筛选不能漏掉
+        quoted_file = write_labels(temp_dir, 'q', ['A"B\\C'])
+        result = coco_engine.LabelRewriter({'a"b\\c': 'abc'}, case_sensitive=False).run([quoted_file])
+        assert read_labels(quoted_file) == ['abc'] and result['scanned'] == 1
+        coco_engine.LabelRewriter({r'^d(o)g$': r'd\1ggy'}, use_regex=True).run([cat_file, untouched_file])
+        assert read_labels(untouched_file) == ['doggy', 'bird']
+        result = coco_engine.LabelRewriter({'fish': 'shark'}).run([cat_file], backup_dir + '3')
+        assert result['modified'] == [] and result['journal'] is None and not os.path.exists(backup_dir + '3')
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_label_file_index_updates_incrementally():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        a = write_labels(temp_dir, 'a', ['cat', 'cat', 'dog'])
+        b = write_labels(temp_dir, 'b', ['dog'])
+        # 扩展名大写的JSON与转换时一样被索引
+        upper = os.path.join(temp_dir, 'u.JSON')
+        os.rename(write_labels(temp_dir, 'u', ['cat']), upper)
+        annotation_index = coco_engine.AnnotationIndex()
+        dataset_index = coco_engine.DatasetIndex()
+        index = coco_engine.LabelFileIndex(temp_dir, annotation_index, dataset_index)
+        assert index.refresh() == 3
+        assert dataset_index.get(temp_dir) is not None
+        assert index.count('cat') == 3 and index.count('dog') == 2 and index.count('fish') == 0
+        assert index.files_for('cat') == {a: 2, upper: 1}
+        os.remove(upper)
+        assert index.refresh() == 1
+        assert index.files_for('dog') == {a: 1, b: 1}
+
+        rewriter = coco_engine.LabelRewriter({'dog': 'puppy'})
+        assert index.preview_changes(rewriter.map_label) == {a: [('dog', 'puppy', 1)], b: [('dog', 'puppy', 1)]}
+
+        # 修改后只重新解析被修改的文件
+        result = rewriter.run([b])
+        for json_file, _ in result['modified']:
+            annotation_index.invalidate(json_file)
+        misses = annotation_index.misses
+        assert index.update_files([b]) == 1
+        assert annotation_index.misses == misses + 1
+        assert index.files_for('dog') == {a: 1} and index.count('puppy') == 1
+
+        # 新增和删除的文件在refresh时更新，未变化的文件不重新解析
+        c = write_labels(temp_dir, 'c', ['bird'])
+        os.remove(a)
+        misses = annotation_index.misses
+        assert index.refresh() == 2
+        assert annotation_index.misses == misses + 1
+        assert index.labels() == {'puppy', 'bird'} and len(index) == 2
+        assert index.files_for('bird') == {c: 1}
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_rewrite_backup_and_rollback()
+    test_label_file_index_updates_incrementally()
+    print("标签修改测试通过")
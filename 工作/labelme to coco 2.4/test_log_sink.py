@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试界面日志队列：多线程写入、级别过滤、日志文件完整记录、分批取出、界面更新项
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import importlib.util
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_gui_module():
+    """加载 labelme to coco 2.4.py（文件名含空格，无法直接import；不会创建窗口）"""
+    module_path = os.path.join(CURRENT_DIR, 'labelme to coco 2.4.py')
+    spec = importlib.util.spec_from_file_location('labelme_to_coco_gui', module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_log_sink_filter_and_file():
+    module = load_gui_module()
+    temp_dir = tempfile.mkdtemp()
+    sink = module.LogSink()
+    try:
+        log_file = os.path.join(temp_dir, 'conversion.log')
+        sink.set_log_file(log_file)
+        sink.set_level('WARNING')
+
+        def worker(index):
+            for i in range(500):
+                sink.put(f"处理文件 {index}-{i}")
+                if i % 100 == 0:
+                    sink.put(f"警告: 标签 'x{index}' 不在全局映射中，跳过该标注")
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 界面更新项与日志按顺序取出，不受显示级别影响，也不写入日志文件
+        updates = []
+        sink.call(updates.append, 0.5)
+        sink.put("处理失败: 测试")
+        sink.put("自定义调试信息", level='DEBUG')
+
+        visible = []
+        batches = 0
+        while True:
+            batch, has_more = sink.drain(limit=300)
+            visible.extend(batch)
+            batches += 1
+            if not has_more:
+                break
+        assert batches > 1
+
+        assert visible[-2] == (module.LogSink.UI_CALL, (updates.append, (0.5,)))
+        func, args = visible.pop(-2)[1]
+        func(*args)
+        assert updates == [0.5]
+
+        # 界面只显示警告及以上
+        assert len(visible) == 4 * 5 + 1
+        assert {level for level, _ in visible} == {'WARNING', 'ERROR'}
+        assert visible[-1] == ('ERROR', "处理失败: 测试")
+
+        sink.close()
+        with open(log_file, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        # 日志文件记录全部消息
+        assert len(lines) == 4 * 505 + 2
+        assert lines[-1].endswith("[DEBUG] 自定义调试信息")
+    finally:
+        sink.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_log_sink_filter_and_file()
+    print("日志队列测试通过")
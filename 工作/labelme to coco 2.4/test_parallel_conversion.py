@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多进程转换：分片+进程池合并后的COCO结果与单进程逐文件转换完全一致
+"""
+
+import os
+import json
+import bisect
+import itertools
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import coco_engine
+
+
+def write_fixture_dataset(folder):
+    """构造测试数据：重复文件名、重复标注、缺失尺寸、越界多边形、未映射标签、坏JSON"""
+    label_files = []
+
+    def write(name, data):
+        path = os.path.join(folder, name + '.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            if isinstance(data, str):
+                f.write(data)
+            else:
+                json.dump(data, f)
+        label_files.append(path)
+
+    for i in range(60):
+        shapes = [
+            {'label': 'cat', 'shape_type': 'polygon',
+             'points': [[1.5 + i, 2.0], [30.2, 4.7 + i % 7], [12.0, 40.9]]},
+            {'label': 'dog', 'shape_type': 'rectangle', 'points': [[50.0, 60.0], [10.0, 20.0]]},
+            # 重复标注，应被去重
+            {'label': 'dog', 'shape_type': 'rectangle', 'points': [[10.0, 20.0], [50.0, 60.0]]},
+            {'label': 'unknown', 'shape_type': 'polygon', 'points': [[0.0, 0.0], [5.0, 0.0], [5.0, 5.0]]},
+            {'label': 'cat', 'shape_type': 'point', 'points': [[3, 3]]},
+        ]
+        if i % 11 == 0:
+            # 完全越界的多边形：转换出错，但之前的标注保留
+            shapes.append({'label': 'cat', 'shape_type': 'polygon',
+                           'points': [[500.0, 500.0], [600.0, 500.0], [550.0, 600.0]]})
+        # 每5个文件复用一次图片文件名
+        image_path = f'..\\images\\img_{i - 1 if i % 5 == 4 else i}.jpg'
+        data = {'imagePath': image_path, 'imageHeight': 80, 'imageWidth': 100, 'shapes': shapes}
+        if i % 13 == 7:
+            del data['imageWidth']
+        write(f'sample_{i}', data)
+
+    write('broken', '{not json')
+    label_files.append(os.path.join(folder, 'missing.json'))
+    return label_files
+
+
+def build_coco(converter, label_files, results, log):
+    builder = coco_engine.CocoSplitBuilder()
+    for label_file, result in zip(label_files, results):
+        if result is None:
+            log.append(f"警告: 找不到对应的JSON文件 {label_file}")
+            continue
+        warnings, error = builder.add_file(result)
+        log.extend(warnings)
+        if error is not None:
+            log.append(f"处理文件 {label_file} 时出错: {error}")
+    data_coco = builder.to_coco(converter)
+    del data_coco['info']['date_created']
+    return data_coco
+
+
+def test_parallel_matches_serial():
+    converter = coco_engine.SimpleLabelme2COCO()
+    for label in ('cat', 'dog'):
+        converter.labels_list.append(label)
+        converter.label_to_num[label] = len(converter.labels_list)
+        converter.categories_list.append(converter.categories(label))
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        label_files = write_fixture_dataset(temp_dir)
+
+        serial_log = []
+        serial = build_coco(converter, label_files,
+                            coco_engine.convert_labelme_files(converter, label_files), serial_log)
+
+        shards = coco_engine.shard_file_list(label_files, 3)
+        assert len(shards) > 1
+        if 'fork' in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context('fork')
+        else:
+            mp_context = None
+        with ProcessPoolExecutor(max_workers=3, mp_context=mp_context) as executor:
+            parallel_results = []
+            for shard_results in executor.map(coco_engine.convert_labelme_files,
+                                              [converter] * len(shards), shards):
+                parallel_results.extend(shard_results)
+        parallel_log = []
+        parallel = build_coco(converter, label_files, parallel_results, parallel_log)
+
+        assert json.dumps(serial, sort_keys=False) == json.dumps(parallel, sort_keys=False)
+        assert serial_log == parallel_log
+        assert serial['annotations'] and serial['images']
+        assert [ann['id'] for ann in serial['annotations']] == list(range(1, len(serial['annotations']) + 1))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class RecordingExecutor:
+    """同步执行分片并记录提交次数，用来检查在途分片数量"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_parallel_conversion_bounds_pending_shards():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        label_files = write_fixture_dataset(temp_dir) * 4
+        config = coco_engine.ConversionConfig(input_folders=[temp_dir], output_dir=temp_dir)
+        engine = coco_engine.DatasetConversionEngine(config)
+        executor = RecordingExecutor()
+        engine._conversion_executor = executor
+        engine._conversion_workers = 2
+        converter = coco_engine.SimpleLabelme2COCO()
+
+        shards = coco_engine.shard_file_list(label_files, 2)
+        max_pending = coco_engine.MAX_PENDING_SHARDS_PER_WORKER * 2
+        assert len(shards) > max_pending
+        shard_ends = list(itertools.accumulate(len(shard) for shard in shards))
+
+        results = []
+        for result in engine._iter_conversion_results(converter, label_files):
+            results.append(result)
+            # 当前分片之后最多再提交max_pending-1个分片
+            current_shard = bisect.bisect_left(shard_ends, len(results))
+            assert executor.submitted <= current_shard + max_pending
+        assert executor.submitted == len(shards)
+        assert len(results) == len(label_files)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_parallel_matches_serial()
+    test_parallel_conversion_bounds_pending_shards()
+    print("多进程转换测试通过")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试图片放置方式：各模式的结果、不支持时退回复制、覆盖旧链接不影响源文件；
+并发放置引擎的结果、进度回调和重试
+"""
+
+import os
+import shutil
+import tempfile
+
+import coco_engine
+
+
+def test_place_file_modes():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        src = os.path.join(temp_dir, 'src.jpg')
+        with open(src, 'wb') as f:
+            f.write(b'\xff\xd8image-bytes')
+
+        for mode in coco_engine.PLACEMENT_MODES:
+            dst = os.path.join(temp_dir, f'{mode}.jpg')
+            actual = coco_engine.place_file(src, dst, mode)
+            assert actual in (mode, 'copy')
+            with open(dst, 'rb') as f:
+                assert f.read() == b'\xff\xd8image-bytes'
+            if actual == 'hardlink':
+                assert os.path.samefile(src, dst)
+            if actual == 'symlink':
+                assert os.path.islink(dst)
+
+        # 目标是上次生成的链接时，重新复制不能写穿到源文件
+        dst = os.path.join(temp_dir, 'hardlink.jpg')
+        with open(src, 'wb') as f:
+            f.write(b'new-bytes')
+        assert coco_engine.place_file(src, dst, 'copy') == 'copy'
+        assert not os.path.samefile(src, dst)
+        with open(src, 'rb') as f:
+            assert f.read() == b'new-bytes'
+
+        try:
+            coco_engine.place_file(src, dst, 'move')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("未知的放置方式应抛出ValueError")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_copy_file_fast_chunks():
+    temp_dir = tempfile.mkdtemp()
+    buffer_size = coco_engine.COPY_BUFFER_SIZE
+    try:
+        src = os.path.join(temp_dir, 'big.bin')
+        dst = os.path.join(temp_dir, 'big_copy.bin')
+        payload = os.urandom(300 * 1024 + 7)
+        with open(src, 'wb') as f:
+            f.write(payload)
+        # 缩小块大小以覆盖多次循环
+        coco_engine.COPY_BUFFER_SIZE = 64 * 1024
+        coco_engine.copy_file_fast(src, dst)
+        with open(dst, 'rb') as f:
+            assert f.read() == payload
+        assert int(os.stat(src).st_mtime) == int(os.stat(dst).st_mtime)
+    finally:
+        coco_engine.COPY_BUFFER_SIZE = buffer_size
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_parallel_copier_progress_and_retry():
+    temp_dir = tempfile.mkdtemp()
+    original_place_file = coco_engine.place_file
+    try:
+        src_dir = os.path.join(temp_dir, 'src')
+        dst_dir = os.path.join(temp_dir, 'dst')
+        os.makedirs(src_dir)
+        os.makedirs(dst_dir)
+        tasks = []
+        for i in range(200):
+            src = os.path.join(src_dir, f'{i}.jpg')
+            with open(src, 'wb') as f:
+                f.write(str(i).encode() * 10)
+            tasks.append((src, os.path.join(dst_dir, f'{i}.jpg')))
+
+        # 第一个文件首次放置失败，应自动重试
+        failed = []
+
+        def flaky_place_file(src, dst, mode='copy'):
+            if src == tasks[0][0] and not failed:
+                failed.append(src)
+                raise OSError("模拟网络存储瞬时错误")
+            return original_place_file(src, dst, mode)
+
+        coco_engine.place_file = flaky_place_file
+        calls = []
+        copier = coco_engine.ParallelFileCopier('copy', max_workers=4, progress_interval=60)
+        copier.run(tasks, lambda done, total: calls.append((done, total)))
+
+        assert calls == [(200, 200)]
+        assert copier.files == 200 and copier.retried == 1
+        assert copier.mode_counts == {'copy': 200}
+        for src, dst in tasks:
+            with open(src, 'rb') as fsrc, open(dst, 'rb') as fdst:
+                assert fsrc.read() == fdst.read()
+        assert '200 个文件' in copier.summary()
+    finally:
+        coco_engine.place_file = original_place_file
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_place_file_modes()
+    test_copy_file_fast_chunks()
+    test_parallel_copier_progress_and_retry()
+    print("图片放置方式测试通过")
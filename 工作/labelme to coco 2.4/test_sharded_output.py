@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分片输出：按索引读取单张图片的标注，重新生成的COCO文件与直接写出的逐字节一致
+"""
+
+import os
+import shutil
+import tempfile
+
+import coco_engine
+import rebuild_coco_json
+from test_coco_engine import write_labelme_folder
+
+
+def test_sharded_output_roundtrip():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        folder = os.path.join(temp_dir, 'a')
+        write_labelme_folder(folder, 40, ['cat', 'dog', 'bird'])
+        common = ['-i', folder, '--seed', '3', '--no-parallel', '--placement', 'hardlink']
+
+        plain_dir = os.path.join(temp_dir, 'plain')
+        sharded_dir = os.path.join(temp_dir, 'sharded')
+        assert coco_engine.main(common + ['-o', plain_dir]) == 0
+        # 分片很小，每个分片只放几张图片
+        assert coco_engine.main(common + ['-o', sharded_dir, '--sharded', '--shard-size-mb', '0.001']) == 0
+
+        for subset in ('train', 'test', 'verify'):
+            annotations_dir = os.path.join(sharded_dir, subset, 'annotations')
+            split_dir = coco_engine.sharded_split_dir(annotations_dir, subset)
+            assert not os.path.exists(os.path.join(annotations_dir, f'instance_{subset}.json'))
+
+            expected = coco_engine.json_codec.load(
+                os.path.join(plain_dir, subset, 'annotations', f'instance_{subset}.json'))
+            with coco_engine.ShardedCocoReader(split_dir) as reader:
+                if subset == 'train':
+                    assert len(reader.meta['shards']) > 1
+                assert reader.image_ids() == [image['id'] for image in expected['images']]
+                for image in expected['images'][::7]:
+                    assert reader.get(image['id']) == (
+                        image, [a for a in expected['annotations'] if a['image_id'] == image['id']])
+                assert reader.get(10 ** 9) == (None, [])
+
+            assert rebuild_coco_json.main([split_dir]) == 0
+            with open(os.path.join(annotations_dir, f'instance_{subset}.json'), 'rb') as f:
+                rebuilt = f.read()
+            with open(os.path.join(plain_dir, subset, 'annotations', f'instance_{subset}.json'), 'rb') as f:
+                assert rebuilt.split(b'"info"')[0] == f.read().split(b'"info"')[0]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_continuation_records_are_indexed():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        split_dir = os.path.join(temp_dir, 'instance_train')
+        writer = coco_engine.ShardedCocoWriter(split_dir, shard_bytes=1)
+        for image_id in (1, 2):
+            writer.add_image({'id': image_id, 'file_name': f'{image_id}.jpg', 'height': 1, 'width': 1})
+            writer.add_annotation({'image_id': image_id, 'category_id': 1, 'id': image_id})
+        # 同名图片的标注来自不相邻的文件
+        writer.add_annotation({'image_id': 1, 'category_id': 2, 'id': 3})
+        summary = writer.finish([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}], {})
+        assert summary['annotations'] == 3 and summary['category_counts'] == {1: 2, 2: 1}
+        assert sorted(os.listdir(temp_dir)) == ['instance_train']
+
+        with coco_engine.ShardedCocoReader(split_dir) as reader:
+            image, annotations = reader.get(1)
+            assert image['file_name'] == '1.jpg'
+            assert [a['id'] for a in annotations] == [1, 3]
+            assert reader.image_ids() == [1, 2]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_sharded_output_roundtrip()
+    test_continuation_records_are_indexed()
+    print("分片输出测试通过")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试流式COCO写出：缩进模式与json.dump逐字节一致，紧凑模式内容一致
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+import coco_engine
+
+
+def build_sample():
+    images = [{'height': 80, 'width': 100, 'id': i + 1, 'file_name': f'图片_{i}.jpg'} for i in range(5)]
+    categories = [{'supercategory': 'component', 'id': 1, 'name': '猫'}, {'supercategory': 'component', 'id': 2, 'name': 'dog'}]
+    annotations = [
+        {'segmentation': [[1.5, 2.0, 30.2, 4.7, 12.0, 40.9]], 'iscrowd': 0, 'image_id': i % 5 + 1,
+         'bbox': [1.0, 2.0, 29.0, 38.0], 'area': 1102.0, 'category_id': i % 2 + 1, 'id': i + 1}
+        for i in range(7)
+    ]
+    info = {'description': 'Converted from Labelme format', 'version': '1.0', 'date_created': '2024-01-01 00:00:00'}
+    return images, categories, annotations, info
+
+
+def write_streaming(json_path, images, categories, annotations, info, compact):
+    writer = coco_engine.StreamingCocoWriter(json_path, compact=compact)
+    for image in images:
+        writer.add_image(image)
+    for annotation in annotations:
+        writer.add_annotation(annotation)
+    return writer.finish(categories, info)
+
+
+def test_streaming_writer_matches_json_dump():
+    temp_dir = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(temp_dir, 'instance_train.json')
+        for images, annotations in [build_sample()[::2], ([], [])]:
+            _, categories, _, info = build_sample()
+            expected = {'images': images, 'categories': categories, 'annotations': annotations, 'info': info}
+
+            summary = write_streaming(json_path, images, categories, annotations, info, compact=False)
+            with open(json_path, encoding='utf-8') as f:
+                assert f.read() == json.dumps(expected, indent=2, ensure_ascii=False)
+            assert summary['images'] == len(images)
+            assert summary['annotations'] == len(annotations)
+
+            write_streaming(json_path, images, categories, annotations, info, compact=True)
+            with open(json_path, encoding='utf-8') as f:
+                text = f.read()
+            assert '\n' not in text
+            assert json.loads(text) == expected
+        # 临时文件已清理
+        assert os.listdir(temp_dir) == ['instance_train.json']
+
+        # 中途放弃（出错或取消）时原有输出保持不变
+        with open(json_path, 'rb') as f:
+            previous = f.read()
+        writer = coco_engine.StreamingCocoWriter(json_path)
+        writer.add_image(images[0] if images else build_sample()[0][0])
+        writer.close()
+        with open(json_path, 'rb') as f:
+            assert f.read() == previous
+        assert os.listdir(temp_dir) == ['instance_train.json']
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    test_streaming_writer_matches_json_dump()
+    print("流式写出测试通过")
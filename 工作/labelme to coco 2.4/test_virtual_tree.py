@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试Treeview行管理：刷新时只更新变化的行，只填充前面一批行
+"""
+
+from virtual_tree import VirtualTreeRows
+
+
+class FakeTree:
+    """记录调用次数的Treeview替身"""
+
+    def __init__(self):
+        self.children = []
+        self.values = {}
+        self.calls = {'insert': 0, 'delete': 0, 'move': 0, 'item': 0}
+        self.idle = []
+
+    def configure(self, **options):
+        self.yscrollcommand = options['yscrollcommand']
+
+    def insert(self, parent, index, iid, values):
+        self.calls['insert'] += 1
+        self.children.insert(len(self.children) if index == 'end' else index, iid)
+        self.values[iid] = values
+
+    def delete(self, *iids):
+        self.calls['delete'] += 1
+        for iid in iids:
+            self.children.remove(iid)
+            del self.values[iid]
+
+    def move(self, iid, parent, index):
+        self.calls['move'] += 1
+        self.children.remove(iid)
+        self.children.insert(index, iid)
+
+    def item(self, iid, values):
+        self.calls['item'] += 1
+        self.values[iid] = values
+
+    def after_idle(self, callback):
+        self.idle.append(callback)
+
+    def rows(self):
+        return [self.values[iid] for iid in self.children]
+
+
+def label_rows(labels, counts=None):
+    counts = counts or {}
+    return [(label, (i + 1, label, counts.get(label, 0))) for i, label in enumerate(labels)]
+
+
+def test_rows_are_diffed_and_filled_lazily():
+    tree = FakeTree()
+    rows = VirtualTreeRows(tree, chunk_size=100)
+    labels = [f'label_{i:04d}' for i in range(1000)]
+
+    rows.set_rows(label_rows(labels))
+    assert len(rows) == 1000 and rows.shown == 100
+    assert tree.rows() == [values for _, values in label_rows(labels)[:100]]
+
+    # 只有一个标签的计数变化
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    rows.set_rows(label_rows(labels, {'label_0003': 9}))
+    assert tree.calls == {'insert': 0, 'delete': 0, 'move': 0, 'item': 1}
+    first = tree.children[0]
+
+    # 删除和新增标签
+    labels = ['new'] + labels[:5] + labels[6:]
+    rows.set_rows(label_rows(labels))
+    assert tree.rows() == [values for _, values in label_rows(labels)[:100]]
+    assert tree.children[1] == first
+
+    # 滚动到底部时追加下一批
+    tree.yscrollcommand('0.5', '0.95')
+    tree.yscrollcommand('0.5', '0.96')
+    assert len(tree.idle) == 1
+    tree.idle.pop()()
+    assert rows.shown == 200
+
+    # 选择还没有填充的行
+    iid = rows.iid_for('label_0700')
+    assert tree.values[iid][1] == 'label_0700' and rows.shown == 800
+    assert rows.iid_for('missing') is None
+
+    # 顺序变化
+    labels.reverse()
+    rows.set_rows(label_rows(labels))
+    assert tree.rows() == [values for _, values in label_rows(labels)[:800]]
+
+    rows.set_rows([('--', ('--', '请先添加文件夹', '--'))])
+    assert tree.rows() == [('--', '请先添加文件夹', '--')]
+
+
+if __name__ == "__main__":
+    test_rows_are_diffed_and_filled_lazily()
+    print("Treeview行管理测试通过")
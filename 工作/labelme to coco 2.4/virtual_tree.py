@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+按差异更新、按需填充的 ttk.Treeview 行
+
+标签映射和文件夹列表在每次添加/删除文件夹后都会刷新。以前每次刷新都先删除全部行再逐行插入，
+每行都是一次Tcl调用，几千个标签时每次点击都会卡住界面。这里记住已经显示的行：
+
+- set_rows 只对值变化的行调用 item，新增和消失的行才 insert/delete，顺序变化时才 move
+- 只插入前面一批行，滚动接近底部时再追加下一批，刷新的开销取决于已显示的行数而不是总行数
+
+只依赖Treeview的 insert/delete/move/item/configure/after_idle，不直接导入tkinter。
+"""
+
+
+class VirtualTreeRows:
+    """
+    Treeview 的行管理
+    
+    每行由唯一的key（标签名、文件夹路径等）和values元组组成；Treeview中的iid由这里生成，
+    选中状态等只跟随key，值变化时不会丢失。
+    
+    Args:
+        tree: ttk.Treeview
+        scrollbar: 纵向滚动条，接管tree的yscrollcommand后转发给它；None时不联动
+        chunk_size: 每次填充的行数
+    """
+    
+    # 可见区域底部超过该比例时追加下一批
+    LOAD_MORE_THRESHOLD = 0.9
+    
+    def __init__(self, tree, scrollbar=None, chunk_size=200):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.chunk_size = chunk_size
+        self._rows = []          # 全部行 [(key, values)]
+        self._shown_keys = []    # 已插入Treeview的行，始终是_rows的前缀
+        self._iids = {}          # key -> iid
+        self._values = {}        # key -> 已显示的values
+        self._next_iid = 0
+        self._load_pending = False
+        tree.configure(yscrollcommand=self._on_yscroll)
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    @property
+    def shown(self):
+        """已插入Treeview的行数"""
+        return len(self._shown_keys)
+    
+    def set_rows(self, rows):
+        """
+        替换全部行，只更新已显示部分中变化的行
+        
+        Args:
+            rows: [(key, values)]，key在列表中唯一
+        """
+        self._rows = [(key, tuple(values)) for key, values in rows]
+        # 已经滚动加载过的行继续保持显示，避免刷新后滚动位置跳回
+        target = self._rows[:max(len(self._shown_keys), self.chunk_size)]
+        new_keys = [key for key, _ in target]
+        new_set = set(new_keys)
+        
+        removed = [key for key in self._shown_keys if key not in new_set]
+        if removed:
+            self.tree.delete(*[self._iids.pop(key) for key in removed])
+            for key in removed:
+                del self._values[key]
+        
+        # 保留下来的行相对顺序变了才移动，之后按顺序插入新行即可得到目标顺序
+        kept = [key for key in self._shown_keys if key in new_set]
+        kept_set = set(kept)
+        kept_in_new_order = [key for key in new_keys if key in kept_set]
+        if kept != kept_in_new_order:
+            for index, key in enumerate(kept_in_new_order):
+                self.tree.move(self._iids[key], '', index)
+        
+        for index, (key, values) in enumerate(target):
+            iid = self._iids.get(key)
+            if iid is None:
+                self._insert(key, values, index)
+            elif self._values[key] != values:
+                self.tree.item(iid, values=values)
+                self._values[key] = values
+        self._shown_keys = new_keys
+    
+    def iid_for(self, key):
+        """key对应的iid，该行还没有显示时先填充到它为止；没有这一行时返回None"""
+        if key not in self._iids:
+            index = next((i for i, (row_key, _) in enumerate(self._rows) if row_key == key), None)
+            if index is None:
+                return None
+            while len(self._shown_keys) <= index:
+                self.load_more()
+        return self._iids[key]
+    
+    def load_more(self):
+        """追加下一批行"""
+        self._load_pending = False
+        start = len(self._shown_keys)
+        for key, values in self._rows[start:start + self.chunk_size]:
+            self._insert(key, values, 'end')
+            self._shown_keys.append(key)
+    
+    def _insert(self, key, values, index):
+        self._next_iid += 1
+        iid = f'row{self._next_iid}'
+        self.tree.insert('', index, iid=iid, values=values)
+        self._iids[key] = iid
+        self._values[key] = values
+    
+    def _on_yscroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        # 插入行会再次触发yscrollcommand，放到空闲时执行
+        if (float(last) >= self.LOAD_MORE_THRESHOLD and len(self._shown_keys) < len(self._rows)
+                and not self._load_pending):
+            self._load_pending = True
+            self.tree.after_idle(self.load_more)